@@ -0,0 +1,359 @@
+''' Implements a local HTTP server that emulates the API Gateway endpoint, with micro-batching.
+
+The server accepts the same event JSON as lambda_handler (POSTed to any path) and returns the
+same response, with the HTTP status set to the response's status code. The model and vectorizer
+are loaded once at startup and stay resident.
+
+Concurrent requests are coalesced: the first request to arrive opens a batch, which is classified
+as soon as it holds BATCH_MAX_SIZE messages or BATCH_MAX_WAIT_MS milliseconds have passed,
+whichever comes first. The messages of every request in the batch are vectorized and passed to
+the model together, and each request receives the predictions for its own messages. Since most
+requests carry a single message, this turns many small predictions into a few large ones.
+
+Events that request metrics ('metrics': true) or a profile ('profile': true) bypass the batcher,
+since their timings would otherwise include the other requests in the batch, and so do events
+that request probabilities ('probabilities': true), since the batcher only returns classes. Only
+'spam_or_ham' events are batched; events that call other functions of the model registry are
+handled directly.
+
+Usage:
+    python -m Resources.BatchingServer --port 8080 --max-wait-ms 5 --max-batch-size 64
+
+    curl -X POST localhost:8080 -d '{"function": "spam_or_ham", "messages": ["Hello"]}'
+    curl localhost:8080/health
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment
+import json                 # For JSON decoding
+import time                 # For measuring the batching window
+import asyncio              # For serving concurrent requests
+import argparse             # For parsing input arguments
+from http import HTTPStatus  # For the HTTP reason phrases
+from concurrent.futures import ThreadPoolExecutor  # For classifying off the event loop
+
+SERVER_HOST = os.environ.get('SERVER_HOST', '127.0.0.1')
+SERVER_PORT = int(os.environ.get('SERVER_PORT', 8080))
+BATCH_MAX_WAIT_MS = float(os.environ.get('BATCH_MAX_WAIT_MS', 5))
+BATCH_MAX_SIZE = int(os.environ.get('BATCH_MAX_SIZE', 64))
+HEALTH_PATH = '/health'
+MAX_BODY_SIZE = 10 * 1024 * 1024
+CONTENT_LENGTH = 'content-length'
+CONNECTION = 'connection'
+ERRORS = 'errors'
+BATCHES = 'batches'
+REQUESTS = 'requests'
+BATCHED_MESSAGES = 'messages'
+
+
+class Micro_Batcher:
+    """ Coalesces the messages of concurrent requests into batches for a classify function """
+
+    def __init__(self, classify, max_wait_ms=BATCH_MAX_WAIT_MS, max_batch_size=BATCH_MAX_SIZE):
+        """ Create the batcher
+
+        Args:
+            classify (callable): Classifies a list of messages, returning the label of each distinct
+                message keyed by message (e.g. lambda_function.classify_messages)
+            max_wait_ms (float): The longest a request waits for other requests to join its batch
+            max_batch_size (int): The number of messages at which a batch is classified immediately
+        """
+
+        self.classify = classify
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.stats = {BATCHES: 0, REQUESTS: 0, BATCHED_MESSAGES: 0}
+        self._queue = None
+        self._task = None
+        # Classification runs on a single thread, one batch at a time, so the event loop stays responsive
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def start(self):
+        """ Start collecting batches on the running event loop """
+
+        self._queue = asyncio.Queue()
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """ Stop collecting batches and release the classification thread """
+
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown()
+
+    async def submit(self, messages):
+        """ Classify the messages of one request as part of the next batch
+
+        Args:
+            messages (list): A list of messages to classify
+
+        Returns:
+            dict: The label of each distinct message, keyed by message and in order of first appearance
+        """
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((messages, future))
+        return await future
+
+    async def _collect(self):
+        """ Wait for a request, then gather more until the batch is full or the window closes """
+
+        batch = [await self._queue.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(request)
+            size += len(request[0])
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            batch = await self._collect()
+            messages = [message for request_messages, _ in batch for message in request_messages]
+
+            self.stats[BATCHES] += 1
+            self.stats[REQUESTS] += len(batch)
+            self.stats[BATCHED_MESSAGES] += len(messages)
+
+            try:
+                labels = await loop.run_in_executor(self._executor, self.classify, messages)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            # Fan the predictions back out to the request that sent each message
+            for request_messages, future in batch:
+                if not future.done():
+                    future.set_result({message: labels[message] for message in dict.fromkeys(request_messages)})
+
+
+class Batching_Server:
+    """ Serves lambda_handler-compatible events over HTTP, micro-batching their messages """
+
+    def __init__(self, batcher, host=SERVER_HOST, port=SERVER_PORT, sock=None):
+        """ Create the server
+
+        Args:
+            batcher (Micro_Batcher): Classifies the messages of valid events
+            host (str): The address to listen on
+            port (int): The port to listen on; 0 picks a free port
+            sock (socket.socket): An already listening socket to accept connections from instead,
+                e.g. one shared by the workers of the pre-fork server
+        """
+
+        self.batcher = batcher
+        self.host = host
+        self.port = port
+        self.sock = sock
+        self._server = None
+
+    async def start(self):
+        """ Start listening; the port actually used is stored in self.port """
+
+        self.batcher.start()
+        if self.sock is not None:
+            self._server = await asyncio.start_server(self._handle_connection, sock=self.sock)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """ Stop listening and stop the batcher """
+
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        await self.batcher.stop()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def handle_event(self, event):
+        """ Classify the messages of an event, as lambda_handler would
+
+        Args:
+            event (dict): A dictionary containing the input data and parameters
+
+        Returns:
+            dict: The same response as lambda_handler
+        """
+
+        import lambda_function
+
+        if isinstance(event, dict) and (event.get(lambda_function.METRICS) is True or
+                                        event.get(lambda_function.PROFILE) is True or
+                                        event.get(lambda_function.PROBABILITIES) is True or
+                                        event.get(lambda_function.FUNCTION) != lambda_function.SPAM_OR_HAM):
+            return await asyncio.get_running_loop().run_in_executor(None, lambda_function.lambda_handler, event)
+
+        validation_errors = lambda_function.event_is_valid(event)
+        if validation_errors is not None:
+            return validation_errors
+
+        messages = event[lambda_function.MESSAGES]
+        try:
+            responses = await self.batcher.submit(messages)
+        except Exception as e:
+            return {
+                lambda_function.STATUS_CODE: lambda_function.STATUS_CODE_BAD_REQUEST,
+                lambda_function.FUNCTION: lambda_function.SPAM_OR_HAM,
+                lambda_function.RESPONSES: lambda_function.EMPTY_DICT,
+                lambda_function.ERRORS: [str(e)]
+            }
+
+        return {
+            lambda_function.STATUS_CODE: lambda_function.STATUS_CODE_SUCCESS,
+            lambda_function.FUNCTION: lambda_function.SPAM_OR_HAM,
+            lambda_function.RESPONSES: lambda_function.format_responses(
+                messages, responses, event.get(lambda_function.RESPONSE_FORMAT, lambda_function.MAP_FORMAT)),
+            lambda_function.ERRORS: []
+        }
+
+    async def _handle_connection(self, reader, writer):
+        """ Serve the requests of one connection, keeping it open unless the client closes it """
+
+        try:
+            while True:
+                try:
+                    head = await self._read_head(reader)
+                except ValueError as e:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {ERRORS: [f'Bad request: {e}']})
+                    break
+                if head is None:
+                    break
+
+                method, path, headers, length = head
+                if length > MAX_BODY_SIZE:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {ERRORS: ['Request body is too large']})
+                    break
+
+                body = await reader.readexactly(length) if length else b''
+                status, response = await self._route(method, path, body)
+                await self._respond(writer, status, response)
+
+                if headers.get(CONNECTION, '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader):
+        """ Read the request line and headers of the next request on a connection
+
+        Returns:
+            tuple: The method, the path, the headers (keyed by lowercase name) and the length of
+                the body, or None if the client closed the connection
+
+        Raises:
+            ValueError: If the request line, a header or the Content-Length is malformed
+        """
+
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+
+        parts = request_line.decode('latin-1').split(' ', 2)
+        if len(parts) != 3:
+            raise ValueError(f'Malformed request line: {request_line.strip()[:100]!r}')
+        method, path, _ = parts
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = headers.get(CONTENT_LENGTH, '0')
+        if not (length.isascii() and length.isdigit()):
+            raise ValueError(f'Invalid Content-Length: {length[:100]!r}')
+
+        return method, path, headers, int(length)
+
+    async def _route(self, method, path, body):
+        import lambda_function
+
+        if method == 'GET' and path == HEALTH_PATH:
+            return HTTPStatus.OK, {'status': 'ok', 'batching': self.batcher.stats}
+
+        if method != 'POST':
+            return HTTPStatus.METHOD_NOT_ALLOWED, {ERRORS: [f'Method not allowed: {method}']}
+
+        try:
+            event = json.loads(body)
+        except Exception as e:
+            return HTTPStatus.BAD_REQUEST, {
+                lambda_function.STATUS_CODE: lambda_function.STATUS_CODE_BAD_REQUEST,
+                lambda_function.FUNCTION: lambda_function.EMPTY_STRING,
+                lambda_function.RESPONSES: lambda_function.EMPTY_DICT,
+                lambda_function.ERRORS: [f'Unable to parse event object: {str(e)}']
+            }
+
+        response = await self.handle_event(event)
+        return HTTPStatus(response[lambda_function.STATUS_CODE]), response
+
+    async def _respond(self, writer, status, response):
+        import lambda_function
+
+        body = lambda_function.serialize_response(response).encode('utf-8')
+        writer.write(f'HTTP/1.1 {status.value} {status.phrase}\r\n'
+                     f'Content-Type: application/json\r\n'
+                     f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+        await writer.drain()
+
+
+def main():
+    """ Load the artifacts and serve the classifier over HTTP """
+
+    parser = argparse.ArgumentParser(description='Serve the classifier over HTTP with micro-batching')
+    parser.add_argument('--host', type=str, default=SERVER_HOST, help='Address to listen on')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='Port to listen on')
+    parser.add_argument('--max-wait-ms', type=float, default=BATCH_MAX_WAIT_MS, help='Longest a request waits for a batch to fill')
+    parser.add_argument('--max-batch-size', type=int, default=BATCH_MAX_SIZE, help='Number of messages that closes a batch immediately')
+    args = parser.parse_args()
+
+    import lambda_function
+
+    lambda_function.warmup()
+
+    # Each batch is classified by the version serving spam_or_ham at the time (see the model registry)
+    batcher = Micro_Batcher(lambda messages: lambda_function.classify_function(lambda_function.SPAM_OR_HAM, messages),
+                            args.max_wait_ms, args.max_batch_size)
+    server = Batching_Server(batcher, args.host, args.port)
+
+    print(f'Serving on http://{args.host}:{args.port}')
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,333 @@
+''' Implements a reproducible per-stage latency benchmark of the lambda function.
+
+The messages in Resources/spam.csv are replayed through each stage of lambda_handler at several
+batch sizes, and the latency of each stage is reported as p50/p95/p99 (in milliseconds), along
+with the end-to-end throughput and the peak memory (RSS) of the process.
+
+Stages:
+    validation:        event_is_valid
+    model_load:        Loading the model from disk (measured once per repeat, independent of batch size)
+    vectorizer_load:   Unpickling the vectorizer (measured once per repeat, independent of batch size)
+    tokenization:      Custom_Tokenizer on the lowercased messages
+    tfidf_transform:   The TF-IDF transform of the already tokenized messages
+    predict:           model.predict on the encoded messages
+    response:          Converting the predictions into the response
+    end_to_end:        lambda_handler, with the artifacts loaded and the prediction cache empty
+
+Usage:
+    Benchmark a backend and save the results:
+        python -m Resources.Benchmark --backend numpy --output numpy.json
+
+    Compare two saved results (e.g. two backends, or the same backend on two commits), exiting
+    with status 1 if any stage of the candidate is slower than the baseline by more than the threshold:
+        python -m Resources.Benchmark --compare keras.json numpy.json --threshold 0.10
+'''
+
+# Import the required libraries
+import os                   # For locating the repository
+import sys                  # For reporting to standard error
+import copy                 # For copying the vectorizer
+import json                 # For saving and loading results
+import time                 # For timing the stages
+import argparse             # For parsing input arguments
+import resource             # For measuring peak memory
+import subprocess           # For recording the current commit
+import numpy as np          # For computing percentiles
+
+from Resources.SpamDataset import load_spam_dataset, SPAM_CSV
+
+VALIDATION = 'validation'
+MODEL_LOAD = 'model_load'
+VECTORIZER_LOAD = 'vectorizer_load'
+TOKENIZATION = 'tokenization'
+TFIDF_TRANSFORM = 'tfidf_transform'
+PREDICT = 'predict'
+RESPONSE = 'response'
+END_TO_END = 'end_to_end'
+LOAD_STAGES = [MODEL_LOAD, VECTORIZER_LOAD]
+BATCH_STAGES = [VALIDATION, TOKENIZATION, TFIDF_TRANSFORM, PREDICT, RESPONSE, END_TO_END]
+COLD = 'cold'               # The batch size key of the load stages
+FULL = 'full'               # Replays the entire dataset as a single batch
+
+DEFAULT_BATCH_SIZES = ['1', '10', '100', '1000', FULL]
+DEFAULT_REPEATS = 20
+DEFAULT_LOAD_REPEATS = 3
+DEFAULT_THRESHOLD = 0.10    # Relative slowdown allowed before a stage counts as a regression
+DEFAULT_MIN_DELTA_MS = 0.05 # Absolute slowdown ignored as noise
+PERCENTILES = {'p50': 50, 'p95': 95, 'p99': 99}
+
+BACKEND = 'backend'
+COMMIT = 'commit'
+BATCH_SIZES = 'batch_sizes'
+STAGES = 'stages'
+THROUGHPUT = 'throughput'
+PEAK_RSS_MB = 'peak_rss_mb'
+
+
+def _pretokenized(tokens):
+    """ Tokenizer for messages that have already been tokenized """
+
+    return tokens
+
+
+def tfidf_only_vectorizer(vectorizer):
+    """ Copy the vectorizer so that it skips tokenization, to time the TF-IDF transform on its own
+
+    Args:
+        vectorizer (TfidfVectorizer or Parallel_Vectorizer): The loaded vectorizer
+
+    Returns:
+        TfidfVectorizer: A copy of the (unwrapped) vectorizer that expects already tokenized messages
+    """
+
+    # A Parallel_Vectorizer reads its attributes from the vectorizer it wraps, so it is unwrapped first
+    vectorizer = getattr(vectorizer, 'vectorizer', vectorizer)
+
+    tfidf_only = copy.copy(vectorizer)
+    tfidf_only.tokenizer = _pretokenized
+    tfidf_only.lowercase = False
+    return tfidf_only
+
+
+class Precomputed_Model:
+    """ Returns predictions computed ahead of time, so the response stage can be timed on its own """
+
+    def __init__(self, predictions):
+        self.predictions = predictions
+
+    def predict(self, encoded_messages, **kwargs):
+        return self.predictions
+
+
+def summarize(timings_ms):
+    """ Compute the latency percentiles of a list of timings
+
+    Args:
+        timings_ms (list): The timings, in milliseconds
+
+    Returns:
+        dict: The p50, p95 and p99 latency, in milliseconds
+    """
+
+    return {name: float(np.percentile(timings_ms, percentile)) for name, percentile in PERCENTILES.items()}
+
+
+def measure(function, repeats):
+    """ Time repeated calls of a function
+
+    Args:
+        function (callable): The function to time, called without arguments
+        repeats (int): The number of times to call it
+
+    Returns:
+        list: The duration of each call, in milliseconds
+    """
+
+    timings_ms = []
+    for _ in range(repeats):
+        start = time.perf_counter_ns()
+        function()
+        timings_ms.append((time.perf_counter_ns() - start) / 1e6)
+    return timings_ms
+
+
+def peak_rss_mb():
+    """ Get the peak resident set size of this process, in megabytes """
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1024 if sys.platform != 'darwin' else peak / (1024 * 1024)
+
+
+def current_commit():
+    """ Get the current git commit, or None if it cannot be determined """
+
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def build_batch(messages, batch_size):
+    """ Get the first batch_size messages, repeating the dataset if it is too short """
+
+    if batch_size == FULL:
+        return list(messages)
+
+    size = int(batch_size)
+    repeats = -(-size // len(messages))
+    return (list(messages) * repeats)[:size]
+
+
+def run_benchmark(backend, batch_sizes=DEFAULT_BATCH_SIZES, repeats=DEFAULT_REPEATS,
+                  load_repeats=DEFAULT_LOAD_REPEATS, dataset_path=SPAM_CSV):
+    """ Benchmark each stage of the lambda function
+
+    Args:
+        backend (str): The model backend to benchmark ('keras' or 'numpy')
+        batch_sizes (list): The batch sizes to replay, as strings ('full' for the entire dataset)
+        repeats (int): The number of times each batch is replayed
+        load_repeats (int): The number of times the model and vectorizer are loaded
+        dataset_path (str): The path to the labeled dataset
+
+    Returns:
+        dict: The backend, commit, per-stage latency percentiles per batch size, end-to-end
+            throughput (messages per second) per batch size, and peak RSS
+    """
+
+    import lambda_function  # Imported here so the backend can be selected before anything is loaded
+
+    lambda_function.MODEL_BACKEND = backend
+    messages, _ = load_spam_dataset(dataset_path)
+    stages = {stage: {} for stage in LOAD_STAGES + BATCH_STAGES}
+    throughput = {}
+
+    # Load the artifacts, timing cold loads of each
+    stages[MODEL_LOAD][COLD] = summarize(measure(lambda_function.load_model, load_repeats))
+    stages[VECTORIZER_LOAD][COLD] = summarize(measure(lambda_function.load_vectorizer, load_repeats))
+
+    lambda_function.clear_artifact_cache()
+    model, vectorizer = lambda_function.get_artifacts()
+    tokenizer = vectorizer.tokenizer.__self__
+
+    tfidf_only = tfidf_only_vectorizer(vectorizer)
+
+    # Warm up every stage once, so lazily loaded resources are not attributed to the first batch
+    lambda_function.warmup()
+
+    for batch_size in batch_sizes:
+        batch = build_batch(messages, batch_size)
+        event = {lambda_function.FUNCTION: lambda_function.SPAM_OR_HAM, lambda_function.MESSAGES: batch}
+        lowercased = [message.lower() for message in batch]
+        tokens = tokenizer.tokenize_many(lowercased)
+        encoded = lambda_function.encode_messages(model, vectorizer, batch)
+        precomputed = Precomputed_Model(model.predict(encoded, verbose=0))
+
+        stages[VALIDATION][batch_size] = summarize(measure(lambda: lambda_function.event_is_valid(event), repeats))
+        stages[TOKENIZATION][batch_size] = summarize(measure(lambda: tokenizer.tokenize_many(lowercased), repeats))
+        stages[TFIDF_TRANSFORM][batch_size] = summarize(measure(lambda: tfidf_only.transform(tokens), repeats))
+        stages[PREDICT][batch_size] = summarize(measure(lambda: model.predict(encoded, verbose=0), repeats))
+        stages[RESPONSE][batch_size] = summarize(
+            measure(lambda: lambda_function.spam_or_ham(precomputed, batch, encoded), repeats))
+
+        def end_to_end():
+            lambda_function.clear_prediction_cache()
+            lambda_function.lambda_handler(event)
+
+        timings_ms = measure(end_to_end, repeats)
+        stages[END_TO_END][batch_size] = summarize(timings_ms)
+        throughput[batch_size] = len(batch) / (np.mean(timings_ms) / 1000)
+
+    return {
+        BACKEND: backend,
+        COMMIT: current_commit(),
+        BATCH_SIZES: list(batch_sizes),
+        STAGES: stages,
+        THROUGHPUT: throughput,
+        PEAK_RSS_MB: peak_rss_mb()
+    }
+
+
+def format_report(results):
+    """ Format the results as a table of p50/p95/p99 latencies per stage and batch size
+
+    Args:
+        results (dict): The results of run_benchmark
+
+    Returns:
+        str: The report
+    """
+
+    lines = [f'Backend: {results[BACKEND]}    Commit: {results[COMMIT]}    Peak RSS: {results[PEAK_RSS_MB]:.1f} MB', '']
+    lines.append(f'{"stage":<18}{"batch":>8}{"p50 ms":>12}{"p95 ms":>12}{"p99 ms":>12}')
+
+    for stage, by_batch in results[STAGES].items():
+        for batch_size, latency in by_batch.items():
+            lines.append(f'{stage:<18}{batch_size:>8}{latency["p50"]:>12.3f}{latency["p95"]:>12.3f}{latency["p99"]:>12.3f}')
+
+    lines.append('')
+    lines.append(f'{"throughput":<18}{"batch":>8}{"msg/s":>12}')
+    for batch_size, messages_per_second in results[THROUGHPUT].items():
+        lines.append(f'{"end_to_end":<18}{batch_size:>8}{messages_per_second:>12.1f}')
+
+    return '\n'.join(lines)
+
+
+def compare_results(baseline, candidate, threshold=DEFAULT_THRESHOLD, min_delta_ms=DEFAULT_MIN_DELTA_MS):
+    """ Find the stages where the candidate is slower than the baseline
+
+    A stage regresses when its p50 or p95 latency grows by more than the threshold (relative)
+    and by more than min_delta_ms (absolute). Peak RSS regresses when it grows by more than the
+    threshold.
+
+    Args:
+        baseline (dict): The results of run_benchmark for the baseline
+        candidate (dict): The results of run_benchmark for the candidate
+        threshold (float): The relative slowdown allowed
+        min_delta_ms (float): The absolute slowdown ignored as noise
+
+    Returns:
+        list: A description of each regression; empty if there are none
+    """
+
+    regressions = []
+
+    for stage, by_batch in candidate[STAGES].items():
+        for batch_size, latency in by_batch.items():
+            expected = baseline[STAGES].get(stage, {}).get(batch_size)
+            if expected is None:
+                continue
+
+            for percentile in ('p50', 'p95'):
+                delta = latency[percentile] - expected[percentile]
+                if delta > min_delta_ms and latency[percentile] > expected[percentile] * (1 + threshold):
+                    regressions.append(f'{stage} (batch {batch_size}) {percentile}: '
+                                       f'{expected[percentile]:.3f} ms -> {latency[percentile]:.3f} ms')
+
+    if candidate[PEAK_RSS_MB] > baseline[PEAK_RSS_MB] * (1 + threshold):
+        regressions.append(f'peak RSS: {baseline[PEAK_RSS_MB]:.1f} MB -> {candidate[PEAK_RSS_MB]:.1f} MB')
+
+    return regressions
+
+
+def main():
+    """ Run the benchmark, or compare two saved results """
+
+    parser = argparse.ArgumentParser(description='Benchmark the stages of the lambda function')
+    parser.add_argument('--backend', type=str, default='numpy', help='Model backend to benchmark (keras or numpy)')
+    parser.add_argument('--batch-sizes', type=str, nargs='+', default=DEFAULT_BATCH_SIZES, help='Batch sizes to replay ("full" for the entire dataset)')
+    parser.add_argument('--repeats', type=int, default=DEFAULT_REPEATS, help='Number of times each batch is replayed')
+    parser.add_argument('--load-repeats', type=int, default=DEFAULT_LOAD_REPEATS, help='Number of times the artifacts are loaded')
+    parser.add_argument('--data', type=str, default=SPAM_CSV, help='Path to the labeled dataset')
+    parser.add_argument('--output', type=str, help='Save the results to this JSON file')
+    parser.add_argument('--compare', type=str, nargs=2, metavar=('BASELINE', 'CANDIDATE'), help='Compare two saved results')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Relative slowdown allowed before failing')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as file:
+            baseline = json.load(file)
+        with open(args.compare[1]) as file:
+            candidate = json.load(file)
+
+        regressions = compare_results(baseline, candidate, args.threshold)
+        for regression in regressions:
+            print(f'REGRESSION: {regression}')
+        print(f'{len(regressions)} regression(s) found')
+        return 1 if regressions else 0
+
+    # Run from the root of the repository, where the artifact paths are relative to
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    results = run_benchmark(args.backend, args.batch_sizes, args.repeats, args.load_repeats, args.data)
+    print(format_report(results))
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,176 @@
+''' Implements streaming classification of large files of messages.
+
+Messages are read lazily from the input file, classified in fixed-size chunks and written to
+the output file as each chunk completes, so memory use does not depend on the size of the file.
+
+Supported input formats (selected by file extension):
+    .jsonl: One message per line, either as a JSON string or as a JSON object with a 'message' field
+    .csv:   One message per row, read from the 'message' column, the 'v2' column (the format of
+            Resources/spam.csv), a column selected with the column argument, or else the first column
+
+The output is a JSON Lines file with one object per input message, in input order:
+    {"index": 0, "message": "message 1", "label": "ham"}
+
+Usage (through the lambda function's command line):
+    python lambda_function.py --input Resources/spam.csv --encoding ISO-8859-1 --output out.jsonl
+'''
+
+# Import the required libraries
+import os                   # For inspecting file extensions
+import csv                  # For reading CSV files
+import sys                  # For writing to standard output
+import json                 # For JSON encoding/decoding
+from itertools import islice  # For reading fixed-size chunks
+
+JSONL_EXTENSION = '.jsonl'
+CSV_EXTENSION = '.csv'
+STDOUT = '-'
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_ENCODING = 'utf-8'
+MESSAGE_FIELD = 'message'
+MESSAGE_COLUMNS = [MESSAGE_FIELD, 'v2']   # Searched in order when no column is specified
+INDEX = 'index'
+LABEL = 'label'
+
+
+def read_jsonl_messages(file):
+    """ Read the messages from a JSON Lines file, one at a time
+
+    Args:
+        file (file): An open JSON Lines file
+
+    Yields:
+        str: Each message in the file
+    """
+
+    for line_number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+
+        record = json.loads(line)
+        if isinstance(record, dict):
+            record = record.get(MESSAGE_FIELD)
+
+        if not isinstance(record, str):
+            raise ValueError(f'Line {line_number} does not contain a message')
+
+        yield record
+
+
+def read_csv_messages(file, column=None):
+    """ Read the messages from a CSV file with a header row, one at a time
+
+    Args:
+        file (file): An open CSV file
+        column (str): The column containing the messages; found automatically if None
+
+    Yields:
+        str: Each message in the file; blank rows are skipped
+
+    Raises:
+        ValueError: If the column is not in the header, or a row is too short to contain it
+    """
+
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    if column is None:
+        column = next((name for name in MESSAGE_COLUMNS if name in header), header[0])
+
+    if column not in header:
+        raise ValueError(f'Column not found in CSV file: {column}')
+
+    index = header.index(column)
+    for row in reader:
+        if not row:
+            continue
+
+        if len(row) <= index:
+            raise ValueError(f'Line {reader.line_num} does not contain a {column} column')
+
+        yield row[index]
+
+
+def read_messages(path, encoding=DEFAULT_ENCODING, column=None):
+    """ Lazily read the messages from a JSON Lines or CSV file
+
+    Args:
+        path (str): The path of the input file
+        encoding (str): The text encoding of the input file
+        column (str): The CSV column containing the messages
+
+    Yields:
+        str: Each message in the file
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension not in (JSONL_EXTENSION, CSV_EXTENSION):
+        raise ValueError(f'Unsupported input file type: {extension or path}')
+
+    with open(path, newline='', encoding=encoding) as file:
+        if extension == JSONL_EXTENSION:
+            yield from read_jsonl_messages(file)
+        else:
+            yield from read_csv_messages(file, column)
+
+
+def chunked(iterable, chunk_size):
+    """ Split an iterable into lists of at most chunk_size items, without reading ahead
+
+    Args:
+        iterable (iterable): The items to split
+        chunk_size (int): The maximum number of items per chunk
+
+    Yields:
+        list: Each chunk of items
+    """
+
+    if chunk_size < 1:
+        raise ValueError('Chunk size must be at least 1')
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def classify_file(input_path, output_path, classify, chunk_size=DEFAULT_CHUNK_SIZE,
+                  encoding=DEFAULT_ENCODING, column=None):
+    """ Classify every message in a file, writing the results as each chunk completes
+
+    Args:
+        input_path (str): The path of the JSON Lines or CSV input file
+        output_path (str): The path of the JSON Lines output file, or '-' for standard output
+        classify (callable): Classifies a list of messages, returning the label of each distinct
+            message keyed by message (e.g. lambda_function.classify_messages)
+        chunk_size (int): The number of messages classified at a time
+        encoding (str): The text encoding of the input file
+        column (str): The CSV column containing the messages
+
+    Returns:
+        int: The number of messages classified
+    """
+
+    output = sys.stdout if output_path == STDOUT else open(output_path, 'w', encoding='utf-8')
+    count = 0
+
+    try:
+        for chunk in chunked(read_messages(input_path, encoding, column), chunk_size):
+            labels = classify(chunk)
+
+            lines = []
+            for message in chunk:
+                lines.append(json.dumps({INDEX: count, MESSAGE_FIELD: message, LABEL: labels[message]}))
+                count += 1
+
+            output.write('\n'.join(lines) + '\n')
+            output.flush()
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    return count
@@ -0,0 +1,312 @@
+''' Implements a two-stage cascade: a linear prefilter in front of the Sequential model.
+
+Most messages are obviously ham or obviously spam. A logistic regression over the same TF-IDF
+features classifies those about as well as the neural network, for the cost of one sparse dot
+product per message. The cascade scores every message with the linear model first, and only the
+messages it is unsure about are passed to the Sequential model:
+
+    p = sigmoid(x . coef + intercept)          (probability of spam)
+    |p - 0.5| >= margin  ->  linear prediction  (confident)
+    otherwise            ->  model.predict(x)   (uncertain)
+
+A margin of 0.45 therefore trusts the linear model below 5% or above 95% spam probability, and a
+margin of 0.5 sends every message to the Sequential model.
+
+The cascade provides the same interface as the model it wraps (predict, input_shape, output_shape
+and supports_sparse), so the lambda function uses it as a drop-in replacement, and it counts how
+many messages took each path.
+
+The linear scorer is trained with scikit-learn and stored as a NumPy archive ('.npz'):
+    coef:      The weight of each feature (vocabulary)
+    intercept: The bias (scalar)
+Serving it only requires NumPy.
+
+The command line splits the dataset into a stratified training and test split (as
+Resources/VocabularyPruning.py does), trains the scorer on the training split only, and reports
+the accuracy and agreement of each margin on the held-out test split, so the margin is not
+chosen on the data the scorer was fitted to.
+
+Usage:
+    Train the linear scorer on the training split and check the cascade against the full model,
+    on the test split, for several margins:
+        python -m Resources.CascadeModel --vectorizer MODEL.pkl --weights MODEL.npz --output MODEL.linear.npz
+
+    Check an existing scorer against a Keras model instead of exported weights:
+        python -m Resources.CascadeModel --vectorizer MODEL.pkl --model MODEL.keras --scorer MODEL.linear.npz
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment
+import argparse             # For parsing input arguments
+import threading            # For counting the paths of concurrent predictions
+import numpy as np          # For numerical operations
+from scipy import sparse    # For scoring sparse TF-IDF vectors without densifying them
+from Resources.InvocationMetrics import NULL_METRICS  # For counting the paths of an invocation
+
+CASCADE_ENABLED = os.environ.get('CASCADE_ENABLED') == '1'
+CASCADE_MARGIN = float(os.environ.get('CASCADE_MARGIN', 0.45))
+DTYPE = np.float32
+COEF = 'coef'
+INTERCEPT = 'intercept'
+REGULARIZATION = 10.0       # Inverse regularization strength (C) of the logistic regression
+DEFAULT_MARGINS = [0.3, 0.4, 0.45, 0.49]
+TEST_SIZE = 0.2             # The fraction of the dataset held out for evaluating the cascade
+
+# Path counters, also used as invocation metric names
+CASCADE_LINEAR = 'cascade_linear'
+CASCADE_MODEL = 'cascade_model'
+
+# Evaluation keys
+MARGIN = 'margin'
+LINEAR_FRACTION = 'linear_fraction'
+CASCADE_ACCURACY = 'cascade_accuracy'
+MODEL_ACCURACY = 'model_accuracy'
+LINEAR_ACCURACY = 'linear_accuracy'
+AGREEMENT = 'agreement'
+
+
+class Linear_Scorer:
+    """ A logistic regression over TF-IDF vectors, evaluated with NumPy """
+
+    def __init__(self, coef, intercept):
+        """ Build the scorer from its weights
+
+        Args:
+            coef (numpy.ndarray): The weight of each feature
+            intercept (float): The bias
+        """
+
+        self.coef = np.asarray(coef, dtype=DTYPE).ravel()
+        self.intercept = DTYPE(np.asarray(intercept).ravel()[0])
+
+    @classmethod
+    def load(cls, path):
+        """ Load a scorer from an archive created by save """
+
+        with np.load(path) as archive:
+            return cls(archive[COEF], archive[INTERCEPT])
+
+    @classmethod
+    def train(cls, encoded_messages, labels, regularization=REGULARIZATION):
+        """ Fit a logistic regression to encoded messages (requires scikit-learn)
+
+        Args:
+            encoded_messages (scipy.sparse matrix): The encoded messages
+            labels (list): The class index of each message (0 = ham, 1 = spam)
+            regularization (float): The inverse regularization strength
+
+        Returns:
+            Linear_Scorer: The trained scorer
+        """
+
+        from sklearn.linear_model import LogisticRegression
+
+        classifier = LogisticRegression(C=regularization, max_iter=1000)
+        classifier.fit(encoded_messages, labels)
+        return cls(classifier.coef_[0], classifier.intercept_)
+
+    def save(self, path):
+        """ Save the scorer to a NumPy archive that load can read """
+
+        np.savez(path, **{COEF: self.coef, INTERCEPT: np.array([self.intercept])})
+
+    @property
+    def num_features(self):
+        return self.coef.shape[0]
+
+    def predict_proba(self, inputs):
+        """ Get the probability that each message is spam
+
+        Args:
+            inputs (numpy.ndarray or scipy.sparse matrix): A 2D array of encoded messages
+
+        Returns:
+            numpy.ndarray: The probability of spam, per message
+        """
+
+        scores = np.asarray(inputs @ self.coef, dtype=DTYPE).ravel() + self.intercept
+        return 1 / (1 + np.exp(-scores))
+
+
+class Cascade_Model:
+    """ Classifies confident messages with a linear scorer and the rest with a model """
+
+    supports_sparse = True  # The scorer takes sparse inputs; the remainder is densified if the model needs it
+
+    def __init__(self, scorer, model, margin=CASCADE_MARGIN):
+        """ Build the cascade
+
+        Args:
+            scorer (Linear_Scorer): The linear prefilter
+            model (keras.models.Sequential or Numpy_Model): The model for uncertain messages
+            margin (float): How far from 0.5 the spam probability must be for the scorer to decide (0 to 0.5)
+        """
+
+        if not 0 <= margin <= 0.5:
+            raise ValueError(f'Cascade margin must be between 0 and 0.5, but got {margin}')
+
+        if scorer.num_features != model.input_shape[-1]:
+            raise ValueError(f'Linear scorer expects {scorer.num_features} input features, '
+                             f'but the model expects {model.input_shape[-1]}')
+
+        self.scorer = scorer
+        self.model = model
+        self.margin = margin
+        self._stats = {CASCADE_LINEAR: 0, CASCADE_MODEL: 0}
+        self._stats_lock = threading.Lock()
+
+    @property
+    def input_shape(self):
+        return self.model.input_shape
+
+    @property
+    def output_shape(self):
+        return self.model.output_shape
+
+    def stats(self):
+        """ Get the number of messages that took each path since the cascade was created """
+
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def predict(self, inputs, metrics=NULL_METRICS, **kwargs):
+        """ Get the probability of each class, per message
+
+        Args:
+            inputs (numpy.ndarray or scipy.sparse matrix): A 2D array of encoded messages
+            metrics (Invocation_Metrics): Counts the messages that took each path
+            kwargs: Passed to the model's predict method
+
+        Returns:
+            numpy.ndarray: The probability of each class (ham, spam), per message
+        """
+
+        spam_probability = self.scorer.predict_proba(inputs)
+
+        outputs = np.empty((spam_probability.shape[0], 2), dtype=DTYPE)
+        outputs[:, 0] = 1 - spam_probability
+        outputs[:, 1] = spam_probability
+
+        uncertain = np.flatnonzero(np.abs(spam_probability - 0.5) < self.margin)
+        if uncertain.size:
+            remainder = inputs[uncertain]
+            if sparse.issparse(remainder) and getattr(self.model, 'supports_sparse', False) is not True:
+                remainder = remainder.toarray()
+            outputs[uncertain] = self.model.predict(remainder, **kwargs)
+
+        num_linear = len(outputs) - uncertain.size
+        with self._stats_lock:
+            self._stats[CASCADE_LINEAR] += num_linear
+            self._stats[CASCADE_MODEL] += uncertain.size
+        metrics.count(CASCADE_LINEAR, num_linear)
+        metrics.count(CASCADE_MODEL, int(uncertain.size))
+
+        return outputs
+
+
+def evaluate_cascade(scorer, model, encoded_messages, labels, margins=DEFAULT_MARGINS):
+    """ Compare the cascade with the full model, for several margins
+
+    The scorer and the model are each evaluated once over every message; the cascade's
+    prediction for a margin is then the scorer's where it is confident and the model's elsewhere.
+
+    Args:
+        scorer (Linear_Scorer): The linear prefilter
+        model (keras.models.Sequential or Numpy_Model): The full model
+        encoded_messages (scipy.sparse matrix): The encoded messages
+        labels (list): The class index of each message
+        margins (list): The margins to evaluate
+
+    Returns:
+        list: For each margin, the fraction of messages classified by the scorer, the accuracy of the
+            cascade, the model and the scorer alone, and how often the cascade agrees with the model
+    """
+
+    labels = np.asarray(labels)
+    spam_probability = scorer.predict_proba(encoded_messages)
+    linear_predictions = (spam_probability >= 0.5).astype(int)
+
+    if getattr(model, 'supports_sparse', False) is not True:
+        encoded_messages = encoded_messages.toarray()
+    model_predictions = np.argmax(model.predict(encoded_messages), axis=1)
+
+    results = []
+    for margin in margins:
+        confident = np.abs(spam_probability - 0.5) >= margin
+        cascade_predictions = np.where(confident, linear_predictions, model_predictions)
+        results.append({
+            MARGIN: margin,
+            LINEAR_FRACTION: float(confident.mean()),
+            CASCADE_ACCURACY: float(np.mean(cascade_predictions == labels)),
+            MODEL_ACCURACY: float(np.mean(model_predictions == labels)),
+            LINEAR_ACCURACY: float(np.mean(linear_predictions == labels)),
+            AGREEMENT: float(np.mean(cascade_predictions == model_predictions))
+        })
+
+    return results
+
+
+def main():
+    """ Train the linear scorer and/or check the cascade against the full model """
+
+    parser = argparse.ArgumentParser(description='Train and evaluate the linear prefilter of the cascade')
+    parser.add_argument('--vectorizer', type=str, required=True, help='Path to the pickled vectorizer')
+    parser.add_argument('--weights', type=str, help='Path to the exported .npz weights of the full model')
+    parser.add_argument('--model', type=str, help='Path to the .keras full model (instead of --weights)')
+    parser.add_argument('--scorer', type=str, help='Path to an existing linear scorer to evaluate')
+    parser.add_argument('--output', type=str, help='Train a linear scorer and save it to this path')
+    parser.add_argument('--data', type=str, default=None, help='Path to the labeled dataset')
+    parser.add_argument('--margins', type=float, nargs='+', default=DEFAULT_MARGINS, help='Margins to evaluate')
+    parser.add_argument('--test-size', type=float, default=TEST_SIZE, help='Fraction of the dataset held out for the evaluation')
+    args = parser.parse_args()
+
+    if bool(args.weights) == bool(args.model):
+        parser.error('exactly one of --weights or --model is required')
+    if bool(args.scorer) == bool(args.output):
+        parser.error('exactly one of --scorer or --output is required')
+
+    import pickle
+    from sklearn.model_selection import train_test_split
+    from Resources.Train import RANDOM_STATE
+    from Resources.CustomTokenizer import Custom_Tokenizer
+    from Resources.NumpyModel import Numpy_Model
+    from Resources.SpamDataset import load_spam_dataset, encode_labels, SPAM_CSV
+
+    with open(args.vectorizer, 'rb') as file:
+        vectorizer = pickle.load(file)
+        vectorizer.tokenizer = Custom_Tokenizer().custom_tokenizer
+
+    messages, labels = load_spam_dataset(args.data or SPAM_CSV)
+    labels = encode_labels(labels)
+    encoded_messages = vectorizer.transform(messages)
+
+    # Train on one split and evaluate on the other, so the reported accuracies are not training accuracies
+    train_messages, test_messages, train_labels, test_labels = train_test_split(
+        encoded_messages, labels, test_size=args.test_size, stratify=labels, random_state=RANDOM_STATE)
+
+    if args.output:
+        scorer = Linear_Scorer.train(train_messages, train_labels)
+        scorer.save(args.output)
+        print(f'Saved the linear scorer to {args.output}')
+    else:
+        scorer = Linear_Scorer.load(args.scorer)
+
+    if args.weights:
+        model = Numpy_Model.load(args.weights)
+    else:
+        import keras
+        model = keras.models.load_model(args.model)
+
+    print(f'Evaluated on the held-out test split: {len(test_labels)} of {len(labels)} messages '
+          f'(stratified, random_state={RANDOM_STATE})' +
+          (f'; the scorer was trained on the other {len(train_labels)}' if args.output else ''))
+    print(f'{"margin":>6}  {"linear %":>8}  {"cascade acc":>11}  {"model acc":>9}  {"linear acc":>10}  {"agreement":>9}')
+    for result in evaluate_cascade(scorer, model, test_messages, test_labels, args.margins):
+        print(f'{result[MARGIN]:>6.3f}  {result[LINEAR_FRACTION] * 100:>8.2f}  {result[CASCADE_ACCURACY]:>11.5f}  '
+              f'{result[MODEL_ACCURACY]:>9.5f}  {result[LINEAR_ACCURACY]:>10.5f}  {result[AGREEMENT]:>9.5f}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
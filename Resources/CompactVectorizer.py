@@ -0,0 +1,420 @@
+''' Implements a compact, memory-mapped replacement for the fitted TF-IDF vectorizer.
+
+Unpickling the vectorizer rebuilds a full scikit-learn TfidfVectorizer, including a Python dict
+with one entry per vocabulary term, and requires scikit-learn at serving time. This module exports
+the fitted state of the vectorizer into a directory of flat files that are memory-mapped on load,
+so loading takes milliseconds and only the pages that are actually used are read from disk:
+
+    config.json:  The vectorizer settings (lowercase, binary, norm) and the table sizes
+    terms.bin:    The vocabulary terms, sorted and UTF-8 encoded, concatenated without separators
+    offsets.npy:  The start of each term in terms.bin, plus the end of the last term (int64)
+    columns.npy:  The feature column of each sorted term (int32)
+    index.npy:    An open-addressing hash table (CRC-32, linear probing) of positions in the
+                  sorted term table, with -1 for empty slots (int32)
+    idf.npy:      The inverse document frequency of each feature column (float64)
+
+Compact_Vectorizer.transform reproduces TfidfVectorizer.transform exactly for the settings used
+by the model (word analyzer with a custom tokenizer, unigrams, no stop words or accent stripping,
+l2 or no normalization): lowercase, tokenize, count, weight by idf, then l2-normalize each row.
+
+Usage:
+    Export the pickled vectorizer:
+        python -m Resources.CompactVectorizer --export MODEL.pkl --vectorizer MODEL.vectorizer
+
+    Verify that the compact vectorizer matches scikit-learn on the training data:
+        python -m Resources.CompactVectorizer --parity MODEL.pkl --vectorizer MODEL.vectorizer
+'''
+
+# Import the required libraries
+import os                   # For building artifact paths
+import json                 # For reading and writing the settings
+import math                 # For computing the l2 norm
+import zlib                 # For hashing the vocabulary terms
+import functools            # For memoizing term lookups
+import argparse             # For parsing input arguments
+from collections.abc import Mapping  # For exposing the vocabulary like a dict
+import numpy as np          # For the memory-mapped tables
+from scipy import sparse    # For building the encoded messages
+
+CONFIG_FILE = 'config.json'
+TERMS_FILE = 'terms.bin'
+OFFSETS_FILE = 'offsets.npy'
+COLUMNS_FILE = 'columns.npy'
+INDEX_FILE = 'index.npy'
+IDF_FILE = 'idf.npy'
+FORMAT_VERSION = 1
+EMPTY_SLOT = -1
+L2_NORM = 'l2'
+TERM_ENCODING = 'utf-8'
+LOOKUP_CACHE_SIZE = 100000  # Most frequent terms looked up without probing the hash table
+
+# Settings of the fitted vectorizer that the compact vectorizer reproduces; anything else is rejected
+SUPPORTED_SETTINGS = {
+    'analyzer': 'word',
+    'ngram_range': (1, 1),
+    'stop_words': None,
+    'strip_accents': None,
+    'preprocessor': None,
+    'sublinear_tf': False,
+    'use_idf': True,
+    'dtype': np.float64
+}
+SUPPORTED_NORMS = [L2_NORM, None]
+
+NUM_SAMPLES = 'num_samples'
+MAX_ABS_DIFFERENCE = 'max_abs_difference'
+IDENTICAL = 'identical'
+
+
+def hash_term(term_bytes):
+    """ Hash a UTF-8 encoded term; stable across processes, unlike hash() """
+
+    return zlib.crc32(term_bytes)
+
+
+def build_index(terms):
+    """ Build the open-addressing hash table of a sorted list of terms
+
+    Args:
+        terms (list): The UTF-8 encoded terms, in sorted order
+
+    Returns:
+        numpy.ndarray: The hash table; each slot holds a position in terms, or -1 if empty
+    """
+
+    # A power of two at least twice the number of terms keeps probe sequences short
+    size = 1
+    while size < 2 * max(len(terms), 1):
+        size *= 2
+
+    index = np.full(size, EMPTY_SLOT, dtype=np.int32)
+    mask = size - 1
+
+    for position, term in enumerate(terms):
+        slot = hash_term(term) & mask
+        while index[slot] != EMPTY_SLOT:
+            slot = (slot + 1) & mask
+        index[slot] = position
+
+    return index
+
+
+class Compact_Vocabulary(Mapping):
+    """ Read-only mapping of vocabulary terms to feature columns, backed by the memory-mapped tables """
+
+    def __init__(self, terms, offsets, columns, index):
+        """ Wrap the vocabulary tables
+
+        Args:
+            terms (numpy.ndarray): The concatenated UTF-8 encoded terms (uint8)
+            offsets (numpy.ndarray): The start of each term, plus the end of the last term
+            columns (numpy.ndarray): The feature column of each term
+            index (numpy.ndarray): The hash table of positions in the term table
+        """
+
+        # Memoryviews return Python ints and bytes slices much faster than indexing NumPy arrays
+        self._terms = memoryview(terms) if len(terms) else memoryview(b'')
+        self._offsets = memoryview(offsets)
+        self._columns = memoryview(columns)
+        self._index = memoryview(index)
+        self._mask = len(index) - 1
+
+    def position(self, term):
+        """ Find the position of a term in the sorted term table
+
+        Args:
+            term (str): The term to look up
+
+        Returns:
+            int: The position of the term, or -1 if it is not in the vocabulary
+        """
+
+        term_bytes = term.encode(TERM_ENCODING)
+        slot = hash_term(term_bytes) & self._mask
+
+        while True:
+            position = self._index[slot]
+            if position == EMPTY_SLOT:
+                return EMPTY_SLOT
+            if self._terms[self._offsets[position]:self._offsets[position + 1]] == term_bytes:
+                return position
+            slot = (slot + 1) & self._mask
+
+    def get(self, term, default=None):
+        position = self.position(term)
+        return default if position == EMPTY_SLOT else self._columns[position]
+
+    def __getitem__(self, term):
+        position = self.position(term)
+        if position == EMPTY_SLOT:
+            raise KeyError(term)
+        return self._columns[position]
+
+    def __contains__(self, term):
+        return isinstance(term, str) and self.position(term) != EMPTY_SLOT
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield bytes(self._terms[self._offsets[position]:self._offsets[position + 1]]).decode(TERM_ENCODING)
+
+
+class Compact_Vectorizer:
+    """ Reproduces TfidfVectorizer.transform from the exported, memory-mapped vocabulary and idf vector """
+
+    analyzer = None         # Replaces lowercasing and tokenization when set to a callable (as in TfidfVectorizer)
+
+    def __init__(self, vocabulary, idf, tokenizer=None, lowercase=True, binary=False, norm=L2_NORM, path=None):
+        """ Create the vectorizer
+
+        Args:
+            vocabulary (Compact_Vocabulary or dict): Maps each term to its feature column
+            idf (numpy.ndarray): The inverse document frequency of each feature column
+            tokenizer (callable): Splits a message into tokens
+            lowercase (bool): Whether messages are lowercased before tokenizing
+            binary (bool): Whether term counts are replaced by 1
+            norm (str): 'l2' to normalize each row, or None
+            path (str): The directory the vectorizer was loaded from, if any
+        """
+
+        if norm not in SUPPORTED_NORMS:
+            raise ValueError(f'Unsupported norm: {norm}')
+
+        self.vocabulary_ = vocabulary
+        self.idf_ = idf
+        self.tokenizer = tokenizer
+        self.lowercase = lowercase
+        self.binary = binary
+        self.norm = norm
+        self.path = path
+        self._idf = memoryview(np.ascontiguousarray(idf, dtype=np.float64))
+        self._lookup = functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)(vocabulary.get)
+
+    @classmethod
+    def load(cls, path, tokenizer=None):
+        """ Memory-map an exported vectorizer
+
+        Args:
+            path (str): The directory written by export_vectorizer
+            tokenizer (callable): Splits a message into tokens
+
+        Returns:
+            Compact_Vectorizer: The vectorizer
+        """
+
+        with open(os.path.join(path, CONFIG_FILE)) as file:
+            config = json.load(file)
+
+        if config['format_version'] != FORMAT_VERSION:
+            raise ValueError(f'Unsupported compact vectorizer format: {config["format_version"]}')
+
+        terms = np.memmap(os.path.join(path, TERMS_FILE), dtype=np.uint8, mode='r') \
+            if os.path.getsize(os.path.join(path, TERMS_FILE)) else np.zeros(0, dtype=np.uint8)
+        offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode='r')
+        columns = np.load(os.path.join(path, COLUMNS_FILE), mmap_mode='r')
+        index = np.load(os.path.join(path, INDEX_FILE), mmap_mode='r')
+        idf = np.load(os.path.join(path, IDF_FILE), mmap_mode='r')
+
+        return cls(Compact_Vocabulary(terms, offsets, columns, index), idf, tokenizer,
+                   config['lowercase'], config['binary'], config['norm'], path)
+
+    def __getstate__(self):
+        # Memoryviews cannot be pickled, so loaded vectorizers are pickled by path and mapped again
+        if self.path is None:
+            raise TypeError('Only a Compact_Vectorizer loaded from disk can be pickled')
+        return {'path': self.path, 'tokenizer': self.tokenizer}
+
+    def __setstate__(self, state):
+        loaded = Compact_Vectorizer.load(state['path'], state['tokenizer'])
+        self.__dict__.update(loaded.__dict__)
+
+    def __copy__(self):
+        # Shallow copies share the mapped tables instead of mapping them again through __getstate__
+        copied = Compact_Vectorizer.__new__(Compact_Vectorizer)
+        copied.__dict__.update(self.__dict__)
+        return copied
+
+    def build_analyzer(self):
+        """ Get the function that turns a message into its list of tokens """
+
+        if callable(self.analyzer):
+            return self.analyzer
+
+        return self._analyze
+
+    def _analyze(self, message):
+        if self.lowercase:
+            message = message.lower()
+        return self.tokenizer(message)
+
+    def transform(self, messages):
+        """ Convert the messages into TF-IDF vectors
+
+        Args:
+            messages (list): A list of messages to encode
+
+        Returns:
+            scipy.sparse.csr_matrix: The encoded messages (messages x features), identical to
+                the output of the fitted TfidfVectorizer
+        """
+
+        if isinstance(messages, str):
+            raise ValueError('Iterable over raw text documents expected, string object received.')
+
+        analyze = self.build_analyzer()
+        lookup = self._lookup
+        idf = self._idf
+        normalize = self.norm == L2_NORM
+
+        indices = []
+        data = []
+        indptr = [0]
+
+        for message in messages:
+            counts = {}
+            for token in analyze(message):
+                column = lookup(token)
+                if column is not None:
+                    counts[column] = counts.get(column, 0) + 1
+
+            # Same order of operations as TfidfVectorizer: sort the columns, weight each count by
+            # its idf, then divide by the l2 norm accumulated in column order
+            columns = sorted(counts)
+            values = [(1 if self.binary else counts[column]) * idf[column] for column in columns]
+
+            if normalize:
+                sum_of_squares = 0.0
+                for value in values:
+                    sum_of_squares += value * value
+
+                if sum_of_squares != 0.0:
+                    norm = math.sqrt(sum_of_squares)
+                    values = [value / norm for value in values]
+
+            indices.extend(columns)
+            data.extend(values)
+            indptr.append(len(indices))
+
+        return sparse.csr_matrix((np.array(data, dtype=np.float64),
+                                  np.array(indices, dtype=np.int32),
+                                  np.array(indptr, dtype=np.int32)),
+                                 shape=(len(indptr) - 1, len(self.idf_)))
+
+
+def export_vectorizer(vectorizer, path):
+    """ Export the fitted state of a TfidfVectorizer to a directory
+
+    Args:
+        vectorizer (TfidfVectorizer): A fitted vectorizer with a custom tokenizer
+        path (str): The directory to write the artifact to; created if it does not exist
+
+    Returns:
+        Compact_Vectorizer: The exported vectorizer, loaded from the directory
+    """
+
+    for setting, expected in SUPPORTED_SETTINGS.items():
+        value = getattr(vectorizer, setting)
+        if value != expected:
+            raise ValueError(f'Unsupported vectorizer setting: {setting}={value!r}')
+
+    if vectorizer.norm not in SUPPORTED_NORMS:
+        raise ValueError(f'Unsupported vectorizer setting: norm={vectorizer.norm!r}')
+
+    if vectorizer.tokenizer is None:
+        raise ValueError('Unsupported vectorizer setting: a custom tokenizer is required')
+
+    vocabulary = sorted(vectorizer.vocabulary_.items())
+    terms = [term.encode(TERM_ENCODING) for term, _ in vocabulary]
+    offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(term) for term in terms])
+
+    os.makedirs(path, exist_ok=True)
+
+    with open(os.path.join(path, TERMS_FILE), 'wb') as file:
+        file.write(b''.join(terms))
+
+    np.save(os.path.join(path, OFFSETS_FILE), offsets)
+    np.save(os.path.join(path, COLUMNS_FILE), np.array([column for _, column in vocabulary], dtype=np.int32))
+    np.save(os.path.join(path, INDEX_FILE), build_index(terms))
+    np.save(os.path.join(path, IDF_FILE), np.asarray(vectorizer.idf_, dtype=np.float64))
+
+    with open(os.path.join(path, CONFIG_FILE), 'w') as file:
+        json.dump({
+            'format_version': FORMAT_VERSION,
+            'num_features': len(vocabulary),
+            'lowercase': bool(vectorizer.lowercase),
+            'binary': bool(vectorizer.binary),
+            'norm': vectorizer.norm
+        }, file, indent=2)
+
+    return Compact_Vectorizer.load(path, vectorizer.tokenizer)
+
+
+def check_parity(vectorizer, compact_vectorizer, messages):
+    """ Compare the output of the fitted TfidfVectorizer and the compact vectorizer
+
+    Args:
+        vectorizer (TfidfVectorizer): The fitted vectorizer
+        compact_vectorizer (Compact_Vectorizer): The vectorizer exported from it
+        messages (list): The messages to encode with both
+
+    Returns:
+        dict: The number of messages compared, the largest absolute difference between the
+            encoded messages, and whether they are identical
+    """
+
+    expected = sparse.csr_matrix(vectorizer.transform(messages))
+    actual = compact_vectorizer.transform(messages)
+    difference = abs(expected - actual)
+
+    return {
+        NUM_SAMPLES: len(messages),
+        MAX_ABS_DIFFERENCE: float(difference.max()) if difference.nnz else 0.0,
+        IDENTICAL: bool(np.array_equal(expected.indptr, actual.indptr)
+                        and np.array_equal(expected.indices, actual.indices)
+                        and np.array_equal(expected.data, actual.data))
+    }
+
+
+def main():
+    """ Export a pickled vectorizer and/or check its parity against scikit-learn """
+
+    parser = argparse.ArgumentParser(description='Export a TF-IDF vectorizer to the compact format')
+    parser.add_argument('--export', type=str, metavar='PICKLE', help='Path to the pickled vectorizer to export')
+    parser.add_argument('--parity', type=str, metavar='PICKLE', help='Path to the pickled vectorizer to compare against')
+    parser.add_argument('--vectorizer', type=str, required=True, help='Path to the compact vectorizer directory')
+    parser.add_argument('--data', type=str, default=None, help='Path to the labeled dataset used by --parity')
+    args = parser.parse_args()
+
+    import pickle
+    from Resources.CustomTokenizer import Custom_Tokenizer
+
+    tokenizer = Custom_Tokenizer().custom_tokenizer
+
+    if args.export:
+        with open(args.export, 'rb') as file:
+            vectorizer = pickle.load(file)
+            vectorizer.tokenizer = tokenizer
+
+        compact_vectorizer = export_vectorizer(vectorizer, args.vectorizer)
+        print(f'Exported {len(compact_vectorizer.vocabulary_)} terms to {args.vectorizer}')
+
+    if args.parity:
+        from Resources.SpamDataset import load_spam_dataset, SPAM_CSV
+
+        with open(args.parity, 'rb') as file:
+            vectorizer = pickle.load(file)
+            vectorizer.tokenizer = tokenizer
+
+        messages, _ = load_spam_dataset(args.data or SPAM_CSV)
+        result = check_parity(vectorizer, Compact_Vectorizer.load(args.vectorizer, tokenizer), messages)
+        print(result)
+        return 0 if result[IDENTICAL] else 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
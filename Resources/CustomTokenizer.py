@@ -1,39 +1,163 @@
+import os                   # For reading configuration from the environment
 import nltk                 # For text processing
+import functools            # For memoizing lemmatization
+import threading            # For guarding initialization
 
 # Import the NLTK libraries
-
-'''
-The following libraries are needed for processing the text messages:
-
-1. punkt: This package is used to split the text into individual words or sentences.
-2. stopwords: Stop words are common words that are removed from text processing tasks to improve the
-   accuracy and efficiency of the results. Examples: 'the', 'is', 'and', 'a', etc.
-3. wordnet: This package is used for lemmatization, which is the process of converting a word to its
-   base form. Example: The lemma of the word 'running' is 'run'.
-'''
-
-# NOTE: When deployed to AWS, these libraries should already be available in an AWS Lambda Layer.
-# The following line sets the path to their location in the AWS Lambda Layer.
-nltk.data.path.append('./opt/nltk_data')
-
-nltk.download('punkt_tab')
-nltk.download('stopwords')
-nltk.download('wordnet')
+# NOTE: The NLTK data (punkt_tab, stopwords and wordnet) is not downloaded at runtime. It must be
+#       bundled with the deployment; see Resources/NltkData.py for where it is looked up.
+from Resources.NltkData import load_packages
+from Resources.FastTokenizer import fast_word_tokenize
 
 from nltk.corpus import stopwords
 from nltk.stem import WordNetLemmatizer
 lemmatizer = WordNetLemmatizer()
 
+STOPWORDS_LANGUAGE = 'english'
+LEMMA_CACHE_SIZE = 100000   # Maximum number of token -> lemma entries kept per tokenizer
+NLTK_ENGINE = 'nltk'        # nltk.word_tokenize (Punkt sentence splitting + Treebank word tokenizer)
+REGEX_ENGINE = 'regex'      # Resources/FastTokenizer.fast_word_tokenize (no Punkt)
+TOKENIZER_ENGINES = [NLTK_ENGINE, REGEX_ENGINE]
+TOKENIZER_ENGINE = os.environ.get('TOKENIZER_ENGINE', NLTK_ENGINE)
+HITS = 'hits'
+MISSES = 'misses'
+SIZE = 'size'
+MAX_SIZE = 'max_size'
+HIT_RATE = 'hit_rate'
+
+# Shared by every tokenizer, since unpickled instances are created without calling __init__
+_initialize_lock = threading.Lock()
+
+
 class Custom_Tokenizer:
+    """ Tokenizer used by the TF-IDF vectorizer to remove stopwords and lemmatize the tokens
+
+    The stopwords are loaded into a set once, and the lemma of each token is memoized in a
+    bounded LRU cache, since the same words are lemmatized over and over again.
+
+    The messages are split into words by nltk.word_tokenize, or by the faster regex-only
+    fast_word_tokenize when the engine is 'regex'. Check the parity of the regex engine with
+    Resources/FastTokenizer.py before using it with a model trained on the NLTK engine.
+
+    Thread safety: initialization runs once, under a lock, and loads every NLTK resource
+    eagerly (see Resources/NltkData.load_packages). After that the tokenizer only reads shared
+    state; the stopword set is immutable and functools.lru_cache is thread-safe. Threaded
+    servers should call initialize() before starting their threads.
+
+    NOTE: The pickled vectorizers reference this class by name, so it must not be renamed.
+          Unpickling does not call __init__, so the stopwords and cache are built on first use.
+    """
+
+    # Defaults for instances restored from pickles created before these attributes existed
+    cache_size = LEMMA_CACHE_SIZE
+    engine = NLTK_ENGINE
+    _stop_words = None
+    _lemmatize = None
+
+    def __init__(self, cache_size=LEMMA_CACHE_SIZE, engine=None):
+        """ Create a tokenizer
+
+        Args:
+            cache_size (int): The maximum number of lemmas to memoize
+            engine (str): The word tokenizer, 'nltk' or 'regex'; TOKENIZER_ENGINE if None
+        """
+
+        engine = TOKENIZER_ENGINE if engine is None else engine
+        if engine not in TOKENIZER_ENGINES:
+            raise ValueError(f'Invalid tokenizer engine: {engine}')
+
+        self.cache_size = cache_size
+        self.engine = engine
+        self._stop_words = None
+        self._lemmatize = None
+
+    def __getstate__(self):
+        # The cache wraps a bound method and cannot be pickled; it is rebuilt on first use
+        return {'cache_size': self.cache_size, 'engine': self.engine}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def initialize(self):
+        """ Load the NLTK resources and build the stopword set and the lemma cache, if not done already
+
+        Safe to call from any number of threads; only the first call does any work.
+
+        Raises:
+            Nltk_Data_Error: If the NLTK data is not available locally
+        """
+
+        if self._lemmatize is not None:
+            return
+
+        with _initialize_lock:
+            if self._lemmatize is not None:
+                return
+
+            load_packages(punkt=self.engine != REGEX_ENGINE)
+            self._stop_words = frozenset(stopwords.words(STOPWORDS_LANGUAGE))
+            # Assigned last: other threads treat a non-None lemma cache as fully initialized
+            self._lemmatize = functools.lru_cache(maxsize=self.cache_size)(lemmatizer.lemmatize)
+
+    # Custom tokenizer function to remove stopwords and use lemmatization
+    def custom_tokenizer(self, text):
+        """ Split a message into tokens, remove the stopwords and lemmatize the remaining tokens
+
+        Args:
+            text (str): The message to tokenize
+
+        Returns:
+            list: The lemmatized tokens
+        """
+
+        if self._lemmatize is None:
+            self.initialize()
+
+        stop_words = self._stop_words
+        lemmatize = self._lemmatize
+        tokens = nltk.word_tokenize(text) if self.engine == NLTK_ENGINE else fast_word_tokenize(text)
+
+        # Split string into tokens, filter for stopwords and perform lemmatization
+        return [lemmatize(token) for token in tokens if token not in stop_words]
+
+    def tokenize_many(self, messages):
+        """ Tokenize a batch of messages
+
+        Args:
+            messages (list): A list of messages to tokenize
+
+        Returns:
+            list: The lemmatized tokens of each message
+        """
+
+        tokenize = self.custom_tokenizer
+        return [tokenize(message) for message in messages]
+
+    def cache_info(self):
+        """ Get the lemma cache statistics
+
+        Returns:
+            dict: The number of cache hits and misses, the current and maximum number of
+                cached lemmas, and the fraction of lookups served from the cache
+        """
+
+        if self._lemmatize is None:
+            hits, misses, size = 0, 0, 0
+        else:
+            info = self._lemmatize.cache_info()
+            hits, misses, size = info.hits, info.misses, info.currsize
+
+        lookups = hits + misses
+        return {
+            HITS: hits,
+            MISSES: misses,
+            SIZE: size,
+            MAX_SIZE: self.cache_size,
+            HIT_RATE: hits / lookups if lookups else 0.0
+        }
+
+    def clear_cache(self):
+        """ Empty the lemma cache and reset its statistics """
 
-   # Custom tokenizer function to remove stopwords and use lemmatization
-   def custom_tokenizer(self, str):
-         # Split string into tokens
-         tokens=nltk.word_tokenize(str)
-         
-         # Filter for stopwords
-         nostop = list(filter(lambda token: token not in stopwords.words('english'), tokens))
-         
-         # Perform lemmatization
-         lemmatized=[lemmatizer.lemmatize(word) for word in nostop]
-         return lemmatized
+        if self._lemmatize is not None:
+            self._lemmatize.cache_clear()
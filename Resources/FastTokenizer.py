@@ -0,0 +1,227 @@
+''' Implements a fast, regex-only alternative to nltk.word_tokenize, and a harness to check its parity.
+
+nltk.word_tokenize splits the text into sentences with the Punkt sentence tokenizer and then
+runs the Treebank word tokenizer (a fixed sequence of precompiled regular expressions) over
+each sentence. Punkt is the expensive part, and the only thing the sentence boundaries change
+in the output is the period at the end of each sentence, which the Treebank tokenizer splits
+off ('spam.' -> 'spam', '.') while it keeps the other periods attached ('Mr.').
+
+fast_word_tokenize skips Punkt. A single precompiled regex finds the periods that end a word
+followed by whitespace, a few rules decide which of them end a sentence (approximating Punkt:
+known abbreviations, initials and numbers followed by a lowercase word do not), those periods
+are split off, and the Treebank tokenizer runs once over the whole message. For single-sentence
+messages the tokens are identical to nltk.word_tokenize by construction; for the rest, only
+Punkt's learned abbreviations and capitalization statistics can make them differ.
+
+It does not need the punkt_tab data, and is selected in Custom_Tokenizer with engine='regex'
+(or TOKENIZER_ENGINE=regex), which then neither requires nor loads punkt_tab (see
+Resources/NltkData.load_packages).
+
+The parity harness runs both tokenizers over every message of the dataset and reports the
+messages whose tokens differ, and optionally how many TF-IDF vectors and model predictions
+differ, so the regex engine is only adopted where its outputs match.
+
+Usage:
+    Compare the tokens (requires the NLTK data):
+        python -m Resources.FastTokenizer --parity
+
+    Also compare the predictions of a model:
+        python -m Resources.FastTokenizer --parity --vectorizer MODEL.pkl --weights MODEL.npz
+'''
+
+# Import the required libraries
+import re                   # For the precompiled regular expressions
+import time                 # For timing both tokenizers
+import argparse             # For parsing input arguments
+from nltk.tokenize.destructive import NLTKWordTokenizer  # The word tokenizer used by nltk.word_tokenize
+
+# Punkt abbreviations common in English text; a period after them does not end a sentence
+ABBREVIATIONS = frozenset([
+    'mr', 'mrs', 'ms', 'dr', 'prof', 'st', 'jr', 'sr', 'vs', 'etc', 'inc', 'ltd', 'co', 'corp',
+    'jan', 'feb', 'mar', 'apr', 'jun', 'jul', 'aug', 'sep', 'sept', 'oct', 'nov', 'dec'
+])
+
+# A word ending with a single period, followed by optional closing punctuation, whitespace and another word
+PERIOD_FINAL_WORD = re.compile(r'(?<!\S)(\S*[^.\s])\.(?=[\]\)}>"\'»”’]*\s+(\S))')
+INTERNAL_PERIODS = re.compile(r'^(?:[a-z]\.)+[a-z]$')      # e.g. 'u.s', 'e.g', 'a.m'
+NUMBER = re.compile(r'^-?[.,]?\d[\d,.-]*$')                 # Punkt's '##number##' type
+LEADING_PUNCTUATION = '([{<"\'`«“‘'
+
+NUM_EXAMPLES = 10
+MESSAGES = 'messages'
+TOKEN_MISMATCHES = 'token_mismatches'
+TOKEN_MATCH_RATE = 'token_match_rate'
+EXAMPLES = 'examples'
+NLTK_SECONDS = 'nltk_seconds'
+REGEX_SECONDS = 'regex_seconds'
+VECTOR_MISMATCHES = 'vector_mismatches'
+PREDICTION_MISMATCHES = 'prediction_mismatches'
+NLTK_ACCURACY = 'nltk_accuracy'
+REGEX_ACCURACY = 'regex_accuracy'
+
+_word_tokenizer = NLTKWordTokenizer()
+
+
+def ends_sentence(word, next_character):
+    """ Decide whether the period after a word ends a sentence, approximating Punkt
+
+    Args:
+        word (str): The word before the period
+        next_character (str): The first character of the next word
+
+    Returns:
+        bool: True if the period ends a sentence
+    """
+
+    word = word.lstrip(LEADING_PUNCTUATION).lower()
+    word = word.rsplit('-', 1)[-1]
+
+    # Initials are almost always followed by a name, which Punkt does not treat as a sentence start
+    if word in ABBREVIATIONS or INTERNAL_PERIODS.match(word) or len(word) == 1 and word.isalpha():
+        return False
+
+    # Numbers (e.g. ordinals) are only treated as abbreviations before a lowercase word
+    if NUMBER.match(word):
+        return not next_character.islower()
+
+    return True
+
+
+def _split_period(match):
+    if ends_sentence(match.group(1), match.group(2)):
+        return f'{match.group(1)} .'
+    return match.group(0)
+
+
+def fast_word_tokenize(text):
+    """ Split a message into tokens, like nltk.word_tokenize but without Punkt
+
+    Args:
+        text (str): The message to tokenize
+
+    Returns:
+        list: The tokens
+    """
+
+    # The Treebank tokenizer splits off the period at the end of the text itself
+    return _word_tokenizer.tokenize(PERIOD_FINAL_WORD.sub(_split_period, text))
+
+
+def check_parity(messages, labels=None, vectorizer=None, model=None, num_examples=NUM_EXAMPLES):
+    """ Compare the regex tokenizer with nltk.word_tokenize on every message
+
+    Args:
+        messages (list): A list of messages
+        labels (list): The class index of each message, to report the accuracy of each tokenizer
+        vectorizer (TfidfVectorizer): The vectorizer, to compare the TF-IDF vectors of both tokenizers
+        model (Numpy_Model or keras.models.Sequential): The model, to compare the predictions (requires vectorizer)
+        num_examples (int): The number of differing messages to include in the report
+
+    Returns:
+        dict: The number of messages whose tokens differ (with examples) and the time taken by
+            each tokenizer, plus the number of differing vectors and predictions when available
+    """
+
+    import nltk
+    import numpy as np
+
+    start = time.perf_counter()
+    nltk_tokens = [nltk.word_tokenize(message) for message in messages]
+    nltk_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    regex_tokens = [fast_word_tokenize(message) for message in messages]
+    regex_seconds = time.perf_counter() - start
+
+    mismatches = [i for i, (expected, result) in enumerate(zip(nltk_tokens, regex_tokens)) if expected != result]
+
+    report = {
+        MESSAGES: len(messages),
+        TOKEN_MISMATCHES: len(mismatches),
+        TOKEN_MATCH_RATE: 1 - len(mismatches) / len(messages) if messages else 1.0,
+        NLTK_SECONDS: nltk_seconds,
+        REGEX_SECONDS: regex_seconds,
+        EXAMPLES: [{'message': messages[i], 'nltk': nltk_tokens[i], 'regex': regex_tokens[i]}
+                   for i in mismatches[:num_examples]]
+    }
+
+    if vectorizer is None:
+        return report
+
+    from Resources.CustomTokenizer import Custom_Tokenizer, NLTK_ENGINE, REGEX_ENGINE
+
+    encoded = {}
+    for engine in (NLTK_ENGINE, REGEX_ENGINE):
+        vectorizer.tokenizer = Custom_Tokenizer(engine=engine).custom_tokenizer
+        encoded[engine] = vectorizer.transform(messages)
+
+    vector_differences = abs(encoded[NLTK_ENGINE] - encoded[REGEX_ENGINE]).max(axis=1).toarray().ravel()
+    report[VECTOR_MISMATCHES] = int(np.count_nonzero(vector_differences))
+
+    if model is None:
+        return report
+
+    predictions = {}
+    for engine, encoded_messages in encoded.items():
+        if getattr(model, 'supports_sparse', False) is not True:
+            encoded_messages = encoded_messages.toarray()
+        predictions[engine] = np.argmax(model.predict(encoded_messages), axis=1)
+
+    report[PREDICTION_MISMATCHES] = int(np.count_nonzero(predictions[NLTK_ENGINE] != predictions[REGEX_ENGINE]))
+    if labels is not None:
+        report[NLTK_ACCURACY] = float(np.mean(predictions[NLTK_ENGINE] == np.asarray(labels)))
+        report[REGEX_ACCURACY] = float(np.mean(predictions[REGEX_ENGINE] == np.asarray(labels)))
+
+    return report
+
+
+def main():
+    """ Report the parity of the regex tokenizer with nltk.word_tokenize """
+
+    parser = argparse.ArgumentParser(description='Compare the regex tokenizer with nltk.word_tokenize')
+    parser.add_argument('--parity', action='store_true', help='Run the parity harness')
+    parser.add_argument('--data', type=str, default=None, help='Path to the labeled dataset')
+    parser.add_argument('--vectorizer', type=str, help='Path to the pickled vectorizer, to compare the TF-IDF vectors')
+    parser.add_argument('--weights', type=str, help='Path to the exported .npz weights, to compare the predictions')
+    parser.add_argument('--model', type=str, help='Path to the .keras model, to compare the predictions')
+    parser.add_argument('--examples', type=int, default=NUM_EXAMPLES, help='Number of differing messages to show')
+    args = parser.parse_args()
+
+    if not args.parity:
+        parser.error('nothing to do; use --parity')
+    if (args.weights or args.model) and not args.vectorizer:
+        parser.error('comparing predictions requires --vectorizer')
+
+    from Resources.NltkData import load_packages
+    from Resources.SpamDataset import load_spam_dataset, encode_labels, SPAM_CSV
+
+    load_packages()
+    messages, labels = load_spam_dataset(args.data or SPAM_CSV)
+
+    vectorizer = None
+    model = None
+    if args.vectorizer:
+        import pickle
+        with open(args.vectorizer, 'rb') as file:
+            vectorizer = pickle.load(file)
+
+    if args.weights:
+        from Resources.NumpyModel import Numpy_Model
+        model = Numpy_Model.load(args.weights)
+    elif args.model:
+        import keras
+        model = keras.models.load_model(args.model)
+
+    report = check_parity(messages, encode_labels(labels), vectorizer, model, args.examples)
+
+    for example in report.pop(EXAMPLES):
+        print(f"{example['message']!r}\n    nltk:  {example['nltk']}\n    regex: {example['regex']}")
+    for key, value in report.items():
+        print(f'{key}: {value}')
+
+    # Non-zero exit status when the regex tokenizer changes any token
+    return 0 if report[TOKEN_MISMATCHES] == 0 else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+''' Implements optional per-invocation metrics for the lambda function.
+
+When enabled, each invocation records how long every stage took, how many messages and tokens
+it processed and how many predictions were served from the prediction cache. The metrics are
+written to standard output as a single line of JSON in the CloudWatch Embedded Metric Format
+(EMF), which CloudWatch Logs turns into metrics without any extra API calls:
+{
+    "_aws": {
+        "Timestamp": 1700000000000,
+        "CloudWatchMetrics": [{
+            "Namespace": "AITextClassifier",
+            "Dimensions": [["function"]],
+            "Metrics": [{"Name": "validation_ms", "Unit": "Milliseconds"}, ...]
+        }]
+    },
+    "function": "spam_or_ham",
+    "validation_ms": 0.012,
+    "messages": 3,
+    ...
+}
+
+When disabled, the handler uses NULL_METRICS, whose methods do nothing, so the only cost is a
+few no-op calls per invocation.
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment
+import sys                  # For writing to standard output
+import json                 # For JSON encoding
+import time                 # For timing the stages
+from contextlib import contextmanager, nullcontext  # For timing blocks of code
+
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED') == '1'
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'AITextClassifier')
+MILLISECONDS = 'Milliseconds'
+COUNT = 'Count'
+STAGE_SUFFIX = '_ms'
+EMF_KEY = '_aws'
+DIMENSION = 'function'
+
+
+class Invocation_Metrics:
+    """ Records the stage timings and counters of a single invocation """
+
+    enabled = True
+
+    def __init__(self, function_name, namespace=METRICS_NAMESPACE, clock=time.perf_counter):
+        """ Start recording the metrics of an invocation
+
+        Args:
+            function_name (str): The function being invoked, used as the metric dimension
+            namespace (str): The CloudWatch namespace of the metrics
+            clock (callable): Returns the current time in seconds
+        """
+
+        self.function_name = function_name
+        self.namespace = namespace
+        self.clock = clock
+        self.stages = {}
+        self.counters = {}
+
+    def set_function(self, function_name):
+        """ Record the metrics under another function, e.g. once the event has been validated """
+
+        self.function_name = function_name
+
+    @contextmanager
+    def stage(self, name):
+        """ Time a block of code, adding its duration to the named stage """
+
+        start = self.clock()
+        try:
+            yield
+        finally:
+            elapsed_ms = (self.clock() - start) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed_ms
+
+    def count(self, name, value=1):
+        """ Add a value to the named counter """
+
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def to_dict(self):
+        """ Get the recorded metrics
+
+        Returns:
+            dict: The duration of each stage (in milliseconds, suffixed with '_ms') and each counter
+        """
+
+        metrics = {f'{name}{STAGE_SUFFIX}': round(value, 3) for name, value in self.stages.items()}
+        metrics.update(self.counters)
+        return metrics
+
+    def to_emf(self, timestamp_ms=None):
+        """ Format the recorded metrics in the CloudWatch Embedded Metric Format
+
+        Args:
+            timestamp_ms (int): The time of the invocation in milliseconds since the epoch; now if None
+
+        Returns:
+            dict: The EMF document
+        """
+
+        metrics = self.to_dict()
+        definitions = [{'Name': name, 'Unit': MILLISECONDS if name.endswith(STAGE_SUFFIX) else COUNT}
+                       for name in metrics]
+
+        document = {
+            EMF_KEY: {
+                'Timestamp': int(time.time() * 1000) if timestamp_ms is None else timestamp_ms,
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [[DIMENSION]],
+                    'Metrics': definitions
+                }]
+            },
+            DIMENSION: self.function_name
+        }
+        document.update(metrics)
+        return document
+
+    def emit(self, stream=None):
+        """ Write the metrics to standard output (or another stream) as a single line of EMF JSON """
+
+        stream = sys.stdout if stream is None else stream
+        stream.write(json.dumps(self.to_emf()) + '\n')
+        stream.flush()
+
+
+class Null_Metrics:
+    """ Stands in for Invocation_Metrics when metrics are disabled, recording nothing """
+
+    enabled = False
+    _context = nullcontext()
+
+    def set_function(self, function_name):
+        pass
+
+    def stage(self, name):
+        return self._context
+
+    def count(self, name, value=1):
+        pass
+
+    def to_dict(self):
+        return {}
+
+    def emit(self, stream=None):
+        pass
+
+
+NULL_METRICS = Null_Metrics()
@@ -0,0 +1,353 @@
+''' Implements an opt-in profiler for invocations of the lambda function.
+
+Chasing a regression needs more than the stage timings of Resources/InvocationMetrics.py: it
+needs to know which functions the time went to and where memory was allocated. When profiling
+is enabled (PROFILING_ENABLED=1, every PROFILE_EVERY_N-th invocation) or requested by an event
+('profile': true), the invocation runs under cProfile and tracemalloc, and three files are
+written to PROFILE_DIR, named after the time, the process ID and the invocation number:
+
+    <name>.prof             The cProfile statistics, for pstats, snakeviz, etc.
+    <name>.allocations.txt  The peak traced memory, and the lines whose allocations made during
+                            the invocation still hold the most memory when it ends (temporary
+                            arrays freed before then only show in the peak)
+    <name>.json             The summary below
+
+The summary reports the time spent in each of the libraries the classifier depends on:
+{
+    "seconds": 0.0123,
+    "library_seconds": {"nltk": 0.0071, "sklearn": 0.0032, "keras": 0.0, "other": 0.002},
+    "peak_allocated_mb": 1.52,
+    "top_functions": [{"function": "...", "calls": 3, "cumulative_seconds": 0.011}, ...],
+    "stats_file": "...", "allocations_file": "...", "summary_file": "..."
+}
+
+A function's own time is counted towards the library its code belongs to. The own time of
+other code (builtins, NumPy, SciPy, this repository) is counted towards the library that called
+it, so the regular expressions run by the NLTK tokenizer count as NLTK and the sparse matrix
+operations run by the vectorizer count as scikit-learn, and the libraries add up to the total.
+Code called from several places is split between them in proportion to the time of each call.
+Keras includes TensorFlow; code not called from any of the libraries is counted as 'other'.
+
+Both profilers slow the invocation down (cProfile by roughly 2x for Python-heavy code), so the
+timings are only meaningful relative to each other. When profiling is off, the handler only
+checks a flag; nothing is imported, started or counted.
+
+NOTE: cProfile can only profile one invocation at a time, so an invocation that would be
+      profiled while another one is (e.g. on a threaded server) runs unprofiled, and its
+      summary is empty.
+
+Usage:
+    Profile an event file from the command line:
+        python -m Resources.InvocationProfiler --event EVENT.json --output DIRECTORY
+
+    Summarize a saved profile:
+        python -m Resources.InvocationProfiler --stats NAME.prof
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment
+import sys                  # For writing to standard output
+import json                 # For JSON encoding
+import time                 # For naming the profiles
+import argparse             # For parsing input arguments
+import itertools            # For counting the invocations
+import threading            # For profiling one invocation at a time
+import tempfile             # For the default profile directory
+from contextlib import contextmanager  # For profiling a block of code
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+PROFILE_EVERY_N = int(os.environ.get('PROFILE_EVERY_N', 1))       # Profile every N-th invocation
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'profiles'))
+PROFILE_TOP_ALLOCATIONS = int(os.environ.get('PROFILE_TOP_ALLOCATIONS', 25))
+PROFILE_TOP_FUNCTIONS = int(os.environ.get('PROFILE_TOP_FUNCTIONS', 10))
+BYTES_PER_MEGABYTE = 1024 * 1024
+
+# The libraries reported separately, and the top-level packages their code lives in
+NLTK = 'nltk'
+SKLEARN = 'sklearn'
+KERAS = 'keras'
+OTHER = 'other'
+LIBRARY_PACKAGES = {
+    'nltk': NLTK,
+    'sklearn': SKLEARN,
+    'keras': KERAS,
+    'tensorflow': KERAS,
+    'tf_keras': KERAS
+}
+LIBRARIES = [NLTK, SKLEARN, KERAS, OTHER]
+BUILTIN_FILENAME = '~'      # The file name cProfile gives to built-in functions
+
+# Summary keys
+SECONDS = 'seconds'
+LIBRARY_SECONDS = 'library_seconds'
+PEAK_ALLOCATED_MB = 'peak_allocated_mb'
+TOP_FUNCTIONS = 'top_functions'
+STATS_FILE = 'stats_file'
+ALLOCATIONS_FILE = 'allocations_file'
+SUMMARY_FILE = 'summary_file'
+STATS_SUFFIX = '.prof'
+ALLOCATIONS_SUFFIX = '.allocations.txt'
+SUMMARY_SUFFIX = '.json'
+PROFILE_KEY = 'profile'
+
+
+def library_of(filename):
+    """ Find the library a source file belongs to
+
+    Args:
+        filename (str): The path of the source file, as recorded by cProfile
+
+    Returns:
+        str: 'nltk', 'sklearn' or 'keras', or None if the file is not part of any of them
+    """
+
+    for part in os.path.normpath(filename).split(os.sep):
+        if part in LIBRARY_PACKAGES:
+            return LIBRARY_PACKAGES[part]
+    return None
+
+
+def library_shares(stats):
+    """ Split the time of every profiled function between the libraries
+
+    Args:
+        stats (dict): The statistics of pstats.Stats, keyed by (filename, line number, function name)
+
+    Returns:
+        dict: The fraction of each function's own time that counts towards each library, keyed like stats
+    """
+
+    shares = {}
+    for function in stats:
+        # Walk up the callers without recursion, since call chains can be deeper than the recursion limit
+        stack = [function]
+        visiting = set()
+        while stack:
+            current = stack[-1]
+            if current in shares:
+                stack.pop()
+                continue
+
+            library = library_of(current[0]) if current[0] != BUILTIN_FILENAME else None
+            callers = stats[current][4]
+            if library is not None or not callers:
+                shares[current] = {library or OTHER: 1.0}
+                stack.pop()
+                continue
+
+            if current not in visiting:
+                visiting.add(current)
+                stack.extend(caller for caller in callers if caller not in shares and caller not in visiting)
+                continue
+
+            # Every caller has been resolved, except those that are part of a recursive cycle
+            weights = {caller: edge[3] for caller, edge in callers.items()}
+            if not any(weights.values()):
+                weights = {caller: edge[1] for caller, edge in callers.items()}
+            total = sum(weights.values()) or 1.0
+
+            share = {}
+            for caller, weight in weights.items():
+                for caller_library, fraction in shares.get(caller, {OTHER: 1.0}).items():
+                    share[caller_library] = share.get(caller_library, 0.0) + fraction * weight / total
+            shares[current] = share
+            visiting.discard(current)
+            stack.pop()
+
+    return shares
+
+
+def summarize_stats(stats, top_functions=PROFILE_TOP_FUNCTIONS):
+    """ Summarize profiling statistics
+
+    Args:
+        stats (pstats.Stats): The statistics of a profile
+        top_functions (int): The number of functions with the highest cumulative time to include
+
+    Returns:
+        dict: The total time, the time spent in each library and the functions with the highest
+            cumulative time, in seconds
+    """
+
+    shares = library_shares(stats.stats)
+
+    library_seconds = dict.fromkeys(LIBRARIES, 0.0)
+    for function, (_, _, own_time, _, _) in stats.stats.items():
+        for library, fraction in shares[function].items():
+            library_seconds[library] += own_time * fraction
+
+    functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top_functions]
+
+    return {
+        SECONDS: round(stats.total_tt, 6),
+        LIBRARY_SECONDS: {library: round(seconds, 6) for library, seconds in library_seconds.items()},
+        TOP_FUNCTIONS: [{
+            'function': f'{filename}:{line}({name})',
+            'calls': calls,
+            'cumulative_seconds': round(cumulative_time, 6)
+        } for (filename, line, name), (_, calls, _, cumulative_time, _) in functions]
+    }
+
+
+class Invocation_Profiler:
+    """ Profiles invocations with cProfile and tracemalloc, and writes the results to a directory """
+
+    def __init__(self, directory=PROFILE_DIR, every_n=PROFILE_EVERY_N, top_allocations=PROFILE_TOP_ALLOCATIONS,
+                 top_functions=PROFILE_TOP_FUNCTIONS):
+        """ Create the profiler
+
+        Args:
+            directory (str): The directory the profiles are written to; created when needed
+            every_n (int): Profile every N-th invocation counted by due()
+            top_allocations (int): The number of allocation sites written to the allocations file
+            top_functions (int): The number of functions included in the summary
+        """
+
+        if every_n < 1:
+            raise ValueError(f'Profiling requires every_n to be at least 1, but got {every_n}')
+
+        self.directory = directory
+        self.every_n = every_n
+        self.top_allocations = top_allocations
+        self.top_functions = top_functions
+        self._invocations = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def due(self):
+        """ Count an invocation, and check whether it is one of the invocations to profile """
+
+        return next(self._invocations) % self.every_n == 0
+
+    @contextmanager
+    def profile(self):
+        """ Profile a block of code
+
+        Yields:
+            dict: The summary of the profile (see summarize_stats), filled in when the block exits,
+                with the peak traced memory and the paths of the files written; empty if another
+                invocation was being profiled
+        """
+
+        summary = {}
+        if not self._lock.acquire(blocking=False):
+            yield summary
+            return
+
+        import cProfile
+        import tracemalloc
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+
+        try:
+            profiler.enable()
+            try:
+                yield summary
+            finally:
+                profiler.disable()
+                _, peak = tracemalloc.get_traced_memory()
+                snapshot = tracemalloc.take_snapshot()
+                if started_tracing:
+                    tracemalloc.stop()
+            summary.update(self.write(profiler, snapshot, peak))
+        finally:
+            self._lock.release()
+
+    def write(self, profiler, snapshot, peak):
+        """ Write the statistics, the top allocation sites and the summary of a profile
+
+        Args:
+            profiler (cProfile.Profile): The profiler, after it was disabled
+            snapshot (tracemalloc.Snapshot): The memory allocations traced during the profile
+            peak (int): The peak traced memory during the profile, in bytes
+
+        Returns:
+            dict: The summary of the profile
+        """
+
+        import pstats
+        import tracemalloc
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = os.path.join(self.directory, f'{time.strftime("%Y%m%dT%H%M%S")}_{os.getpid()}_{next(_profile_numbers)}')
+
+        stats_file = name + STATS_SUFFIX
+        profiler.dump_stats(stats_file)
+
+        summary = summarize_stats(pstats.Stats(profiler), self.top_functions)
+        summary[PEAK_ALLOCATED_MB] = round(peak / BYTES_PER_MEGABYTE, 3)
+
+        # Leave out the allocations made by the import system and by tracemalloc itself
+        snapshot = snapshot.filter_traces([
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<unknown>')
+        ])
+        allocations_file = name + ALLOCATIONS_SUFFIX
+        with open(allocations_file, 'w') as file:
+            file.write(f'Peak traced memory: {summary[PEAK_ALLOCATED_MB]} MB\n')
+            file.write(f'Top {self.top_allocations} allocation sites still holding memory:\n')
+            for statistic in snapshot.statistics('lineno')[:self.top_allocations]:
+                file.write(f'{statistic}\n')
+
+        summary[STATS_FILE] = stats_file
+        summary[ALLOCATIONS_FILE] = allocations_file
+        summary[SUMMARY_FILE] = name + SUMMARY_SUFFIX
+        with open(summary[SUMMARY_FILE], 'w') as file:
+            json.dump(summary, file, indent=2)
+
+        return summary
+
+
+# Numbers the profiles written by this process, so profiles written in the same second do not collide
+_profile_numbers = itertools.count(1)
+
+
+def emit(summary, stream=None):
+    """ Write the summary of a profile to standard output (or another stream) as a single line of JSON """
+
+    stream = sys.stdout if stream is None else stream
+    stream.write(json.dumps({PROFILE_KEY: summary}) + '\n')
+    stream.flush()
+
+
+def main():
+    """ Profile an invocation of the lambda function, or summarize a saved profile """
+
+    parser = argparse.ArgumentParser(description='Profile the lambda function')
+    parser.add_argument('--event', type=str, help='Path to a JSON event to profile lambda_handler with')
+    parser.add_argument('--output', type=str, default=PROFILE_DIR, help='Directory to write the profile to')
+    parser.add_argument('--warmup', action='store_true', help='Load the artifacts before profiling, to leave out the cold start')
+    parser.add_argument('--stats', type=str, help='Path to a saved profile (.prof) to summarize')
+    parser.add_argument('--top', type=int, default=PROFILE_TOP_FUNCTIONS, help='Number of functions to show')
+    args = parser.parse_args()
+
+    if bool(args.event) == bool(args.stats):
+        parser.error('use exactly one of --event and --stats')
+
+    if args.stats:
+        import pstats
+        summary = summarize_stats(pstats.Stats(args.stats), args.top)
+    else:
+        import lambda_function
+
+        with open(args.event) as file:
+            event = json.load(file)
+        if args.warmup:
+            lambda_function.warmup()
+
+        profiler = Invocation_Profiler(args.output, top_functions=args.top)
+        with profiler.profile() as summary:
+            response = lambda_function.lambda_handler(event)
+        print(f'status_code: {response[lambda_function.STATUS_CODE]}')
+
+    print(json.dumps(summary, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,528 @@
+''' Implements an open-loop load generator that replays Resources/spam.csv against the classifier.
+
+The benchmark (see Resources/Benchmark.py) is closed-loop: it sends the next request when the
+previous one returns, so it never queues and cannot show how latency grows under load. The load
+generator is open-loop: requests arrive on a schedule fixed in advance, at a target rate, whether
+or not the earlier ones have returned, like traffic from many independent clients. When the
+target cannot keep up, requests queue and their latency grows, which is what sizing a fleet needs.
+
+Arrivals follow a Poisson process (exponential gaps, the usual model of independent clients) or
+a fixed rate. Each request carries the next messages of the dataset, replayed in order, and its
+batch size is drawn from a distribution such as '1:0.8,10:0.15,100:0.05' (sizes and weights).
+
+Targets:
+    handler:  lambda_handler, called in this process on a pool of threads (one by default, like
+              a single Lambda container, which serves one invocation at a time)
+    http:     A running server (see Resources/BatchingServer.py and Resources/PreforkServer.py),
+              over a pool of keep-alive connections
+
+The latency of a request is measured from the time it was scheduled to arrive, not from the time
+it was sent, so a generator that falls behind its schedule cannot hide queueing delay (coordinated
+omission); how far it fell behind is reported as the generator lag. Requests that would exceed
+the in-flight limit are dropped and counted, rather than delaying the schedule.
+
+The report includes the achieved throughput, the latency percentiles and error counts of the whole
+run and of each interval (by completion time), and can sweep several rates to find the highest rate
+whose p99 latency and error rate stay within a limit.
+
+NOTE: The prediction cache serves repeated messages without the model, so once the dataset has been
+      replayed the in-process handler gets faster. Set PREDICTION_CACHE_SIZE=0 to measure the model
+      on every request.
+
+Usage:
+    Drive lambda_handler in this process:
+        python -m Resources.LoadGenerator --target handler --rate 50 --duration 30
+
+    Drive a server, sweeping rates to find where p99 exceeds 100 ms:
+        python -m Resources.LoadGenerator --target http://127.0.0.1:8080/ --rates 100 200 400 800 --slo-ms 100
+'''
+
+# Import the required libraries
+import os                   # For locating the repository
+import json                 # For encoding the events and saving the results
+import math                 # For counting the intervals
+import asyncio              # For sending requests on schedule without waiting for the previous ones
+import argparse             # For parsing input arguments
+import urllib.parse         # For parsing the server URL
+import numpy as np          # For drawing the arrivals and batch sizes
+from concurrent.futures import ThreadPoolExecutor  # For calling lambda_handler without blocking the schedule
+
+from Resources.SpamDataset import load_spam_dataset, SPAM_CSV
+from Resources.Benchmark import summarize
+
+POISSON = 'poisson'
+FIXED = 'fixed'
+ARRIVAL_PROCESSES = [POISSON, FIXED]
+HANDLER_TARGET = 'handler'
+DEFAULT_RATE = 50.0             # Requests per second
+DEFAULT_DURATION = 30.0         # Seconds
+DEFAULT_BATCH_SIZES = '1'
+DEFAULT_INTERVAL = 1.0          # Seconds per interval of the report
+DEFAULT_MAX_IN_FLIGHT = 1000
+DEFAULT_TIMEOUT = 30.0          # Seconds
+DEFAULT_THREADS = 1
+DEFAULT_MAX_ERROR_RATE = 0.01
+DEFAULT_SEED = 0
+CLOSING_STATUSES = (400, 413)     # Errors after which the server may close the connection
+TIMEOUT = 'timeout'
+DROPPED = 'dropped'
+FUNCTION = 'function'
+EVENT_MESSAGES = 'messages'
+SPAM_OR_HAM = 'spam_or_ham'
+STATUS_CODE = 'status_code'
+
+# Result keys
+PROCESS = 'process'
+RATE = 'rate'
+DURATION = 'duration'
+BATCH_SIZES = 'batch_sizes'
+REQUESTS = 'requests'
+COMPLETED = 'completed'
+ERRORS = 'errors'
+ERROR_RATE = 'error_rate'
+THROUGHPUT = 'throughput'
+REQUESTS_PER_SECOND = 'requests_per_second'
+MESSAGES_PER_SECOND = 'messages_per_second'
+LATENCY_MS = 'latency_ms'
+GENERATOR_LAG_MS = 'generator_lag_ms'
+INTERVALS = 'intervals'
+START = 'start'
+
+
+def parse_batch_sizes(spec):
+    """ Parse a batch size distribution
+
+    Args:
+        spec (str): Comma-separated batch sizes, each optionally followed by ':' and its weight,
+            e.g. '1:0.8,10:0.15,100:0.05'; sizes without a weight have a weight of 1
+
+    Returns:
+        tuple: The batch sizes (list of int) and the probability of each (list of float)
+
+    Raises:
+        ValueError: If a size is not a positive integer or a weight is not a positive number
+    """
+
+    sizes = []
+    weights = []
+    for item in spec.split(','):
+        size, _, weight = item.strip().partition(':')
+        try:
+            size = int(size)
+            weight = float(weight) if weight else 1.0
+        except ValueError:
+            raise ValueError(f'Invalid batch size distribution: {spec}') from None
+        if size < 1 or not weight > 0:
+            raise ValueError(f'Invalid batch size distribution: {spec}; sizes and weights must be positive')
+        sizes.append(size)
+        weights.append(weight)
+
+    total = sum(weights)
+    return sizes, [weight / total for weight in weights]
+
+
+def arrival_offsets(rate, duration, process=POISSON, rng=None):
+    """ Schedule the arrivals of the requests
+
+    Args:
+        rate (float): The mean number of requests per second
+        duration (float): The length of the schedule, in seconds
+        process (str): 'poisson' for exponentially distributed gaps, or 'fixed' for equal gaps
+        rng (numpy.random.Generator): The random number generator for Poisson arrivals
+
+    Returns:
+        numpy.ndarray: The time of each arrival, in seconds from the start, in increasing order
+
+    Raises:
+        ValueError: If the rate or duration is not positive, or the process is unknown
+    """
+
+    if not rate > 0 or not duration > 0:
+        raise ValueError(f'Rate and duration must be positive, but got {rate} and {duration}')
+
+    if process == FIXED:
+        offsets = np.arange(math.ceil(rate * duration)) / rate
+    elif process == POISSON:
+        rng = np.random.default_rng() if rng is None else rng
+        expected = rate * duration
+        offsets = np.cumsum(rng.exponential(1 / rate, int(expected + 6 * math.sqrt(expected) + 10)))
+        while offsets[-1] < duration:
+            offsets = np.concatenate([offsets, offsets[-1] + np.cumsum(rng.exponential(1 / rate, len(offsets)))])
+    else:
+        raise ValueError(f'Unknown arrival process: {process}; expected one of {ARRIVAL_PROCESSES}')
+
+    return offsets[offsets < duration]
+
+
+class Message_Replayer:
+    """ Replays the messages of the dataset in order, starting over when they run out """
+
+    def __init__(self, messages):
+        if not messages:
+            raise ValueError('Replaying requires at least one message')
+        self.messages = list(messages)
+        self._position = 0
+
+    def next_batch(self, size):
+        """ Get the next size messages """
+
+        batch = []
+        while len(batch) < size:
+            end = min(len(self.messages), self._position + size - len(batch))
+            batch.extend(self.messages[self._position:end])
+            self._position = end % len(self.messages)
+        return batch
+
+
+class Handler_Target:
+    """ Sends events to lambda_handler in this process, on a pool of threads """
+
+    def __init__(self, handler=None, threads=DEFAULT_THREADS):
+        """ Create the target
+
+        Args:
+            handler (callable): Handles an event and returns the response; lambda_handler if None
+            threads (int): The number of events handled at the same time; the rest wait in a queue
+        """
+
+        if handler is None:
+            import lambda_function
+            handler = lambda_function.lambda_handler
+
+        self.handler = handler
+        self.executor = ThreadPoolExecutor(threads)
+
+    async def send(self, event):
+        """ Handle an event
+
+        Returns:
+            str: The error, or None if the event was handled successfully
+        """
+
+        response = await asyncio.get_running_loop().run_in_executor(self.executor, self.handler, event)
+        status_code = response.get(STATUS_CODE)
+        return None if status_code == 200 else f'status_{status_code}'
+
+    async def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class Http_Target:
+    """ Posts events to a server, reusing keep-alive connections """
+
+    def __init__(self, url):
+        """ Create the target
+
+        Args:
+            url (str): The URL the events are posted to, e.g. 'http://127.0.0.1:8080/'
+        """
+
+        parsed = urllib.parse.urlsplit(url)
+        if parsed.scheme != 'http' or not parsed.hostname:
+            raise ValueError(f'Invalid target URL: {url}; expected http://HOST:PORT/PATH')
+
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = parsed.path or '/'
+        self._idle = []
+
+    async def send(self, event):
+        """ Post an event
+
+        Returns:
+            str: The error, or None if the server responded with status 200
+        """
+
+        body = json.dumps(event).encode('utf-8')
+        request = (f'POST {self.path} HTTP/1.1\r\nHost: {self.host}:{self.port}\r\n'
+                   f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n').encode('latin-1') + body
+
+        reader, writer = self._idle.pop() if self._idle else await asyncio.open_connection(self.host, self.port)
+        try:
+            writer.write(request)
+            await writer.drain()
+            status, keep_alive = await self._read_response(reader)
+        except BaseException:
+            # The connection may hold a partial response, so it cannot be reused
+            writer.close()
+            raise
+
+        # Connections the server has closed (or is about to) are dropped rather than reused
+        if keep_alive and status not in CLOSING_STATUSES and not reader.at_eof():
+            self._idle.append((reader, writer))
+        else:
+            writer.close()
+        return None if status == 200 else f'http_{status}'
+
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionError('Server closed the connection')
+
+        length = 0
+        keep_alive = True
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                keep_alive = keep_alive and line != b''
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name = name.strip().lower()
+            if name == 'content-length':
+                length = int(value)
+            elif name == 'connection' and value.strip().lower() == 'close':
+                keep_alive = False
+
+        await reader.readexactly(length)
+        return int(status_line.split()[1]), keep_alive
+
+    async def close(self):
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+async def run_load(target, messages, rate, duration, process=POISSON, batch_sizes=DEFAULT_BATCH_SIZES,
+                   interval=DEFAULT_INTERVAL, max_in_flight=DEFAULT_MAX_IN_FLIGHT, timeout=DEFAULT_TIMEOUT,
+                   seed=DEFAULT_SEED):
+    """ Send requests to a target on an open-loop schedule
+
+    Args:
+        target (Handler_Target or Http_Target): Where the requests are sent
+        messages (list): The messages to replay
+        rate (float): The mean number of requests per second
+        duration (float): How long to send requests for, in seconds
+        process (str): The arrival process, 'poisson' or 'fixed'
+        batch_sizes (str): The batch size distribution (see parse_batch_sizes)
+        interval (float): The length of each interval of the report, in seconds
+        max_in_flight (int): The number of unfinished requests at which new arrivals are dropped
+        timeout (float): How long a request may take before it counts as an error, in seconds
+        seed (int): Seeds the arrivals and batch sizes, so runs can be repeated
+
+    Returns:
+        dict: The results (see summarize_run)
+    """
+
+    rng = np.random.default_rng(seed)
+    offsets = arrival_offsets(rate, duration, process, rng)
+    sizes, probabilities = parse_batch_sizes(batch_sizes)
+    request_sizes = rng.choice(sizes, size=len(offsets), p=probabilities)
+    replayer = Message_Replayer(messages)
+
+    loop = asyncio.get_running_loop()
+    records = []
+    in_flight = set()
+    dropped = 0
+    max_lag = 0.0
+
+    async def send(event, scheduled):
+        try:
+            error = await asyncio.wait_for(target.send(event), timeout)
+        except asyncio.TimeoutError:
+            error = TIMEOUT
+        except Exception as e:
+            error = type(e).__name__
+        finished = loop.time()
+        records.append((finished - start, (finished - scheduled) * 1000, len(event[EVENT_MESSAGES]), error))
+
+    start = loop.time()
+    for offset, size in zip(offsets, request_sizes):
+        scheduled = start + offset
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        max_lag = max(max_lag, loop.time() - scheduled)
+
+        if len(in_flight) >= max_in_flight:
+            dropped += 1
+            continue
+
+        event = {FUNCTION: SPAM_OR_HAM, EVENT_MESSAGES: replayer.next_batch(int(size))}
+        task = asyncio.create_task(send(event, scheduled))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    if in_flight:
+        await asyncio.wait(in_flight)
+
+    return summarize_run(records, len(offsets), dropped, duration, interval, {
+        PROCESS: process,
+        RATE: rate,
+        DURATION: duration,
+        BATCH_SIZES: batch_sizes,
+        GENERATOR_LAG_MS: max_lag * 1000
+    })
+
+
+def _summarize_records(records, seconds):
+    latencies_ms = [latency_ms for _, latency_ms, _, error in records if error is None]
+    errors = {}
+    for _, _, _, error in records:
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+
+    return {
+        COMPLETED: len(latencies_ms),
+        ERRORS: errors,
+        THROUGHPUT: {
+            REQUESTS_PER_SECOND: len(latencies_ms) / seconds,
+            MESSAGES_PER_SECOND: sum(size for _, _, size, error in records if error is None) / seconds
+        },
+        LATENCY_MS: {**summarize(latencies_ms), 'max': max(latencies_ms)} if latencies_ms else None
+    }
+
+
+def summarize_run(records, requests, dropped, duration, interval=DEFAULT_INTERVAL, settings=None):
+    """ Summarize the requests of a run, overall and per interval
+
+    Args:
+        records (list): A (finish time in seconds from the start, latency in milliseconds,
+            number of messages, error or None) tuple per request that was sent
+        requests (int): The number of requests scheduled
+        dropped (int): The number of requests dropped because too many were in flight
+        duration (float): The length of the schedule, in seconds
+        interval (float): The length of each interval, in seconds
+        settings (dict): The settings of the run, included in the results
+
+    Returns:
+        dict: The settings, the number of requests scheduled, and the completed requests, errors
+            (by kind, including dropped requests), error rate, throughput and latency percentiles
+            of the whole run and of each interval (by finish time)
+    """
+
+    # Requests that finish after the schedule ends still count towards the throughput of the run
+    elapsed = max([duration] + [finished for finished, _, _, _ in records])
+
+    results = dict(settings or {})
+    results[REQUESTS] = requests
+    results.update(_summarize_records(records, elapsed))
+    if dropped:
+        results[ERRORS][DROPPED] = dropped
+    results[ERROR_RATE] = sum(results[ERRORS].values()) / requests if requests else 0.0
+
+    intervals = [[] for _ in range(max(1, math.ceil(elapsed / interval)))]
+    for record in records:
+        intervals[min(len(intervals) - 1, int(record[0] // interval))].append(record)
+    results[INTERVALS] = [{START: i * interval, **_summarize_records(interval_records, interval)}
+                          for i, interval_records in enumerate(intervals)]
+
+    return results
+
+
+def sustainable_rate(sweep, slo_ms, max_error_rate=DEFAULT_MAX_ERROR_RATE):
+    """ Find the highest rate that stays within a latency and error limit
+
+    Args:
+        sweep (list): The results of runs at increasing rates
+        slo_ms (float): The highest acceptable p99 latency, in milliseconds
+        max_error_rate (float): The highest acceptable fraction of failed or dropped requests
+
+    Returns:
+        float: The highest rate at which every run up to it met both limits, or None if the first did not
+    """
+
+    best = None
+    for results in sorted(sweep, key=lambda results: results[RATE]):
+        latency = results[LATENCY_MS]
+        if latency is None or latency['p99'] > slo_ms or results[ERROR_RATE] > max_error_rate:
+            break
+        best = results[RATE]
+    return best
+
+
+def format_report(results):
+    """ Format the results of a run as a table of intervals followed by the totals
+
+    Args:
+        results (dict): The results of run_load
+
+    Returns:
+        str: The report
+    """
+
+    def row(label, summary):
+        latency = summary[LATENCY_MS] or dict.fromkeys(['p50', 'p95', 'p99', 'max'], float('nan'))
+        return (f'{label:<10}{summary[COMPLETED]:>10}{summary[THROUGHPUT][REQUESTS_PER_SECOND]:>10.1f}'
+                f'{summary[THROUGHPUT][MESSAGES_PER_SECOND]:>10.1f}{latency["p50"]:>10.1f}{latency["p95"]:>10.1f}'
+                f'{latency["p99"]:>10.1f}{latency["max"]:>10.1f}{sum(summary[ERRORS].values()):>8}')
+
+    lines = [f'Rate: {results[RATE]} req/s ({results[PROCESS]})    Duration: {results[DURATION]} s    '
+             f'Batch sizes: {results[BATCH_SIZES]}    Generator lag: {results[GENERATOR_LAG_MS]:.1f} ms', '']
+    lines.append(f'{"start s":<10}{"done":>10}{"req/s":>10}{"msg/s":>10}{"p50 ms":>10}{"p95 ms":>10}'
+                 f'{"p99 ms":>10}{"max ms":>10}{"errors":>8}')
+    for summary in results[INTERVALS]:
+        lines.append(row(f'{summary[START]:g}', summary))
+    lines.append(row('total', results))
+
+    lines.append('')
+    lines.append(f'Requests: {results[REQUESTS]}    Error rate: {results[ERROR_RATE]:.2%}    Errors: {results[ERRORS] or "none"}')
+    return '\n'.join(lines)
+
+
+def main():
+    """ Replay the dataset against the handler or a server, and report the throughput, latency and errors """
+
+    parser = argparse.ArgumentParser(description='Open-loop load generator for the classifier')
+    parser.add_argument('--target', type=str, default=HANDLER_TARGET, help='"handler" for lambda_handler in this process, or the URL of a server')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help='Requests per second')
+    parser.add_argument('--rates', type=float, nargs='+', help='Sweep these rates, one run each, instead of --rate')
+    parser.add_argument('--duration', type=float, default=DEFAULT_DURATION, help='Seconds per run')
+    parser.add_argument('--arrivals', type=str, choices=ARRIVAL_PROCESSES, default=POISSON, help='Arrival process')
+    parser.add_argument('--batch-sizes', type=str, default=DEFAULT_BATCH_SIZES, help='Batch size distribution, e.g. "1:0.8,10:0.15,100:0.05"')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help='Seconds per interval of the report')
+    parser.add_argument('--threads', type=int, default=DEFAULT_THREADS, help='Concurrent invocations of the in-process handler')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT, help='Unfinished requests at which arrivals are dropped')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a request counts as an error')
+    parser.add_argument('--slo-ms', type=float, help='Report the highest swept rate whose p99 latency is within this limit')
+    parser.add_argument('--max-error-rate', type=float, default=DEFAULT_MAX_ERROR_RATE, help='Highest acceptable error rate for --slo-ms')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Seed for the arrivals and batch sizes')
+    parser.add_argument('--data', type=str, default=SPAM_CSV, help='Path to the labeled dataset')
+    parser.add_argument('--output', type=str, help='Save the results to this JSON file')
+    args = parser.parse_args()
+
+    try:
+        parse_batch_sizes(args.batch_sizes)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Run from the root of the repository, where the dataset and artifact paths are relative to
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    messages, _ = load_spam_dataset(args.data)
+
+    if args.target == HANDLER_TARGET:
+        import lambda_function
+        lambda_function.warmup()
+        target = Handler_Target(threads=args.threads)
+    else:
+        try:
+            target = Http_Target(args.target)
+        except ValueError as e:
+            parser.error(str(e))
+
+    async def run():
+        sweep = []
+        try:
+            for rate in args.rates or [args.rate]:
+                sweep.append(await run_load(target, messages, rate, args.duration, args.arrivals, args.batch_sizes,
+                                            args.interval, args.max_in_flight, args.timeout, args.seed))
+                print(format_report(sweep[-1]) + '\n')
+        finally:
+            await target.close()
+        return sweep
+
+    sweep = asyncio.run(run())
+
+    if args.slo_ms is not None:
+        rate = sustainable_rate(sweep, args.slo_ms, args.max_error_rate)
+        print(f'Highest rate within p99 <= {args.slo_ms} ms and error rate <= {args.max_error_rate:.2%}: '
+              f'{"none" if rate is None else f"{rate} req/s"}')
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(sweep if args.rates else sweep[0], file, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,91 @@
+''' Implements the helpers that load, check and run a model and its vectorizer.
+
+They are shared by the lambda function and the model registry (see Resources/ModelRegistry.py),
+which loads the versions it serves with them. Keeping them out of lambda_function lets the
+registry use them without importing the lambda function, which imports the registry.
+
+Keras (and its TensorFlow backend) is only imported by load_keras_model, when serving the
+original '.keras' model. The NumPy backend serves the same model from its exported weights, so
+importing this module does not load TensorFlow.
+'''
+
+# Import the required libraries
+from Resources.CascadeModel import Cascade_Model
+from Resources.InvocationMetrics import NULL_METRICS
+
+NUM_CLASSES = 2
+
+
+def load_keras_model(model_name):
+    """ Load a '.keras' model, importing Keras (and TensorFlow) on first use
+
+    Args:
+        model_name (str): The path of the '.keras' model
+
+    Returns:
+        keras.models.Sequential: The trained deep learning model
+
+    Raises:
+        ImportError: If Keras is not installed
+    """
+
+    try:
+        import keras        # For deep learning model (Still requires TensorFlow backend)
+    except ImportError:
+        raise ImportError('Keras is not installed; export the model weights to use the numpy backend') from None
+
+    return keras.models.load_model(model_name)
+
+
+def validate_artifacts(model, vectorizer):
+    """ Verify that the model and vectorizer can be used together
+
+    Args:
+        model (keras.models.Sequential or Numpy_Model): A trained deep learning model
+        vectorizer (TfidfVectorizer): The vectorizer used to train the model
+
+    Raises:
+        ValueError: If either artifact is unusable or they do not match each other
+    """
+
+    if not hasattr(vectorizer, 'transform') or not hasattr(vectorizer, 'vocabulary_'):
+        raise ValueError('Vectorizer is not a fitted vectorizer')
+
+    num_features = len(vectorizer.vocabulary_)
+    if model.input_shape[-1] != num_features:
+        raise ValueError(f'Model expects {model.input_shape[-1]} input features, '
+                         f'but the vectorizer produces {num_features}')
+
+    if model.output_shape[-1] != NUM_CLASSES:
+        raise ValueError(f'Model produces {model.output_shape[-1]} classes, expected {NUM_CLASSES}')
+
+
+def model_supports_sparse(model):
+    """ Check whether the model can consume sparse TF-IDF vectors directly
+
+    Args:
+        model (keras.models.Sequential or Numpy_Model): A trained deep learning model
+
+    Returns:
+        bool: True if the model's predict method accepts SciPy sparse matrices
+    """
+
+    return getattr(model, 'supports_sparse', False) is True
+
+
+def predict_probabilities(model, encoded_messages, metrics=NULL_METRICS):
+    """ Get the probability of each class, per message
+
+    Args:
+        model (keras.models.Sequential or Numpy_Model): A trained deep learning model
+        encoded_messages (numpy.ndarray or scipy.sparse.csr_matrix): A 2D array of encoded messages
+        metrics (Invocation_Metrics): Counts the messages on each path of a cascade
+
+    Returns:
+        numpy.ndarray: The probability of each class (ham, spam), per message
+    """
+
+    if isinstance(model, Cascade_Model):
+        return model.predict(encoded_messages, metrics) # Also counts the messages on each path
+
+    return model.predict(encoded_messages)
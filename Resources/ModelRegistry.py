@@ -0,0 +1,386 @@
+''' Implements a registry of versioned models, one per function, that are swapped in without restarting.
+
+The lambda function serves the 'spam_or_ham' function from artifacts whose paths are fixed in
+the code, so releasing a new model means redeploying and paying a cold start. When
+MODEL_REGISTRY_DIR is set, functions are served from a directory of versioned artifacts instead:
+
+    <MODEL_REGISTRY_DIR>/
+        spam_or_ham/
+            1/
+            2/
+                weights/        The memory-mapped weights (see Resources/NumpyModel.py), or
+                model.npz       the exported weights, or
+                model.keras     the Keras model
+                vectorizer/     The compact vectorizer (see Resources/CompactVectorizer.py), or
+                vectorizer.pkl  the pickled vectorizer
+                READY           Written last; versions without it are ignored
+        another_function/
+            ...
+
+Every function directory becomes a function that events can call by name, in addition to the
+built-in 'spam_or_ham' (which the registry overrides when it has a 'spam_or_ham' directory).
+Each function serves its latest ready version, in natural order ('2' < '10', '2024-01-02' <
+'2024-01-10'). Every function is a ham/spam classifier, with the same event fields and responses.
+
+A background thread polls the directory every MODEL_REGISTRY_POLL_SECONDS. A new version is
+loaded, validated and warmed up on that thread while the current version keeps serving, and is
+then swapped in by replacing a single reference. Requests that already hold the previous version
+finish with it, so no request is dropped or served by a half-loaded model. A version that fails
+to load is reported by stats() and skipped, and the previous version keeps serving. Threads do
+not survive os.fork, so each worker of a pre-fork server calls restart_watchers to swap versions
+on its own; other forked children (e.g. process pool workers) do not watch the directory.
+
+Functions whose vectorizers tokenize the same way (the same tokenizer engine and preprocessing)
+share one tokenizer, so an event that calls several of them tokenizes its messages only once
+(see tokenization_key and lambda_function.classify_functions).
+
+Usage:
+    Publish a new version of a function:
+        mkdir -p registry/spam_or_ham/3
+        cp MODEL.npz registry/spam_or_ham/3/model.npz
+        cp MODEL.pkl registry/spam_or_ham/3/vectorizer.pkl
+        touch registry/spam_or_ham/3/READY
+
+    List the versions that would be served:
+        python -m Resources.ModelRegistry registry
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment and listing versions
+import re                   # For ordering the versions
+import time                 # For recording when each version was loaded
+import pickle               # For loading pickled vectorizers
+import weakref              # For restarting the watchers of forked workers
+import argparse             # For parsing input arguments
+import threading            # For the background watcher and serializing swaps
+
+from Resources.ModelArtifacts import load_keras_model, validate_artifacts, model_supports_sparse, predict_probabilities
+
+MODEL_REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR')     # Unset disables the registry
+MODEL_REGISTRY_POLL_SECONDS = float(os.environ.get('MODEL_REGISTRY_POLL_SECONDS', 10))  # 0 disables the watcher
+
+# Artifact names within a version directory, in order of preference
+MAPPED_WEIGHTS_FILE = 'weights'
+WEIGHTS_FILE = 'model.npz'
+KERAS_MODEL_FILE = 'model.keras'
+COMPACT_VECTORIZER_FILE = 'vectorizer'
+VECTORIZER_FILE = 'vectorizer.pkl'
+READY_FILE = 'READY'
+
+WARMUP_MESSAGE = 'warmup'
+DIGITS = re.compile(r'(\d+)')
+
+# Statistics keys
+VERSION = 'version'
+LOADED_AT = 'loaded_at'
+SWAPS = 'swaps'
+FAILED_VERSIONS = 'failed_versions'
+
+# Registries whose watcher is running; threads do not survive os.fork, so forked workers restart them
+_watching = weakref.WeakSet()
+
+
+def version_key(version):
+    """ Sort key that orders version names naturally, comparing runs of digits as numbers """
+
+    return [int(part) if part.isdigit() else part for part in DIGITS.split(version)]
+
+
+def _identity(setting):
+    # Callables are identified by their instance (a bound custom_tokenizer by its Custom_Tokenizer)
+    if callable(setting):
+        return id(getattr(setting, '__self__', setting))
+    return repr(setting)
+
+
+def tokenization_key(vectorizer):
+    """ Identify how a vectorizer turns a message into tokens
+
+    Vectorizers with the same key produce the same tokens for every message, so their messages
+    only need to be tokenized once. The key covers the settings used by build_analyzer; the
+    token pattern only counts when there is no tokenizer, since the tokenizer replaces it.
+
+    Args:
+        vectorizer (TfidfVectorizer or Compact_Vectorizer): A fitted vectorizer
+
+    Returns:
+        tuple: The analyzer, preprocessor and tokenizer (each callable identified by its instance)
+            and the settings that change the tokens
+    """
+
+    tokenizer = getattr(vectorizer, 'tokenizer', None)
+    return (_identity(getattr(vectorizer, 'analyzer', None) or 'word'),
+            _identity(getattr(vectorizer, 'preprocessor', None)),
+            _identity(tokenizer),
+            None if tokenizer is not None else repr(getattr(vectorizer, 'token_pattern', None)),
+            repr(getattr(vectorizer, 'input', 'content')),
+            getattr(vectorizer, 'lowercase', True),
+            repr(getattr(vectorizer, 'strip_accents', None)),
+            repr(getattr(vectorizer, 'stop_words', None)),
+            tuple(getattr(vectorizer, 'ngram_range', (1, 1))))
+
+
+class Model_Version:
+    """ The loaded model and vectorizer of one version of a function """
+
+    def __init__(self, function, version, path, model, vectorizer):
+        """ Wrap the loaded artifacts
+
+        Args:
+            function (str): The function served by this version
+            version (str): The version name (the name of its directory)
+            path (str): The version directory
+            model (keras.models.Sequential, Numpy_Model): The trained model
+            vectorizer (TfidfVectorizer or Compact_Vectorizer): The fitted vectorizer, with its tokenizer
+        """
+
+        self.function = function
+        self.version = version
+        self.path = path
+        self.model = model
+        self.vectorizer = vectorizer
+        self.loaded_at = time.time()
+
+    @property
+    def cache_version(self):
+        """ Identifies the predictions of this version in the prediction cache """
+
+        return f'{self.function}/{self.version}'
+
+
+def load_version(function, version, path, tokenizer_for):
+    """ Load, validate and warm up the artifacts of a version directory
+
+    Args:
+        function (str): The function served by the version
+        version (str): The version name
+        path (str): The version directory
+        tokenizer_for (callable): Returns the shared Custom_Tokenizer of a tokenizer engine
+
+    Returns:
+        Model_Version: The loaded version
+
+    Raises:
+        ValueError: If the directory is missing an artifact or the artifacts do not match
+    """
+
+    from Resources.NumpyModel import Numpy_Model
+    from Resources.CompactVectorizer import Compact_Vectorizer
+    from Resources.CustomTokenizer import Custom_Tokenizer, TOKENIZER_ENGINE
+
+    def artifact(name):
+        return os.path.join(path, name)
+
+    if os.path.exists(artifact(MAPPED_WEIGHTS_FILE)):
+        model = Numpy_Model.load(artifact(MAPPED_WEIGHTS_FILE))
+    elif os.path.exists(artifact(WEIGHTS_FILE)):
+        model = Numpy_Model.load(artifact(WEIGHTS_FILE))
+    elif os.path.exists(artifact(KERAS_MODEL_FILE)):
+        model = load_keras_model(artifact(KERAS_MODEL_FILE))
+    else:
+        raise ValueError(f'No model found in {path}')
+
+    # The tokenizer engine is kept from the pickled tokenizer; compact vectorizers use the default engine
+    if os.path.isdir(artifact(COMPACT_VECTORIZER_FILE)):
+        vectorizer = Compact_Vectorizer.load(artifact(COMPACT_VECTORIZER_FILE))
+        engine = TOKENIZER_ENGINE
+    elif os.path.exists(artifact(VECTORIZER_FILE)):
+        with open(artifact(VECTORIZER_FILE), 'rb') as file:
+            vectorizer = pickle.load(file)
+        tokenizer = getattr(getattr(vectorizer, 'tokenizer', None), '__self__', None)
+        engine = tokenizer.engine if isinstance(tokenizer, Custom_Tokenizer) else TOKENIZER_ENGINE
+    else:
+        raise ValueError(f'No vectorizer found in {path}')
+
+    vectorizer.tokenizer = tokenizer_for(engine).custom_tokenizer
+    validate_artifacts(model, vectorizer)
+
+    # Run one message through both, so that the first request after the swap is not a cold start
+    encoded_messages = vectorizer.transform([WARMUP_MESSAGE])
+    if not model_supports_sparse(model):
+        encoded_messages = encoded_messages.toarray()
+    predict_probabilities(model, encoded_messages)
+
+    return Model_Version(function, version, path, model, vectorizer)
+
+
+class Model_Registry:
+    """ Serves the latest version of each function in a directory, swapping in new versions as they appear """
+
+    def __init__(self, path, tokenizers=None, poll_seconds=MODEL_REGISTRY_POLL_SECONDS, loader=load_version):
+        """ Create the registry; call refresh (or start) to load the versions
+
+        Args:
+            path (str): The registry directory
+            tokenizers (dict): Custom_Tokenizer instances to share, keyed by engine; others are created on demand
+            poll_seconds (float): How often the watcher looks for new versions
+            loader (callable): Loads a version (see load_version)
+        """
+
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._loader = loader
+        self._tokenizers = dict(tokenizers or {})
+        self._versions = {}         # function -> Model_Version; replaced, never mutated, on each swap
+        self._swaps = {}
+        self._failed = {}           # (function, version) -> error message
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def tokenizer_for(self, engine):
+        """ Get the tokenizer shared by every version that uses a tokenizer engine """
+
+        from Resources.CustomTokenizer import Custom_Tokenizer
+
+        tokenizer = self._tokenizers.get(engine)
+        if tokenizer is None:
+            tokenizer = self._tokenizers.setdefault(engine, Custom_Tokenizer(engine=engine))
+        return tokenizer
+
+    def latest_versions(self):
+        """ Find the latest ready version of each function in the directory
+
+        Returns:
+            dict: The name of the latest ready version of each function
+        """
+
+        latest = {}
+        if not os.path.isdir(self.path):
+            return latest
+
+        for function in os.scandir(self.path):
+            if not function.is_dir():
+                continue
+            versions = [version.name for version in os.scandir(function.path)
+                        if version.is_dir() and os.path.exists(os.path.join(version.path, READY_FILE))]
+            if versions:
+                latest[function.name] = max(versions, key=version_key)
+
+        return latest
+
+    def refresh(self):
+        """ Load and swap in the latest version of every function that has a new one
+
+        Returns:
+            list: The (function, version) pairs that were swapped in
+        """
+
+        swapped = []
+
+        # One refresh at a time; get keeps serving the current versions throughout
+        with self._refresh_lock:
+            for function, version in self.latest_versions().items():
+                current = self._versions.get(function)
+                if current is not None and current.version == version or (function, version) in self._failed:
+                    continue
+
+                try:
+                    loaded = self._loader(function, version, os.path.join(self.path, function, version),
+                                          self.tokenizer_for)
+                except Exception as e:
+                    self._failed[(function, version)] = str(e)
+                    continue
+
+                # A single reference assignment, so readers see either the old or the new mapping
+                self._versions = {**self._versions, function: loaded}
+                self._swaps[function] = self._swaps.get(function, 0) + 1
+                swapped.append((function, version))
+
+        return swapped
+
+    def get(self, function):
+        """ Get the version that currently serves a function, or None if the registry does not have it """
+
+        return self._versions.get(function)
+
+    def functions(self):
+        """ Get the names of the functions the registry serves """
+
+        return list(self._versions)
+
+    def start(self):
+        """ Load the current versions, then watch the directory for new ones on a background thread """
+
+        self.refresh()
+        if self.poll_seconds > 0 and self._thread is None:
+            self._start_watcher()
+
+    def _start_watcher(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._watch, name='model-registry', daemon=True)
+        self._thread.start()
+        _watching.add(self)
+
+    def stop(self):
+        """ Stop watching the directory; the loaded versions keep serving """
+
+        _watching.discard(self)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _after_fork(self):
+        # The lock may have been held by the parent's watcher, which does not exist in the child
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._start_watcher()
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.refresh()
+            except OSError:
+                pass            # The directory is being modified or is briefly unavailable; retried on the next poll
+
+    def stats(self):
+        """ Get the version served for each function, when it was loaded and how many times it was swapped
+
+        Returns:
+            dict: The statistics of each function, plus the versions that failed to load and why
+        """
+
+        stats = {function: {VERSION: loaded.version, LOADED_AT: loaded.loaded_at, SWAPS: self._swaps.get(function, 0)}
+                 for function, loaded in self._versions.items()}
+        stats[FAILED_VERSIONS] = {f'{function}/{version}': error for (function, version), error in self._failed.items()}
+        return stats
+
+
+def restart_watchers():
+    """ Restart the watchers that were running in the parent of a forked process
+
+    Called by each worker of Resources/PreforkServer.py, so that it watches the directory and
+    swaps versions itself. Other forked children do not serve requests and should not call it.
+    """
+
+    for registry in list(_watching):
+        registry._after_fork()
+
+
+def main():
+    """ List the latest ready version of each function in a registry directory """
+
+    parser = argparse.ArgumentParser(description='List the versions a model registry directory would serve')
+    parser.add_argument('path', type=str, nargs='?', default=MODEL_REGISTRY_DIR, help='The registry directory')
+    parser.add_argument('--load', action='store_true', help='Also load and validate each version')
+    args = parser.parse_args()
+
+    if not args.path:
+        parser.error('no registry directory; pass one or set MODEL_REGISTRY_DIR')
+
+    registry = Model_Registry(args.path, poll_seconds=0)
+    latest = registry.latest_versions()
+    if args.load:
+        registry.refresh()
+
+    for function, version in sorted(latest.items()):
+        print(f'{function}: {version}')
+    for name, error in registry.stats()[FAILED_VERSIONS].items():
+        print(f'Failed to load {name}: {error}')
+
+    return 1 if registry.stats()[FAILED_VERSIONS] else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,438 @@
+''' Implements a bounded MinHash/LSH index of recent spam, to label near-duplicates without the model.
+
+Spam campaigns send thousands of lightly varied copies of the same text (a different name, phone
+number or prize amount), which the prediction cache does not catch because it only matches
+identical messages. The index keeps a MinHash signature of every message the model recently
+classified as spam, and a message whose estimated Jaccard similarity to one of them reaches the
+threshold is labeled spam without being tokenized, vectorized or passed to the model.
+
+    Shingles:   The overlapping 5-byte n-grams of the normalized message (lowercased, with runs of
+                whitespace collapsed), each packed into an integer
+    Signature:  For each of NUM_PERMUTATIONS random hash functions h(x) = (a * x + b) mod 2 ** 64
+                (with odd a), the minimum over the shingles; two signatures agree at a position
+                with probability (close to) the Jaccard similarity of their shingle sets
+    LSH:        The signature is split into bands of rows; messages sharing any band are the
+                candidates, and only those are compared, so a lookup does not scan the index
+
+With 16 bands of 4 rows, messages with a Jaccard similarity of 0.8 become candidates with
+probability 0.9998, and those of 0.3 with probability 0.12; the candidates are then filtered by
+their estimated similarity. Messages with fewer than MIN_SHINGLES shingles are never indexed or
+matched, since short texts ('call me', 'ok') say little about a campaign.
+
+The index holds at most max_size signatures, evicting the least recently matched or added one,
+and each signature is tied to the version of the model that classified it, like the prediction
+cache. Only the model's own spam predictions are added, so matches cannot drift away from a
+message the model actually saw.
+
+The evaluation replays the distinct messages of the dataset in order, labeling each one with the
+index when it matches and with the model (or, without one, the true label) otherwise, and reports
+how many messages the index labeled and how many of those were actually spam, per threshold.
+
+Usage:
+    Evaluate the index on the dataset, using the true labels in place of the model:
+        python -m Resources.NearDuplicateIndex --evaluate
+
+    Evaluate it against the predictions of a model:
+        python -m Resources.NearDuplicateIndex --evaluate --vectorizer MODEL.pkl --weights MODEL.npz
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment
+import re                   # For normalizing whitespace
+import time                 # For timing the evaluation
+import argparse             # For parsing input arguments
+import threading            # For guarding the index
+import numpy as np          # For computing the signatures
+from collections import OrderedDict  # For least-recently-used ordering
+
+NEAR_DUPLICATE_ENABLED = os.environ.get('NEAR_DUPLICATE_ENABLED') == '1'
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.8))
+NEAR_DUPLICATE_INDEX_SIZE = int(os.environ.get('NEAR_DUPLICATE_INDEX_SIZE', 10000))
+NUM_PERMUTATIONS = 64
+NUM_BANDS = 16              # Bands of NUM_PERMUTATIONS // NUM_BANDS rows
+SHINGLE_SIZE = 5            # Bytes per shingle, at most 8 so a shingle fits in a uint64
+MIN_SHINGLES = 10
+MAX_COEFFICIENT = 1 << 63
+SIGNATURE_SHIFT = np.uint64(32)  # Keeps the high, well-mixed half of each minimum hash
+CHUNK_SHINGLES = 4096       # Shingles hashed at a time, so the hashes of a chunk stay in the CPU cache
+SEED = 1                    # Fixes the hash functions, so every process computes the same signatures
+WHITESPACE = re.compile(r'\s+')
+SPAM = 'spam'
+HAM = 'ham'
+
+HITS = 'hits'
+MISSES = 'misses'
+SKIPPED = 'skipped'         # Lookups of messages too short to match
+ADDITIONS = 'additions'
+SIZE = 'size'
+MAX_SIZE = 'max_size'
+EVICTIONS = 'evictions'
+HIT_RATE = 'hit_rate'
+
+# Evaluation keys
+THRESHOLD = 'threshold'
+MESSAGES = 'messages'
+SPAM_MESSAGES = 'spam_messages'
+INDEX_LABELED = 'index_labeled'
+INDEX_PRECISION = 'index_precision'
+SPAM_RECALL = 'spam_recall'
+MODEL_AGREEMENT = 'model_agreement'
+ACCURACY = 'accuracy'
+BASELINE_ACCURACY = 'baseline_accuracy'
+MICROSECONDS_PER_LOOKUP = 'microseconds_per_lookup'
+FALSE_POSITIVES = 'false_positives'
+DEFAULT_THRESHOLDS = [0.5, 0.6, 0.7, 0.8, 0.9]
+NUM_EXAMPLES = 5
+
+
+def normalize(message):
+    """ Lowercase a message and collapse its runs of whitespace, returning its UTF-8 bytes """
+
+    return WHITESPACE.sub(' ', message.lower()).strip().encode('utf-8', 'surrogatepass')
+
+
+def shingle_values(text, shingle_size=SHINGLE_SIZE):
+    """ Pack every shingle of a normalized message into an integer
+
+    Args:
+        text (bytes): The normalized message (see normalize), or several of them joined together
+        shingle_size (int): The number of bytes per shingle (at most 8)
+
+    Returns:
+        numpy.ndarray: The bytes of the shingle starting at each position, as one uint64 per position
+    """
+
+    characters = np.frombuffer(text, dtype=np.uint8).astype(np.uint64)
+    count = max(len(characters) - shingle_size + 1, 0)
+    values = characters[:count].copy()
+    for offset in range(1, shingle_size):
+        values <<= np.uint64(8)
+        values |= characters[offset:offset + count]
+    return values
+
+
+class Near_Duplicate_Index:
+    """ A thread-safe, bounded MinHash/LSH index of spam signatures with LRU eviction """
+
+    def __init__(self, max_size=NEAR_DUPLICATE_INDEX_SIZE, threshold=NEAR_DUPLICATE_THRESHOLD,
+                 num_permutations=NUM_PERMUTATIONS, num_bands=NUM_BANDS, shingle_size=SHINGLE_SIZE,
+                 min_shingles=MIN_SHINGLES):
+        """ Create an index
+
+        Args:
+            max_size (int): The maximum number of signatures to keep; 0 disables the index
+            threshold (float): The estimated Jaccard similarity at which a message matches a signature
+            num_permutations (int): The number of hash functions per signature
+            num_bands (int): The number of LSH bands; must divide num_permutations
+            shingle_size (int): The number of characters per shingle
+            min_shingles (int): The number of shingles below which a message is neither indexed nor matched
+        """
+
+        if not 0 < threshold <= 1:
+            raise ValueError(f'Near-duplicate threshold must be in (0, 1], but got {threshold}')
+        if not 0 < shingle_size <= 8:
+            raise ValueError(f'Shingle size must be between 1 and 8 bytes, but got {shingle_size}')
+        if num_permutations % num_bands:
+            raise ValueError(f'The number of bands ({num_bands}) must divide the number of permutations ({num_permutations})')
+
+        self.max_size = max_size
+        self.threshold = threshold
+        self.num_bands = num_bands
+        self.rows = num_permutations // num_bands
+        self.shingle_size = shingle_size
+        self.min_shingles = min_shingles
+
+        rng = np.random.default_rng(SEED)
+        self._a = (rng.integers(0, MAX_COEFFICIENT, num_permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1))[:, np.newaxis]
+        self._b = rng.integers(0, MAX_COEFFICIENT, num_permutations, dtype=np.uint64)[:, np.newaxis]
+
+        self._entries = OrderedDict()   # key -> signature
+        self._bands = [{} for _ in range(num_bands)]  # band -> (version, band bytes) -> set of keys
+        self._lock = threading.Lock()
+        self._stats = {HITS: 0, MISSES: 0, SKIPPED: 0, ADDITIONS: 0, EVICTIONS: 0}
+
+    def signatures(self, messages):
+        """ Compute the MinHash signatures of the messages
+
+        The shingles of many messages are hashed together, a chunk at a time, and the minimum of
+        each message is taken over its own segment of the chunk.
+
+        Args:
+            messages (list): A list of messages
+
+        Returns:
+            list: The signature of each message (one uint32 per permutation), or None for the
+                messages with fewer than min_shingles shingles
+        """
+
+        texts = [normalize(message) for message in messages]
+        signatures = [None] * len(texts)
+        pending = [i for i, text in enumerate(texts) if len(text) - self.shingle_size + 1 >= self.min_shingles]
+
+        start = 0
+        while start < len(pending):
+            # Take messages until the chunk is full (but at least one, however long)
+            end = start + 1
+            total = len(texts[pending[start]])
+            while end < len(pending) and total + len(texts[pending[end]]) <= CHUNK_SHINGLES:
+                total += len(texts[pending[end]])
+                end += 1
+            chunk = pending[start:end]
+            start = end
+
+            # Leave out the shingles that span two messages, so each message is a contiguous segment
+            lengths = np.array([len(texts[i]) for i in chunk])
+            windows = lengths - self.shingle_size + 1
+            offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            segment_starts = np.concatenate([[0], np.cumsum(windows)[:-1]])
+            positions = np.arange(windows.sum()) + np.repeat(offsets - segment_starts, windows)
+            values = shingle_values(b''.join(texts[i] for i in chunk), self.shingle_size)[positions]
+
+            hashes = np.multiply(self._a, values)
+            hashes += self._b
+            segments = np.minimum.reduceat(hashes, segment_starts, axis=1)
+            segments >>= SIGNATURE_SHIFT
+
+            for i, signature in zip(chunk, segments.T.astype(np.uint32)):
+                signatures[i] = signature
+
+        return signatures
+
+    def signature(self, message):
+        """ Compute the MinHash signature of a single message, or None if it is too short (see signatures) """
+
+        return self.signatures([message])[0]
+
+    def _band_keys(self, signature, version):
+        return [(version, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.num_bands)]
+
+    def get_many(self, messages, version=''):
+        """ Find the messages that are near-duplicates of indexed spam
+
+        Args:
+            messages (list): A list of unique messages
+            version (str): Identifies the model whose spam is matched
+
+        Returns:
+            dict: 'spam' for each message whose estimated Jaccard similarity to an indexed
+                signature reaches the threshold, keyed by message
+        """
+
+        found = {}
+        if self.max_size <= 0:
+            return found
+
+        signatures = zip(messages, self.signatures(messages))
+
+        with self._lock:
+            for message, signature in signatures:
+                if signature is None:
+                    self._stats[SKIPPED] += 1
+                    continue
+
+                candidates = set()
+                for band, band_key in enumerate(self._band_keys(signature, version)):
+                    candidates.update(self._bands[band].get(band_key, ()))
+
+                match = None
+                for key in candidates:
+                    if np.count_nonzero(self._entries[key] == signature) >= self.threshold * len(signature):
+                        match = key
+                        break
+
+                if match is None:
+                    self._stats[MISSES] += 1
+                else:
+                    self._entries.move_to_end(match)
+                    self._stats[HITS] += 1
+                    found[message] = SPAM
+
+        return found
+
+    def put_many(self, messages, version=''):
+        """ Add spam messages to the index, evicting the least recently used signatures if it is full
+
+        Args:
+            messages (list): Messages the model classified as spam
+            version (str): Identifies the model that classified them
+        """
+
+        if self.max_size <= 0:
+            return
+
+        signatures = zip(messages, self.signatures(messages))
+
+        with self._lock:
+            for message, signature in signatures:
+                if signature is None:
+                    continue
+
+                key = (version, message)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    continue
+
+                self._entries[key] = signature
+                for band, band_key in enumerate(self._band_keys(signature, version)):
+                    self._bands[band].setdefault(band_key, set()).add(key)
+                self._stats[ADDITIONS] += 1
+
+            while len(self._entries) > self.max_size:
+                key, signature = self._entries.popitem(last=False)
+                for band, band_key in enumerate(self._band_keys(signature, key[0])):
+                    keys = self._bands[band][band_key]
+                    keys.discard(key)
+                    if not keys:
+                        del self._bands[band][band_key]
+                self._stats[EVICTIONS] += 1
+
+    def stats(self):
+        """ Get the index statistics
+
+        Returns:
+            dict: The number of hits, misses, skipped lookups, additions and evictions, the current
+                and maximum number of signatures, and the fraction of matchable lookups that were hits
+        """
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats[SIZE] = len(self._entries)
+
+        lookups = stats[HITS] + stats[MISSES]
+        stats[MAX_SIZE] = self.max_size
+        stats[HIT_RATE] = stats[HITS] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """ Remove every signature and reset the statistics """
+
+        with self._lock:
+            self._entries.clear()
+            for band in self._bands:
+                band.clear()
+            for stat in self._stats:
+                self._stats[stat] = 0
+
+
+def evaluate_index(messages, labels, predictions=None, thresholds=DEFAULT_THRESHOLDS, max_size=NEAR_DUPLICATE_INDEX_SIZE,
+                   num_examples=NUM_EXAMPLES):
+    """ Replay the messages through the index, in order, at several thresholds
+
+    Each message is looked up first; if it matches, the index labels it spam, and otherwise the
+    model labels it and, if spam, it is added to the index.
+
+    Args:
+        messages (list): A list of distinct messages
+        labels (list): The true class ('spam' or 'ham') of each message
+        predictions (list): The model's class of each message; the true labels if None
+        thresholds (list): The thresholds to evaluate
+        max_size (int): The maximum number of signatures in the index
+        num_examples (int): The number of ham messages labeled spam by the index to include
+
+    Returns:
+        list: For each threshold, the number of messages the index labeled, the fraction of those
+            that were spam (precision) and that the model also labeled spam (agreement), the
+            fraction of spam it caught, the accuracy with and without it, the lookup time, and
+            examples of ham it labeled spam
+    """
+
+    predictions = labels if predictions is None else predictions
+    spam_messages = sum(label == SPAM for label in labels)
+    baseline_accuracy = float(np.mean([prediction == label for prediction, label in zip(predictions, labels)]))
+
+    reports = []
+    for threshold in thresholds:
+        index = Near_Duplicate_Index(max_size, threshold)
+        served = []
+        labeled = []    # (position, message) of every message the index labeled
+        lookup_seconds = 0.0
+
+        for position, (message, prediction) in enumerate(zip(messages, predictions)):
+            start = time.perf_counter()
+            match = index.get_many([message])
+            lookup_seconds += time.perf_counter() - start
+
+            if match:
+                served.append(SPAM)
+                labeled.append(position)
+            else:
+                served.append(prediction)
+                if prediction == SPAM:
+                    index.put_many([message])
+
+        false_positives = [position for position in labeled if labels[position] != SPAM]
+        reports.append({
+            THRESHOLD: threshold,
+            MESSAGES: len(messages),
+            INDEX_LABELED: len(labeled),
+            INDEX_PRECISION: 1 - len(false_positives) / len(labeled) if labeled else 1.0,
+            MODEL_AGREEMENT: float(np.mean([predictions[position] == SPAM for position in labeled])) if labeled else 1.0,
+            SPAM_RECALL: (len(labeled) - len(false_positives)) / spam_messages if spam_messages else 0.0,
+            ACCURACY: float(np.mean([result == label for result, label in zip(served, labels)])),
+            BASELINE_ACCURACY: baseline_accuracy,
+            MICROSECONDS_PER_LOOKUP: lookup_seconds / len(messages) * 1e6 if messages else 0.0,
+            FALSE_POSITIVES: [messages[position] for position in false_positives[:num_examples]]
+        })
+
+    return reports
+
+
+def main():
+    """ Report how many messages the index labels on the dataset, and how accurately """
+
+    parser = argparse.ArgumentParser(description='Evaluate the near-duplicate spam index')
+    parser.add_argument('--evaluate', action='store_true', help='Replay the dataset through the index')
+    parser.add_argument('--data', type=str, default=None, help='Path to the labeled dataset')
+    parser.add_argument('--thresholds', type=float, nargs='+', default=DEFAULT_THRESHOLDS, help='Jaccard thresholds to evaluate')
+    parser.add_argument('--max-size', type=int, default=NEAR_DUPLICATE_INDEX_SIZE, help='Maximum number of signatures in the index')
+    parser.add_argument('--vectorizer', type=str, help='Path to the pickled vectorizer, to label with a model')
+    parser.add_argument('--weights', type=str, help='Path to the exported .npz weights, to label with a model')
+    parser.add_argument('--model', type=str, help='Path to the .keras model, to label with a model')
+    parser.add_argument('--examples', type=int, default=NUM_EXAMPLES, help='Number of false positives to show')
+    args = parser.parse_args()
+
+    if not args.evaluate:
+        parser.error('nothing to do; use --evaluate')
+    if (args.weights or args.model) and not args.vectorizer:
+        parser.error('labeling with a model requires --vectorizer')
+
+    from Resources.SpamDataset import load_spam_dataset, SPAM_CSV
+
+    messages, labels = load_spam_dataset(args.data or SPAM_CSV)
+
+    # Exact repeats are served by the prediction cache, so only distinct messages are replayed
+    distinct = dict(zip(messages, labels))
+    messages, labels = list(distinct), list(distinct.values())
+
+    predictions = None
+    if args.weights or args.model:
+        import pickle
+        from Resources.NltkData import load_packages
+
+        load_packages()
+        with open(args.vectorizer, 'rb') as file:
+            vectorizer = pickle.load(file)
+
+        if args.weights:
+            from Resources.NumpyModel import Numpy_Model
+            model = Numpy_Model.load(args.weights)
+        else:
+            import keras
+            model = keras.models.load_model(args.model)
+
+        encoded = vectorizer.transform(messages)
+        if getattr(model, 'supports_sparse', False) is not True:
+            encoded = encoded.toarray()
+        predictions = [SPAM if code == 1 else HAM for code in np.argmax(model.predict(encoded), axis=1)]
+
+    for report in evaluate_index(messages, labels, predictions, args.thresholds, args.max_size, args.examples):
+        examples = report.pop(FALSE_POSITIVES)
+        print(', '.join(f'{key}: {value:.4f}' if isinstance(value, float) else f'{key}: {value}' for key, value in report.items()))
+        for message in examples:
+            print(f'    ham labeled spam: {message!r}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
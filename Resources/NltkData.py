@@ -0,0 +1,211 @@
+''' Locates the NLTK data used by the custom tokenizer without downloading it.
+
+The following NLTK packages are needed for processing the text messages:
+
+1. punkt_tab: This package is used to split the text into individual words or sentences.
+2. stopwords: Stop words are common words that are removed from text processing tasks to improve the
+   accuracy and efficiency of the results. Examples: 'the', 'is', 'and', 'a', etc.
+3. wordnet: This package is used for lemmatization, which is the process of converting a word to its
+   base form. Example: The lemma of the word 'running' is 'run'.
+
+The packages are expected to be bundled with the deployment (e.g. in an AWS Lambda Layer) rather
+than downloaded at runtime, so startup never touches the network. The bundled directories are
+searched before NLTK's default locations:
+
+1. The directory named by the NLTK_DATA_DIR environment variable, if set
+2. './opt/nltk_data', the location of the data in the AWS Lambda Layer
+
+If a package cannot be found, a Nltk_Data_Error is raised explaining how to bundle it.
+
+NLTK loads each corpus lazily, by replacing its LazyCorpusLoader in place the first time it is
+used. That replacement is not safe when several threads use a corpus for the first time at once,
+so load_packages loads all of them up front, under a lock, exactly once per process. Tokenizers
+that do not use nltk.word_tokenize (the regex engine, see Resources/FastTokenizer.py) load them
+with punkt=False, which neither requires nor loads punkt_tab.
+
+Usage:
+    Bundle the required packages into a directory (the only step that uses the network):
+        python -m Resources.NltkData --vendor packages/nltk_data
+
+    Verify that the required packages can be found:
+        python -m Resources.NltkData --check
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment
+import glob                 # For finding downloaded archives
+import zipfile              # For extracting downloaded archives
+import argparse             # For parsing input arguments
+import threading            # For guarding the resolver state
+import nltk                 # For text processing
+
+LAMBDA_LAYER_DATA_DIR = './opt/nltk_data'
+NLTK_DATA_DIR = os.environ.get('NLTK_DATA_DIR')
+
+# The NLTK packages used by the tokenizer, and the resource that each one provides
+PUNKT_PACKAGE = 'punkt_tab'     # Only used by nltk.word_tokenize
+REQUIRED_PACKAGES = {
+    'punkt_tab': 'tokenizers/punkt_tab/english/',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet'
+}
+
+_configured = False
+_found_packages = set()
+_lock = threading.Lock()
+_loaded = False             # The stopwords and wordnet
+_punkt_loaded = False
+_load_lock = threading.Lock()
+WARMUP_TEXT = 'Warming up the tokenizer.'
+
+
+class Nltk_Data_Error(LookupError):
+    """ Raised when a required NLTK package is not available locally """
+
+
+def data_dirs():
+    """ Get the directories that contain the bundled NLTK data, in search order
+
+    Returns:
+        list: The bundled data directories
+    """
+
+    dirs = [LAMBDA_LAYER_DATA_DIR]
+    if NLTK_DATA_DIR:
+        dirs.insert(0, NLTK_DATA_DIR)
+    return dirs
+
+
+def configure_data_path():
+    """ Add the bundled data directories to the front of NLTK's search path (once per process) """
+
+    global _configured
+
+    if _configured:
+        return
+
+    with _lock:
+        if not _configured:
+            for data_dir in reversed(data_dirs()):
+                if data_dir in nltk.data.path:
+                    nltk.data.path.remove(data_dir)
+                nltk.data.path.insert(0, data_dir)
+            _configured = True
+
+
+def require_packages(packages=REQUIRED_PACKAGES):
+    """ Verify that the NLTK packages are available, without downloading or loading them
+
+    The packages themselves are loaded lazily by NLTK the first time they are used.
+
+    Args:
+        packages (dict): The package names and the resource that each one provides
+
+    Raises:
+        Nltk_Data_Error: If any of the packages cannot be found
+    """
+
+    configure_data_path()
+
+    missing = []
+    for package, resource in packages.items():
+        if package in _found_packages:
+            continue
+
+        try:
+            nltk.data.find(resource)
+            _found_packages.add(package)
+        except LookupError:
+            missing.append(package)
+
+    if missing:
+        raise Nltk_Data_Error(f'NLTK data not found: {", ".join(missing)}. Searched in: {nltk.data.path}. '
+                              f'Bundle the data with "python -m Resources.NltkData --vendor DIR" and '
+                              f'set NLTK_DATA_DIR=DIR or deploy it to {LAMBDA_LAYER_DATA_DIR}')
+
+
+def load_packages(punkt=True):
+    """ Verify the NLTK packages and load all of them eagerly, once per process
+
+    Safe to call from any number of threads; only the first call loads anything, and the
+    others wait until it has finished.
+
+    Args:
+        punkt (bool): Whether to require and load punkt_tab, which only nltk.word_tokenize uses
+
+    Raises:
+        Nltk_Data_Error: If any of the packages cannot be found
+    """
+
+    global _loaded, _punkt_loaded
+
+    if _loaded and (_punkt_loaded or not punkt):
+        return
+
+    with _load_lock:
+        load_corpora = not _loaded
+        load_punkt = punkt and not _punkt_loaded
+        if not (load_corpora or load_punkt):
+            return
+
+        require_packages({package: resource for package, resource in REQUIRED_PACKAGES.items()
+                          if (load_punkt if package == PUNKT_PACKAGE else load_corpora)})
+
+        if load_corpora:
+            from nltk.corpus import stopwords, wordnet
+            stopwords.ensure_loaded()
+            wordnet.ensure_loaded()
+            _loaded = True
+
+        if load_punkt:
+            nltk.word_tokenize(WARMUP_TEXT)     # Loads (and caches) the punkt_tab sentence tokenizer
+            _punkt_loaded = True
+
+
+def vendor_packages(target_dir, packages=REQUIRED_PACKAGES):
+    """ Download the NLTK packages into a directory and extract them, for bundling with a deployment
+
+    Args:
+        target_dir (str): The directory to download the packages into
+        packages (dict): The package names and the resource that each one provides
+
+    Returns:
+        list: The paths of the extracted packages
+    """
+
+    extracted = []
+
+    for package in packages:
+        if not nltk.download(package, download_dir=target_dir, quiet=True, raise_on_error=True):
+            raise Nltk_Data_Error(f'Unable to download NLTK package: {package}')
+
+        # NLTK leaves some packages zipped; extract them so they are read directly from disk
+        for archive in glob.glob(os.path.join(target_dir, '*', f'{package}.zip')):
+            with zipfile.ZipFile(archive) as file:
+                file.extractall(os.path.dirname(archive))
+            os.remove(archive)
+
+        extracted.extend(glob.glob(os.path.join(target_dir, '*', package)))
+
+    return extracted
+
+
+def main():
+    """ Bundle or verify the NLTK data """
+
+    parser = argparse.ArgumentParser(description='Bundle or verify the NLTK data used by the tokenizer')
+    parser.add_argument('--vendor', type=str, metavar='DIR', help='Download and extract the required packages into DIR')
+    parser.add_argument('--check', action='store_true', help='Verify that the required packages can be found')
+    args = parser.parse_args()
+
+    if args.vendor:
+        for path in vendor_packages(args.vendor):
+            print(f'Bundled {path}')
+
+    if args.check:
+        load_packages()
+        print(f'Found NLTK packages: {", ".join(REQUIRED_PACKAGES)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,516 @@
+''' Implements a TensorFlow-free inference engine for the trained Sequential model.
+
+The model built by the Model Builder notebook is a stack of Dense layers (one 64-node ReLU
+hidden layer followed by a 2-node softmax output layer). Serving it through Keras requires
+TensorFlow, which is far larger than the model itself. This module exports the weights and
+biases of each Dense layer from the '.keras' file into a compact NumPy archive ('.npz') and
+runs the forward pass using NumPy only.
+
+Inputs may be dense arrays or SciPy sparse matrices. TF-IDF encoded messages are almost
+entirely zeros, so sparse inputs are multiplied directly against the first layer's weights
+(sparse @ dense) instead of being densified first.
+
+The exported archive contains:
+    kernel_<i>:  The weight matrix of layer i (inputs x nodes)
+    bias_<i>:    The bias vector of layer i (nodes)
+    scale_<i>:   The per-column scale of layer i, only present when its kernel is quantized to int8
+    activations: The name of the activation function of each layer
+
+The first layer (vocabulary x 64) holds almost all of the weights, so it can be quantized to
+reduce the size of the archive, the memory used by each worker and the memory read per prediction:
+    int8:    Each column is scaled by its largest absolute weight / 127 and rounded (4x smaller)
+    float16: Each weight is stored in half precision (2x smaller)
+Quantized kernels stay quantized in memory. For sparse inputs, only the rows of the kernel used by
+the batch are converted back to float32; int8 columns are then multiplied by their scale.
+
+The weights can also be saved as a directory with one '.npy' file per array (named like the keys
+of the archive), which is memory-mapped read-only on load instead of being read into memory. Every
+process that loads the same directory then shares a single copy of the weights through the page
+cache, which is what the pre-fork server relies on (see Resources/PreforkServer.py).
+
+Usage:
+    Export the weights (requires Keras):
+        python -m Resources.NumpyModel --export MODEL.keras --weights MODEL.npz
+
+    Verify that the NumPy engine matches Keras on the training data (requires Keras):
+        python -m Resources.NumpyModel --parity MODEL.keras --weights MODEL.npz --vectorizer MODEL.pkl
+
+    Quantize the first layer of exported weights, reporting the accuracy change on the training data:
+        python -m Resources.NumpyModel --weights MODEL.npz --quantize int8 --output MODEL.int8.npz --vectorizer MODEL.pkl
+
+    Save exported weights as a memory-mapped directory:
+        python -m Resources.NumpyModel --weights MODEL.npz --mapped MODEL.weights
+'''
+
+# Import the required libraries
+import os                   # For reporting archive sizes
+import argparse             # For parsing input arguments
+import numpy as np          # For numerical operations
+from scipy import sparse    # For multiplying sparse TF-IDF vectors without densifying them
+
+KERNEL = 'kernel_{}'
+BIAS = 'bias_{}'
+SCALE = 'scale_{}'
+ACTIVATIONS = 'activations'
+ARRAY_FILE = '{}.npy'       # The file of each array in a memory-mapped directory
+DENSE_LAYER = 'Dense'
+DTYPE = np.float32          # Keras stores and evaluates the weights as float32
+PARITY_TOLERANCE = 1e-5
+
+NUM_SAMPLES = 'num_samples'
+MAX_ABS_DIFFERENCE = 'max_abs_difference'
+MISMATCHED_PREDICTIONS = 'mismatched_predictions'
+PARITY_OK = 'parity_ok'
+
+INT8 = 'int8'
+FLOAT16 = 'float16'
+QUANTIZATION_MODES = [INT8, FLOAT16]
+INT8_MAX = 127              # Symmetric range, so that -127..127 maps to -max..max
+QUANTIZED_DTYPES = {INT8: np.int8, FLOAT16: np.float16}
+
+REFERENCE_ACCURACY = 'reference_accuracy'
+QUANTIZED_ACCURACY = 'quantized_accuracy'
+ACCURACY_DELTA = 'accuracy_delta'
+
+
+def relu(x):
+    """ Rectified Linear Unit: Returns zero for negative values, else returns the value """
+
+    return np.maximum(x, 0, out=x)
+
+
+def softmax(x):
+    """ Converts each row into a probability distribution """
+
+    x -= x.max(axis=1, keepdims=True)
+    np.exp(x, out=x)
+    x /= x.sum(axis=1, keepdims=True)
+    return x
+
+
+def linear(x):
+    """ Returns the value unchanged """
+
+    return x
+
+
+ACTIVATION_FUNCTIONS = {
+    'relu': relu,
+    'softmax': softmax,
+    'linear': linear
+}
+
+
+class Numpy_Model:
+    """ A stack of Dense layers evaluated with NumPy
+
+    Provides the subset of the keras.models.Sequential interface used by the lambda function
+    (predict, input_shape and output_shape), so it can be used as a drop-in replacement.
+    """
+
+    supports_sparse = True  # predict accepts SciPy sparse matrices
+
+    def __init__(self, kernels, biases, activations, scales=None):
+        """ Build the model from the weights of each Dense layer
+
+        Args:
+            kernels (list): The weight matrix of each layer; int8 and float16 kernels are kept as they are
+            biases (list): The bias vector of each layer
+            activations (list): The name of the activation function of each layer
+            scales (list): The per-column scale of each int8 kernel, and None for the other layers
+        """
+
+        scales = [None] * len(kernels) if scales is None else list(scales)
+
+        if not (len(kernels) == len(biases) == len(activations) == len(scales)) or len(kernels) == 0:
+            raise ValueError('Each layer requires a kernel, a bias and an activation')
+
+        for activation in activations:
+            if activation not in ACTIVATION_FUNCTIONS:
+                raise ValueError(f'Unsupported activation function: {activation}')
+
+        self.kernels = []
+        for kernel, scale in zip(kernels, scales):
+            kernel = np.asarray(kernel)
+            if kernel.dtype == np.int8 and scale is None:
+                raise ValueError('An int8 kernel requires a scale')
+            if kernel.dtype not in (np.int8, np.float16):
+                kernel = kernel.astype(DTYPE, copy=False)  # Keeps memory-mapped float32 kernels mapped
+            self.kernels.append(kernel)
+
+        self.scales = [None if scale is None else np.asarray(scale, dtype=DTYPE) for scale in scales]
+        self.biases = [np.asarray(bias, dtype=DTYPE) for bias in biases]
+        self.activations = [str(activation) for activation in activations]
+
+    @classmethod
+    def load(cls, weights_path):
+        """ Load a model from an archive created by export_weights, or a directory created by save_mapped
+
+        Args:
+            weights_path (str): The path to the '.npz' archive, or to the directory of '.npy' files
+
+        Returns:
+            Numpy_Model: The loaded model; the weights of a directory are memory-mapped read-only
+        """
+
+        if os.path.isdir(weights_path):
+            return cls.load_mapped(weights_path)
+
+        with np.load(weights_path) as archive:
+            activations = list(archive[ACTIVATIONS])
+            kernels = [archive[KERNEL.format(i)] for i in range(len(activations))]
+            biases = [archive[BIAS.format(i)] for i in range(len(activations))]
+            scales = [archive[SCALE.format(i)] if SCALE.format(i) in archive else None
+                      for i in range(len(activations))]
+
+        return cls(kernels, biases, activations, scales)
+
+    @classmethod
+    def load_mapped(cls, path):
+        """ Load a model from a directory created by save_mapped, without reading the weights into memory
+
+        Args:
+            path (str): The path to the directory of '.npy' files
+
+        Returns:
+            Numpy_Model: The model, whose kernels, biases and scales are read-only memory maps
+        """
+
+        def array_path(name):
+            return os.path.join(path, ARRAY_FILE.format(name))
+
+        activations = list(np.load(array_path(ACTIVATIONS)))
+        kernels = [np.load(array_path(KERNEL.format(i)), mmap_mode='r') for i in range(len(activations))]
+        biases = [np.load(array_path(BIAS.format(i)), mmap_mode='r') for i in range(len(activations))]
+        scales = [np.load(array_path(SCALE.format(i)), mmap_mode='r') if os.path.exists(array_path(SCALE.format(i)))
+                  else None for i in range(len(activations))]
+
+        return cls(kernels, biases, activations, scales)
+
+    @classmethod
+    def from_keras(cls, model):
+        """ Build a model from the Dense layers of an in-memory Keras model
+
+        Args:
+            model (keras.Model): A Sequential model made of Dense layers
+
+        Returns:
+            Numpy_Model: The model, with float32 weights
+        """
+
+        kernels = []
+        biases = []
+        activations = []
+
+        for layer in model.layers:
+            if layer.__class__.__name__ != DENSE_LAYER:
+                raise ValueError(f'Unsupported layer type: {layer.__class__.__name__} ({layer.name})')
+
+            kernel, bias = layer.get_weights()
+            kernels.append(kernel)
+            biases.append(bias)
+            activations.append(layer.activation.__name__)
+
+        return cls(kernels, biases, activations)
+
+    def save(self, weights_path):
+        """ Save the model to a NumPy archive that load can read
+
+        Args:
+            weights_path (str): The path of the '.npz' archive to create
+        """
+
+        arrays = {ACTIVATIONS: np.array(self.activations)}
+        for i, (kernel, bias, scale) in enumerate(zip(self.kernels, self.biases, self.scales)):
+            arrays[KERNEL.format(i)] = kernel
+            arrays[BIAS.format(i)] = bias
+            if scale is not None:
+                arrays[SCALE.format(i)] = scale
+
+        np.savez(weights_path, **arrays)
+
+    def save_mapped(self, path):
+        """ Save the model to a directory of '.npy' files that load_mapped can memory-map
+
+        Args:
+            path (str): The path of the directory to create
+        """
+
+        os.makedirs(path, exist_ok=True)
+        np.save(os.path.join(path, ARRAY_FILE.format(ACTIVATIONS)), np.array(self.activations))
+        for i, (kernel, bias, scale) in enumerate(zip(self.kernels, self.biases, self.scales)):
+            np.save(os.path.join(path, ARRAY_FILE.format(KERNEL.format(i))), kernel)
+            np.save(os.path.join(path, ARRAY_FILE.format(BIAS.format(i))), bias)
+            if scale is not None:
+                np.save(os.path.join(path, ARRAY_FILE.format(SCALE.format(i))), scale)
+
+    @property
+    def input_shape(self):
+        """ The shape of the model input, matching keras.Model.input_shape """
+
+        return (None, self.kernels[0].shape[0])
+
+    @property
+    def output_shape(self):
+        """ The shape of the model output, matching keras.Model.output_shape """
+
+        return (None, self.kernels[-1].shape[1])
+
+    def predict(self, inputs, **kwargs):
+        """ Run the forward pass
+
+        Args:
+            inputs (numpy.ndarray or scipy.sparse matrix): A 2D array of encoded messages
+            kwargs: Ignored; accepted for compatibility with keras.Model.predict (e.g. verbose)
+
+        Returns:
+            numpy.ndarray: The probability of each class, per message
+        """
+
+        if sparse.issparse(inputs):
+            # Only the non-zero entries are multiplied; the product with the first kernel is dense
+            outputs = inputs.tocsr().astype(DTYPE)
+        else:
+            outputs = np.asarray(inputs, dtype=DTYPE)
+
+        for kernel, scale, bias, activation in zip(self.kernels, self.scales, self.biases, self.activations):
+            outputs = multiply(outputs, kernel, scale)
+            outputs += bias
+            outputs = ACTIVATION_FUNCTIONS[activation](outputs)
+
+        return outputs
+
+
+def multiply(inputs, kernel, scale=None):
+    """ Multiply the inputs by a float32, float16 or int8 kernel
+
+    Args:
+        inputs (numpy.ndarray or scipy.sparse.csr_matrix): The float32 inputs of the layer
+        kernel (numpy.ndarray): The weight matrix of the layer
+        scale (numpy.ndarray): The per-column scale of an int8 kernel, or None
+
+    Returns:
+        numpy.ndarray: The float32 product
+    """
+
+    if kernel.dtype == DTYPE:
+        return np.asarray(inputs @ kernel)
+
+    if sparse.issparse(inputs):
+        # Only convert the rows of the kernel that the batch actually uses
+        columns = np.unique(inputs.indices)
+        product = np.asarray(inputs[:, columns] @ kernel[columns].astype(DTYPE))
+    else:
+        product = inputs @ kernel.astype(DTYPE)
+
+    # Scaling each output column is equivalent to scaling each column of the kernel
+    if scale is not None:
+        product *= scale
+
+    return product
+
+
+def quantize_kernel(kernel, mode):
+    """ Quantize a float32 weight matrix
+
+    Args:
+        kernel (numpy.ndarray): The weight matrix (inputs x nodes)
+        mode (str): 'int8' or 'float16'
+
+    Returns:
+        tuple: The quantized kernel and its per-column scale (None for float16)
+    """
+
+    if mode == FLOAT16:
+        return kernel.astype(np.float16), None
+
+    if mode != INT8:
+        raise ValueError(f'Unsupported quantization mode: {mode}')
+
+    scale = np.abs(kernel).max(axis=0) / INT8_MAX
+    scale[scale == 0] = 1.0     # All-zero columns stay zero with any scale
+    quantized = np.clip(np.rint(kernel / scale), -INT8_MAX, INT8_MAX).astype(np.int8)
+
+    return quantized, scale.astype(DTYPE)
+
+
+def quantize_model(model, mode, layers=(0,)):
+    """ Quantize the kernels of a model
+
+    Args:
+        model (Numpy_Model): A float32 model
+        mode (str): 'int8' or 'float16'
+        layers (tuple): The indexes of the layers to quantize; by default only the first layer,
+            which holds almost all of the weights
+
+    Returns:
+        Numpy_Model: The quantized model
+    """
+
+    kernels = list(model.kernels)
+    scales = list(model.scales)
+
+    for i in layers:
+        if kernels[i].dtype != DTYPE:
+            raise ValueError(f'Layer {i} is already quantized')
+        kernels[i], scales[i] = quantize_kernel(kernels[i], mode)
+
+    return Numpy_Model(kernels, model.biases, model.activations, scales)
+
+
+def export_weights(model_path, weights_path):
+    """ Export the Dense layer weights of a saved Keras model into a NumPy archive
+
+    Args:
+        model_path (str): The path to the '.keras' model file
+        weights_path (str): The path of the '.npz' archive to create
+
+    Returns:
+        Numpy_Model: The exported model, loaded from the new archive
+    """
+
+    import keras            # Only needed for exporting; the NumPy engine does not use it
+
+    model = keras.models.load_model(model_path)
+    Numpy_Model.from_keras(model).save(weights_path)
+
+    return Numpy_Model.load(weights_path)
+
+
+def check_parity(keras_model, numpy_model, encoded_messages, tolerance=PARITY_TOLERANCE):
+    """ Compare the outputs of the Keras model and the NumPy engine
+
+    Args:
+        keras_model (keras.models.Sequential): The original Keras model
+        numpy_model (Numpy_Model): The NumPy engine built from the exported weights
+        encoded_messages (numpy.ndarray or scipy.sparse matrix): A 2D array of encoded messages;
+            sparse inputs are densified for Keras and passed to the NumPy engine as-is
+        tolerance (float): The largest acceptable difference between the two outputs
+
+    Returns:
+        dict: The number of samples compared, the largest absolute difference between
+            the probabilities, the number of messages whose predicted class differs, and
+            whether the engines agree within the tolerance.
+    """
+
+    dense_messages = encoded_messages.toarray() if sparse.issparse(encoded_messages) else encoded_messages
+
+    expected = np.asarray(keras_model.predict(dense_messages, verbose=0))
+    actual = numpy_model.predict(encoded_messages)
+
+    max_abs_difference = float(np.max(np.abs(expected - actual))) if len(expected) else 0.0
+    mismatched = int(np.sum(np.argmax(expected, axis=1) != np.argmax(actual, axis=1)))
+
+    return {
+        NUM_SAMPLES: len(expected),
+        MAX_ABS_DIFFERENCE: max_abs_difference,
+        MISMATCHED_PREDICTIONS: mismatched,
+        PARITY_OK: mismatched == 0 and max_abs_difference <= tolerance
+    }
+
+
+def compare_accuracy(reference_model, quantized_model, encoded_messages, labels):
+    """ Compare the accuracy of a quantized model with the model it was quantized from
+
+    Args:
+        reference_model (Numpy_Model): The float32 model
+        quantized_model (Numpy_Model): The quantized model
+        encoded_messages (numpy.ndarray or scipy.sparse matrix): A 2D array of encoded messages
+        labels (list): The class index of each message (0 = ham, 1 = spam)
+
+    Returns:
+        dict: The number of samples, the accuracy of each model and their difference, the
+            largest absolute difference between the probabilities, and the number of messages
+            whose predicted class differs.
+    """
+
+    expected = reference_model.predict(encoded_messages)
+    actual = quantized_model.predict(encoded_messages)
+    labels = np.asarray(labels)
+
+    reference_accuracy = float(np.mean(np.argmax(expected, axis=1) == labels))
+    quantized_accuracy = float(np.mean(np.argmax(actual, axis=1) == labels))
+
+    return {
+        NUM_SAMPLES: len(labels),
+        REFERENCE_ACCURACY: reference_accuracy,
+        QUANTIZED_ACCURACY: quantized_accuracy,
+        ACCURACY_DELTA: quantized_accuracy - reference_accuracy,
+        MAX_ABS_DIFFERENCE: float(np.max(np.abs(expected - actual))) if len(labels) else 0.0,
+        MISMATCHED_PREDICTIONS: int(np.sum(np.argmax(expected, axis=1) != np.argmax(actual, axis=1)))
+    }
+
+
+def main():
+    """ Export model weights, check their parity against Keras, and/or quantize them """
+
+    parser = argparse.ArgumentParser(description='Export a Keras model for the NumPy inference engine')
+    parser.add_argument('--export', type=str, metavar='MODEL', help='Path to the .keras model to export')
+    parser.add_argument('--parity', type=str, metavar='MODEL', help='Path to the .keras model to compare against')
+    parser.add_argument('--weights', type=str, required=True, help='Path to the .npz weights archive')
+    parser.add_argument('--vectorizer', type=str, help='Path to the pickled vectorizer (required by --parity)')
+    parser.add_argument('--data', type=str, default=None, help='Path to the labeled dataset used by --parity and --quantize')
+    parser.add_argument('--quantize', type=str, choices=QUANTIZATION_MODES, help='Quantize the first layer of the weights archive')
+    parser.add_argument('--output', type=str, help='Path of the quantized archive to create (required by --quantize)')
+    parser.add_argument('--mapped', type=str, metavar='DIRECTORY', help='Save the weights as a memory-mapped directory')
+    args = parser.parse_args()
+
+    if args.export:
+        numpy_model = export_weights(args.export, args.weights)
+        print(f'Exported {len(numpy_model.kernels)} layers to {args.weights}')
+
+    if args.parity:
+        import keras
+        import pickle
+        from Resources.CustomTokenizer import Custom_Tokenizer
+        from Resources.SpamDataset import load_spam_dataset, SPAM_CSV
+
+        if not args.vectorizer:
+            parser.error('--parity requires --vectorizer')
+
+        with open(args.vectorizer, 'rb') as file:
+            vectorizer = pickle.load(file)
+            vectorizer.tokenizer = Custom_Tokenizer().custom_tokenizer
+
+        messages, _ = load_spam_dataset(args.data or SPAM_CSV)
+        encoded_messages = vectorizer.transform(messages)
+
+        result = check_parity(keras.models.load_model(args.parity),
+                              Numpy_Model.load(args.weights),
+                              encoded_messages)
+        print(result)
+        if not result[PARITY_OK]:
+            return 1
+
+    if args.quantize:
+        if not args.output:
+            parser.error('--quantize requires --output')
+
+        reference_model = Numpy_Model.load(args.weights)
+        quantized_model = quantize_model(reference_model, args.quantize)
+        quantized_model.save(args.output)
+        print(f'Quantized to {args.quantize}: {os.path.getsize(args.weights)} -> {os.path.getsize(args.output)} bytes')
+
+        # The accuracy report needs the vectorizer to encode the dataset
+        if args.vectorizer:
+            import pickle
+            from Resources.CustomTokenizer import Custom_Tokenizer
+            from Resources.SpamDataset import load_spam_dataset, encode_labels, SPAM_CSV
+
+            with open(args.vectorizer, 'rb') as file:
+                vectorizer = pickle.load(file)
+                vectorizer.tokenizer = Custom_Tokenizer().custom_tokenizer
+
+            messages, labels = load_spam_dataset(args.data or SPAM_CSV)
+            print(compare_accuracy(reference_model, Numpy_Model.load(args.output),
+                                   vectorizer.transform(messages), encode_labels(labels)))
+
+    if args.mapped:
+        Numpy_Model.load(args.weights).save_mapped(args.mapped)
+        print(f'Saved the weights to {args.mapped}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,117 @@
+''' Implements multi-core vectorization of large batches of messages.
+
+Tokenization (NLTK word_tokenize + lemmatization) is pure Python, so the vectorizer only uses
+one core. For large batches, the messages are split into shards which are vectorized by a pool
+of worker processes. Each worker receives its own copy of the vectorizer (and its tokenizer)
+once, when it starts. The resulting sparse matrices are stacked back together in the original
+order of the messages.
+
+Small batches are vectorized in the calling process, since starting the pool and sending the
+messages to the workers costs more than it saves.
+
+NOTE: AWS Lambda does not support the shared memory used by process pools, so parallel
+      vectorization is disabled by default (PARALLEL_WORKERS=1). It is intended for bulk jobs.
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment
+import math                 # For computing shard sizes
+import pickle               # For sending the vectorizer to the workers
+import threading            # For starting the pool once across threads
+from concurrent.futures import ProcessPoolExecutor  # For running the workers
+from scipy import sparse    # For stacking the vectorized shards
+
+PARALLEL_WORKERS = int(os.environ.get('PARALLEL_WORKERS', 1))
+PARALLEL_MIN_BATCH = int(os.environ.get('PARALLEL_MIN_BATCH', 1000))
+
+# The vectorizer used by each worker process, set once by _initialize_worker
+_worker_vectorizer = None
+
+
+def _initialize_worker(vectorizer_bytes):
+    """ Restore the vectorizer in a worker process """
+
+    global _worker_vectorizer
+    _worker_vectorizer = pickle.loads(vectorizer_bytes)
+
+
+def _transform_shard(messages):
+    """ Vectorize a shard of messages in a worker process """
+
+    return _worker_vectorizer.transform(messages)
+
+
+class Parallel_Vectorizer:
+    """ Wraps a fitted vectorizer, sharding the transform of large batches across processes
+
+    Every attribute other than transform (e.g. vocabulary_) is read from the wrapped vectorizer,
+    so the wrapper can be used wherever the vectorizer is.
+    """
+
+    def __init__(self, vectorizer, workers=PARALLEL_WORKERS, min_batch_size=PARALLEL_MIN_BATCH):
+        """ Wrap a vectorizer
+
+        Args:
+            vectorizer (TfidfVectorizer): A fitted, picklable vectorizer
+            workers (int): The number of worker processes
+            min_batch_size (int): The smallest batch that is vectorized in parallel
+        """
+
+        self.vectorizer = vectorizer
+        self.workers = workers
+        self.min_batch_size = min_batch_size
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Only called for attributes not defined on the wrapper itself
+        if name == 'vectorizer':
+            raise AttributeError(name)
+        return getattr(self.vectorizer, name)
+
+    def _get_pool(self):
+        """ Start the worker processes on first use """
+
+        if self._pool is not None:
+            return self._pool
+
+        with self._pool_lock:
+            # Another thread may have started the pool while this one waited for the lock
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                                 initializer=_initialize_worker,
+                                                 initargs=(pickle.dumps(self.vectorizer),))
+            return self._pool
+
+    def transform(self, messages):
+        """ Vectorize the messages, in parallel if the batch is large enough
+
+        Args:
+            messages (list): A list of messages to vectorize
+
+        Returns:
+            scipy.sparse.csr_matrix: The vectorized messages, in the same order
+        """
+
+        if self.workers <= 1 or len(messages) < max(self.min_batch_size, 2):
+            return self.vectorizer.transform(messages)
+
+        shard_size = math.ceil(len(messages) / self.workers)
+        shards = [messages[i:i + shard_size] for i in range(0, len(messages), shard_size)]
+
+        # map returns the results in the order of the shards
+        return sparse.vstack(list(self._get_pool().map(_transform_shard, shards)), format='csr')
+
+    def close(self):
+        """ Stop the worker processes """
+
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,155 @@
+''' Implements a bounded cache of previous predictions, keyed by the content of each message.
+
+Traffic contains many identical messages (campaign spam, "ok", "on my way", etc.), so the
+prediction for each message is cached and reused instead of being tokenized, vectorized and
+predicted again.
+
+Each entry is keyed by a SHA-256 hash of the message text together with a version string
+identifying the model and vectorizer, so that predictions made by one model are never returned
+for another. Entries are evicted in least-recently-used order once the cache is full, and
+expire after a configurable time-to-live.
+'''
+
+# Import the required libraries
+import time                 # For expiring entries
+import hashlib              # For hashing the message text
+import threading            # For guarding the cache
+from collections import OrderedDict  # For least-recently-used ordering
+
+HITS = 'hits'
+MISSES = 'misses'
+SIZE = 'size'
+MAX_SIZE = 'max_size'
+EVICTIONS = 'evictions'
+EXPIRATIONS = 'expirations'
+HIT_RATE = 'hit_rate'
+
+
+class Prediction_Cache:
+    """ A thread-safe LRU cache of predictions with a time-to-live """
+
+    def __init__(self, max_size, ttl_seconds=None, version='', clock=time.monotonic):
+        """ Create a cache
+
+        Args:
+            max_size (int): The maximum number of predictions to keep; 0 disables the cache
+            ttl_seconds (float): How long a prediction stays valid; None keeps it until evicted
+            version (str): Identifies the model and vectorizer that made the predictions
+            clock (callable): Returns the current time in seconds
+        """
+
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.version = version
+        self._clock = clock
+        self._entries = OrderedDict()   # key -> (expiry time, prediction)
+        self._lock = threading.Lock()
+        self._stats = {HITS: 0, MISSES: 0, EVICTIONS: 0, EXPIRATIONS: 0}
+
+    def key(self, message, version=None):
+        """ Get the cache key of a message
+
+        Args:
+            message (str): The original text message
+            version (str): Identifies the model that made the prediction; the cache's version if None
+
+        Returns:
+            bytes: The hash of the version and the message text
+        """
+
+        version = self.version if version is None else version
+        return hashlib.sha256(f'{version}\0{message}'.encode('utf-8', 'surrogatepass')).digest()
+
+    def get_many(self, messages, version=None):
+        """ Look up the cached predictions of the messages
+
+        Args:
+            messages (list): A list of unique messages
+            version (str): Identifies the model whose predictions are looked up; the cache's version if None
+
+        Returns:
+            dict: The cached prediction of each message that was found, keyed by message
+        """
+
+        found = {}
+        if self.max_size <= 0:
+            return found
+
+        keys = [(message, self.key(message, version)) for message in messages]
+        now = self._clock()
+
+        with self._lock:
+            for message, key in keys:
+                entry = self._entries.get(key)
+
+                if entry is not None and entry[0] is not None and entry[0] <= now:
+                    del self._entries[key]
+                    self._stats[EXPIRATIONS] += 1
+                    entry = None
+
+                if entry is None:
+                    self._stats[MISSES] += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self._stats[HITS] += 1
+                    found[message] = entry[1]
+
+        return found
+
+    def put_many(self, predictions, version=None):
+        """ Add predictions to the cache, evicting the least recently used ones if it is full
+
+        Args:
+            predictions (dict): The prediction of each message, keyed by message
+            version (str): Identifies the model that made the predictions; the cache's version if None
+        """
+
+        if self.max_size <= 0:
+            return
+
+        keys = [(self.key(message, version), prediction) for message, prediction in predictions.items()]
+        expiry = None if self.ttl_seconds is None else self._clock() + self.ttl_seconds
+
+        with self._lock:
+            for key, prediction in keys:
+                self._entries[key] = (expiry, prediction)
+                self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._stats[EVICTIONS] += 1
+
+    def get(self, message):
+        """ Look up the cached prediction of a single message, or None if it is not cached """
+
+        return self.get_many([message]).get(message)
+
+    def put(self, message, prediction):
+        """ Add the prediction of a single message to the cache """
+
+        self.put_many({message: prediction})
+
+    def stats(self):
+        """ Get the cache statistics
+
+        Returns:
+            dict: The number of hits, misses, evictions and expirations, the current and
+                maximum number of entries, and the fraction of lookups that were hits
+        """
+
+        with self._lock:
+            stats = dict(self._stats)
+            stats[SIZE] = len(self._entries)
+
+        lookups = stats[HITS] + stats[MISSES]
+        stats[MAX_SIZE] = self.max_size
+        stats[HIT_RATE] = stats[HITS] / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """ Remove every entry and reset the statistics """
+
+        with self._lock:
+            self._entries.clear()
+            for stat in self._stats:
+                self._stats[stat] = 0
@@ -0,0 +1,320 @@
+''' Implements a pre-fork HTTP server whose workers share one copy of the model and vectorizer.
+
+Running N independent copies of the batching server (see Resources/BatchingServer.py) loads the
+model and the vectorizer N times, so memory grows linearly with the number of workers. The
+pre-fork server loads them once, in a master process, and then forks its workers from it:
+
+    1. The master loads the artifacts with lambda_function.warmup(). With the weights saved as a
+       memory-mapped directory (see Resources/NumpyModel.py) and the vectorizer in the compact
+       format (see Resources/CompactVectorizer.py), the Dense weights, the idf vector and the
+       vocabulary index are read-only memory maps of files, backed by the page cache.
+    2. The master freezes the garbage collector (gc.freeze), so that collections in the workers
+       do not write to the pages of the objects it allocated, and binds the listening socket.
+    3. Each worker is forked from the master, serves the shared socket with a Batching_Server
+       and maps the same pages, so an additional worker only costs the memory it writes to:
+       the interpreter's own state, its caches and the requests it is serving. Each worker
+       restarts the model registry's watcher, if any (see Resources/ModelRegistry.py).
+
+The master restarts workers that exit, and stops them all on SIGINT or SIGTERM. The memory of
+each worker (resident, proportional and private, from /proc/<pid>/smaps_rollup on Linux) can be
+reported once they have started, to check how much of it is actually shared.
+
+NOTE: The workers are forked, so the model must be served by the NumPy backend, and the master
+      must not have imported TensorFlow: its thread pools are not fork-safe, and every worker
+      would inherit its memory. The server refuses to start with MODEL_BACKEND=keras, or once
+      TensorFlow has been imported. Artifacts that are not memory-mapped (the '.npz' weights or
+      the pickled vectorizer) still work, but are only shared until the workers write to them
+      (copy-on-write), so the server warns about them at startup.
+
+Usage:
+    python -m Resources.PreforkServer --port 8080 --workers 4 --report-memory 5
+'''
+
+# Import the required libraries
+import os                   # For forking and supervising the workers
+import sys                  # For checking that TensorFlow has not been imported
+import gc                   # For freezing the objects allocated before forking
+import time                 # For waiting before reporting the memory of the workers
+import signal               # For stopping the workers
+import socket               # For the listening socket shared by the workers
+import asyncio              # For running the batching server in each worker
+import argparse             # For parsing input arguments
+import numpy as np          # For detecting memory-mapped arrays
+from Resources.BatchingServer import Micro_Batcher, Batching_Server, SERVER_HOST, SERVER_PORT, \
+    BATCH_MAX_WAIT_MS, BATCH_MAX_SIZE
+from Resources.ModelRegistry import restart_watchers
+
+PREFORK_WORKERS = int(os.environ.get('PREFORK_WORKERS', os.cpu_count() or 1))
+LISTEN_BACKLOG = 1024
+SMAPS_ROLLUP = '/proc/{}/smaps_rollup'
+KILOBYTES_PER_MEGABYTE = 1024
+FORK_UNSAFE_MODULES = ['tensorflow']    # Modules whose threads and memory must not be forked
+
+# Memory report keys, and the smaps_rollup fields they are computed from
+RSS = 'rss_mb'
+PSS = 'pss_mb'
+PRIVATE = 'private_mb'
+SHARED = 'shared_mb'
+SMAPS_FIELDS = {
+    'Rss': RSS,
+    'Pss': PSS,
+    'Private_Clean': PRIVATE,
+    'Private_Dirty': PRIVATE,
+    'Shared_Clean': SHARED,
+    'Shared_Dirty': SHARED
+}
+
+# Names of the artifacts reported by unshared_artifacts
+MODEL = 'model'
+VECTORIZER = 'vectorizer'
+
+
+def memory_usage(pid='self'):
+    """ Get the memory used by a process, split into shared and private memory (Linux only)
+
+    Args:
+        pid (int or str): The process ID, or 'self' for the calling process
+
+    Returns:
+        dict: The resident, proportional (shared pages divided among the processes that map them),
+            private and shared memory of the process, in megabytes, or None if it is not available
+    """
+
+    try:
+        with open(SMAPS_ROLLUP.format(pid)) as file:
+            lines = file.readlines()
+    except OSError:
+        return None
+
+    usage = dict.fromkeys(SMAPS_FIELDS.values(), 0.0)
+    for line in lines:
+        name, _, value = line.partition(':')
+        if name in SMAPS_FIELDS:
+            usage[SMAPS_FIELDS[name]] += int(value.split()[0]) / KILOBYTES_PER_MEGABYTE
+
+    return usage
+
+
+def is_memory_mapped(array):
+    """ Check whether an array is backed by a memory-mapped file """
+
+    while array is not None:
+        if isinstance(array, np.memmap):
+            return True
+        array = getattr(array, 'base', None)
+    return False
+
+
+def unshared_artifacts(model, vectorizer):
+    """ Find the artifacts that are held in the memory of the process rather than memory-mapped
+
+    Args:
+        model (Numpy_Model or Cascade_Model): The loaded model
+        vectorizer (Compact_Vectorizer or TfidfVectorizer): The loaded vectorizer
+
+    Returns:
+        list: The names of the artifacts that each worker would copy as soon as it writes to them
+
+    Raises:
+        ValueError: If the model is not served by the NumPy backend
+    """
+
+    from Resources.NumpyModel import Numpy_Model
+    from Resources.CompactVectorizer import Compact_Vectorizer
+
+    # The cascade's linear scorer is a single vector, so only the model behind it matters
+    model = getattr(model, 'model', model)
+    if not isinstance(model, Numpy_Model):
+        raise ValueError('Pre-fork serving requires the numpy model backend')
+
+    unshared = []
+    if not all(is_memory_mapped(array) for array in model.kernels + model.biases):
+        unshared.append(MODEL)
+
+    vectorizer = getattr(vectorizer, 'vectorizer', vectorizer)    # Unwrap a Parallel_Vectorizer
+    if not isinstance(vectorizer, Compact_Vectorizer) or not is_memory_mapped(vectorizer.idf_):
+        unshared.append(VECTORIZER)
+
+    return unshared
+
+
+def check_fork_safe():
+    """ Verify that this process can fork workers, i.e. that it has not imported TensorFlow
+
+    Raises:
+        RuntimeError: If a module that cannot be used in a forked child has been imported
+    """
+
+    imported = [name for name in FORK_UNSAFE_MODULES if name in sys.modules]
+    if imported:
+        raise RuntimeError(f'Pre-fork serving cannot fork a process that has imported {", ".join(imported)}; '
+                           f'serve the exported weights with the numpy model backend')
+
+
+class Prefork_Server:
+    """ Forks workers that serve a shared listening socket with the artifacts loaded by the master """
+
+    def __init__(self, classify, workers=PREFORK_WORKERS, host=SERVER_HOST, port=SERVER_PORT,
+                 max_wait_ms=BATCH_MAX_WAIT_MS, max_batch_size=BATCH_MAX_SIZE):
+        """ Create the server
+
+        Args:
+            classify (callable): Classifies a list of messages (see Micro_Batcher); called in the workers
+            workers (int): The number of worker processes
+            host (str): The address to listen on
+            port (int): The port to listen on; 0 picks a free port
+            max_wait_ms (float): The longest a request waits for other requests to join its batch
+            max_batch_size (int): The number of messages at which a batch is classified immediately
+        """
+
+        if workers < 1:
+            raise ValueError(f'Pre-fork server requires at least 1 worker, but got {workers}')
+
+        self.classify = classify
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.max_wait_ms = max_wait_ms
+        self.max_batch_size = max_batch_size
+        self.pids = set()
+        self._sock = None
+        self._stopping = False
+
+    def start(self):
+        """ Bind the listening socket and fork the workers; the port actually used is stored in self.port
+
+        Raises:
+            RuntimeError: If this process has imported TensorFlow (see check_fork_safe)
+        """
+
+        check_fork_safe()
+
+        self._sock = socket.create_server((self.host, self.port), backlog=LISTEN_BACKLOG)
+        self._sock.setblocking(False)
+        self.port = self._sock.getsockname()[1]
+
+        # Objects allocated so far are never collected, so the workers do not write to their pages
+        gc.freeze()
+
+        for _ in range(self.workers):
+            self._fork_worker()
+
+    def _fork_worker(self):
+        pid = os.fork()
+        if pid:
+            self.pids.add(pid)
+            return
+
+        # Worker: serve until stopped, and never return into the master's code
+        status = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            restart_watchers()      # Each worker swaps in new model versions itself
+            batcher = Micro_Batcher(self.classify, self.max_wait_ms, self.max_batch_size)
+            asyncio.run(Batching_Server(batcher, sock=self._sock).serve_forever())
+        except BaseException:
+            status = 1
+        finally:
+            os._exit(status)
+
+    def serve_forever(self):
+        """ Start the workers and restart any that exit, until stop is called or a signal is received """
+
+        if self._sock is None:
+            self.start()
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        try:
+            while not self._stopping:
+                try:
+                    pid, _ = os.wait()
+                except ChildProcessError:
+                    break
+                except InterruptedError:
+                    continue
+                self.pids.discard(pid)
+                if not self._stopping:
+                    self._fork_worker()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        """ Stop the workers and close the listening socket """
+
+        self._stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in list(self.pids):
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+            self.pids.discard(pid)
+
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            gc.unfreeze()
+
+    def memory_report(self):
+        """ Get the memory used by the master and by each worker
+
+        Returns:
+            dict: The memory usage (see memory_usage) of each process, keyed by process ID
+        """
+
+        return {pid: memory_usage(pid) for pid in [os.getpid(), *sorted(self.pids)]}
+
+
+def main():
+    """ Load the artifacts once and serve the classifier from pre-forked workers """
+
+    parser = argparse.ArgumentParser(description='Serve the classifier over HTTP from pre-forked workers')
+    parser.add_argument('--host', type=str, default=SERVER_HOST, help='Address to listen on')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help='Port to listen on')
+    parser.add_argument('--workers', type=int, default=PREFORK_WORKERS, help='Number of worker processes')
+    parser.add_argument('--max-wait-ms', type=float, default=BATCH_MAX_WAIT_MS, help='Longest a request waits for a batch to fill')
+    parser.add_argument('--max-batch-size', type=int, default=BATCH_MAX_SIZE, help='Number of messages that closes a batch immediately')
+    parser.add_argument('--report-memory', type=float, metavar='SECONDS', help='Print the memory of each process this long after starting')
+    args = parser.parse_args()
+
+    import lambda_function
+
+    # Refuse the Keras backend before loading it, since loading it imports TensorFlow
+    if lambda_function.MODEL_BACKEND == lambda_function.KERAS_BACKEND:
+        parser.error('Pre-fork serving requires the numpy model backend')
+
+    lambda_function.warmup()
+    model, vectorizer, _ = lambda_function.get_function_artifacts(lambda_function.SPAM_OR_HAM)
+
+    try:
+        unshared = unshared_artifacts(model, vectorizer)
+        check_fork_safe()
+    except (ValueError, RuntimeError) as e:
+        parser.error(str(e))
+    for name in unshared:
+        print(f'Warning: the {name} is not memory-mapped, so each worker may end up with its own copy')
+
+    server = Prefork_Server(lambda messages: lambda_function.classify_function(lambda_function.SPAM_OR_HAM, messages),
+                            args.workers, args.host, args.port, args.max_wait_ms, args.max_batch_size)
+    server.start()
+    print(f'Serving on http://{args.host}:{server.port} with {args.workers} workers')
+
+    if args.report_memory is not None:
+        time.sleep(args.report_memory)
+        for pid, usage in server.memory_report().items():
+            role = 'master' if pid == os.getpid() else 'worker'
+            print(f'{role} {pid}: {usage}')
+
+    server.serve_forever()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,54 @@
+''' Loads the labeled SMS Spam Collection dataset used to train and evaluate the model.
+
+The dataset is stored as a CSV file with the following columns:
+    v1: The classification of the message ('ham' or 'spam')
+    v2: The original text message
+
+NOTE: The data is not "UTF-8" format, so the file is read using the "ISO-8859-1" encoding
+      (the same encoding used by the Model Builder notebook).
+'''
+
+# Import the required libraries
+import csv                  # For reading the dataset
+
+SPAM_CSV = 'Resources/spam.csv'
+ENCODING = 'ISO-8859-1'
+LABEL_COLUMN = 'v1'
+MESSAGE_COLUMN = 'v2'
+HAM = 'ham'
+SPAM = 'spam'
+CLASSES = [HAM, SPAM]       # Index of each class matches the model's output (0 = ham, 1 = spam)
+
+
+def load_spam_dataset(path=SPAM_CSV):
+    """ Load the labeled messages from the dataset
+
+    Args:
+        path (str): The path to the dataset CSV file
+
+    Returns:
+        tuple: A list of messages and a list of their labels ('ham' or 'spam')
+    """
+
+    messages = []
+    labels = []
+
+    with open(path, newline='', encoding=ENCODING) as file:
+        for row in csv.DictReader(file):
+            messages.append(row[MESSAGE_COLUMN])
+            labels.append(row[LABEL_COLUMN])
+
+    return messages, labels
+
+
+def encode_labels(labels):
+    """ Convert the labels into class indexes (0 = ham, 1 = spam)
+
+    Args:
+        labels (list): A list of 'ham'/'spam' labels
+
+    Returns:
+        list: The class index of each label
+    """
+
+    return [CLASSES.index(label) for label in labels]
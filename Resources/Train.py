@@ -0,0 +1,367 @@
+''' Implements the training pipeline of the Model Builder notebook as a module and command line tool.
+
+The notebook densifies the whole TF-IDF matrix (messages x vocabulary) and runs its 10 stratified
+folds one after the other on the same model, so each fold continues training the previous
+fold's weights. This module trains the same model (one 64-node ReLU hidden layer and a 2-node
+softmax output layer, adam, categorical cross-entropy, 10 epochs of batches of 64) with:
+    - Sparse mini-batches: the TF-IDF matrix stays sparse, and only the rows of the current
+      batch are densified, so memory grows with the number of non-zero entries, not with
+      messages x vocabulary
+    - Independent folds: every fold is trained from fresh weights in its own process (up to
+      FOLD_WORKERS at a time), so folds cannot leak into each other and run in parallel
+    - A tokenized corpus cache: tokenizing (NLTK) is the slow part of fitting the vectorizer,
+      so the tokens of each message are cached on disk, keyed by the dataset and tokenizer
+      engine, and reused by later runs
+
+After cross-validation, a final model is trained from fresh weights on every message and saved
+with its vectorizer, named like the notebook's artifacts after the mean fold accuracy:
+    Sequential_<accuracy>_<epochs>_<batch size>_<hidden layers>_<nodes>_relu_softmax.keras
+    Sequential_<accuracy>_<epochs>_<batch size>_<hidden layers>_<nodes>_relu_softmax.pkl
+    Sequential_<accuracy>_<epochs>_<batch size>_<hidden layers>_<nodes>_relu_softmax.npz  (NumPy engine)
+Point lambda_function's MODEL_NAME, VECTORIZER_NAME and WEIGHTS_NAME at the new files to serve them.
+
+Usage:
+    python -m Resources.Train --output-dir Resources --folds 10 --workers 4
+
+    Also export the compact vectorizer (see Resources/CompactVectorizer.py):
+        python -m Resources.Train --output-dir Resources --compact
+'''
+
+# Import the required libraries
+import os                   # For reading configuration from the environment and building paths
+import math                 # For the number of batches per epoch
+import pickle               # For caching the tokens and saving the vectorizer
+import hashlib              # For keying the token cache
+import argparse             # For parsing input arguments
+import multiprocessing      # For training each fold in its own process
+import numpy as np          # For numerical operations
+from concurrent.futures import ProcessPoolExecutor  # For training folds in parallel
+from Resources.SpamDataset import load_spam_dataset, encode_labels, CLASSES, SPAM_CSV
+
+# Training settings, matching the Model Builder notebook
+MODEL_TYPE = 'Sequential'
+EPOCHS = 10
+BATCH_SIZE = 64
+NUM_HIDDEN_LAYERS = 1
+NUM_NODES = 64
+HIDDEN_ACTIVATION = 'relu'
+OUTPUT_ACTIVATION = 'softmax'
+NUM_FOLDS = 10
+RANDOM_STATE = 24
+
+FOLD_WORKERS = int(os.environ.get('FOLD_WORKERS', 2))
+TOKEN_CACHE_DIR = os.environ.get('TOKEN_CACHE_DIR', os.path.join('Resources', '.token_cache'))
+TOKEN_CACHE_VERSION = '1'   # Change to invalidate every cached corpus
+
+FOLD_ACCURACIES = 'fold_accuracies'
+MEAN_ACCURACY = 'mean_accuracy'
+ARTIFACTS = 'artifacts'
+
+
+def pretokenized_analyzer(tokens):
+    """ Analyzer for vectorizers fed with already tokenized messages """
+
+    return tokens
+
+
+def tokenize_corpus(vectorizer, messages):
+    """ Tokenize each message with the vectorizer's analyzer
+
+    Args:
+        vectorizer (TfidfVectorizer): The vectorizer whose tokenizer is used (need not be fitted)
+        messages (list): A list of messages
+
+    Returns:
+        list: The tokens of each message
+    """
+
+    analyze = vectorizer.build_analyzer()
+    return [analyze(message) for message in messages]
+
+
+def load_tokenized_corpus(vectorizer, messages, engine, cache_dir=TOKEN_CACHE_DIR):
+    """ Tokenize each message, reusing the tokens cached by a previous run when available
+
+    Args:
+        vectorizer (TfidfVectorizer): The vectorizer whose tokenizer is used
+        messages (list): A list of messages
+        engine (str): The tokenizer engine, part of the cache key
+        cache_dir (str): The directory of the cached corpora; None disables the cache
+
+    Returns:
+        list: The tokens of each message
+    """
+
+    if cache_dir is None:
+        return tokenize_corpus(vectorizer, messages)
+
+    digest = hashlib.sha256(f'{TOKEN_CACHE_VERSION}\0{engine}'.encode('utf-8'))
+    for message in messages:
+        digest.update(b'\0' + message.encode('utf-8'))
+    cache_path = os.path.join(cache_dir, f'{digest.hexdigest()}.pkl')
+
+    if os.path.exists(cache_path):
+        with open(cache_path, 'rb') as file:
+            return pickle.load(file)
+
+    tokens = tokenize_corpus(vectorizer, messages)
+
+    # Written to a temporary file first, so an interrupted run never leaves a partial cache behind
+    os.makedirs(cache_dir, exist_ok=True)
+    temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'wb') as file:
+        pickle.dump(tokens, file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary_path, cache_path)
+
+    return tokens
+
+
+def sparse_batches(encoded_messages, labels, batch_size=BATCH_SIZE, shuffle=True, seed=RANDOM_STATE):
+    """ Generate dense mini-batches from a sparse matrix, forever (one pass over the data per epoch)
+
+    Args:
+        encoded_messages (scipy.sparse matrix): The encoded messages
+        labels (list): The class index of each message
+        batch_size (int): The number of messages per batch
+        shuffle (bool): Whether to visit the messages in a new random order every epoch
+        seed (int): The seed of the shuffling order
+
+    Yields:
+        tuple: A (batch x vocabulary) float32 array and the one-hot encoded labels of the batch
+    """
+
+    encoded_messages = encoded_messages.tocsr()
+    one_hot = np.eye(len(CLASSES), dtype=np.float32)[np.asarray(labels)]
+    rng = np.random.default_rng(seed)
+    num_messages = encoded_messages.shape[0]
+
+    while True:
+        order = rng.permutation(num_messages) if shuffle else np.arange(num_messages)
+        for start in range(0, num_messages, batch_size):
+            rows = order[start:start + batch_size]
+            yield encoded_messages[rows].toarray().astype(np.float32), one_hot[rows]
+
+
+def build_model(num_features):
+    """ Build and compile the Sequential model of the Model Builder notebook
+
+    Args:
+        num_features (int): The size of the vocabulary
+
+    Returns:
+        keras.models.Sequential: The compiled model, with fresh weights
+    """
+
+    import keras            # Only needed for training
+
+    model = keras.models.Sequential([
+        keras.Input(shape=(num_features,)),
+        keras.layers.Dense(NUM_NODES, activation=HIDDEN_ACTIVATION, name='Hidden-Layer-1'),
+        keras.layers.Dense(len(CLASSES), activation=OUTPUT_ACTIVATION, name='Output-Layer')
+    ])
+    model.compile(optimizer='adam', loss='categorical_crossentropy', metrics=['accuracy'])
+    return model
+
+
+def train_model(encoded_messages, labels, epochs=EPOCHS, batch_size=BATCH_SIZE, seed=RANDOM_STATE):
+    """ Train a fresh model on encoded messages, feeding it sparse mini-batches
+
+    Args:
+        encoded_messages (scipy.sparse matrix): The encoded training messages
+        labels (list): The class index of each message
+        epochs (int): The number of training epochs
+        batch_size (int): The training batch size
+        seed (int): The seed of the initial weights and of the batch order
+
+    Returns:
+        keras.models.Sequential: The trained model
+    """
+
+    import keras            # Only needed for training
+
+    keras.utils.set_random_seed(seed)
+    model = build_model(encoded_messages.shape[1])
+    model.fit(sparse_batches(encoded_messages, labels, batch_size, seed=seed),
+              steps_per_epoch=math.ceil(encoded_messages.shape[0] / batch_size),
+              epochs=epochs, shuffle=False, verbose=0)     # The generator shuffles every epoch
+    return model
+
+
+def train_fold(encoded_messages, labels, train_index, test_index, epochs=EPOCHS, batch_size=BATCH_SIZE,
+               seed=RANDOM_STATE):
+    """ Train a fresh model on one fold and evaluate it on the held out messages
+
+    Runs in a worker process (see cross_validate), so it only takes and returns picklable values.
+
+    Args:
+        encoded_messages (scipy.sparse matrix): Every encoded message
+        labels (list): The class index of every message
+        train_index (numpy.ndarray): The rows to train on
+        test_index (numpy.ndarray): The rows to evaluate on
+        epochs (int): The number of training epochs
+        batch_size (int): The training batch size
+        seed (int): The seed of the initial weights and of the batch order
+
+    Returns:
+        float: The accuracy of the fold's model on the held out messages
+    """
+
+    from Resources.NumpyModel import Numpy_Model
+
+    labels = np.asarray(labels)
+    model = train_model(encoded_messages[train_index], labels[train_index], epochs, batch_size, seed)
+
+    # The NumPy engine predicts on the sparse rows directly
+    predictions = np.argmax(Numpy_Model.from_keras(model).predict(encoded_messages[test_index]), axis=1)
+    return float(np.mean(predictions == labels[test_index]))
+
+
+def cross_validate(encoded_messages, labels, num_folds=NUM_FOLDS, epochs=EPOCHS, batch_size=BATCH_SIZE,
+                   workers=FOLD_WORKERS):
+    """ Train and evaluate a fresh model on each stratified fold, each in its own process
+
+    Args:
+        encoded_messages (scipy.sparse matrix): Every encoded message
+        labels (list): The class index of every message
+        num_folds (int): The number of folds
+        epochs (int): The number of training epochs
+        batch_size (int): The training batch size
+        workers (int): The number of folds trained at the same time
+
+    Returns:
+        list: The accuracy of each fold
+    """
+
+    from sklearn.model_selection import StratifiedKFold
+
+    folds = StratifiedKFold(n_splits=num_folds, shuffle=True, random_state=RANDOM_STATE)
+    splits = list(folds.split(np.zeros(len(labels)), labels))
+
+    # Spawned (not forked) workers, each used for a single fold, so no TensorFlow state is shared
+    with ProcessPoolExecutor(max_workers=max(workers, 1), mp_context=multiprocessing.get_context('spawn'),
+                             max_tasks_per_child=1) as executor:
+        futures = [executor.submit(train_fold, encoded_messages, labels, train_index, test_index, epochs,
+                                   batch_size, RANDOM_STATE + fold)
+                   for fold, (train_index, test_index) in enumerate(splits)]
+        return [future.result() for future in futures]
+
+
+def artifact_name(accuracy, epochs=EPOCHS, batch_size=BATCH_SIZE):
+    """ Get the base name of a model's artifacts, in the Model Builder notebook's naming scheme """
+
+    return (f'{MODEL_TYPE}_{accuracy:.5f}_{epochs}_{batch_size}_{NUM_HIDDEN_LAYERS}_{NUM_NODES}_'
+            f'{HIDDEN_ACTIVATION}_{OUTPUT_ACTIVATION}')
+
+
+def save_artifacts(base_path, vectorizer, model, compact=False):
+    """ Save a trained model and its vectorizer in every format lambda_function can load
+
+    Args:
+        base_path (str): The path of the artifacts, without extension
+        vectorizer (TfidfVectorizer): The fitted vectorizer, with its tokenizer
+        model (keras.models.Sequential): The trained model
+        compact (bool): Whether to also export the compact vectorizer
+
+    Returns:
+        list: The paths of the saved artifacts
+    """
+
+    from Resources.NumpyModel import Numpy_Model
+
+    paths = [f'{base_path}.keras', f'{base_path}.pkl', f'{base_path}.npz']
+
+    model.save(paths[0])
+    with open(paths[1], 'wb') as file:
+        pickle.dump(vectorizer, file)
+    Numpy_Model.from_keras(model).save(paths[2])
+
+    if compact:
+        from Resources.CompactVectorizer import export_vectorizer
+        paths.append(f'{base_path}.vectorizer')
+        export_vectorizer(vectorizer, paths[-1])
+
+    return paths
+
+
+def train(messages, labels, output_dir, tokenizer, engine, epochs=EPOCHS, batch_size=BATCH_SIZE,
+          num_folds=NUM_FOLDS, workers=FOLD_WORKERS, cache_dir=TOKEN_CACHE_DIR, compact=False):
+    """ Cross-validate the model, then train it on every message and save the artifacts
+
+    Args:
+        messages (list): A list of messages
+        labels (list): The class index of each message
+        output_dir (str): The directory to save the artifacts to
+        tokenizer (callable): The tokenizer of the vectorizer (Custom_Tokenizer.custom_tokenizer)
+        engine (str): The tokenizer engine, part of the token cache key
+        epochs (int): The number of training epochs
+        batch_size (int): The training batch size
+        num_folds (int): The number of cross-validation folds
+        workers (int): The number of folds trained at the same time
+        cache_dir (str): The directory of the token cache; None disables it
+        compact (bool): Whether to also export the compact vectorizer
+
+    Returns:
+        dict: The accuracy of each fold, their mean and the paths of the saved artifacts
+    """
+
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    # As in the notebook, the vectorizer is fitted on every message before cross-validation
+    vectorizer = TfidfVectorizer(tokenizer=tokenizer, token_pattern=None)
+    tokens = load_tokenized_corpus(vectorizer, messages, engine, cache_dir)
+
+    # Fitted on the cached tokens, then switched back to the tokenizer so that it encodes raw messages
+    encoded_messages = vectorizer.set_params(analyzer=pretokenized_analyzer, tokenizer=None).fit_transform(tokens)
+    vectorizer.set_params(analyzer='word', tokenizer=tokenizer)
+
+    fold_accuracies = cross_validate(encoded_messages, labels, num_folds, epochs, batch_size, workers)
+    mean_accuracy = float(np.mean(fold_accuracies))
+
+    model = train_model(encoded_messages, labels, epochs, batch_size)
+
+    os.makedirs(output_dir, exist_ok=True)
+    base_path = os.path.join(output_dir, artifact_name(mean_accuracy, epochs, batch_size))
+
+    return {
+        FOLD_ACCURACIES: fold_accuracies,
+        MEAN_ACCURACY: mean_accuracy,
+        ARTIFACTS: save_artifacts(base_path, vectorizer, model, compact)
+    }
+
+
+def main():
+    """ Train the model and save its artifacts """
+
+    from Resources.CustomTokenizer import Custom_Tokenizer, TOKENIZER_ENGINE, TOKENIZER_ENGINES
+
+    parser = argparse.ArgumentParser(description='Train the spam classifier and save its artifacts')
+    parser.add_argument('--data', type=str, default=SPAM_CSV, help='Path to the labeled dataset')
+    parser.add_argument('--output-dir', type=str, default='Resources', help='Directory to save the artifacts to')
+    parser.add_argument('--epochs', type=int, default=EPOCHS, help='Training epochs')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Training batch size')
+    parser.add_argument('--folds', type=int, default=NUM_FOLDS, help='Number of cross-validation folds')
+    parser.add_argument('--workers', type=int, default=FOLD_WORKERS, help='Number of folds trained at the same time')
+    parser.add_argument('--engine', type=str, choices=TOKENIZER_ENGINES, default=TOKENIZER_ENGINE, help='Tokenizer engine')
+    parser.add_argument('--cache-dir', type=str, default=TOKEN_CACHE_DIR, help='Directory of the tokenized corpus cache')
+    parser.add_argument('--no-cache', action='store_true', help='Tokenize the corpus without the cache')
+    parser.add_argument('--compact', action='store_true', help='Also export the compact vectorizer')
+    args = parser.parse_args()
+
+    messages, labels = load_spam_dataset(args.data)
+    tokenizer = Custom_Tokenizer(engine=args.engine)
+
+    result = train(messages, encode_labels(labels), args.output_dir, tokenizer.custom_tokenizer, args.engine,
+                   args.epochs, args.batch_size, args.folds, args.workers,
+                   None if args.no_cache else args.cache_dir, args.compact)
+
+    for fold, accuracy in enumerate(result[FOLD_ACCURACIES], start=1):
+        print(f'Fold {fold}: {accuracy:.5f}')
+    print(f'Mean accuracy: {result[MEAN_ACCURACY]:.5f}')
+    for path in result[ARTIFACTS]:
+        print(f'Saved {path}')
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,301 @@
+''' Implements a training-side tool that prunes the vocabulary of the TF-IDF vectorizer.
+
+The vectorizer built by the Model Builder notebook keeps every token seen in the training data,
+and the first Dense layer has one row of weights per token. Most of those tokens appear once or
+twice and carry little information about the label, so a much smaller vocabulary can classify
+(almost) as well while making the vectorizer, the weights and each prediction cheaper.
+
+The tool:
+    1. Tokenizes spam.csv once with the vectorizer's tokenizer (the slow part) and reuses the tokens
+    2. Splits the data into stratified train/test sets
+    3. Ranks the features of the training set by chi-squared or mutual information with the labels
+    4. For each target size, keeps the top ranked tokens, re-encodes the data and retrains the
+       Sequential model from fresh weights, with the training pipeline of Resources/Train.py
+    5. Reports the test accuracy, the size of the first layer and the per-message transform and
+       predict latency (NumPy engine) of each size, next to the full vocabulary
+
+The pruned vectorizers are ordinary TfidfVectorizers with a fixed vocabulary, so they can be
+deployed in place of the original (together with their retrained model).
+
+Usage:
+    python -m Resources.VocabularyPruning --vectorizer MODEL.pkl --method chi2 --sizes 500 1000 2000 4000
+
+    Save the model and vectorizer of each size, named like the notebook's artifacts:
+        python -m Resources.VocabularyPruning --vectorizer MODEL.pkl --sizes 2000 --output-dir Resources/pruned
+'''
+
+# Import the required libraries
+import os                   # For building artifact paths
+import json                 # For writing the report
+import time                 # For measuring latency
+import pickle               # For loading and saving vectorizers
+import argparse             # For parsing input arguments
+import numpy as np          # For numerical operations
+from sklearn.feature_extraction.text import TfidfVectorizer  # For building the pruned vectorizers
+from sklearn.model_selection import train_test_split         # For the stratified train/test split
+from Resources.NumpyModel import Numpy_Model                 # For measuring predict latency without Keras
+from Resources.SpamDataset import load_spam_dataset, encode_labels, SPAM_CSV
+from Resources.Train import pretokenized_analyzer, tokenize_corpus, train_model, artifact_name  # The training pipeline
+from Resources.Train import EPOCHS, BATCH_SIZE, RANDOM_STATE
+
+CHI2 = 'chi2'
+MUTUAL_INFO = 'mutual_info'
+RANKING_METHODS = [CHI2, MUTUAL_INFO]
+DEFAULT_SIZES = [500, 1000, 2000, 4000]
+FULL = 'full'
+
+TEST_SIZE = 0.2
+
+LATENCY_REPEATS = 5
+
+VOCABULARY_SIZE = 'vocabulary_size'
+ACCURACY = 'accuracy'
+ACCURACY_DELTA = 'accuracy_delta'
+FIRST_LAYER_BYTES = 'first_layer_bytes'
+TRANSFORM_MS = 'transform_ms_per_message'
+PREDICT_MS = 'predict_ms_per_message'
+
+
+def rank_features(encoded_messages, labels, method=CHI2):
+    """ Rank the features by how much they tell about the labels
+
+    Args:
+        encoded_messages (scipy.sparse matrix): The encoded messages (messages x features)
+        labels (list): The class index of each message
+        method (str): 'chi2' or 'mutual_info'
+
+    Returns:
+        numpy.ndarray: The column index of each feature, most informative first
+    """
+
+    from sklearn.feature_selection import chi2, mutual_info_classif
+
+    if method == CHI2:
+        scores, _ = chi2(encoded_messages, labels)
+    elif method == MUTUAL_INFO:
+        scores = mutual_info_classif(encoded_messages, labels, discrete_features=True, random_state=RANDOM_STATE)
+    else:
+        raise ValueError(f'Invalid ranking method: {method}')
+
+    # Features that never appear in the training set score NaN under chi2
+    scores = np.nan_to_num(scores, nan=0.0)
+    return np.argsort(-scores, kind='stable')
+
+
+def prune_vocabulary(vocabulary, ranking, size):
+    """ Keep the top ranked terms of a vocabulary
+
+    Args:
+        vocabulary (dict): The column index of each term, as in TfidfVectorizer.vocabulary_
+        ranking (numpy.ndarray): The column indexes, most informative first (see rank_features)
+        size (int): The number of terms to keep
+
+    Returns:
+        list: The kept terms, sorted (the column order sklearn would give them)
+    """
+
+    if size < 1:
+        raise ValueError(f'Vocabulary size must be at least 1, but got {size}')
+
+    terms = np.empty(len(vocabulary), dtype=object)
+    for term, column in vocabulary.items():
+        terms[column] = term
+
+    return sorted(terms[ranking[:size]])
+
+
+def build_vectorizer(vocabulary, tokens):
+    """ Fit a TF-IDF vectorizer with a fixed vocabulary on tokenized messages
+
+    Args:
+        vocabulary (list): The terms to keep, or None to keep every term
+        tokens (list): The tokens of each message
+
+    Returns:
+        tuple: The fitted vectorizer and the encoded messages
+    """
+
+    vectorizer = TfidfVectorizer(analyzer=pretokenized_analyzer, vocabulary=vocabulary)
+    encoded_messages = vectorizer.fit_transform(tokens)
+    return vectorizer, encoded_messages
+
+
+def measure_latency(function, repeats=LATENCY_REPEATS):
+    """ Get the best of several timings of a function, in milliseconds """
+
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+
+def evaluate_size(vocabulary, train_tokens, train_labels, test_tokens, test_labels, epochs=EPOCHS,
+                  batch_size=BATCH_SIZE):
+    """ Train and evaluate a model on a (pruned) vocabulary
+
+    Args:
+        vocabulary (list): The terms to keep, or None to keep every term
+        train_tokens (list): The tokens of each training message
+        train_labels (list): The class index of each training message
+        test_tokens (list): The tokens of each test message
+        test_labels (list): The class index of each test message
+        epochs (int): The number of training epochs
+        batch_size (int): The training batch size
+
+    Returns:
+        tuple: The trade-off point (dict), the fitted vectorizer and the trained Keras model
+    """
+
+    vectorizer, train_encoded = build_vectorizer(vocabulary, train_tokens)
+    model = train_model(train_encoded, train_labels, epochs, batch_size)
+    numpy_model = Numpy_Model.from_keras(model)
+
+    test_encoded = vectorizer.transform(test_tokens)
+    predictions = np.argmax(numpy_model.predict(test_encoded), axis=1)
+    num_messages = len(test_tokens)
+
+    point = {
+        VOCABULARY_SIZE: len(vectorizer.vocabulary_),
+        ACCURACY: float(np.mean(predictions == np.asarray(test_labels))),
+        FIRST_LAYER_BYTES: int(numpy_model.kernels[0].nbytes),
+        TRANSFORM_MS: measure_latency(lambda: vectorizer.transform(test_tokens)) / num_messages,
+        PREDICT_MS: measure_latency(lambda: numpy_model.predict(test_encoded)) / num_messages
+    }
+
+    return point, vectorizer, model
+
+
+def run_pruning(vectorizer, messages, labels, sizes=DEFAULT_SIZES, method=CHI2, epochs=EPOCHS,
+                batch_size=BATCH_SIZE, on_point=None):
+    """ Evaluate the accuracy vs. latency/size trade-off of several vocabulary sizes
+
+    Args:
+        vectorizer (TfidfVectorizer): The fitted vectorizer whose tokenizer is used
+        messages (list): A list of messages
+        labels (list): The class index of each message
+        sizes (list): The vocabulary sizes to evaluate
+        method (str): The ranking method ('chi2' or 'mutual_info')
+        epochs (int): The number of training epochs
+        batch_size (int): The training batch size
+        on_point (callable): Called with (size, point, vectorizer, model) after each size is evaluated,
+            size being 'full' for the full vocabulary
+
+    Returns:
+        list: One trade-off point per size, starting with the full vocabulary
+    """
+
+    tokens = tokenize_corpus(vectorizer, messages)
+    train_tokens, test_tokens, train_labels, test_labels = train_test_split(
+        tokens, labels, test_size=TEST_SIZE, stratify=labels, random_state=RANDOM_STATE)
+
+    # The full vocabulary of the training split is the baseline, and is what gets ranked
+    full_point, full_vectorizer, full_model = evaluate_size(None, train_tokens, train_labels, test_tokens,
+                                                            test_labels, epochs, batch_size)
+    full_point[ACCURACY_DELTA] = 0.0
+    points = [full_point]
+    if on_point is not None:
+        on_point(FULL, full_point, full_vectorizer, full_model)
+
+    ranking = rank_features(full_vectorizer.transform(train_tokens), train_labels, method)
+
+    for size in sorted(set(sizes), reverse=True):
+        if size >= len(full_vectorizer.vocabulary_):
+            continue
+
+        vocabulary = prune_vocabulary(full_vectorizer.vocabulary_, ranking, size)
+        point, pruned_vectorizer, model = evaluate_size(vocabulary, train_tokens, train_labels, test_tokens,
+                                                        test_labels, epochs, batch_size)
+        point[ACCURACY_DELTA] = point[ACCURACY] - full_point[ACCURACY]
+        points.append(point)
+        if on_point is not None:
+            on_point(size, point, pruned_vectorizer, model)
+
+    return points
+
+
+def save_artifacts(output_dir, size, point, vectorizer, model, tokenizer, epochs=EPOCHS, batch_size=BATCH_SIZE):
+    """ Save a retrained model and its vectorizer, ready to be deployed
+
+    The vectorizer is switched from the pre-tokenized analyzer back to the tokenizer, so that it
+    encodes raw messages like the original.
+
+    Args:
+        output_dir (str): The directory to save the artifacts to (a sub-directory per size)
+        size (int or str): The vocabulary size, or 'full'
+        point (dict): The trade-off point of the model
+        vectorizer (TfidfVectorizer): The fitted vectorizer
+        model (keras.models.Sequential): The trained model
+        tokenizer (callable): The tokenizer of the original vectorizer
+        epochs (int): The number of training epochs
+        batch_size (int): The training batch size
+
+    Returns:
+        str: The base path of the saved artifacts (without extension)
+    """
+
+    directory = os.path.join(output_dir, str(size))
+    os.makedirs(directory, exist_ok=True)
+    base_path = os.path.join(directory, artifact_name(point[ACCURACY], epochs, batch_size))
+
+    vectorizer.set_params(analyzer='word', tokenizer=tokenizer)
+    with open(f'{base_path}.pkl', 'wb') as file:
+        pickle.dump(vectorizer, file)
+    model.save(f'{base_path}.keras')
+
+    return base_path
+
+
+def format_report(points):
+    """ Format the trade-off points as a table """
+
+    lines = [f'{"vocabulary":>10}  {"accuracy":>8}  {"delta":>8}  {"layer KB":>9}  {"transform ms":>12}  {"predict ms":>10}']
+    for point in points:
+        lines.append(f'{point[VOCABULARY_SIZE]:>10}  {point[ACCURACY]:>8.5f}  {point[ACCURACY_DELTA]:>+8.5f}  '
+                     f'{point[FIRST_LAYER_BYTES] / 1024:>9.1f}  {point[TRANSFORM_MS]:>12.5f}  {point[PREDICT_MS]:>10.5f}')
+    lines.append('(latencies are per message, over the test split; predict uses the NumPy engine)')
+    return '\n'.join(lines)
+
+
+def main():
+    """ Evaluate pruned vocabularies and print the trade-off report """
+
+    parser = argparse.ArgumentParser(description='Prune the vectorizer vocabulary and retrain the model')
+    parser.add_argument('--vectorizer', type=str, required=True, help='Path to the pickled vectorizer')
+    parser.add_argument('--data', type=str, default=SPAM_CSV, help='Path to the labeled dataset')
+    parser.add_argument('--method', type=str, choices=RANKING_METHODS, default=CHI2, help='Feature ranking method')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Vocabulary sizes to evaluate')
+    parser.add_argument('--epochs', type=int, default=EPOCHS, help='Training epochs per size')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Training batch size')
+    parser.add_argument('--output-dir', type=str, help='Save the model and vectorizer of each size to this directory')
+    parser.add_argument('--report', type=str, help='Write the trade-off points to this JSON file')
+    args = parser.parse_args()
+
+    from Resources.CustomTokenizer import Custom_Tokenizer
+
+    with open(args.vectorizer, 'rb') as file:
+        vectorizer = pickle.load(file)
+    tokenizer = Custom_Tokenizer().custom_tokenizer
+    vectorizer.tokenizer = tokenizer
+
+    messages, labels = load_spam_dataset(args.data)
+
+    def on_point(size, point, pruned_vectorizer, model):
+        print(f'{size}: accuracy {point[ACCURACY]:.5f}', flush=True)
+        if args.output_dir:
+            print(f'  saved to {save_artifacts(args.output_dir, size, point, pruned_vectorizer, model, tokenizer, args.epochs, args.batch_size)}')
+
+    points = run_pruning(vectorizer, messages, encode_labels(labels), args.sizes, args.method, args.epochs,
+                         args.batch_size, on_point)
+    print(format_report(points))
+
+    if args.report:
+        with open(args.report, 'w') as file:
+            json.dump(points, file, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
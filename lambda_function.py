@@ -25,50 +25,147 @@ NOTES:
 1. The function takes in the original text messages as a list of strings.
 2. The responses are stored in a dictionary, with the original text message as
    the key and the predicted classes as the value.
+3. The model and vectorizer are loaded once per process and reused by every
+   invocation that lands on a warm container. Call warmup() to load them ahead
+   of the first request.
+4. Duplicate messages within an event are only classified once, and previous
+   predictions are cached (see PREDICTION_CACHE_SIZE and PREDICTION_CACHE_TTL).
+5. Per-stage timings and counts are logged in the CloudWatch Embedded Metric Format
+   when METRICS_ENABLED=1, with the function called (or the comma-separated functions, for a
+   list) as the 'function' dimension, and returned in a 'metrics' field of the response when the
+   event contains 'metrics': true (see Resources/InvocationMetrics.py).
+6. When the vectorizer has been exported to the compact format (see
+   Resources/CompactVectorizer.py), it is memory-mapped instead of unpickled, and
+   scikit-learn is not needed to serve the model.
+7. Thread-safe serving (e.g. behind a threaded WSGI server): call warmup() before
+   starting the threads, so every NLTK resource is loaded once, under a lock, rather
+   than on first use by several threads at once. After that, lambda_handler and
+   classify_many can be called from any number of threads.
+8. When CASCADE_ENABLED=1, a linear scorer classifies the messages it is confident
+   about (see CASCADE_MARGIN) and only the rest are passed to the model (see
+   Resources/CascadeModel.py). The number of messages on each path is reported by
+   get_cache_stats and the invocation metrics.
+9. Large events are tokenized, vectorized and classified in chunks, so peak memory
+   does not grow with the number of messages. The chunk size is derived from
+   INFERENCE_MEMORY_BUDGET_MB and the width of the vocabulary (see inference_chunk_size),
+   unless INFERENCE_CHUNK_SIZE is set.
+10. Callers that do not need the messages echoed back can select a compact response
+    with the optional 'response_format' field:
+        'map':    The default format shown above
+        'labels': An array with the class of each message, in input order, e.g. ['ham', 'spam', 'ham']
+        'codes':  An array with the class index of each message (0 = ham, 1 = spam), e.g. [0, 1, 0]
+    With either array format, 'probabilities': true adds a 'probabilities' array with the
+    probability that each message is spam. Probabilities are always computed by the model,
+    since the prediction cache only holds classes.
+11. When the weights have been saved as a memory-mapped directory (MAPPED_WEIGHTS_NAME, see
+    Resources/NumpyModel.py) and the vectorizer in the compact format, the weights, the idf
+    vector and the vocabulary index are memory-mapped read-only, so every process serving them
+    shares one copy through the page cache. Resources/PreforkServer.py loads them once and
+    forks its workers from the loaded process.
+12. When MODEL_REGISTRY_DIR is set, functions are also served from a directory of versioned
+    artifacts (see Resources/ModelRegistry.py): every function in the directory can be called
+    by name, new versions are swapped in by a background thread without a restart, and the
+    registry's 'spam_or_ham' (if any) replaces the built-in artifacts. The 'function' field may
+    also be a list of function names, which classifies the messages with each of them and
+    returns the responses of each function keyed by name. Functions that tokenize the same way
+    share a single tokenization pass.
+13. When PROFILING_ENABLED=1 (every PROFILE_EVERY_N-th invocation), or when the event contains
+    'profile': true, the invocation runs under cProfile and tracemalloc (see
+    Resources/InvocationProfiler.py). The statistics and top allocation sites are written to
+    PROFILE_DIR, and a summary with the time spent in NLTK, scikit-learn and Keras is logged
+    (or returned in a 'profile' field of the response, when requested by the event).
+14. When NEAR_DUPLICATE_ENABLED=1, messages that are not in the prediction cache are looked
+    up in a bounded MinHash/LSH index of the messages recently classified as spam (see
+    Resources/NearDuplicateIndex.py). Messages whose estimated Jaccard similarity to one of
+    them reaches NEAR_DUPLICATE_THRESHOLD are labeled spam without the model, which catches
+    the lightly varied copies sent by spam campaigns. The number of matches is reported by
+    get_cache_stats and the invocation metrics.
 '''
 
 # To run locally, install the required libraries
 # !python -m pip install -r Resources/lambda_requirements.txt
 
 # Import the required libraries
-import nltk                 # For text processing
 import pickle               # For loading the vectorizer
-import keras                # For deep learning model (Still requires TensorFlow backend)
 import json                 # For JSON encoding/decoding
 import argparse             # For parsing input arguments
+import os                   # For reading configuration from the environment
+import sys                  # For writing the result of the command line
+import copy                 # For copying the vectorizer when timing its stages
+import threading            # For guarding the artifact cache
+from concurrent.futures import ThreadPoolExecutor  # For tokenizing on multiple threads
 
+import numpy as np          # For preallocating the dense input buffer
 from numpy import argmax    # For finding the index of the maximum value
 
-# Import the NLTK libraries
+# NOTE: Keras (and its TensorFlow backend) is only imported when serving the original '.keras'
+# model (see Resources/ModelArtifacts.py). The NumPy backend serves the same model from its
+# exported weights, so importing this module does not load TensorFlow.
 
-'''
-The following libraries are needed for processing the text messages:
-
-1. punkt: This package is used to split the text into individual words or sentences.
-2. stopwords: Stop words are common words that are removed from text processing tasks to improve the
-   accuracy and efficiency of the results. Examples: 'the', 'is', 'and', 'a', etc.
-3. wordnet: This package is used for lemmatization, which is the process of converting a word to its
-   base form. Example: The lemma of the word 'running' is 'run'.
-'''
+# orjson encodes responses several times faster than json; it is used when installed
+try:
+    import orjson           # For fast JSON encoding
+except ImportError:
+    orjson = None
 
-# NOTE: When deployed to AWS, these libraries should already be available in an AWS Lambda Layer.
-# The following line sets the path to their location in the AWS Lambda Layer.
-nltk.data.path.append('./opt/nltk_data')
-
-nltk.download('punkt_tab')
-nltk.download('stopwords')
-nltk.download('wordnet')
-
-from nltk.corpus import stopwords
-from nltk.stem import WordNetLemmatizer
-lemmatizer = WordNetLemmatizer()
+# NOTE: The NLTK data used by the tokenizer (punkt_tab, stopwords and wordnet) is not downloaded
+# at runtime. When deployed to AWS, it should already be available in an AWS Lambda Layer; see
+# Resources/NltkData.py for the locations that are searched and how to bundle the data.
 
 # Import the custom tokenizer - Used for encoding the messages with the same vectorizer as the trained model
 from Resources.CustomTokenizer import Custom_Tokenizer
 tokenizer_Instance = Custom_Tokenizer()
 
+# Import the artifact helpers - Used for loading, validating and running the model (shared with the model registry)
+from Resources.ModelArtifacts import load_keras_model, validate_artifacts, model_supports_sparse, predict_probabilities
+
+# Import the NumPy inference engine - Used for serving the model without TensorFlow
+from Resources.NumpyModel import Numpy_Model
+
+# Import the compact vectorizer - Used for encoding the messages without scikit-learn
+from Resources.CompactVectorizer import Compact_Vectorizer
+
+# Import the prediction cache - Used for skipping messages that have already been classified
+from Resources.PredictionCache import Prediction_Cache
+
+# Import the bulk classifier - Used for classifying files of messages from the command line
+from Resources.BulkClassifier import classify_file, DEFAULT_CHUNK_SIZE, DEFAULT_ENCODING, STDOUT
+
+# Import the parallel vectorizer - Used for tokenizing large batches on multiple cores
+from Resources.ParallelVectorizer import Parallel_Vectorizer, PARALLEL_WORKERS
+
+# Import the invocation metrics - Used for reporting where the time of each invocation is spent
+from Resources.InvocationMetrics import Invocation_Metrics, NULL_METRICS, METRICS_ENABLED
+
+# Import the invocation profiler - Used for finding the functions and libraries a regression is in
+from Resources.InvocationProfiler import Invocation_Profiler, emit as emit_profile, PROFILING_ENABLED
+
+# Import the cascade - Used for classifying confident messages without the model
+from Resources.CascadeModel import Cascade_Model, Linear_Scorer, CASCADE_ENABLED, CASCADE_MARGIN
+
+# Import the model registry - Used for serving versioned models that are swapped in without a restart
+from Resources.ModelRegistry import Model_Registry, tokenization_key, MODEL_REGISTRY_DIR, MODEL_REGISTRY_POLL_SECONDS
+
+# Import the near-duplicate index - Used for labeling variants of recent spam without the model
+from Resources.NearDuplicateIndex import Near_Duplicate_Index, NEAR_DUPLICATE_ENABLED, NEAR_DUPLICATE_THRESHOLD, \
+    NEAR_DUPLICATE_INDEX_SIZE
+
 MODEL_NAME = 'Resources/Sequential_0.99875_10_64_1_64_relu_softmax.keras'
 VECTORIZER_NAME = 'Resources/Sequential_0.99875_10_64_1_64_relu_softmax.pkl'
+WEIGHTS_NAME = 'Resources/Sequential_0.99875_10_64_1_64_relu_softmax.npz'
+MAPPED_WEIGHTS_NAME = 'Resources/Sequential_0.99875_10_64_1_64_relu_softmax.weights'  # Preferred over WEIGHTS_NAME
+COMPACT_VECTORIZER_NAME = 'Resources/Sequential_0.99875_10_64_1_64_relu_softmax.vectorizer'
+LINEAR_SCORER_NAME = 'Resources/Sequential_0.99875_10_64_1_64_relu_softmax.linear.npz'
+KERAS_BACKEND = 'keras'
+NUMPY_BACKEND = 'numpy'
+AUTO_BACKEND = 'auto'       # Use the NumPy backend when the exported weights are available
+MODEL_BACKEND = os.environ.get('MODEL_BACKEND', AUTO_BACKEND)
+PICKLE_FORMAT = 'pickle'
+COMPACT_FORMAT = 'compact'
+VECTORIZER_FORMAT = os.environ.get('VECTORIZER_FORMAT', AUTO_BACKEND)  # Compact when it has been exported
+ARTIFACT_VERSION = os.path.splitext(os.path.basename(VECTORIZER_NAME))[0]  # Shared by the model and vectorizer
+PREDICTION_CACHE_SIZE = int(os.environ.get('PREDICTION_CACHE_SIZE', 10000))  # 0 disables the cache
+PREDICTION_CACHE_TTL = float(os.environ.get('PREDICTION_CACHE_TTL', 3600))   # Seconds
 STATUS_CODE = 'status_code'
 RESPONSES = 'responses'
 ERRORS = 'errors'
@@ -78,10 +175,74 @@ SPAM_OR_HAM = 'spam_or_ham'
 SUPPORTED_FUNCTIONS = [SPAM_OR_HAM]
 MESSAGES = 'messages'
 FUNCTION = 'function'
+METRICS = 'metrics'
+PROFILE = 'profile'
+RESPONSE_FORMAT = 'response_format'
+PROBABILITIES = 'probabilities'
 SPAM_OR_HAM_FIELDS = [FUNCTION, MESSAGES]
+SPAM_OR_HAM_OPTIONAL_FIELDS = [METRICS, PROFILE, RESPONSE_FORMAT, PROBABILITIES]
+MAP_FORMAT = 'map'
+LABELS_FORMAT = 'labels'
+CODES_FORMAT = 'codes'
+RESPONSE_FORMATS = [MAP_FORMAT, LABELS_FORMAT, CODES_FORMAT]
+HAM = 'ham'
+SPAM = 'spam'
+CLASS_CODES = {HAM: 0, SPAM: 1}
 EMPTY_STRING = ''
 EMPTY_DICT = {}
 EMPTY_LIST = []
+CACHE_HITS = 'cache_hits'
+CACHE_MISSES = 'cache_misses'
+ARTIFACTS_LOADED = 'artifacts_loaded'
+PREDICTION_CACHE = 'prediction_cache'
+CASCADE = 'cascade'
+REGISTRY = 'registry'
+NEAR_DUPLICATE_INDEX = 'near_duplicate_index'
+MESSAGES_CLASSIFIED = 'messages_classified'
+OUTPUT = 'output'
+WARMUP_MESSAGE = 'warmup'
+TOKENIZER_THREADS = int(os.environ.get('TOKENIZER_THREADS', 4))      # Used by classify_many
+TOKENIZER_CHUNK_SIZE = int(os.environ.get('TOKENIZER_CHUNK_SIZE', 256))
+INFERENCE_MEMORY_BUDGET_MB = float(os.environ.get('INFERENCE_MEMORY_BUDGET_MB', 64))  # Per chunk of messages
+INFERENCE_CHUNK_SIZE = int(os.environ.get('INFERENCE_CHUNK_SIZE', 0))  # 0 derives it from the memory budget
+MESSAGE_OVERHEAD_BYTES = 2048  # Estimated text, tokens and sparse TF-IDF row of a message
+DENSE_DTYPE = np.float64    # The dtype of the TF-IDF vectors, and so of their dense copy
+
+# Names of the stages and counters recorded by the invocation metrics
+TOTAL = 'total'
+VALIDATION = 'validation'
+ARTIFACT_LOAD = 'artifact_load'
+TOKENIZATION = 'tokenization'
+TFIDF_TRANSFORM = 'tfidf_transform'
+VECTORIZATION = 'vectorization'     # Tokenization and TF-IDF transform, when they cannot be timed separately
+PREDICT = 'predict'
+RESPONSE = 'response'
+COLD_START = 'cold_start'
+FAILED = 'failed'
+MESSAGE_COUNT = 'message_count'
+UNIQUE_MESSAGE_COUNT = 'unique_message_count'
+TOKEN_COUNT = 'token_count'
+PREDICTION_CACHE_HITS = 'prediction_cache_hits'
+NEAR_DUPLICATE_LOOKUP = 'near_duplicate_lookup'
+NEAR_DUPLICATE_HITS = 'near_duplicate_hits'
+
+# Cache of the loaded (model, vectorizer) pair, shared by all invocations in this process
+_artifacts = None
+_artifacts_lock = threading.Lock()
+_cache_stats = {CACHE_HITS: 0, CACHE_MISSES: 0}
+
+# Cache of previous predictions, keyed by message text and artifact version
+_prediction_cache = Prediction_Cache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, ARTIFACT_VERSION)
+
+# Index of recently classified spam, matched by near-duplicate messages (see NOTE 14)
+_near_duplicate_index = Near_Duplicate_Index(NEAR_DUPLICATE_INDEX_SIZE, NEAR_DUPLICATE_THRESHOLD) if NEAR_DUPLICATE_ENABLED else None
+
+# Registry of versioned models, created on first use when MODEL_REGISTRY_DIR is set (see NOTE 12)
+_registry = None
+_registry_lock = threading.Lock()
+
+# Profiles the invocations selected by PROFILING_ENABLED or the event (see NOTE 13)
+_profiler = Invocation_Profiler()
 
 
 def lambda_handler(event, context=None):
@@ -98,39 +259,791 @@ def lambda_handler(event, context=None):
             request fails.  
     """
 
+    # Only record metrics when they are logged or requested, so they cost nothing otherwise
+    metrics_requested = isinstance(event, dict) and event.get(METRICS) is True
+    metrics = Invocation_Metrics(SPAM_OR_HAM) if METRICS_ENABLED or metrics_requested else NULL_METRICS
+
+    # Likewise, only profile when enabled or requested; otherwise the profiler is never started
+    profile_requested = isinstance(event, dict) and event.get(PROFILE) is True
+    if profile_requested or PROFILING_ENABLED and _profiler.due():
+        with _profiler.profile() as profile:
+            with metrics.stage(TOTAL):
+                response = handle_event(event, metrics)
+
+        if PROFILING_ENABLED:
+            emit_profile(profile)
+
+        if profile_requested:
+            response[PROFILE] = profile
+    else:
+        with metrics.stage(TOTAL):
+            response = handle_event(event, metrics)
+
+    if metrics.enabled:
+        metrics.count(FAILED, int(response[STATUS_CODE] != STATUS_CODE_SUCCESS))
+
+        if METRICS_ENABLED:
+            metrics.emit()
+
+        if metrics_requested:
+            response[METRICS] = metrics.to_dict()
+
+    return response
+
+
+def handle_event(event, metrics=NULL_METRICS):
+    """ Validate the event and classify its messages
+
+    Args:
+        event (dict): A dictionary containing the input data and parameters
+        metrics (Invocation_Metrics): Records the duration of each stage
+
+    Returns:
+        dict: A JSON object containing the status code with function name and 
+            response data for successful queries or error information if the
+            request fails.  
+    """
+
     try:
         # Validate that the event has the required fields and contains at least one message
-        validation_errors = event_is_valid(event)
+        with metrics.stage(VALIDATION):
+            validation_errors = event_is_valid(event)
         if validation_errors is not None:
             return validation_errors
         
-        # Load the model from the file
-        model = keras.models.load_model(MODEL_NAME)
+        # Get the messages from the event
+        function_name = event[FUNCTION]
 
-         # Get the messages from the event
+        # File the metrics under the function(s) called; events that fail validation stay under spam_or_ham
+        metrics.set_function(','.join(function_name) if isinstance(function_name, list) else function_name)
         messages = event[MESSAGES]
+        response_format = event.get(RESPONSE_FORMAT, MAP_FORMAT)
 
-        # Load the vectorizer from the pickle-encoded file
-        with open(VECTORIZER_NAME, 'rb') as file:
-            vectorizer = pickle.load(file)
-            vectorizer.tokenizer = tokenizer_Instance.custom_tokenizer
+        # Several functions share the tokenization of the messages, and respond by function name
+        if isinstance(function_name, list):
+            responses = classify_functions(function_name, messages, metrics)
+            return {
+                STATUS_CODE: STATUS_CODE_SUCCESS,
+                FUNCTION: function_name,
+                RESPONSES: {name: format_responses(messages, responses[name], response_format) for name in responses},
+                ERRORS: []
+            }
+
+        # Get the model and vectorizer (only loaded from disk on the first invocation)
+        cache_misses = _cache_stats[CACHE_MISSES]
+        with metrics.stage(ARTIFACT_LOAD):
+            model, vectorizer, version = get_function_artifacts(function_name)
+        metrics.count(COLD_START, _cache_stats[CACHE_MISSES] - cache_misses)
 
-        # Use the vectorizer to encode the messages
-        # Convert the messages into TF-IDF vector using the same vectorizer as the trained model
-        encoded_messages = vectorizer.transform(messages).toarray()
-        
         # Check all messages to see if they are spam or ham
-        return spam_or_ham(model, messages, encoded_messages)
+        if event.get(PROBABILITIES) is True:
+            responses, probabilities = score_messages(model, vectorizer, messages, metrics)
+        else:
+            responses, probabilities = classify_messages(model, vectorizer, messages, metrics, version), None
+
+        response = {
+            STATUS_CODE: STATUS_CODE_SUCCESS,
+            FUNCTION: function_name,
+            RESPONSES: format_responses(messages, responses, response_format),
+            ERRORS: []
+        }
+
+        if probabilities is not None:
+            response[PROBABILITIES] = [probabilities[message] for message in messages]
+
+        return response
     
     except Exception as e:
         return {
             STATUS_CODE: STATUS_CODE_BAD_REQUEST,
-            FUNCTION: SPAM_OR_HAM,
+            FUNCTION: event.get(FUNCTION, SPAM_OR_HAM) if isinstance(event, dict) else SPAM_OR_HAM,
             RESPONSES: EMPTY_DICT,
             ERRORS: [str(e)]
         }    
 
 
+def load_model():
+    """ Load the trained model from the file, using the backend selected by MODEL_BACKEND
+
+    Returns:
+        keras.models.Sequential, Numpy_Model or Cascade_Model: The trained deep learning model,
+            behind the linear prefilter when CASCADE_ENABLED=1
+    """
+
+    # The memory-mapped weights are shared by every process that serves them (see NOTE 11)
+    weights_name = MAPPED_WEIGHTS_NAME if os.path.exists(MAPPED_WEIGHTS_NAME) else WEIGHTS_NAME
+
+    backend = MODEL_BACKEND
+    if backend == AUTO_BACKEND:
+        backend = NUMPY_BACKEND if os.path.exists(weights_name) else KERAS_BACKEND
+
+    if backend == NUMPY_BACKEND:
+        model = Numpy_Model.load(weights_name)
+    elif backend == KERAS_BACKEND:
+        model = load_keras_model(MODEL_NAME)
+    else:
+        raise ValueError(f'Invalid model backend: {backend}')
+
+    # Put the linear prefilter in front of the model (see NOTE 8)
+    if CASCADE_ENABLED:
+        model = Cascade_Model(Linear_Scorer.load(LINEAR_SCORER_NAME), model, CASCADE_MARGIN)
+
+    return model
+
+
+def load_vectorizer():
+    """ Load the vectorizer, in the format selected by VECTORIZER_FORMAT
+
+    Returns:
+        TfidfVectorizer or Compact_Vectorizer: The vectorizer used to train the model,
+            with its tokenizer bound to this process' tokenizer instance
+    """
+
+    vectorizer_format = VECTORIZER_FORMAT
+    if vectorizer_format == AUTO_BACKEND:
+        vectorizer_format = COMPACT_FORMAT if os.path.isdir(COMPACT_VECTORIZER_NAME) else PICKLE_FORMAT
+
+    if vectorizer_format == COMPACT_FORMAT:
+        return Compact_Vectorizer.load(COMPACT_VECTORIZER_NAME, tokenizer_Instance.custom_tokenizer)
+
+    if vectorizer_format != PICKLE_FORMAT:
+        raise ValueError(f'Invalid vectorizer format: {vectorizer_format}')
+
+    with open(VECTORIZER_NAME, 'rb') as file:
+        vectorizer = pickle.load(file)
+        vectorizer.tokenizer = tokenizer_Instance.custom_tokenizer
+
+    return vectorizer
+
+
+def get_artifacts():
+    """ Get the model and vectorizer, loading and validating them on first use
+
+    The artifacts are cached at module level so that every invocation handled by a warm
+    container reuses them instead of deserializing them again.
+
+    Returns:
+        tuple: The (model, vectorizer) pair
+    """
+
+    global _artifacts
+
+    artifacts = _artifacts
+    if artifacts is not None:
+        _cache_stats[CACHE_HITS] += 1
+        return artifacts
+
+    with _artifacts_lock:
+        # Another thread may have finished loading while this one waited for the lock
+        if _artifacts is not None:
+            _cache_stats[CACHE_HITS] += 1
+            return _artifacts
+
+        _cache_stats[CACHE_MISSES] += 1
+        model = load_model()
+        vectorizer = load_vectorizer()
+        validate_artifacts(model, vectorizer)
+
+        # Shard large batches across worker processes when enabled (see PARALLEL_WORKERS)
+        if PARALLEL_WORKERS > 1:
+            vectorizer = Parallel_Vectorizer(vectorizer)
+
+        # Only cache the pair once both have loaded and validated, so failures are retried
+        _artifacts = (model, vectorizer)
+        return _artifacts
+
+
+def get_registry():
+    """ Get the model registry, loading it and starting its watcher on first use
+
+    Returns:
+        Model_Registry: The registry, or None if MODEL_REGISTRY_DIR is not set
+    """
+
+    global _registry
+
+    if MODEL_REGISTRY_DIR is None or _registry is not None:
+        return _registry
+
+    with _registry_lock:
+        if _registry is None:
+            # Versions that use this process' tokenizer engine share its tokenizer (and lemma cache)
+            registry = Model_Registry(MODEL_REGISTRY_DIR, {tokenizer_Instance.engine: tokenizer_Instance},
+                                      MODEL_REGISTRY_POLL_SECONDS)
+            registry.start()
+            _registry = registry
+
+    return _registry
+
+
+def supported_functions():
+    """ Get the names of the functions that events can call
+
+    Returns:
+        list: The built-in functions, followed by the other functions of the registry
+    """
+
+    registry = get_registry()
+    if registry is None:
+        return SUPPORTED_FUNCTIONS
+
+    return SUPPORTED_FUNCTIONS + [name for name in registry.functions() if name not in SUPPORTED_FUNCTIONS]
+
+
+def get_function_artifacts(function_name):
+    """ Get the model and vectorizer that currently serve a function
+
+    The registry's version is used when it has one, and the built-in artifacts otherwise.
+
+    Args:
+        function_name (str): The name of a supported function
+
+    Returns:
+        tuple: The model, the vectorizer and the version of their predictions in the prediction
+            cache (None for the built-in artifacts)
+    """
+
+    registry = get_registry()
+    loaded = registry.get(function_name) if registry is not None else None
+    if loaded is not None:
+        return loaded.model, loaded.vectorizer, loaded.cache_version
+
+    if function_name != SPAM_OR_HAM:
+        raise ValueError(f'Invalid function name: {function_name}')
+
+    model, vectorizer = get_artifacts()
+    return model, vectorizer, None
+
+
+def warmup():
+    """ Load the artifacts and run a sample message through the vectorizer
+
+    Intended to be called during container initialization so that the first request does
+    not pay for loading the model, the vectorizer, or the NLTK resources used by the tokenizer.
+    Threaded servers must call it before starting their threads (see NOTE 7).
+
+    Returns:
+        dict: The cache statistics after warming up
+    """
+
+    tokenizer_Instance.initialize()
+    _, vectorizer, _ = get_function_artifacts(SPAM_OR_HAM)
+    vectorizer.transform([WARMUP_MESSAGE])
+
+    return get_cache_stats()
+
+
+def get_cache_stats():
+    """ Get the artifact cache statistics for this process
+
+    Returns:
+        dict: The number of artifact cache hits and misses, whether the artifacts are loaded,
+            the prediction cache statistics and, when the cascade is in use, the number of
+            messages that took each of its paths, the registry's versions and the near-duplicate
+            index statistics when they are enabled
+    """
+
+    stats = {
+        CACHE_HITS: _cache_stats[CACHE_HITS],
+        CACHE_MISSES: _cache_stats[CACHE_MISSES],
+        ARTIFACTS_LOADED: _artifacts is not None,
+        PREDICTION_CACHE: _prediction_cache.stats()
+    }
+
+    artifacts = _artifacts
+    if artifacts is not None and isinstance(artifacts[0], Cascade_Model):
+        stats[CASCADE] = artifacts[0].stats()
+
+    if _registry is not None:
+        stats[REGISTRY] = _registry.stats()
+
+    if _near_duplicate_index is not None:
+        stats[NEAR_DUPLICATE_INDEX] = _near_duplicate_index.stats()
+
+    return stats
+
+
+def clear_artifact_cache():
+    """ Drop the cached artifacts, registry and predictions and reset the statistics, forcing a reload on next use """
+
+    global _artifacts, _registry
+
+    with _artifacts_lock:
+        _artifacts = None
+        _cache_stats[CACHE_HITS] = 0
+        _cache_stats[CACHE_MISSES] = 0
+        clear_prediction_cache()
+
+    with _registry_lock:
+        if _registry is not None:
+            _registry.stop()
+            _registry = None
+
+
+def pretokenized_analyzer(tokens):
+    """ Analyzer for messages that have already been tokenized """
+
+    return tokens
+
+
+def vectorize_with_metrics(vectorizer, messages, metrics):
+    """ Convert the messages into TF-IDF vectors, timing tokenization and the TF-IDF transform separately
+
+    Args:
+        vectorizer (TfidfVectorizer): The vectorizer used to train the model
+        messages (list): A list of messages to encode
+        metrics (Invocation_Metrics): Records the duration of each stage and the number of tokens
+
+    Returns:
+        scipy.sparse.csr_matrix: A 2D array of encoded messages, identical to vectorizer.transform(messages)
+    """
+
+    # The analyzer lowercases, tokenizes and removes stop words, exactly as transform does
+    analyze = vectorizer.build_analyzer()
+    with metrics.stage(TOKENIZATION):
+        tokens = [analyze(message) for message in messages]
+    metrics.count(TOKEN_COUNT, sum(len(message_tokens) for message_tokens in tokens))
+
+    with metrics.stage(TFIDF_TRANSFORM):
+        return pretokenized(vectorizer).transform(tokens)
+
+
+def pretokenized(vectorizer):
+    """ Get a shallow copy of the vectorizer that takes lists of tokens instead of messages
+
+    Args:
+        vectorizer (TfidfVectorizer or Compact_Vectorizer): The vectorizer used to train the model
+
+    Returns:
+        TfidfVectorizer or Compact_Vectorizer: The copy, which shares the fitted vocabulary and idf
+    """
+
+    pretokenized_vectorizer = copy.copy(vectorizer)
+    pretokenized_vectorizer.analyzer = pretokenized_analyzer
+    return pretokenized_vectorizer
+
+
+def encode_messages(model, vectorizer, messages, metrics=NULL_METRICS, buffer=None):
+    """ Convert the messages into TF-IDF vectors
+
+    The vectorizer produces a sparse matrix (batch x vocabulary) in which almost every entry
+    is zero. It is passed to the model as-is when the model supports sparse inputs, and only
+    densified as a fallback for models that do not (e.g. Keras).
+
+    Args:
+        model (keras.models.Sequential or Numpy_Model): A trained deep learning model
+        vectorizer (TfidfVectorizer): The vectorizer used to train the model
+        messages (list): A list of messages to encode
+        metrics (Invocation_Metrics): Records the duration of each stage
+        buffer (numpy.ndarray): Preallocated (rows x vocabulary) array to densify the vectors into,
+            with at least one row per message; a new array is allocated if None
+
+    Returns:
+        scipy.sparse.csr_matrix or numpy.ndarray: A 2D array of encoded messages
+    """
+
+    # Sharded vectorization runs in other processes, so it can only be timed as a whole
+    if metrics.enabled and not isinstance(vectorizer, Parallel_Vectorizer):
+        encoded_messages = vectorize_with_metrics(vectorizer, messages, metrics)
+    else:
+        with metrics.stage(VECTORIZATION):
+            encoded_messages = vectorizer.transform(messages)
+
+    if not model_supports_sparse(model):
+        if buffer is not None and buffer.dtype == encoded_messages.dtype:
+            # toarray adds into the output array, so the rows left over from the last chunk are cleared first
+            out = buffer[:encoded_messages.shape[0]]
+            out.fill(0)
+            encoded_messages = encoded_messages.toarray(out=out)
+        else:
+            encoded_messages = encoded_messages.toarray()
+
+    return encoded_messages
+
+
+def inference_chunk_size(model, vectorizer, memory_budget_mb=INFERENCE_MEMORY_BUDGET_MB):
+    """ Get the number of messages to classify at a time
+
+    Models that take sparse vectors need little memory per message. Models that do not (e.g. Keras)
+    need a dense row as wide as the vocabulary for each message, which dominates the memory used.
+    A cascade takes sparse vectors, but densifies the messages it passes to such a model, so its
+    budget is that of the model behind it.
+
+    Args:
+        model (keras.models.Sequential, Numpy_Model or Cascade_Model): A trained deep learning model
+        vectorizer (TfidfVectorizer): The vectorizer used to train the model
+        memory_budget_mb (float): The memory a chunk of messages may use, in megabytes
+
+    Returns:
+        int: INFERENCE_CHUNK_SIZE if set, else the number of messages that fit in the memory budget
+    """
+
+    if INFERENCE_CHUNK_SIZE > 0:
+        return INFERENCE_CHUNK_SIZE
+
+    bytes_per_message = MESSAGE_OVERHEAD_BYTES
+    if isinstance(model, Cascade_Model):
+        model = model.model
+    if not model_supports_sparse(model):
+        bytes_per_message += len(vectorizer.vocabulary_) * np.dtype(DENSE_DTYPE).itemsize
+
+    return max(int(memory_budget_mb * 1024 * 1024 // bytes_per_message), 1)
+
+
+def classify_messages(model, vectorizer, messages, metrics=NULL_METRICS, version=None):
+    """ Classify the messages, skipping duplicates and previously classified messages
+
+    Each distinct message is only classified once per call, and messages found in the
+    prediction cache or matching recent spam in the near-duplicate index (see NOTE 14) are not
+    tokenized, vectorized or passed to the model at all. The other messages are tokenized,
+    vectorized and classified in chunks (see inference_chunk_size), and models that need dense
+    vectors reuse a single preallocated buffer for every chunk.
+
+    Args:
+        model (keras.models.Sequential or Numpy_Model): A trained deep learning model
+        vectorizer (TfidfVectorizer): The vectorizer used to train the model
+        messages (list): A list of messages to classify
+        metrics (Invocation_Metrics): Records the duration of each stage and the number of messages
+        version (str): Identifies the model's predictions in the prediction cache; the built-in
+            artifacts' version if None
+
+    Returns:
+        dict: The predicted class ('spam' or 'ham') of each distinct message, keyed by
+            message and in order of first appearance
+    """
+
+    # Deduplicate the messages, preserving the order in which they first appear
+    unique_messages = list(dict.fromkeys(messages))
+
+    predictions = _prediction_cache.get_many(unique_messages, version)
+    new_messages = [message for message in unique_messages if message not in predictions]
+
+    metrics.count(MESSAGE_COUNT, len(messages))
+    metrics.count(UNIQUE_MESSAGE_COUNT, len(unique_messages))
+    metrics.count(PREDICTION_CACHE_HITS, len(predictions))
+
+    near_duplicates = match_near_duplicates(new_messages, version, metrics)
+    if near_duplicates:
+        predictions.update(near_duplicates)
+        new_messages = [message for message in new_messages if message not in near_duplicates]
+
+    # Use the vectorizer to encode the messages, a chunk at a time
+    # Convert the messages into TF-IDF vector using the same vectorizer as the trained model
+    for chunk, encoded_messages in encode_chunks(model, vectorizer, new_messages, metrics):
+        new_predictions = spam_or_ham(model, chunk, encoded_messages, metrics)[RESPONSES]
+        _prediction_cache.put_many(new_predictions, version)
+        index_spam(new_predictions, version)
+        predictions.update(new_predictions)
+
+    return {message: predictions[message] for message in unique_messages}
+
+
+def classify_function(function_name, messages, metrics=NULL_METRICS):
+    """ Classify the messages with the version of the model that currently serves a function
+
+    Args:
+        function_name (str): The name of a supported function
+        messages (list): A list of messages to classify
+        metrics (Invocation_Metrics): Records the duration of each stage and the number of messages
+
+    Returns:
+        dict: The predicted class ('spam' or 'ham') of each distinct message, keyed by
+            message and in order of first appearance
+    """
+
+    model, vectorizer, version = get_function_artifacts(function_name)
+    return classify_messages(model, vectorizer, messages, metrics, version)
+
+
+def classify_functions(function_names, messages, metrics=NULL_METRICS):
+    """ Classify the messages with several functions, tokenizing them once per distinct tokenizer
+
+    Each function skips the messages found in the prediction cache or the near-duplicate index.
+    The remaining messages are processed in chunks; the tokens of each chunk are computed by the
+    first function that needs them and reused by every other function whose vectorizer tokenizes
+    the same way (see Resources/ModelRegistry.tokenization_key). Only the messages of the functions
+    that share a tokenization are tokenized for it.
+
+    Args:
+        function_names (list): The names of supported functions
+        messages (list): A list of messages to classify
+        metrics (Invocation_Metrics): Records the duration of each stage and the number of messages
+
+    Returns:
+        dict: For each function, the predicted class ('spam' or 'ham') of each distinct message,
+            keyed by message and in order of first appearance
+    """
+
+    unique_messages = list(dict.fromkeys(messages))
+    metrics.count(MESSAGE_COUNT, len(messages))
+    metrics.count(UNIQUE_MESSAGE_COUNT, len(unique_messages))
+
+    # Every function keeps the version it started with, even if a new one is swapped in meanwhile
+    with metrics.stage(ARTIFACT_LOAD):
+        artifacts = {}
+        for function_name in dict.fromkeys(function_names):
+            model, vectorizer, version = get_function_artifacts(function_name)
+            if isinstance(vectorizer, Parallel_Vectorizer):
+                vectorizer = vectorizer.vectorizer
+            artifacts[function_name] = (model, vectorizer, version)
+
+    predictions = {}
+    new_messages = {}
+    for function_name, (_, _, version) in artifacts.items():
+        predictions[function_name] = _prediction_cache.get_many(unique_messages, version)
+        metrics.count(PREDICTION_CACHE_HITS, len(predictions[function_name]))
+        predictions[function_name].update(match_near_duplicates(
+            [message for message in unique_messages if message not in predictions[function_name]], version, metrics))
+        new_messages[function_name] = set(unique_messages) - predictions[function_name].keys()
+
+    pending = [message for message in unique_messages if any(message in new for new in new_messages.values())]
+    chunk_size = min(inference_chunk_size(model, vectorizer) for model, vectorizer, _ in artifacts.values())
+
+    # Each tokenization only covers the messages of the functions that share it
+    keys = {function_name: tokenization_key(vectorizer) for function_name, (_, vectorizer, _) in artifacts.items()}
+    key_messages = {}
+    for function_name, key in keys.items():
+        key_messages.setdefault(key, set()).update(new_messages[function_name])
+
+    for start in range(0, len(pending), chunk_size):
+        chunk = pending[start:start + chunk_size]
+        tokens = {}     # tokenization_key -> the tokens of each message of the chunk
+
+        for function_name, (model, vectorizer, version) in artifacts.items():
+            function_chunk = [message for message in chunk if message in new_messages[function_name]]
+            if not function_chunk:
+                continue
+
+            key = keys[function_name]
+            if key not in tokens:
+                analyze = vectorizer.build_analyzer()
+                with metrics.stage(TOKENIZATION):
+                    tokens[key] = {message: analyze(message) for message in chunk if message in key_messages[key]}
+                metrics.count(TOKEN_COUNT, sum(len(message_tokens) for message_tokens in tokens[key].values()))
+
+            with metrics.stage(TFIDF_TRANSFORM):
+                encoded_messages = pretokenized(vectorizer).transform([tokens[key][message] for message in function_chunk])
+            if not model_supports_sparse(model):
+                encoded_messages = encoded_messages.toarray()
+
+            new_predictions = spam_or_ham(model, function_chunk, encoded_messages, metrics)[RESPONSES]
+            _prediction_cache.put_many(new_predictions, version)
+            index_spam(new_predictions, version)
+            predictions[function_name].update(new_predictions)
+
+    return {function_name: {message: predictions[function_name][message] for message in unique_messages}
+            for function_name in artifacts}
+
+
+def match_near_duplicates(messages, version=None, metrics=NULL_METRICS):
+    """ Label the messages that are near-duplicates of recently classified spam (see NOTE 14)
+
+    The matches are also added to the prediction cache, so repeats of them skip the index.
+
+    Args:
+        messages (list): A list of unique messages that are not in the prediction cache
+        version (str): Identifies the model whose spam is matched; the built-in artifacts' version if None
+        metrics (Invocation_Metrics): Records the duration of the lookup and the number of matches
+
+    Returns:
+        dict: 'spam' for each message that matched, keyed by message; empty when the index is disabled
+    """
+
+    if _near_duplicate_index is None or not messages:
+        return {}
+
+    version = ARTIFACT_VERSION if version is None else version
+    with metrics.stage(NEAR_DUPLICATE_LOOKUP):
+        matches = _near_duplicate_index.get_many(messages, version)
+    metrics.count(NEAR_DUPLICATE_HITS, len(matches))
+
+    _prediction_cache.put_many(matches, version)
+    return matches
+
+
+def index_spam(predictions, version=None):
+    """ Add the messages the model classified as spam to the near-duplicate index, when it is enabled
+
+    Args:
+        predictions (dict): The predicted class of each message, keyed by message
+        version (str): Identifies the model that made the predictions; the built-in artifacts' version if None
+    """
+
+    if _near_duplicate_index is not None:
+        _near_duplicate_index.put_many([message for message, prediction in predictions.items() if prediction == SPAM],
+                                       ARTIFACT_VERSION if version is None else version)
+
+
+def encode_chunks(model, vectorizer, messages, metrics=NULL_METRICS):
+    """ Convert the messages into TF-IDF vectors, a chunk at a time (see inference_chunk_size)
+
+    Models that need dense vectors reuse a single preallocated buffer for every chunk, so each
+    chunk's vectors are only valid until the next chunk is requested.
+
+    Args:
+        model (keras.models.Sequential or Numpy_Model): A trained deep learning model
+        vectorizer (TfidfVectorizer): The vectorizer used to train the model
+        messages (list): A list of messages to encode
+        metrics (Invocation_Metrics): Records the duration of each stage
+
+    Yields:
+        tuple: The messages of a chunk and their encoded vectors
+    """
+
+    if not messages:
+        return
+
+    chunk_size = inference_chunk_size(model, vectorizer)
+
+    # A single chunk is densified directly; several share one buffer, sized for the largest chunk
+    buffer = None
+    if len(messages) > chunk_size and not model_supports_sparse(model):
+        buffer = np.empty((chunk_size, len(vectorizer.vocabulary_)), dtype=DENSE_DTYPE)
+
+    for start in range(0, len(messages), chunk_size):
+        chunk = messages[start:start + chunk_size]
+        yield chunk, encode_messages(model, vectorizer, chunk, metrics, buffer)
+
+
+def score_messages(model, vectorizer, messages, metrics=NULL_METRICS):
+    """ Classify the messages and get the probability that each one is spam
+
+    Each distinct message is only classified once per call. The prediction cache only holds
+    classes, so it is not used.
+
+    Args:
+        model (keras.models.Sequential or Numpy_Model): A trained deep learning model
+        vectorizer (TfidfVectorizer): The vectorizer used to train the model
+        messages (list): A list of messages to classify
+        metrics (Invocation_Metrics): Records the duration of each stage and the number of messages
+
+    Returns:
+        tuple: The predicted class ('spam' or 'ham') and the probability of spam of each
+            distinct message, as two dictionaries keyed by message
+    """
+
+    unique_messages = list(dict.fromkeys(messages))
+    metrics.count(MESSAGE_COUNT, len(messages))
+    metrics.count(UNIQUE_MESSAGE_COUNT, len(unique_messages))
+
+    # Preallocate the outputs and fill them in a chunk at a time
+    classes = np.empty(len(unique_messages), dtype=np.int8)
+    probabilities = np.empty(len(unique_messages), dtype=np.float64)
+
+    start = 0
+    for chunk, encoded_messages in encode_chunks(model, vectorizer, unique_messages, metrics):
+        with metrics.stage(PREDICT):
+            raw_predictions = np.asarray(predict_probabilities(model, encoded_messages, metrics))
+        classes[start:start + len(chunk)] = argmax(raw_predictions, axis=1)
+        probabilities[start:start + len(chunk)] = raw_predictions[:, CLASS_CODES[SPAM]]
+        start += len(chunk)
+
+    with metrics.stage(RESPONSE):
+        labels = [SPAM if code == CLASS_CODES[SPAM] else HAM for code in classes.tolist()]
+        return dict(zip(unique_messages, labels)), dict(zip(unique_messages, probabilities.tolist()))
+
+
+def format_responses(messages, responses, response_format=MAP_FORMAT):
+    """ Arrange the predicted classes in the requested response format
+
+    Args:
+        messages (list): The messages of the event, in order
+        responses (dict): The predicted class of each distinct message, keyed by message
+        response_format (str): 'map', 'labels' or 'codes' (see NOTE 10)
+
+    Returns:
+        dict or list: The responses as they are, or the class (or class index) of each message, in order
+    """
+
+    if response_format == MAP_FORMAT:
+        return responses
+
+    if response_format == LABELS_FORMAT:
+        return [responses[message] for message in messages]
+
+    if response_format == CODES_FORMAT:
+        return [CLASS_CODES[responses[message]] for message in messages]
+
+    raise ValueError(f'Invalid response format: {response_format}')
+
+
+def serialize_response(response):
+    """ Encode a response as compact JSON, using orjson when it is installed
+
+    Args:
+        response (dict): A response returned by lambda_handler
+
+    Returns:
+        str: The JSON encoded response
+    """
+
+    if orjson is not None:
+        return orjson.dumps(response).decode('utf-8')
+
+    return json.dumps(response, separators=(',', ':'), ensure_ascii=False)
+
+
+def classify_many(messages, workers=TOKENIZER_THREADS, chunk_size=TOKENIZER_CHUNK_SIZE):
+    """ Classify a large batch of messages, tokenizing on a thread pool while the model predicts
+
+    The new messages are split into chunks, which the worker threads tokenize ahead of the
+    calling thread. The calling thread vectorizes and classifies each chunk as soon as its
+    tokens are ready. Model inference (NumPy or Keras) releases the GIL, so the tokenization
+    of the next chunks overlaps with the prediction of the current one.
+
+    Safe to call from multiple threads once warmup() has been called.
+
+    Args:
+        messages (list): A list of messages to classify
+        workers (int): The number of tokenizer threads
+        chunk_size (int): The number of messages tokenized and classified at a time
+
+    Returns:
+        dict: The predicted class ('spam' or 'ham') of each distinct message, keyed by
+            message and in order of first appearance
+    """
+
+    model, vectorizer, version = get_function_artifacts(SPAM_OR_HAM)
+
+    # Tokenization runs on threads here, so the process pool of a parallel vectorizer is not used
+    if isinstance(vectorizer, Parallel_Vectorizer):
+        vectorizer = vectorizer.vectorizer
+
+    unique_messages = list(dict.fromkeys(messages))
+    predictions = _prediction_cache.get_many(unique_messages, version)
+    predictions.update(match_near_duplicates([message for message in unique_messages if message not in predictions], version))
+    new_messages = [message for message in unique_messages if message not in predictions]
+
+    if new_messages:
+        analyze = vectorizer.build_analyzer()
+        pretokenized_vectorizer = pretokenized(vectorizer)
+        chunks = [new_messages[i:i + chunk_size] for i in range(0, len(new_messages), chunk_size)]
+
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            # map submits every chunk at once and yields the tokens in the order of the chunks
+            tokenized_chunks = executor.map(lambda chunk: [analyze(message) for message in chunk], chunks)
+
+            for chunk, tokens in zip(chunks, tokenized_chunks):
+                encoded_messages = pretokenized_vectorizer.transform(tokens)
+                if not model_supports_sparse(model):
+                    encoded_messages = encoded_messages.toarray()
+
+                chunk_predictions = spam_or_ham(model, chunk, encoded_messages)[RESPONSES]
+                _prediction_cache.put_many(chunk_predictions, version)
+                index_spam(chunk_predictions, version)
+                predictions.update(chunk_predictions)
+
+    return {message: predictions[message] for message in unique_messages}
+
+
+def clear_prediction_cache():
+    """ Drop every cached prediction and indexed spam signature, and reset their statistics """
+
+    _prediction_cache.clear()
+    if _near_duplicate_index is not None:
+        _near_duplicate_index.clear()
+
+
 def event_is_valid(event):
     """ Validate the event object
 
@@ -146,7 +1059,7 @@ def event_is_valid(event):
         STATUS_CODE: STATUS_CODE_BAD_REQUEST,
         FUNCTION: EMPTY_STRING,
         RESPONSES: EMPTY_DICT,
-        ERRORS: EMPTY_LIST
+        ERRORS: []
     }
 
     # Validate that the event was provided, is a dictionary, and is not empty
@@ -168,63 +1081,102 @@ def event_is_valid(event):
         error_response[ERRORS].append('Function field is required')
         return error_response
     
-    if not isinstance(event[FUNCTION], str):
+    # A list of function names classifies the messages with each of them (see NOTE 12)
+    function_names = event[FUNCTION]
+    if isinstance(function_names, list):
+        if len(function_names) == 0:
+            error_response[ERRORS].append('Function field must contain at least one function name')
+            return error_response
+
+        if not all(isinstance(function_name, str) for function_name in function_names):
+            error_response[ERRORS].append('Function field contains an invalid function name; all function names must be strings')
+            return error_response
+    elif not isinstance(function_names, str):
         error_response[ERRORS].append('Function field must be a string')
         return error_response
-    
-    function_name = event[FUNCTION]
-    if function_name not in SUPPORTED_FUNCTIONS:
-        error_response[ERRORS].append(f'Invalid function name: {function_name}')
-        return error_response
+    else:
+        function_names = [function_names]
+
+    functions = supported_functions()
+    for function_name in function_names:
+        if function_name not in functions:
+            error_response[ERRORS].append(f'Invalid function name: {function_name}')
+            return error_response
 
-    # Validate the remaining event fields based on the selected function
-    if function_name == SPAM_OR_HAM:
-        error_response[FUNCTION] = SPAM_OR_HAM
+    # Validate the remaining event fields; every function is a spam_or_ham classifier
+    error_response[FUNCTION] = event[FUNCTION]
 
-        # Validate that the event contains the required fields for the selected function,
-        # that the fields are of the correct type, and that they are not empty.
-        # This includes verifying that no additional fields are present
-        field_errors = False
+    # Validate that the event contains the required fields for the selected function,
+    # that the fields are of the correct type, and that they are not empty.
+    # This includes verifying that no additional fields are present
+    field_errors = False
 
-        # Validate the Messages field
-        if MESSAGES not in event:
+    # Validate the Messages field
+    if MESSAGES not in event:
+        field_errors = True
+        error_response[ERRORS].append('Messages field is required')
+    else:
+        if not isinstance(event[MESSAGES], list):
+            field_errors = True
+            error_response[ERRORS].append('Messages field must be a list')
+        elif len(event[MESSAGES]) == 0:
             field_errors = True
-            error_response[ERRORS].append('Messages field is required')
+            error_response[ERRORS].append('Messages field must contain at least one message')
         else:
-            if not isinstance(event[MESSAGES], list):
-                field_errors = True
-                error_response[ERRORS].append('Messages field must be a list')
-            elif len(event[MESSAGES]) == 0:
-                field_errors = True
-                error_response[ERRORS].append('Messages field must contain at least one message')
-            else:
-                messages = event[MESSAGES]
-                for message in messages:
-                    if not isinstance(message, str):
-                        field_errors = True
-                        error_response[ERRORS].append('Messages field contains an invalid message; all messages must be strings')
-                        break
-
-        # Verify that no additional fields are present
-        for key in event:
-            if key not in SPAM_OR_HAM_FIELDS:
-                field_errors = True
-                error_response[ERRORS].append(f'Invalid field in event: {key}')
-        
-        # If any field validations have failed, return the error response
-        if field_errors:
-            return error_response
-        
+            messages = event[MESSAGES]
+            for message in messages:
+                if not isinstance(message, str):
+                    field_errors = True
+                    error_response[ERRORS].append('Messages field contains an invalid message; all messages must be strings')
+                    break
+
+    # Validate the optional Metrics field
+    if METRICS in event and not isinstance(event[METRICS], bool):
+        field_errors = True
+        error_response[ERRORS].append('Metrics field must be a boolean')
+
+    # Validate the optional Profile field
+    if PROFILE in event and not isinstance(event[PROFILE], bool):
+        field_errors = True
+        error_response[ERRORS].append('Profile field must be a boolean')
+
+    # Validate the optional Response Format and Probabilities fields
+    if RESPONSE_FORMAT in event and event[RESPONSE_FORMAT] not in RESPONSE_FORMATS:
+        field_errors = True
+        error_response[ERRORS].append(f'Invalid response format: {event[RESPONSE_FORMAT]}')
+
+    if PROBABILITIES in event:
+        if not isinstance(event[PROBABILITIES], bool):
+            field_errors = True
+            error_response[ERRORS].append('Probabilities field must be a boolean')
+        elif event[PROBABILITIES] and event.get(RESPONSE_FORMAT, MAP_FORMAT) == MAP_FORMAT:
+            field_errors = True
+            error_response[ERRORS].append('Probabilities field requires the labels or codes response format')
+        elif event[PROBABILITIES] and isinstance(event[FUNCTION], list):
+            field_errors = True
+            error_response[ERRORS].append('Probabilities field requires a single function')
+
+    # Verify that no additional fields are present
+    for key in event:
+        if key not in SPAM_OR_HAM_FIELDS and key not in SPAM_OR_HAM_OPTIONAL_FIELDS:
+            field_errors = True
+            error_response[ERRORS].append(f'Invalid field in event: {key}')
+    
+    # If any field validations have failed, return the error response
+    if field_errors:
+        return error_response
+
     return None
 
 
-def spam_or_ham(model, messages, encoded_messages):
+def spam_or_ham(model, messages, encoded_messages, metrics=NULL_METRICS):
     """ Determine if the messages are spam or ham
 
     Args:
-        model (keras.models.Sequential): A trained deep learning model
+        model (keras.models.Sequential or Numpy_Model): A trained deep learning model
         messages (list): A list of messages to classify
-        encoded_messages (numpy.ndarray): A 2D array of encoded messages
+        encoded_messages (numpy.ndarray or scipy.sparse.csr_matrix): A 2D array of encoded messages
+        metrics (Invocation_Metrics): Records the duration of the prediction and of building the response
 
     Returns:
         dict: A JSON object containing the status code with function name and
@@ -233,18 +1185,21 @@ def spam_or_ham(model, messages, encoded_messages):
     """
 
     # Make predictions using the model
-    raw_predictions = model.predict(encoded_messages) # % probability for each class, per message
-    predictions = argmax(raw_predictions, axis=1)
-
-    # Combine the messages and the resulting predictions, converting the predictions
-    # into the final predicted classes (0 = ham, 1 = spam).
-    responses = {}
-   
-    for i in range(len(messages)):
-        if predictions[i] == 0:
-            responses[messages[i]] = 'ham'
-        else:
-            responses[messages[i]] = 'spam'
+    with metrics.stage(PREDICT):
+        raw_predictions = predict_probabilities(model, encoded_messages, metrics) # % probability for each class, per message
+
+    with metrics.stage(RESPONSE):
+        predictions = argmax(raw_predictions, axis=1)
+
+        # Combine the messages and the resulting predictions, converting the predictions
+        # into the final predicted classes (0 = ham, 1 = spam).
+        responses = {}
+       
+        for i in range(len(messages)):
+            if predictions[i] == 0:
+                responses[messages[i]] = HAM
+            else:
+                responses[messages[i]] = SPAM
 
     # Return the responses as a JSON object
     return {
@@ -255,11 +1210,75 @@ def spam_or_ham(model, messages, encoded_messages):
     }
 
 
+def classify_bulk(input_path, output_path, chunk_size=DEFAULT_CHUNK_SIZE, encoding=DEFAULT_ENCODING, column=None,
+                  workers=PARALLEL_WORKERS):
+    """ Classify every message in a file, streaming the results to another file
+
+    The messages are read and classified in chunks of chunk_size messages, so memory use is
+    constant regardless of the size of the input file. With more than one worker, each chunk is
+    tokenized and vectorized across that many processes (see Resources/ParallelVectorizer.py).
+
+    Args:
+        input_path (str): The path of the JSON Lines or CSV input file
+        output_path (str): The path of the JSON Lines output file, or '-' for standard output
+        chunk_size (int): The number of messages classified at a time
+        encoding (str): The text encoding of the input file
+        column (str): The CSV column containing the messages
+        workers (int): The number of processes used for tokenizing and vectorizing each chunk
+
+    Returns:
+        dict: A JSON object containing the status code with function name and the number of
+            messages classified, or error information if the request fails.
+    """
+
+    try:
+        if not output_path:
+            raise ValueError('No output file provided. Use the --output argument to provide an output file')
+
+        model, vectorizer, version = get_function_artifacts(SPAM_OR_HAM)
+
+        # Use a pool of the requested size for this job, unless the cached vectorizer already has one
+        parallel_vectorizer = None
+        if workers > 1 and not isinstance(vectorizer, Parallel_Vectorizer):
+            vectorizer = parallel_vectorizer = Parallel_Vectorizer(vectorizer, workers)
+
+        try:
+            count = classify_file(input_path, output_path,
+                                  lambda messages: classify_messages(model, vectorizer, messages, NULL_METRICS, version),
+                                  chunk_size, encoding, column)
+        finally:
+            if parallel_vectorizer is not None:
+                parallel_vectorizer.close()
+
+        return {
+            STATUS_CODE: STATUS_CODE_SUCCESS,
+            FUNCTION: SPAM_OR_HAM,
+            MESSAGES_CLASSIFIED: count,
+            OUTPUT: output_path,
+            ERRORS: []
+        }
+
+    except Exception as e:
+        return {
+            STATUS_CODE: STATUS_CODE_BAD_REQUEST,
+            FUNCTION: SPAM_OR_HAM,
+            MESSAGES_CLASSIFIED: 0,
+            OUTPUT: output_path,
+            ERRORS: [str(e)]
+        }
+
+
 def main():
     """ Main function for running the AWS Lambda function locally """
 
     parser = argparse.ArgumentParser(description='Run the AWS Lambda function locally')
     parser.add_argument('--event', type=str, help='JSON string representing the event object')
+    parser.add_argument('--input', type=str, help='JSON Lines or CSV file of messages to classify in bulk')
+    parser.add_argument('--output', type=str, help='JSON Lines file to write the bulk results to (- for stdout)')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Number of messages classified at a time in bulk')
+    parser.add_argument('--encoding', type=str, default=DEFAULT_ENCODING, help='Text encoding of the bulk input file')
+    parser.add_argument('--column', type=str, default=None, help='CSV column containing the messages')
+    parser.add_argument('--workers', type=int, default=PARALLEL_WORKERS, help='Number of processes used for tokenizing bulk input')
     args = parser.parse_args()
     
     if args.event:
@@ -275,6 +1294,8 @@ def main():
             }
         
         return lambda_handler(event)
+    elif args.input:
+        return classify_bulk(args.input, args.output, args.chunk_size, args.encoding, args.column, args.workers)
     else:
         return {
                 STATUS_CODE: STATUS_CODE_BAD_REQUEST,
@@ -284,6 +1305,22 @@ def main():
             }
 
 
+def print_result(result):
+    """ Print the result of main, on standard error when the bulk results were streamed to standard output
+
+    Args:
+        result (dict): The result returned by main
+    """
+
+    # Keep standard output valid JSON Lines for '--output -' (e.g. when piped into jq)
+    stream = sys.stderr if result.get(OUTPUT) == STDOUT else sys.stdout
+    print(serialize_response(result), file=stream)
+
+
+# Optionally load the artifacts while the container initializes instead of on the first request
+if os.environ.get('WARMUP_ON_IMPORT') == '1':
+    warmup()
+
+
 if __name__ == '__main__':
-    result = main()
-    print(result)
+    print_result(main())
@@ -0,0 +1,182 @@
+# This module implements unit tests for the micro-batching HTTP server in the Resources/BatchingServer.py module.
+''' Implements tests for the micro-batching HTTP server. '''
+
+# Import the required libraries
+import json
+import asyncio
+import pytest
+from unittest.mock import patch
+from Resources.BatchingServer import Micro_Batcher, Batching_Server, MAX_BODY_SIZE
+
+# Define the test constants
+HAM = 'ham'
+SPAM = 'spam'
+MESSAGE_1 = 'Hello, how are you?'
+MESSAGE_2 = 'Congratulations, you have won a prize!'
+MESSAGE_3 = 'You have been selected for a job interview.'
+FUNCTION_NAME = 'spam_or_ham'
+BATCHES = 'batches'
+LONG_WAIT_MS = 1000
+
+
+class Fake_Classifier:
+
+    def __init__(self):
+        self.batches = []
+
+    def __call__(self, messages):
+        # Classify MESSAGE_2 as spam and everything else as ham, keyed by distinct message
+        self.batches.append(list(messages))
+        return {message: SPAM if message == MESSAGE_2 else HAM for message in messages}
+
+
+async def send(port, request):
+    # Send a raw request to the server and return the HTTP status and the decoded response
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(request)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split(b' ')[1]), json.loads(payload)
+
+
+async def post(port, event):
+    # Send an event to the server and return the HTTP status and the decoded response
+    body = json.dumps(event).encode('utf-8')
+    return await send(port, f'POST / HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+
+
+class Tests__Micro_Batcher:
+
+    def test__concurrent_requests_share_a_batch(self):
+        classifier = Fake_Classifier()
+
+        async def run():
+            batcher = Micro_Batcher(classifier, max_wait_ms=LONG_WAIT_MS, max_batch_size=3)
+            batcher.start()
+            results = await asyncio.gather(batcher.submit([MESSAGE_1]), batcher.submit([MESSAGE_2]),
+                                           batcher.submit([MESSAGE_3, MESSAGE_1]))
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert classifier.batches == [[MESSAGE_1, MESSAGE_2, MESSAGE_3, MESSAGE_1]], f"Expected a single batch, but got {classifier.batches}"
+        assert results == [{MESSAGE_1: HAM}, {MESSAGE_2: SPAM}, {MESSAGE_3: HAM, MESSAGE_1: HAM}], f"Unexpected results: {results}"
+
+    def test__batch_closes_after_max_wait(self):
+        classifier = Fake_Classifier()
+
+        async def run():
+            batcher = Micro_Batcher(classifier, max_wait_ms=1, max_batch_size=100)
+            batcher.start()
+            first = await batcher.submit([MESSAGE_1])
+            second = await batcher.submit([MESSAGE_2])
+            await batcher.stop()
+            return first, second
+
+        first, second = asyncio.run(run())
+        assert classifier.batches == [[MESSAGE_1], [MESSAGE_2]], f"Expected two batches, but got {classifier.batches}"
+        assert first == {MESSAGE_1: HAM} and second == {MESSAGE_2: SPAM}, f"Unexpected results: {first}, {second}"
+
+    def test__errors_are_raised_in_every_request(self):
+
+        def failing_classifier(messages):
+            raise ValueError('Model failed')
+
+        async def run():
+            batcher = Micro_Batcher(failing_classifier, max_wait_ms=LONG_WAIT_MS, max_batch_size=2)
+            batcher.start()
+            results = await asyncio.gather(batcher.submit([MESSAGE_1]), batcher.submit([MESSAGE_2]), return_exceptions=True)
+            await batcher.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert all(isinstance(result, ValueError) for result in results), f"Expected every request to fail, but got {results}"
+
+
+class Tests__Batching_Server:
+
+    def test__http_round_trip(self):
+        classifier = Fake_Classifier()
+
+        async def run():
+            server = Batching_Server(Micro_Batcher(classifier, max_wait_ms=LONG_WAIT_MS, max_batch_size=2), port=0)
+            await server.start()
+            results = await asyncio.gather(post(server.port, {'function': FUNCTION_NAME, 'messages': [MESSAGE_1]}),
+                                           post(server.port, {'function': FUNCTION_NAME, 'messages': [MESSAGE_2]}))
+            await server.stop()
+            return results
+
+        (status_1, response_1), (status_2, response_2) = asyncio.run(run())
+        assert status_1 == 200 and status_2 == 200, f"Expected status 200, but got {status_1} and {status_2}"
+        assert response_1['responses'] == {MESSAGE_1: HAM}, f"Unexpected response: {response_1}"
+        assert response_2['responses'] == {MESSAGE_2: SPAM}, f"Unexpected response: {response_2}"
+        assert len(classifier.batches) == 1, f"Expected the requests to share a batch, but got {classifier.batches}"
+
+    def test__invalid_event(self):
+        classifier = Fake_Classifier()
+
+        async def run():
+            server = Batching_Server(Micro_Batcher(classifier), port=0)
+            await server.start()
+            result = await post(server.port, {'function': FUNCTION_NAME, 'messages': []})
+            await server.stop()
+            return result
+
+        status, response = asyncio.run(run())
+        assert status == 400, f"Expected status 400, but got {status}"
+        assert 'Messages field must contain at least one message' in response['errors'], f"Unexpected response: {response}"
+        assert classifier.batches == [], f"Expected nothing to be classified, but got {classifier.batches}"
+
+    @pytest.mark.parametrize('request_head, status, error', [
+        (b'POST / HTTP/1.1\r\nContent-Length: abc\r\n\r\n', 400, "Bad request: Invalid Content-Length: 'abc'"),
+        (b'POST / HTTP/1.1\r\nContent-Length: -5\r\n\r\n', 400, "Bad request: Invalid Content-Length: '-5'"),
+        (b'GARBAGE\r\n\r\n', 400, "Bad request: Malformed request line: b'GARBAGE'"),
+        (f'POST / HTTP/1.1\r\nContent-Length: {MAX_BODY_SIZE + 1}\r\n\r\n'.encode('latin-1'), 413, 'Request body is too large')
+    ])
+    def test__malformed_requests_get_an_error_response(self, request_head, status, error):
+        classifier = Fake_Classifier()
+
+        async def run():
+            server = Batching_Server(Micro_Batcher(classifier), port=0)
+            await server.start()
+            result = await send(server.port, request_head)
+            await server.stop()
+            return result
+
+        result_status, response = asyncio.run(run())
+        assert result_status == status, f"Expected status {status}, but got {result_status}"
+        assert response['errors'] == [error], f"Unexpected response: {response}"
+        assert classifier.batches == [], f"Expected nothing to be classified, but got {classifier.batches}"
+
+    def test__metrics_requests_bypass_the_batcher(self):
+        classifier = Fake_Classifier()
+        event = {'function': FUNCTION_NAME, 'messages': [MESSAGE_1], 'metrics': True}
+
+        async def run():
+            server = Batching_Server(Micro_Batcher(classifier), port=0)
+            return await server.handle_event(event)
+
+        with patch('lambda_function.lambda_handler') as mock_lambda_handler:
+            result = asyncio.run(run())
+
+        assert result is mock_lambda_handler.return_value, f"Expected the lambda handler's response, but got {result}"
+        assert classifier.batches == [], f"Expected nothing to be batched, but got {classifier.batches}"
+
+    def test__compact_response_format(self):
+        classifier = Fake_Classifier()
+        event = {'function': FUNCTION_NAME, 'messages': [MESSAGE_2, MESSAGE_1, MESSAGE_2], 'response_format': 'codes'}
+
+        async def run():
+            server = Batching_Server(Micro_Batcher(classifier, max_wait_ms=1), port=0)
+            await server.start()
+            result = await post(server.port, event)
+            await server.stop()
+            return result
+
+        status, response = asyncio.run(run())
+        assert status == 200, f"Expected status 200, but got {status}"
+        assert response['responses'] == [1, 0, 1], f"Expected a code per message, in order, but got {response}"
@@ -0,0 +1,85 @@
+# This module implements unit tests for the benchmark helpers in the Resources/Benchmark.py module.
+''' Implements tests for the benchmark suite. '''
+
+# Import the required libraries
+from sklearn.feature_extraction.text import TfidfVectorizer
+from Resources.Benchmark import summarize, build_batch, compare_results, tfidf_only_vectorizer
+from Resources.ParallelVectorizer import Parallel_Vectorizer
+
+# Define the test constants
+MESSAGES = ['Hello, how are you?', 'Congratulations, you have won a prize!', 'You have been selected for a job interview.']
+TIMINGS_MS = [float(i) for i in range(1, 101)]
+STAGE = 'predict'
+BATCH = '10'
+
+
+def build_results(p50, p95, peak_rss_mb=100.0):
+    # Build a minimal set of results with a single stage and batch size
+    return {
+        'stages': {STAGE: {BATCH: {'p50': p50, 'p95': p95, 'p99': p95}}},
+        'peak_rss_mb': peak_rss_mb
+    }
+
+
+class Tests__Summarize:
+
+    def test__percentiles(self):
+        result = summarize(TIMINGS_MS)
+        assert result['p50'] == 50.5, f"Expected p50 == 50.5, but got {result['p50']}"
+        assert round(result['p95'], 2) == 95.05, f"Expected p95 == 95.05, but got {result['p95']}"
+        assert round(result['p99'], 2) == 99.01, f"Expected p99 == 99.01, but got {result['p99']}"
+
+
+class Tests__Build_Batch:
+
+    def test__full_dataset(self):
+        result = build_batch(MESSAGES, 'full')
+        assert result == MESSAGES, f"Expected {MESSAGES}, but got {result}"
+
+    def test__batch_larger_than_dataset(self):
+        result = build_batch(MESSAGES, '7')
+        assert len(result) == 7, f"Expected 7 messages, but got {len(result)}"
+        assert result[3:6] == MESSAGES, f"Expected the dataset to repeat, but got {result}"
+
+
+class Tests__Compare_Results:
+
+    def test__no_regression(self):
+        regressions = compare_results(build_results(1.0, 2.0), build_results(1.05, 2.1), threshold=0.10)
+        assert regressions == [], f"Expected no regressions, but got {regressions}"
+
+    def test__latency_regression(self):
+        regressions = compare_results(build_results(1.0, 2.0), build_results(1.5, 2.0), threshold=0.10)
+        assert len(regressions) == 1, f"Expected 1 regression, but got {regressions}"
+        assert regressions[0].startswith(f'{STAGE} (batch {BATCH}) p50'), f"Unexpected regression: {regressions[0]}"
+
+    def test__small_absolute_change_is_noise(self):
+        regressions = compare_results(build_results(0.01, 0.02), build_results(0.03, 0.04), threshold=0.10,
+                                      min_delta_ms=0.05)
+        assert regressions == [], f"Expected changes below min_delta_ms to be ignored, but got {regressions}"
+
+    def test__memory_regression(self):
+        regressions = compare_results(build_results(1.0, 2.0), build_results(1.0, 2.0, peak_rss_mb=150.0))
+        assert len(regressions) == 1 and regressions[0].startswith('peak RSS'), f"Unexpected regressions: {regressions}"
+
+
+class Tests__Tfidf_Only_Vectorizer:
+
+    def test__matches_the_vectorizer(self):
+        vectorizer = TfidfVectorizer().fit(MESSAGES)
+        tokens = [message.lower().replace(',', '').replace('?', '').replace('!', '').replace('.', '').split()
+                  for message in MESSAGES]
+
+        result = tfidf_only_vectorizer(vectorizer).transform(tokens)
+        expected = vectorizer.transform(MESSAGES)
+        assert (result != expected).nnz == 0, "Expected the same TF-IDF vectors from the tokenized messages"
+        assert vectorizer.tokenizer is None, "Expected the original vectorizer to be left unchanged"
+
+    def test__wrapped_vectorizer_is_unwrapped(self):
+        vectorizer = TfidfVectorizer().fit(MESSAGES)
+        wrapped = Parallel_Vectorizer(vectorizer, workers=2, min_batch_size=1)
+
+        result = tfidf_only_vectorizer(wrapped)
+        assert isinstance(result, TfidfVectorizer), f"Expected a copy of the wrapped vectorizer, but got {type(result)}"
+        assert vectorizer.tokenizer is None and vectorizer.lowercase is True, "Expected the wrapped vectorizer to be left unchanged"
+        assert result.transform([['prize']]).shape == (1, len(vectorizer.vocabulary_)), "Expected the copy to transform in this process"
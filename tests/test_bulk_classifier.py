@@ -0,0 +1,125 @@
+# This module implements unit tests for the streaming bulk classifier in the Resources/BulkClassifier.py module.
+''' Implements tests for the streaming bulk classifier. '''
+
+# Import the required libraries
+import json
+import pytest
+from Resources.BulkClassifier import read_messages, chunked, classify_file
+
+# Define the test constants
+HAM = 'ham'
+SPAM = 'spam'
+MESSAGE_1 = 'Hello, how are you?'
+MESSAGE_2 = 'Congratulations, you have won a prize!'
+MESSAGE_3 = 'You have been selected for a job interview.'
+MESSAGES = [MESSAGE_1, MESSAGE_2, MESSAGE_3, MESSAGE_1, MESSAGE_2]
+
+
+def fake_classify(messages):
+    # Classify MESSAGE_2 as spam and everything else as ham, keyed by distinct message
+    return {message: SPAM if message == MESSAGE_2 else HAM for message in messages}
+
+
+def write_jsonl(path, messages):
+    # Write a mix of JSON strings and JSON objects, one per line
+    with open(path, 'w', encoding='utf-8') as file:
+        for i, message in enumerate(messages):
+            record = message if i % 2 == 0 else {'message': message}
+            file.write(json.dumps(record) + '\n')
+
+
+class Tests__Read_Messages:
+
+    def test__jsonl(self, tmp_path):
+        path = tmp_path / 'messages.jsonl'
+        write_jsonl(path, MESSAGES)
+
+        result = list(read_messages(str(path)))
+        assert result == MESSAGES, f"Expected {MESSAGES}, but got {result}"
+
+    def test__csv_with_spam_dataset_columns(self, tmp_path):
+        path = tmp_path / 'messages.csv'
+        path.write_text('v1,v2,,,\nham,"Hello, how are you?",,,\nspam,"Congratulations, you have won a prize!",,,\n', encoding='ISO-8859-1')
+
+        result = list(read_messages(str(path), encoding='ISO-8859-1'))
+        assert result == [MESSAGE_1, MESSAGE_2], f"Expected {[MESSAGE_1, MESSAGE_2]}, but got {result}"
+
+    def test__csv_with_selected_column(self, tmp_path):
+        path = tmp_path / 'messages.csv'
+        path.write_text('id,text\n1,"Hello, how are you?"\n', encoding='utf-8')
+
+        result = list(read_messages(str(path), column='text'))
+        assert result == [MESSAGE_1], f"Expected {[MESSAGE_1]}, but got {result}"
+
+    def test__csv_blank_rows_are_skipped(self, tmp_path):
+        path = tmp_path / 'messages.csv'
+        path.write_text('id,text\n1,"Hello, how are you?"\n\n2,"Congratulations, you have won a prize!"\n', encoding='utf-8')
+
+        result = list(read_messages(str(path), column='text'))
+        assert result == [MESSAGE_1, MESSAGE_2], f"Expected {[MESSAGE_1, MESSAGE_2]}, but got {result}"
+
+    def test__csv_ragged_row(self, tmp_path):
+        path = tmp_path / 'messages.csv'
+        path.write_text('id,text\n1,"Hello, how are you?"\n2\n', encoding='utf-8')
+
+        with pytest.raises(ValueError, match='Line 3 does not contain a text column'):
+            list(read_messages(str(path), column='text'))
+
+    def test__jsonl_line_without_message(self, tmp_path):
+        path = tmp_path / 'messages.jsonl'
+        path.write_text('{"text": "Hello"}\n', encoding='utf-8')
+
+        with pytest.raises(ValueError, match='Line 1 does not contain a message'):
+            list(read_messages(str(path)))
+
+    def test__unsupported_file_type(self, tmp_path):
+        with pytest.raises(ValueError, match='Unsupported input file type: .txt'):
+            list(read_messages(str(tmp_path / 'messages.txt')))
+
+
+class Tests__Chunked:
+
+    def test__fixed_size_chunks(self):
+        result = list(chunked(range(7), 3))
+        assert result == [[0, 1, 2], [3, 4, 5], [6]], f"Unexpected chunks: {result}"
+
+    def test__reads_lazily(self):
+        consumed = []
+
+        def messages():
+            for message in MESSAGES:
+                consumed.append(message)
+                yield message
+
+        first_chunk = next(chunked(messages(), 2))
+        assert first_chunk == MESSAGES[:2], f"Unexpected chunk: {first_chunk}"
+        assert consumed == MESSAGES[:2], f"Expected only the first chunk to be read, but got {consumed}"
+
+    def test__invalid_chunk_size(self):
+        with pytest.raises(ValueError, match='Chunk size must be at least 1'):
+            list(chunked(MESSAGES, 0))
+
+
+class Tests__Classify_File:
+
+    def test__happy_path(self, tmp_path):
+        input_path = tmp_path / 'messages.jsonl'
+        output_path = tmp_path / 'results.jsonl'
+        write_jsonl(input_path, MESSAGES)
+
+        chunks = []
+
+        def classify(messages):
+            chunks.append(list(messages))
+            return fake_classify(messages)
+
+        count = classify_file(str(input_path), str(output_path), classify, chunk_size=2)
+        assert count == len(MESSAGES), f"Expected {len(MESSAGES)} messages, but got {count}"
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1], f"Unexpected chunk sizes: {chunks}"
+
+        with open(output_path, encoding='utf-8') as file:
+            results = [json.loads(line) for line in file]
+
+        expected = [{'index': i, 'message': message, 'label': SPAM if message == MESSAGE_2 else HAM}
+                    for i, message in enumerate(MESSAGES)]
+        assert results == expected, f"Expected {expected}, but got {results}"
@@ -0,0 +1,102 @@
+# This module implements unit tests for the two-stage cascade in the Resources/CascadeModel.py module.
+''' Implements tests for the linear prefilter cascade. '''
+
+# Import the required libraries
+import pytest
+import numpy as np
+from scipy import sparse
+from unittest.mock import MagicMock
+from Resources.CascadeModel import Linear_Scorer, Cascade_Model, evaluate_cascade
+from Resources.InvocationMetrics import Invocation_Metrics
+
+# Define the test constants
+NUM_FEATURES = 3
+COEF = [10.0, -10.0, 0.0]   # Feature 0 is spam, feature 1 is ham and feature 2 is uninformative
+INTERCEPT = 0.0
+INPUTS = sparse.csr_matrix([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0]])  # Spam, ham, uncertain
+MODEL_OUTPUT = [[0.2, 0.8]]
+CASCADE_LINEAR = 'cascade_linear'
+CASCADE_MODEL = 'cascade_model'
+
+
+def build_mock_model(outputs=MODEL_OUTPUT, supports_sparse=True):
+    # Mock a model that returns fixed class probabilities
+    mock_model = MagicMock()
+    mock_model.input_shape = (None, NUM_FEATURES)
+    mock_model.output_shape = (None, 2)
+    mock_model.supports_sparse = supports_sparse
+    mock_model.predict.return_value = np.array(outputs, dtype=np.float32)
+    return mock_model
+
+
+class Tests__Linear_Scorer:
+
+    def test__predict_proba(self):
+        result = Linear_Scorer(COEF, INTERCEPT).predict_proba(INPUTS)
+        assert result[0] > 0.99 and result[1] < 0.01, f"Expected confident spam and ham, but got {result}"
+        assert result[2] == 0.5, f"Expected 0.5 for an uninformative message, but got {result[2]}"
+
+    def test__save_and_load(self, tmp_path):
+        path = str(tmp_path / 'scorer.npz')
+        Linear_Scorer(COEF, 1.5).save(path)
+        result = Linear_Scorer.load(path)
+        assert np.array_equal(result.coef, COEF), f"Expected {COEF}, but got {result.coef}"
+        assert result.intercept == 1.5, f"Expected intercept 1.5, but got {result.intercept}"
+
+
+class Tests__Cascade_Model:
+
+    def test__only_uncertain_messages_reach_the_model(self):
+        model = build_mock_model()
+        cascade = Cascade_Model(Linear_Scorer(COEF, INTERCEPT), model, margin=0.4)
+        result = cascade.predict(INPUTS)
+
+        assert np.argmax(result, axis=1).tolist() == [1, 0, 1], f"Unexpected predictions: {result}"
+        assert np.allclose(result[2], MODEL_OUTPUT[0]), f"Expected the model's output for the uncertain message, but got {result[2]}"
+        assert model.predict.call_args[0][0].shape[0] == 1, f"Expected 1 message to reach the model, but got {model.predict.call_args}"
+        assert cascade.stats() == {CASCADE_LINEAR: 2, CASCADE_MODEL: 1}, f"Unexpected path counts: {cascade.stats()}"
+
+    def test__confident_batch_skips_the_model(self):
+        model = build_mock_model()
+        cascade = Cascade_Model(Linear_Scorer(COEF, INTERCEPT), model, margin=0.4)
+        cascade.predict(INPUTS[:2])
+        assert model.predict.call_count == 0, f"Expected the model not to be called, but got {model.predict.call_count} calls"
+
+    def test__dense_model_receives_dense_remainder(self):
+        model = build_mock_model(supports_sparse=False)
+        Cascade_Model(Linear_Scorer(COEF, INTERCEPT), model, margin=0.4).predict(INPUTS)
+        assert isinstance(model.predict.call_args[0][0], np.ndarray), f"Expected a dense remainder, but got {model.predict.call_args}"
+
+    def test__maximum_margin_sends_everything_to_the_model(self):
+        model = build_mock_model(outputs=[[0.2, 0.8]] * 3)
+        cascade = Cascade_Model(Linear_Scorer(COEF, INTERCEPT), model, margin=0.5)
+        cascade.predict(INPUTS)
+        assert cascade.stats() == {CASCADE_LINEAR: 0, CASCADE_MODEL: 3}, f"Unexpected path counts: {cascade.stats()}"
+
+    def test__path_metrics(self):
+        metrics = Invocation_Metrics('spam_or_ham')
+        Cascade_Model(Linear_Scorer(COEF, INTERCEPT), build_mock_model(), margin=0.4).predict(INPUTS, metrics)
+        result = metrics.to_dict()
+        assert result[CASCADE_LINEAR] == 2 and result[CASCADE_MODEL] == 1, f"Unexpected path metrics: {result}"
+
+    def test__invalid_margin(self):
+        with pytest.raises(ValueError, match='between 0 and 0.5'):
+            Cascade_Model(Linear_Scorer(COEF, INTERCEPT), build_mock_model(), margin=0.6)
+
+    def test__mismatched_features(self):
+        with pytest.raises(ValueError, match='Linear scorer expects 2 input features'):
+            Cascade_Model(Linear_Scorer([1.0, 2.0], INTERCEPT), build_mock_model())
+
+
+class Tests__Evaluate_Cascade:
+
+    def test__accuracy_against_full_model(self):
+        # The model gets the ham message wrong; the cascade fixes it when the scorer is trusted
+        model = build_mock_model(outputs=[[0.2, 0.8]] * 3)
+        results = evaluate_cascade(Linear_Scorer(COEF, INTERCEPT), model, INPUTS, [1, 0, 1], margins=[0.4, 0.5])
+
+        assert results[0]['linear_fraction'] == 2 / 3, f"Expected 2/3 on the linear path, but got {results[0]}"
+        assert results[0]['cascade_accuracy'] == 1.0, f"Expected cascade accuracy 1.0, but got {results[0]}"
+        assert results[0]['model_accuracy'] == 2 / 3, f"Expected model accuracy 2/3, but got {results[0]}"
+        assert results[0]['agreement'] == 2 / 3, f"Expected agreement 2/3, but got {results[0]}"
+        assert results[1]['linear_fraction'] == 0.0, f"Expected nothing on the linear path, but got {results[1]}"
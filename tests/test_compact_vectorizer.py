@@ -0,0 +1,87 @@
+# This module implements unit tests for the Compact_Vectorizer class in the Resources/CompactVectorizer.py module.
+''' Implements tests for the compact vectorizer. '''
+
+# Import the required libraries
+import copy
+import pickle
+import pytest
+import numpy as np
+from Resources.CompactVectorizer import Compact_Vectorizer, export_vectorizer, check_parity
+
+# Define the test constants
+TRAINING_MESSAGES = ['Free prize! Call now', 'Are you coming home?', 'Win a FREE holiday', 'See you at home, see you soon']
+MESSAGES = ['free free prize', 'see you at the café', 'nothing known here', '', 'HOME home Home']
+IDENTICAL = 'identical'
+
+
+def tokenize(message):
+    # Split on whitespace, keeping punctuation attached (picklable, unlike a lambda)
+    return message.split()
+
+
+def build_vectorizer(**kwargs):
+    # Fit a TF-IDF vectorizer with a custom tokenizer, like the trained model's
+    text = pytest.importorskip('sklearn.feature_extraction.text')
+    vectorizer = text.TfidfVectorizer(tokenizer=tokenize, token_pattern=None, **kwargs)
+    vectorizer.fit(TRAINING_MESSAGES)
+    return vectorizer
+
+
+class Tests__Compact_Vectorizer:
+
+    def test__matches_tfidf_vectorizer(self, tmp_path):
+        vectorizer = build_vectorizer()
+        compact_vectorizer = export_vectorizer(vectorizer, str(tmp_path / 'model.vectorizer'))
+
+        result = check_parity(vectorizer, compact_vectorizer, MESSAGES + TRAINING_MESSAGES)
+        assert result[IDENTICAL] is True, f"Expected identical encodings, but got {result}"
+
+    def test__matches_without_normalization(self, tmp_path):
+        vectorizer = build_vectorizer(norm=None, binary=True, lowercase=False)
+        compact_vectorizer = export_vectorizer(vectorizer, str(tmp_path / 'model.vectorizer'))
+
+        result = check_parity(vectorizer, compact_vectorizer, MESSAGES + TRAINING_MESSAGES)
+        assert result[IDENTICAL] is True, f"Expected identical encodings, but got {result}"
+
+    def test__vocabulary(self, tmp_path):
+        vectorizer = build_vectorizer()
+        vocabulary = export_vectorizer(vectorizer, str(tmp_path / 'model.vectorizer')).vocabulary_
+
+        assert len(vocabulary) == len(vectorizer.vocabulary_), f"Expected {len(vectorizer.vocabulary_)} terms, but got {len(vocabulary)}"
+        assert dict(vocabulary) == vectorizer.vocabulary_, f"Expected {vectorizer.vocabulary_}, but got {dict(vocabulary)}"
+        assert 'unknown' not in vocabulary, "Expected unknown terms not to be found"
+
+        with pytest.raises(KeyError):
+            vocabulary['unknown']
+
+    def test__load_memory_maps_the_tables(self, tmp_path):
+        path = str(tmp_path / 'model.vectorizer')
+        export_vectorizer(build_vectorizer(), path)
+
+        compact_vectorizer = Compact_Vectorizer.load(path, tokenize)
+        assert isinstance(compact_vectorizer.idf_, np.memmap), f"Expected a memory-mapped idf vector, but got {type(compact_vectorizer.idf_)}"
+
+    def test__pickle_round_trip(self, tmp_path):
+        compact_vectorizer = export_vectorizer(build_vectorizer(), str(tmp_path / 'model.vectorizer'))
+
+        result = pickle.loads(pickle.dumps(compact_vectorizer)).transform(MESSAGES)
+        expected = compact_vectorizer.transform(MESSAGES)
+        assert (result != expected).nnz == 0, "Expected the unpickled vectorizer to produce the same encoding"
+
+    def test__copy_with_pretokenized_analyzer(self, tmp_path):
+        compact_vectorizer = export_vectorizer(build_vectorizer(), str(tmp_path / 'model.vectorizer'))
+        analyze = compact_vectorizer.build_analyzer()
+
+        pretokenized_vectorizer = copy.copy(compact_vectorizer)
+        pretokenized_vectorizer.analyzer = lambda tokens: tokens
+
+        result = pretokenized_vectorizer.transform([analyze(message) for message in MESSAGES])
+        expected = compact_vectorizer.transform(MESSAGES)
+        assert (result != expected).nnz == 0, "Expected the pretokenized messages to produce the same encoding"
+        assert compact_vectorizer.analyzer is None, "Expected the original vectorizer to be unchanged"
+
+    def test__unsupported_setting(self, tmp_path):
+        vectorizer = build_vectorizer(ngram_range=(1, 2))
+
+        with pytest.raises(ValueError, match=r'Unsupported vectorizer setting: ngram_range=\(1, 2\)'):
+            export_vectorizer(vectorizer, str(tmp_path / 'model.vectorizer'))
@@ -0,0 +1,202 @@
+# This module implements unit tests for the Custom_Tokenizer class in the Resources/CustomTokenizer.py module.
+''' Implements tests for the custom tokenizer. '''
+
+# Import the required libraries
+import re
+import pickle
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+import Resources.NltkData as NltkData
+from Resources.CustomTokenizer import Custom_Tokenizer
+from Resources.NltkData import Nltk_Data_Error
+
+# Define the test constants
+STOP_WORDS = ['the', 'a', 'you', 'have', 'for']
+MESSAGE_1 = 'congratulations you have won the prizes'
+MESSAGE_2 = 'call now for prizes'
+MESSAGE_3 = 'the the the'
+HITS = 'hits'
+MISSES = 'misses'
+SIZE = 'size'
+MAX_SIZE = 'max_size'
+HIT_RATE = 'hit_rate'
+
+
+def fake_word_tokenize(text):
+    # Split on words and punctuation, like nltk.word_tokenize does for simple messages
+    return re.findall(r"\w+|[^\w\s]", text)
+
+
+def fake_lemmatize(word):
+    # Strip a trailing 's', like the WordNet lemmatizer does for regular plural nouns
+    return word[:-1] if word.endswith('s') else word
+
+
+def reference_tokenizer(text):
+    # The original implementation of Custom_Tokenizer.custom_tokenizer
+    tokens = fake_word_tokenize(text)
+    nostop = list(filter(lambda token: token not in STOP_WORDS, tokens))
+    return [fake_lemmatize(word) for word in nostop]
+
+
+@pytest.fixture
+def nltk_resources():
+    # Mock the NLTK data lookup, tokenizer, stopwords corpus and lemmatizer
+    with patch('Resources.CustomTokenizer.load_packages'), \
+         patch('Resources.CustomTokenizer.nltk.word_tokenize', side_effect=fake_word_tokenize):
+        # The corpus is passed in explicitly so that patch does not inspect (and load) the lazy corpus
+        mock_stopwords = MagicMock()
+        mock_stopwords.words.return_value = list(STOP_WORDS)
+
+        with patch('Resources.CustomTokenizer.stopwords', new=mock_stopwords):
+            mock_lemmatizer = MagicMock()
+            mock_lemmatizer.lemmatize.side_effect = fake_lemmatize
+
+            with patch('Resources.CustomTokenizer.lemmatizer', new=mock_lemmatizer):
+                yield mock_stopwords, mock_lemmatizer
+
+
+class Tests__Custom_Tokenizer:
+
+    def test__matches_original_implementation(self, nltk_resources):
+        tokenizer = Custom_Tokenizer()
+
+        for message in [MESSAGE_1, MESSAGE_2, MESSAGE_3]:
+            result = tokenizer.custom_tokenizer(message)
+            expected = reference_tokenizer(message)
+            assert result == expected, f"Expected {expected}, but got {result}"
+
+    def test__stopwords_are_loaded_once(self, nltk_resources):
+        mock_stopwords, _ = nltk_resources
+        tokenizer = Custom_Tokenizer()
+
+        tokenizer.tokenize_many([MESSAGE_1, MESSAGE_2, MESSAGE_3])
+        assert mock_stopwords.words.call_count == 1, f"Expected the stopwords to be loaded once, but got {mock_stopwords.words.call_count} calls"
+
+    def test__lemmas_are_memoized(self, nltk_resources):
+        _, mock_lemmatizer = nltk_resources
+        tokenizer = Custom_Tokenizer()
+
+        # 'prizes' is lemmatized for the first message and served from the cache for the second
+        tokenizer.tokenize_many([MESSAGE_1, MESSAGE_2])
+        lemmatized = [call.args[0] for call in mock_lemmatizer.lemmatize.call_args_list]
+        assert lemmatized.count('prizes') == 1, f"Expected 'prizes' to be lemmatized once, but got {lemmatized}"
+
+        stats = tokenizer.cache_info()
+        assert stats[HITS] == 1, f"Expected stats[{HITS}] == 1, but got {stats[HITS]}"
+        assert stats[MISSES] == len(lemmatized), f"Expected stats[{MISSES}] == {len(lemmatized)}, but got {stats[MISSES]}"
+        assert stats[HIT_RATE] == pytest.approx(1 / (1 + len(lemmatized))), f"Unexpected stats[{HIT_RATE}]: {stats[HIT_RATE]}"
+
+    def test__cache_is_bounded(self, nltk_resources):
+        tokenizer = Custom_Tokenizer(cache_size=2)
+
+        tokenizer.custom_tokenizer(MESSAGE_1)
+        stats = tokenizer.cache_info()
+        assert stats[SIZE] == 2, f"Expected stats[{SIZE}] == 2, but got {stats[SIZE]}"
+        assert stats[MAX_SIZE] == 2, f"Expected stats[{MAX_SIZE}] == 2, but got {stats[MAX_SIZE]}"
+
+    def test__clear_cache(self, nltk_resources):
+        tokenizer = Custom_Tokenizer()
+
+        tokenizer.tokenize_many([MESSAGE_1, MESSAGE_1])
+        tokenizer.clear_cache()
+        stats = tokenizer.cache_info()
+        assert stats[HITS] == 0 and stats[MISSES] == 0 and stats[SIZE] == 0, f"Expected an empty cache, but got {stats}"
+
+    def test__missing_nltk_data_fails_fast(self, nltk_resources):
+        tokenizer = Custom_Tokenizer()
+
+        with patch('Resources.CustomTokenizer.load_packages') as mock_load_packages:
+            mock_load_packages.side_effect = Nltk_Data_Error('NLTK data not found: wordnet')
+
+            with pytest.raises(Nltk_Data_Error, match='NLTK data not found: wordnet'):
+                tokenizer.custom_tokenizer(MESSAGE_1)
+
+    def test__concurrent_first_use_initializes_once(self, nltk_resources):
+        mock_stopwords, _ = nltk_resources
+        tokenizer = Custom_Tokenizer()
+        start = threading.Barrier(8)
+        results = []
+
+        def tokenize():
+            start.wait()
+            results.append(tokenizer.custom_tokenizer(MESSAGE_1))
+
+        threads = [threading.Thread(target=tokenize) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert mock_stopwords.words.call_count == 1, f"Expected 1 initialization, but got {mock_stopwords.words.call_count}"
+        assert results == [reference_tokenizer(MESSAGE_1)] * 8, f"Unexpected results: {results}"
+
+    def test__tokenize_many(self, nltk_resources):
+        tokenizer = Custom_Tokenizer()
+
+        result = tokenizer.tokenize_many([MESSAGE_1, MESSAGE_2])
+        expected = [reference_tokenizer(MESSAGE_1), reference_tokenizer(MESSAGE_2)]
+        assert result == expected, f"Expected {expected}, but got {result}"
+
+    def test__pickle_round_trip(self, nltk_resources):
+        tokenizer = Custom_Tokenizer(cache_size=10)
+        tokenizer.custom_tokenizer(MESSAGE_1)
+
+        restored = pickle.loads(pickle.dumps(tokenizer))
+        assert restored.cache_size == 10, f"Expected cache_size == 10, but got {restored.cache_size}"
+        assert restored.custom_tokenizer(MESSAGE_2) == reference_tokenizer(MESSAGE_2), "Expected the restored tokenizer to work"
+
+    def test__instance_restored_without_init(self, nltk_resources):
+        # Vectorizers pickled before the cache existed restore the tokenizer without calling __init__
+        tokenizer = Custom_Tokenizer.__new__(Custom_Tokenizer)
+
+        result = tokenizer.custom_tokenizer(MESSAGE_1)
+        assert result == reference_tokenizer(MESSAGE_1), f"Expected {reference_tokenizer(MESSAGE_1)}, but got {result}"
+
+
+class Tests__Tokenizer_Engine:
+
+    def test__regex_engine_does_not_use_nltk_word_tokenize(self, nltk_resources):
+        tokenizer = Custom_Tokenizer(engine='regex')
+
+        with patch('Resources.CustomTokenizer.fast_word_tokenize', side_effect=fake_word_tokenize) as mock_fast, \
+             patch('Resources.CustomTokenizer.nltk.word_tokenize') as mock_word_tokenize:
+            result = tokenizer.custom_tokenizer(MESSAGE_1)
+
+        assert result == reference_tokenizer(MESSAGE_1), f"Expected {reference_tokenizer(MESSAGE_1)}, but got {result}"
+        assert mock_fast.call_count == 1, f"Expected the regex tokenizer to be used, but got {mock_fast.call_count} calls"
+        assert mock_word_tokenize.call_count == 0, f"Expected nltk.word_tokenize not to be used, but got {mock_word_tokenize.call_count} calls"
+
+    def test__regex_engine_does_not_require_punkt(self):
+        # Report punkt_tab as missing, and mock the corpora that are found
+        def require_packages(packages):
+            if 'punkt_tab' in packages:
+                raise Nltk_Data_Error('NLTK data not found: punkt_tab')
+
+        mock_stopwords = MagicMock()
+        mock_stopwords.words.return_value = list(STOP_WORDS)
+        mock_lemmatizer = MagicMock()
+        mock_lemmatizer.lemmatize.side_effect = fake_lemmatize
+
+        with patch.object(NltkData, '_loaded', False), patch.object(NltkData, '_punkt_loaded', False), \
+             patch('Resources.NltkData.require_packages', side_effect=require_packages), \
+             patch('Resources.NltkData.nltk.word_tokenize') as mock_word_tokenize, \
+             patch('nltk.corpus.stopwords', new=MagicMock()), patch('nltk.corpus.wordnet', new=MagicMock()), \
+             patch('Resources.CustomTokenizer.stopwords', new=mock_stopwords), \
+             patch('Resources.CustomTokenizer.lemmatizer', new=mock_lemmatizer):
+            result = Custom_Tokenizer(engine='regex').custom_tokenizer(MESSAGE_1)
+
+            with pytest.raises(Nltk_Data_Error, match='punkt_tab'):
+                Custom_Tokenizer(engine='nltk').initialize()
+
+        assert result == reference_tokenizer(MESSAGE_1), f"Unexpected tokens: {result}"
+        assert mock_word_tokenize.call_count == 0, "Expected the Punkt tokenizer not to be loaded"
+
+    def test__engine_survives_pickling(self):
+        restored = pickle.loads(pickle.dumps(Custom_Tokenizer(engine='regex')))
+        assert restored.engine == 'regex', f"Expected the regex engine, but got {restored.engine}"
+
+    def test__invalid_engine(self):
+        with pytest.raises(ValueError, match='Invalid tokenizer engine: spacy'):
+            Custom_Tokenizer(engine='spacy')
@@ -0,0 +1,71 @@
+# This module implements unit tests for the regex tokenizer in the Resources/FastTokenizer.py module.
+''' Implements tests for the fast regex tokenizer and its parity harness. '''
+
+# Import the required libraries
+import pytest
+from unittest.mock import patch
+from nltk.tokenize.destructive import NLTKWordTokenizer
+from Resources.FastTokenizer import fast_word_tokenize, check_parity
+
+# Define the test constants
+SINGLE_SENTENCES = [
+    "Free entry in 2 a wkly comp to win FA Cup final tkts 21st May 2005.",
+    "Go until jurong point, crazy.. Available only in bugis n great world la e buffet...",
+    "I'm gonna be home soon and i don't want to talk about this stuff anymore tonight, k?",
+    'He said "call me (now)!" and left.',
+    "URGENT! You've won a £1000 prize; call 09061701461 @ 10p/min.",
+]
+SENTENCES = ['Sorry, I will call later.', '"Ok," he said.', '(Can you come?)', 'Thanks!']
+TOKEN_MISMATCHES = 'token_mismatches'
+EXAMPLES = 'examples'
+
+
+def treebank_tokenize(sentences):
+    # Tokenize each sentence separately, as nltk.word_tokenize does after Punkt has split them
+    tokenizer = NLTKWordTokenizer()
+    return [token for sentence in sentences for token in tokenizer.tokenize(sentence)]
+
+
+class Tests__Fast_Word_Tokenize:
+
+    @pytest.mark.parametrize('message', SINGLE_SENTENCES)
+    def test__single_sentence_matches_treebank(self, message):
+        result = fast_word_tokenize(message)
+        expected = treebank_tokenize([message])
+        assert result == expected, f"Expected {expected}, but got {result}"
+
+    def test__sentence_final_periods_are_split(self):
+        result = fast_word_tokenize(' '.join(SENTENCES))
+        expected = treebank_tokenize(SENTENCES)
+        assert result == expected, f"Expected {expected}, but got {result}"
+
+    @pytest.mark.parametrize('message, token', [
+        ('I saw Mr. Smith today', 'Mr.'),
+        ('Meet me at 10 a.m. tomorrow', 'a.m.'),
+        ('Signed J. Smith', 'J.'),
+        ('Finished 2. in the race', '2.'),
+    ])
+    def test__abbreviations_keep_their_period(self, message, token):
+        result = fast_word_tokenize(message)
+        assert token in result, f"Expected '{token}' in {result}"
+
+    def test__number_before_capitalized_word_ends_sentence(self):
+        result = fast_word_tokenize('Call 08001234567. Now')
+        assert result == ['Call', '08001234567', '.', 'Now'], f"Unexpected tokens: {result}"
+
+
+class Tests__Check_Parity:
+
+    def test__reports_token_mismatches(self):
+        messages = [SINGLE_SENTENCES[0], SINGLE_SENTENCES[1]]
+
+        # Mock nltk.word_tokenize, disagreeing with the regex tokenizer on the second message
+        def mock_word_tokenize(text):
+            return treebank_tokenize([text]) if text == messages[0] else ['different']
+
+        with patch('nltk.word_tokenize', side_effect=mock_word_tokenize):
+            result = check_parity(messages)
+
+        assert result[TOKEN_MISMATCHES] == 1, f"Expected 1 mismatch, but got {result}"
+        assert result[EXAMPLES][0]['message'] == messages[1], f"Unexpected examples: {result[EXAMPLES]}"
+        assert result['token_match_rate'] == 0.5, f"Expected a match rate of 0.5, but got {result}"
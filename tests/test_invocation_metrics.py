@@ -0,0 +1,87 @@
+# This module implements unit tests for the Invocation_Metrics class in the Resources/InvocationMetrics.py module.
+''' Implements tests for the invocation metrics. '''
+
+# Import the required libraries
+import io
+import json
+from Resources.InvocationMetrics import Invocation_Metrics, NULL_METRICS
+
+# Define the test constants
+FUNCTION_NAME = 'spam_or_ham'
+NAMESPACE = 'Test'
+TIMESTAMP_MS = 1700000000000
+STAGE = 'predict'
+COUNTER = 'message_count'
+
+
+class Fake_Clock:
+
+    def __init__(self, times):
+        self.times = iter(times)
+
+    def __call__(self):
+        return next(self.times)
+
+
+class Tests__Invocation_Metrics:
+
+    def test__stages_and_counters(self):
+        metrics = Invocation_Metrics(FUNCTION_NAME, clock=Fake_Clock([1.0, 1.5, 2.0, 2.25]))
+
+        with metrics.stage(STAGE):
+            pass
+        with metrics.stage(STAGE):
+            pass
+        metrics.count(COUNTER, 2)
+        metrics.count(COUNTER)
+
+        result = metrics.to_dict()
+        assert result == {'predict_ms': 750.0, COUNTER: 3}, f"Unexpected metrics: {result}"
+
+    def test__emf_document(self):
+        metrics = Invocation_Metrics(FUNCTION_NAME, namespace=NAMESPACE, clock=Fake_Clock([0.0, 0.001]))
+        with metrics.stage(STAGE):
+            pass
+        metrics.count(COUNTER, 5)
+
+        result = metrics.to_emf(TIMESTAMP_MS)
+        expected_definitions = [{'Name': 'predict_ms', 'Unit': 'Milliseconds'}, {'Name': COUNTER, 'Unit': 'Count'}]
+        directive = result['_aws']['CloudWatchMetrics'][0]
+
+        assert result['_aws']['Timestamp'] == TIMESTAMP_MS, f"Unexpected timestamp: {result}"
+        assert directive['Namespace'] == NAMESPACE, f"Unexpected namespace: {directive}"
+        assert directive['Dimensions'] == [['function']], f"Unexpected dimensions: {directive}"
+        assert directive['Metrics'] == expected_definitions, f"Unexpected metric definitions: {directive}"
+        assert result['function'] == FUNCTION_NAME and result[COUNTER] == 5, f"Unexpected values: {result}"
+
+    def test__set_function(self):
+        metrics = Invocation_Metrics(FUNCTION_NAME)
+        metrics.set_function('sms_spam')
+
+        result = metrics.to_emf(TIMESTAMP_MS)
+        assert result['function'] == 'sms_spam', f"Expected the metrics under sms_spam, but got {result['function']}"
+
+    def test__emit_writes_one_line(self):
+        stream = io.StringIO()
+        metrics = Invocation_Metrics(FUNCTION_NAME)
+        metrics.count(COUNTER)
+        metrics.emit(stream)
+
+        lines = stream.getvalue().splitlines()
+        assert len(lines) == 1, f"Expected a single line, but got {lines}"
+        assert json.loads(lines[0])[COUNTER] == 1, f"Unexpected log line: {lines[0]}"
+
+
+class Tests__Null_Metrics:
+
+    def test__records_nothing(self):
+        stream = io.StringIO()
+
+        with NULL_METRICS.stage(STAGE):
+            pass
+        NULL_METRICS.count(COUNTER)
+        NULL_METRICS.emit(stream)
+
+        assert NULL_METRICS.enabled is False, "Expected the null metrics to be disabled"
+        assert NULL_METRICS.to_dict() == {}, f"Expected no metrics, but got {NULL_METRICS.to_dict()}"
+        assert stream.getvalue() == '', f"Expected nothing to be written, but got {stream.getvalue()}"
@@ -0,0 +1,141 @@
+# This module implements unit tests for the Invocation_Profiler class in the Resources/InvocationProfiler.py module.
+''' Implements tests for the invocation profiler. '''
+
+# Import the required libraries
+import io
+import os
+import json
+import pstats
+import cProfile
+import tracemalloc
+import pytest
+from Resources.InvocationProfiler import Invocation_Profiler, library_of, library_shares, summarize_stats, emit
+
+# Define the test constants
+NLTK_FILE = os.path.join('', 'site-packages', 'nltk', 'tokenize', 'destructive.py')
+SKLEARN_FILE = os.path.join('', 'site-packages', 'sklearn', 'feature_extraction', 'text.py')
+TENSORFLOW_FILE = os.path.join('', 'site-packages', 'tensorflow', 'python', 'ops', 'math_ops.py')
+HANDLER_FILE = os.path.join('', 'package', 'lambda_function.py')
+LIBRARIES = ['nltk', 'sklearn', 'keras', 'other']
+SUMMARY_FILES = ['stats_file', 'allocations_file', 'summary_file']
+
+
+def allocate():
+    # Allocate memory that outlives the profiled block, so it shows up in the allocation sites
+    return [bytearray(1024) for _ in range(100)]
+
+
+class Tests__Library_Attribution:
+
+    def test__library_of(self):
+        assert library_of(NLTK_FILE) == 'nltk', f"Expected nltk, but got {library_of(NLTK_FILE)}"
+        assert library_of(SKLEARN_FILE) == 'sklearn', f"Expected sklearn, but got {library_of(SKLEARN_FILE)}"
+        assert library_of(TENSORFLOW_FILE) == 'keras', f"Expected TensorFlow to count as keras, but got {library_of(TENSORFLOW_FILE)}"
+        assert library_of(HANDLER_FILE) is None, f"Expected no library, but got {library_of(HANDLER_FILE)}"
+
+    def test__builtins_count_towards_their_callers(self):
+        handler = (HANDLER_FILE, 1, 'handle_event')
+        tokenize = (NLTK_FILE, 1, 'tokenize')
+        transform = (SKLEARN_FILE, 1, 'transform')
+        builtin = ('~', 0, "<method 'sub' of 're.Pattern' objects>")
+
+        # (primitive calls, calls, own time, cumulative time, callers), as recorded by cProfile
+        stats = {
+            handler: (1, 1, 0.1, 1.0, {}),
+            transform: (1, 1, 0.1, 0.5, {handler: (1, 1, 0.1, 0.5)}),
+            tokenize: (1, 1, 0.1, 0.4, {transform: (1, 1, 0.1, 0.4)}),
+            builtin: (4, 4, 0.4, 0.4, {tokenize: (3, 3, 0.3, 0.3), handler: (1, 1, 0.1, 0.1)})
+        }
+
+        shares = library_shares(stats)
+        assert shares[handler] == {'other': 1.0}, f"Unexpected shares: {shares[handler]}"
+        assert shares[transform] == {'sklearn': 1.0}, f"Unexpected shares: {shares[transform]}"
+        assert shares[builtin] == pytest.approx({'nltk': 0.75, 'other': 0.25}), f"Unexpected shares: {shares[builtin]}"
+
+    def test__recursive_callers(self):
+        first = (HANDLER_FILE, 1, 'first')
+        second = (HANDLER_FILE, 2, 'second')
+        tokenize = (NLTK_FILE, 1, 'tokenize')
+        stats = {
+            tokenize: (1, 1, 0.1, 0.4, {}),
+            first: (2, 2, 0.1, 0.3, {tokenize: (1, 1, 0.1, 0.3), second: (1, 1, 0.0, 0.1)}),
+            second: (1, 1, 0.1, 0.2, {first: (1, 1, 0.1, 0.2)})
+        }
+
+        shares = library_shares(stats)
+        for function in stats:
+            assert sum(shares[function].values()) == pytest.approx(1.0), f"Expected the shares of {function} to add up to 1, but got {shares[function]}"
+
+    def test__libraries_add_up_to_the_total(self):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        sorted(str(i) for i in range(1000))
+        profiler.disable()
+
+        summary = summarize_stats(pstats.Stats(profiler))
+        assert list(summary['library_seconds']) == LIBRARIES, f"Unexpected libraries: {summary['library_seconds']}"
+        total = sum(summary['library_seconds'].values())
+        assert total == pytest.approx(summary['seconds'], abs=1e-5), f"Expected the libraries to add up to {summary['seconds']}, but got {total}"
+
+
+class Tests__Invocation_Profiler:
+
+    def test__profile_writes_the_stats_allocations_and_summary(self, tmp_path):
+        profiler = Invocation_Profiler(str(tmp_path), top_allocations=5)
+
+        with profiler.profile() as summary:
+            data = allocate()
+
+        assert len(data) == 100, f"Expected 100 buffers, but got {len(data)}"
+        for key in SUMMARY_FILES:
+            assert os.path.isfile(summary[key]), f"Expected the {key} to be written, but got {summary[key]}"
+
+        assert pstats.Stats(summary['stats_file']).total_tt >= 0, "Expected the stats file to be readable by pstats"
+        with open(summary['allocations_file']) as file:
+            allocations = file.read()
+        assert __file__ in allocations, f"Expected the allocation site in this file, but got {allocations}"
+
+        with open(summary['summary_file']) as file:
+            saved = json.load(file)
+        assert saved == summary, f"Expected the saved summary to match, but got {saved}"
+        assert summary['peak_allocated_mb'] > 0, f"Expected a peak allocation, but got {summary['peak_allocated_mb']}"
+        assert not tracemalloc.is_tracing(), "Expected tracemalloc to be stopped after profiling"
+
+    def test__every_nth_invocation_is_due(self):
+        profiler = Invocation_Profiler(every_n=3)
+
+        result = [profiler.due() for _ in range(6)]
+        assert result == [False, False, True, False, False, True], f"Unexpected invocations profiled: {result}"
+
+    def test__invalid_every_n(self):
+        with pytest.raises(ValueError):
+            Invocation_Profiler(every_n=0)
+
+    def test__one_invocation_at_a_time(self, tmp_path):
+        profiler = Invocation_Profiler(str(tmp_path))
+
+        with profiler.profile() as outer:
+            with profiler.profile() as inner:
+                pass
+
+        assert inner == {}, f"Expected the nested invocation to be skipped, but got {inner}"
+        assert outer, "Expected the outer invocation to be profiled"
+        assert len(os.listdir(tmp_path)) == 3, f"Expected a single profile, but got {os.listdir(tmp_path)}"
+
+    def test__failed_block_writes_nothing(self, tmp_path):
+        profiler = Invocation_Profiler(str(tmp_path))
+
+        with pytest.raises(RuntimeError):
+            with profiler.profile():
+                raise RuntimeError('failed')
+
+        assert not os.listdir(tmp_path), f"Expected no profile, but got {os.listdir(tmp_path)}"
+        with profiler.profile() as summary:
+            pass
+        assert summary, "Expected the profiler to be usable after a failure"
+
+    def test__emit(self):
+        stream = io.StringIO()
+
+        emit({'seconds': 0.5}, stream)
+        assert json.loads(stream.getvalue()) == {'profile': {'seconds': 0.5}}, f"Unexpected log line: {stream.getvalue()}"
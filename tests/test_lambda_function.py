@@ -2,9 +2,22 @@
 ''' Implements tests for the AWS lambda function. '''
 
 # Import the required libraries
+import os
+import re
+import sys
+import json
+import subprocess
 import pytest
+import numpy as np
 from unittest.mock import patch, MagicMock
 from lambda_function import lambda_handler, event_is_valid, spam_or_ham, main
+from lambda_function import get_artifacts, warmup, get_cache_stats, clear_artifact_cache, load_model, load_vectorizer
+from lambda_function import encode_messages, classify_messages, classify_bulk, vectorize_with_metrics, classify_many
+from lambda_function import inference_chunk_size, serialize_response, load_keras_model, print_result
+from Resources.InvocationMetrics import Invocation_Metrics
+from Resources.InvocationProfiler import Invocation_Profiler
+from Resources.NearDuplicateIndex import Near_Duplicate_Index
+from Resources.CascadeModel import Cascade_Model
 from Resources.CustomTokenizer import Custom_Tokenizer
 
 # Define the test constants
@@ -21,6 +34,7 @@ ENCODED_MESSAGE_2 = [4, 5, 6]
 ENCODED_MESSAGE_3 = [7, 8, 9]
 BAD_MESSAGE = 123
 INVALID_FUNCTION_NAME = 'invalid_function'
+OTHER_FUNCTION_NAME = 'sms_spam'
 INVALID_FIELD = 'invalid_field'
 RESPONSES = 'responses'
 ERRORS = 'errors'
@@ -30,6 +44,42 @@ STATUS_CODE_BAD_REQUEST = 400
 EMPTY_STRING = ''
 EMPTY_DICT = {}
 EMPTY_LIST = []
+VOCABULARY = {'hello': 0, 'prize': 1, 'job': 2}
+CACHE_HITS = 'cache_hits'
+CACHE_MISSES = 'cache_misses'
+ARTIFACTS_LOADED = 'artifacts_loaded'
+PREDICTION_CACHE = 'prediction_cache'
+HITS = 'hits'
+METRICS = 'metrics'
+PROFILE = 'profile'
+RESPONSE_FORMAT = 'response_format'
+PROBABILITIES = 'probabilities'
+CAMPAIGN = 'WINNER!! As a valued network customer you have been selected to receive a £900 prize reward! To claim call 09061701461.'
+CAMPAIGN_VARIANT = 'WINNER!! As a valued network customer you have been selected to receive a £800 prize reward! To claim call 09061701999.'
+
+
+def build_mock_model(num_features=len(VOCABULARY), num_classes=2):
+    # Mock a model whose input and output shapes match the mock vectorizer
+    mock_model = MagicMock()
+    mock_model.input_shape = (None, num_features)
+    mock_model.output_shape = (None, num_classes)
+    return mock_model
+
+
+def build_mock_vectorizer():
+    # Mock a fitted vectorizer
+    mock_vectorizer = MagicMock()
+    mock_vectorizer.vocabulary_ = VOCABULARY
+    return mock_vectorizer
+
+
+@pytest.fixture(autouse=True)
+def reset_artifact_cache():
+    # Every test starts with a cold artifact cache, the Keras backend and the pickled vectorizer selected
+    clear_artifact_cache()
+    with patch('lambda_function.MODEL_BACKEND', 'keras'), patch('lambda_function.VECTORIZER_FORMAT', 'pickle'):
+        yield
+    clear_artifact_cache()
 
 
 class Tests__Event_Is_Valid:
@@ -229,9 +279,9 @@ class Tests__Lambda_Handler:
         with patch('lambda_function.event_is_valid') as mock_event_is_valid:
             mock_event_is_valid.return_value = None
 
-            # Mock the keras.models.load_model function
-            with patch('lambda_function.keras.models.load_model') as mock_load_model:
-                mock_load_model.return_value = MagicMock()
+            # Mock the load_keras_model function
+            with patch('lambda_function.load_keras_model') as mock_load_model:
+                mock_load_model.return_value = build_mock_model()
 
                 # Mock the file open function
                 with patch('lambda_function.open') as mock_open:
@@ -239,7 +289,7 @@ class Tests__Lambda_Handler:
 
                     # Mock the pickle.load function
                     with patch('lambda_function.pickle.load') as mock_pickle_load:
-                        mock_vectorizer = MagicMock()
+                        mock_vectorizer = build_mock_vectorizer()
                         mock_pickle_load.return_value = mock_vectorizer
 
                         # Mock the custom_tokenizer method
@@ -306,8 +356,8 @@ class Tests__Lambda_Handler:
         with patch('lambda_function.event_is_valid') as mock_event_is_valid:
             mock_event_is_valid.return_value = None
 
-            # Mock the keras.models.load_model function
-            with patch('lambda_function.keras.models.load_model') as mock_load_model:
+            # Mock the load_keras_model function
+            with patch('lambda_function.load_keras_model') as mock_load_model:
                 mock_load_model.side_effect = Exception('Test Exception: Model Load Failed')
 
                 result = lambda_handler(event)
@@ -327,9 +377,9 @@ class Tests__Lambda_Handler:
         with patch('lambda_function.event_is_valid') as mock_event_is_valid:
             mock_event_is_valid.return_value = None
 
-            # Mock the keras.models.load_model function
-            with patch('lambda_function.keras.models.load_model') as mock_load_model:
-                mock_load_model.return_value = MagicMock()
+            # Mock the load_keras_model function
+            with patch('lambda_function.load_keras_model') as mock_load_model:
+                mock_load_model.return_value = build_mock_model()
 
                 # Mock the file open function
                 with patch('lambda_function.open') as mock_open:
@@ -352,9 +402,9 @@ class Tests__Lambda_Handler:
         with patch('lambda_function.event_is_valid') as mock_event_is_valid:
             mock_event_is_valid.return_value = None
 
-            # Mock the keras.models.load_model function
-            with patch('lambda_function.keras.models.load_model') as mock_load_model:
-                mock_load_model.return_value = MagicMock()
+            # Mock the load_keras_model function
+            with patch('lambda_function.load_keras_model') as mock_load_model:
+                mock_load_model.return_value = build_mock_model()
 
                 # Mock the file open function
                 with patch('lambda_function.open') as mock_open:
@@ -381,9 +431,9 @@ class Tests__Lambda_Handler:
         with patch('lambda_function.event_is_valid') as mock_event_is_valid:
             mock_event_is_valid.return_value = None
 
-            # Mock the keras.models.load_model function
-            with patch('lambda_function.keras.models.load_model') as mock_load_model:
-                mock_load_model.return_value = MagicMock()
+            # Mock the load_keras_model function
+            with patch('lambda_function.load_keras_model') as mock_load_model:
+                mock_load_model.return_value = build_mock_model()
 
                 # Mock the file open function
                 with patch('lambda_function.open') as mock_open:
@@ -391,7 +441,7 @@ class Tests__Lambda_Handler:
 
                     # Mock the pickle.load function
                     with patch('lambda_function.pickle.load') as mock_pickle_load:
-                        mock_vectorizer = MagicMock()
+                        mock_vectorizer = build_mock_vectorizer()
                         mock_pickle_load.return_value = mock_vectorizer
 
                         # Mock the mock_vectorizer.transform method
@@ -406,6 +456,544 @@ class Tests__Lambda_Handler:
                         assert ERRORS in result, f"Expected {ERRORS} in response, but got {result}"
                         assert 'Test Exception: Vectorizer Failed' in result[ERRORS], f"Expected 'Test Exception: Vectorizer Failed' in response[{ERRORS}], but got {result[ERRORS]}"
 
+class Tests__Artifact_Cache:
+
+    def test__artifacts_are_loaded_once(self):
+        # Mock the load_keras_model function
+        with patch('lambda_function.load_keras_model') as mock_load_model:
+            mock_load_model.return_value = build_mock_model()
+
+            # Mock the file open function
+            with patch('lambda_function.open') as mock_open:
+                mock_open.return_value.__enter__ = lambda *args: MagicMock()
+
+                # Mock the pickle.load function
+                with patch('lambda_function.pickle.load') as mock_pickle_load:
+                    mock_pickle_load.return_value = build_mock_vectorizer()
+
+                    first = get_artifacts()
+                    second = get_artifacts()
+
+                    assert first is second, f"Expected the cached artifacts to be reused, but got {first} and {second}"
+                    assert mock_load_model.call_count == 1, f"Expected the model to be loaded once, but it was loaded {mock_load_model.call_count} times"
+                    assert mock_pickle_load.call_count == 1, f"Expected the vectorizer to be loaded once, but it was loaded {mock_pickle_load.call_count} times"
+
+                    stats = get_cache_stats()
+                    assert stats[CACHE_MISSES] == 1, f"Expected stats[{CACHE_MISSES}] == 1, but got {stats[CACHE_MISSES]}"
+                    assert stats[CACHE_HITS] == 1, f"Expected stats[{CACHE_HITS}] == 1, but got {stats[CACHE_HITS]}"
+                    assert stats[ARTIFACTS_LOADED] is True, f"Expected stats[{ARTIFACTS_LOADED}] is True, but got {stats[ARTIFACTS_LOADED]}"
+
+    def test__warmup(self):
+        # Mock the load_keras_model function
+        with patch('lambda_function.load_keras_model') as mock_load_model:
+            mock_load_model.return_value = build_mock_model()
+
+            # Mock the file open function
+            with patch('lambda_function.open') as mock_open:
+                mock_open.return_value.__enter__ = lambda *args: MagicMock()
+
+                # Mock the pickle.load function
+                with patch('lambda_function.pickle.load') as mock_pickle_load:
+                    mock_vectorizer = build_mock_vectorizer()
+                    mock_pickle_load.return_value = mock_vectorizer
+
+                    # Mock the NLTK resources loaded by the tokenizer
+                    with patch('lambda_function.tokenizer_Instance.initialize') as mock_initialize:
+                        stats = warmup()
+                        assert mock_initialize.call_count == 1, f"Expected the tokenizer to be initialized eagerly, but got {mock_initialize.call_count} calls"
+
+                    assert stats[ARTIFACTS_LOADED] is True, f"Expected stats[{ARTIFACTS_LOADED}] is True, but got {stats[ARTIFACTS_LOADED]}"
+                    assert stats[CACHE_MISSES] == 1, f"Expected stats[{CACHE_MISSES}] == 1, but got {stats[CACHE_MISSES]}"
+                    assert mock_vectorizer.transform.call_count == 1, f"Expected the vectorizer to be exercised once, but got {mock_vectorizer.transform.call_count} calls"
+
+    def test__mismatched_artifacts_are_rejected_and_not_cached(self):
+        # Define the test inputs
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1, MESSAGE_2, MESSAGE_3]}
+
+        # Mock the load_keras_model function with a model expecting a different number of features
+        with patch('lambda_function.load_keras_model') as mock_load_model:
+            mock_load_model.return_value = build_mock_model(num_features=len(VOCABULARY) + 1)
+
+            # Mock the file open function
+            with patch('lambda_function.open') as mock_open:
+                mock_open.return_value.__enter__ = lambda *args: MagicMock()
+
+                # Mock the pickle.load function
+                with patch('lambda_function.pickle.load') as mock_pickle_load:
+                    mock_pickle_load.return_value = build_mock_vectorizer()
+
+                    result = lambda_handler(event)
+                    assert result[STATUS_CODE] == STATUS_CODE_BAD_REQUEST, f"Expected response[{STATUS_CODE}] == {STATUS_CODE_BAD_REQUEST}, but got {result[STATUS_CODE]}"
+                    assert 'Model expects 4 input features, but the vectorizer produces 3' in result[ERRORS], f"Expected a feature mismatch error, but got {result[ERRORS]}"
+
+                    stats = get_cache_stats()
+                    assert stats[ARTIFACTS_LOADED] is False, f"Expected stats[{ARTIFACTS_LOADED}] is False, but got {stats[ARTIFACTS_LOADED]}"
+
+
+class Tests__Classify_Messages:
+
+    def mock_spam_or_ham(self, model, messages, encoded_messages, metrics=None):
+        # Classify MESSAGE_2 as spam and everything else as ham
+        return {
+            STATUS_CODE: STATUS_CODE_SUCCESS,
+            FUNCTION: FUNCTION_NAME,
+            RESPONSES: {message: SPAM if message == MESSAGE_2 else HAM for message in messages},
+            ERRORS: []
+        }
+
+    def test__duplicates_are_classified_once(self):
+        # Define the test inputs
+        messages = [MESSAGE_1, MESSAGE_2, MESSAGE_1, MESSAGE_3, MESSAGE_2]
+        mock_vectorizer = build_mock_vectorizer()
+
+        with patch('lambda_function.spam_or_ham', side_effect=self.mock_spam_or_ham) as mock_spam_or_ham:
+            result = classify_messages(build_mock_model(), mock_vectorizer, messages)
+
+            assert result == {MESSAGE_1: HAM, MESSAGE_2: SPAM, MESSAGE_3: HAM}, f"Unexpected result: {result}"
+            assert list(result) == [MESSAGE_1, MESSAGE_2, MESSAGE_3], f"Expected the order of first appearance, but got {list(result)}"
+
+            encoded = mock_vectorizer.transform.call_args.args[0]
+            assert encoded == [MESSAGE_1, MESSAGE_2, MESSAGE_3], f"Expected each message to be encoded once, but got {encoded}"
+            assert mock_spam_or_ham.call_args.args[1] == [MESSAGE_1, MESSAGE_2, MESSAGE_3], f"Unexpected messages: {mock_spam_or_ham.call_args.args[1]}"
+
+    def test__cached_messages_are_not_classified_again(self):
+        mock_vectorizer = build_mock_vectorizer()
+
+        with patch('lambda_function.spam_or_ham', side_effect=self.mock_spam_or_ham) as mock_spam_or_ham:
+            classify_messages(build_mock_model(), mock_vectorizer, [MESSAGE_1, MESSAGE_2])
+            result = classify_messages(build_mock_model(), mock_vectorizer, [MESSAGE_2, MESSAGE_3, MESSAGE_1])
+
+            assert result == {MESSAGE_2: SPAM, MESSAGE_3: HAM, MESSAGE_1: HAM}, f"Unexpected result: {result}"
+            assert mock_spam_or_ham.call_count == 2, f"Expected 2 calls, but got {mock_spam_or_ham.call_count}"
+            assert mock_spam_or_ham.call_args.args[1] == [MESSAGE_3], f"Expected only the new message to be classified, but got {mock_spam_or_ham.call_args.args[1]}"
+
+            stats = get_cache_stats()[PREDICTION_CACHE]
+            assert stats[HITS] == 2, f"Expected 2 prediction cache hits, but got {stats}"
+
+    def test__fully_cached_batch_skips_the_model(self):
+        mock_vectorizer = build_mock_vectorizer()
+
+        with patch('lambda_function.spam_or_ham', side_effect=self.mock_spam_or_ham) as mock_spam_or_ham:
+            classify_messages(build_mock_model(), mock_vectorizer, [MESSAGE_1])
+            result = classify_messages(build_mock_model(), mock_vectorizer, [MESSAGE_1, MESSAGE_1])
+
+            assert result == {MESSAGE_1: HAM}, f"Unexpected result: {result}"
+            assert mock_spam_or_ham.call_count == 1, f"Expected 1 call, but got {mock_spam_or_ham.call_count}"
+            assert mock_vectorizer.transform.call_count == 1, f"Expected 1 call, but got {mock_vectorizer.transform.call_count}"
+
+
+class Tests__Inference_Chunks:
+
+    def test__messages_are_classified_in_chunks(self):
+        # Define the test inputs
+        messages = [MESSAGE_1, MESSAGE_2, MESSAGE_3]
+        mock_vectorizer = build_mock_vectorizer()
+
+        with patch('lambda_function.INFERENCE_CHUNK_SIZE', 2):
+            with patch('lambda_function.spam_or_ham', side_effect=Tests__Classify_Messages().mock_spam_or_ham) as mock_spam_or_ham:
+                mock_model = build_mock_model()
+                mock_model.supports_sparse = True
+                result = classify_messages(mock_model, mock_vectorizer, messages)
+
+                chunks = [call.args[1] for call in mock_spam_or_ham.call_args_list]
+                assert chunks == [[MESSAGE_1, MESSAGE_2], [MESSAGE_3]], f"Expected 2 chunks, but got {chunks}"
+                assert result == {MESSAGE_1: HAM, MESSAGE_2: SPAM, MESSAGE_3: HAM}, f"Unexpected result: {result}"
+
+    def test__chunk_size_is_derived_from_vocabulary_width(self):
+        mock_vectorizer = build_mock_vectorizer()
+        mock_vectorizer.vocabulary_ = {str(i): i for i in range(8192)}
+        dense_model = build_mock_model(num_features=8192)
+        sparse_model = build_mock_model(num_features=8192)
+        sparse_model.supports_sparse = True
+
+        dense = inference_chunk_size(dense_model, mock_vectorizer, memory_budget_mb=64)
+        sparse = inference_chunk_size(sparse_model, mock_vectorizer, memory_budget_mb=64)
+        assert dense == 64 * 1024 * 1024 // (2048 + 8192 * 8), f"Unexpected dense chunk size: {dense}"
+        assert sparse == 64 * 1024 * 1024 // 2048, f"Unexpected sparse chunk size: {sparse}"
+
+    def test__cascade_over_a_dense_model_is_budgeted_as_dense(self):
+        mock_vectorizer = build_mock_vectorizer()
+        mock_vectorizer.vocabulary_ = {str(i): i for i in range(8192)}
+        mock_scorer = MagicMock(num_features=8192)
+        dense_model = build_mock_model(num_features=8192)
+        dense_model.supports_sparse = False
+        sparse_model = build_mock_model(num_features=8192)
+        sparse_model.supports_sparse = True
+
+        dense = inference_chunk_size(Cascade_Model(mock_scorer, dense_model), mock_vectorizer, memory_budget_mb=64)
+        sparse = inference_chunk_size(Cascade_Model(mock_scorer, sparse_model), mock_vectorizer, memory_budget_mb=64)
+        assert dense == 64 * 1024 * 1024 // (2048 + 8192 * 8), f"Expected the dense model's chunk size, but got {dense}"
+        assert sparse == 64 * 1024 * 1024 // 2048, f"Expected the sparse model's chunk size, but got {sparse}"
+
+    def test__tiny_budget_still_classifies_one_message_at_a_time(self):
+        result = inference_chunk_size(build_mock_model(), build_mock_vectorizer(), memory_budget_mb=0)
+        assert result == 1, f"Expected a chunk size of 1, but got {result}"
+
+    def test__dense_buffer_is_reused_across_chunks(self):
+        # Fit a small TF-IDF vectorizer and record the dense inputs passed to the model
+        text = pytest.importorskip('sklearn.feature_extraction.text')
+        vectorizer = text.TfidfVectorizer().fit([MESSAGE_1, MESSAGE_2, MESSAGE_3])
+        messages = [MESSAGE_2, MESSAGE_1, MESSAGE_3]
+        inputs = []
+
+        def predict(encoded, **kwargs):
+            inputs.append(encoded.copy())
+            return np.tile([0.9, 0.1], (len(encoded), 1))
+
+        mock_model = build_mock_model(num_features=len(vectorizer.vocabulary_))
+        mock_model.predict.side_effect = predict
+
+        with patch('lambda_function.INFERENCE_CHUNK_SIZE', 2):
+            classify_messages(mock_model, vectorizer, messages)
+
+        expected = vectorizer.transform(messages).toarray()
+        assert np.array_equal(np.vstack(inputs), expected), f"Expected the dense vectors of each chunk, but got {inputs}"
+
+
+class Tests__Classify_Many:
+
+    def build_artifacts(self):
+        # Fit a small TF-IDF vectorizer and mock a model that classifies messages with 'prize' as spam
+        text = pytest.importorskip('sklearn.feature_extraction.text')
+        vectorizer = text.TfidfVectorizer()
+        vectorizer.fit([MESSAGE_1, MESSAGE_2, MESSAGE_3])
+        prize = vectorizer.vocabulary_['prize']
+
+        def predict(encoded, **kwargs):
+            is_spam = np.asarray(encoded[:, prize].todense()).ravel() > 0
+            return np.stack([~is_spam, is_spam], axis=1).astype(float)
+
+        mock_model = build_mock_model(num_features=len(vectorizer.vocabulary_))
+        mock_model.supports_sparse = True
+        mock_model.predict.side_effect = predict
+        return mock_model, vectorizer
+
+    def test__matches_classify_messages(self):
+        model, vectorizer = self.build_artifacts()
+        messages = [MESSAGE_1, MESSAGE_2, MESSAGE_3, MESSAGE_2] * 5 + [f'{MESSAGE_2} {i}' for i in range(20)]
+
+        with patch('lambda_function.get_artifacts', return_value=(model, vectorizer)):
+            result = classify_many(messages, workers=3, chunk_size=4)
+
+        clear_artifact_cache()
+        expected = classify_messages(model, vectorizer, messages)
+        assert result == expected, f"Expected {expected}, but got {result}"
+        assert list(result) == list(expected), f"Expected the order of first appearance, but got {list(result)}"
+        assert model.predict.call_count == 6 + 1, f"Expected 6 chunks plus the reference call, but got {model.predict.call_count}"
+
+    def test__cached_messages_are_not_classified_again(self):
+        model, vectorizer = self.build_artifacts()
+
+        with patch('lambda_function.get_artifacts', return_value=(model, vectorizer)):
+            classify_many([MESSAGE_1, MESSAGE_2])
+            result = classify_many([MESSAGE_2, MESSAGE_1])
+
+        assert result == {MESSAGE_2: SPAM, MESSAGE_1: HAM}, f"Unexpected result: {result}"
+        assert model.predict.call_count == 1, f"Expected 1 call, but got {model.predict.call_count}"
+
+
+class Tests__Encode_Messages:
+
+    def test__sparse_model_keeps_sparse_vectors(self):
+        # Define the test inputs
+        messages = [MESSAGE_1, MESSAGE_2, MESSAGE_3]
+        mock_model = build_mock_model()
+        mock_model.supports_sparse = True
+        mock_vectorizer = build_mock_vectorizer()
+
+        result = encode_messages(mock_model, mock_vectorizer, messages)
+        assert result is mock_vectorizer.transform.return_value, f"Expected the sparse vectors, but got {result}"
+        assert mock_vectorizer.transform.return_value.toarray.call_count == 0, "Expected the vectors not to be densified"
+
+    def test__dense_model_densifies_vectors(self):
+        # Define the test inputs
+        messages = [MESSAGE_1, MESSAGE_2, MESSAGE_3]
+        mock_model = build_mock_model()
+        mock_vectorizer = build_mock_vectorizer()
+
+        result = encode_messages(mock_model, mock_vectorizer, messages)
+        assert result is mock_vectorizer.transform.return_value.toarray.return_value, f"Expected the dense vectors, but got {result}"
+
+
+class Tests__Invocation_Metrics:
+
+    def build_artifacts(self):
+        # Fit a small TF-IDF vectorizer and mock a model that classifies every message as ham
+        text = pytest.importorskip('sklearn.feature_extraction.text')
+        vectorizer = text.TfidfVectorizer()
+        vectorizer.fit([MESSAGE_1, MESSAGE_2, MESSAGE_3])
+
+        mock_model = build_mock_model(num_features=len(vectorizer.vocabulary_))
+        mock_model.predict.side_effect = lambda encoded, **kwargs: np.tile([0.9, 0.1], (encoded.shape[0], 1))
+        return mock_model, vectorizer
+
+    def test__metrics_are_returned_when_requested(self):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1, MESSAGE_2, MESSAGE_1], METRICS: True}
+
+        with patch('lambda_function.get_artifacts', return_value=self.build_artifacts()):
+            result = lambda_handler(event)
+
+        assert result[STATUS_CODE] == STATUS_CODE_SUCCESS, f"Unexpected response: {result}"
+        metrics = result[METRICS]
+        for stage in ['total_ms', 'validation_ms', 'artifact_load_ms', 'tokenization_ms', 'tfidf_transform_ms', 'predict_ms', 'response_ms']:
+            assert stage in metrics, f"Expected {stage} in metrics, but got {metrics}"
+
+        assert metrics['message_count'] == 3, f"Expected 3 messages, but got {metrics['message_count']}"
+        assert metrics['unique_message_count'] == 2, f"Expected 2 unique messages, but got {metrics['unique_message_count']}"
+        assert metrics['token_count'] == 9, f"Expected 9 tokens, but got {metrics['token_count']}"
+        assert metrics['prediction_cache_hits'] == 0, f"Expected no cache hits, but got {metrics['prediction_cache_hits']}"
+        assert metrics['failed'] == 0, f"Expected no failure, but got {metrics['failed']}"
+
+    def test__metrics_are_not_returned_by_default(self):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1]}
+
+        with patch('lambda_function.get_artifacts', return_value=self.build_artifacts()):
+            result = lambda_handler(event)
+
+        assert METRICS not in result, f"Expected no metrics in the response, but got {result}"
+
+    def test__metrics_are_logged_when_enabled(self, capsys):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1]}
+
+        with patch('lambda_function.METRICS_ENABLED', True):
+            with patch('lambda_function.get_artifacts', return_value=self.build_artifacts()):
+                result = lambda_handler(event)
+
+        assert METRICS not in result, f"Expected no metrics in the response, but got {result}"
+
+        log_line = json.loads(capsys.readouterr().out)
+        assert '_aws' in log_line, f"Expected an EMF log line, but got {log_line}"
+        assert log_line['message_count'] == 1, f"Expected 1 message, but got {log_line}"
+
+    def test__invalid_metrics_field(self):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1], METRICS: 'yes'}
+
+        result = lambda_handler(event)
+        assert result[STATUS_CODE] == STATUS_CODE_BAD_REQUEST, f"Expected a bad request, but got {result}"
+        assert 'Metrics field must be a boolean' in result[ERRORS], f"Unexpected errors: {result[ERRORS]}"
+
+    def test__timed_vectorization_matches_transform(self):
+        _, vectorizer = self.build_artifacts()
+        messages = [MESSAGE_1, MESSAGE_2, MESSAGE_3]
+
+        result = vectorize_with_metrics(vectorizer, messages, Invocation_Metrics(FUNCTION_NAME))
+        expected = vectorizer.transform(messages)
+        assert (result != expected).nnz == 0, "Expected the timed vectorization to match transform"
+
+
+class Tests__Invocation_Profiler:
+
+    build_artifacts = Tests__Invocation_Metrics.build_artifacts
+
+    def test__profile_is_returned_when_requested(self, tmp_path):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1, MESSAGE_2], PROFILE: True}
+
+        with patch('lambda_function._profiler', Invocation_Profiler(str(tmp_path))):
+            with patch('lambda_function.get_artifacts', return_value=self.build_artifacts()):
+                result = lambda_handler(event)
+
+        assert result[STATUS_CODE] == STATUS_CODE_SUCCESS, f"Unexpected response: {result}"
+        profile = result[PROFILE]
+        assert set(profile['library_seconds']) == {'nltk', 'sklearn', 'keras', 'other'}, f"Unexpected libraries: {profile}"
+        assert profile['library_seconds']['sklearn'] > 0, f"Expected time in scikit-learn, but got {profile['library_seconds']}"
+        assert len(os.listdir(tmp_path)) == 3, f"Expected the profile files, but got {os.listdir(tmp_path)}"
+
+    def test__nothing_is_profiled_by_default(self, tmp_path):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1]}
+        profiler = Invocation_Profiler(str(tmp_path))
+
+        with patch('lambda_function._profiler', profiler), patch.object(profiler, 'profile') as mock_profile:
+            with patch('lambda_function.get_artifacts', return_value=self.build_artifacts()):
+                result = lambda_handler(event)
+
+        assert PROFILE not in result, f"Expected no profile in the response, but got {result}"
+        mock_profile.assert_not_called()
+
+    def test__every_nth_invocation_is_logged_when_enabled(self, tmp_path, capsys):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1]}
+
+        with patch('lambda_function.PROFILING_ENABLED', True):
+            with patch('lambda_function._profiler', Invocation_Profiler(str(tmp_path), every_n=2)):
+                with patch('lambda_function.get_artifacts', return_value=self.build_artifacts()):
+                    results = [lambda_handler(event) for _ in range(4)]
+
+        for result in results:
+            assert PROFILE not in result, f"Expected no profile in the response, but got {result}"
+
+        log_lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+        assert len(log_lines) == 2, f"Expected 2 profiled invocations, but got {log_lines}"
+        assert 'library_seconds' in log_lines[0][PROFILE], f"Unexpected log line: {log_lines[0]}"
+        assert len(os.listdir(tmp_path)) == 6, f"Expected 2 profiles, but got {os.listdir(tmp_path)}"
+
+    def test__invalid_profile_field(self):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1], PROFILE: 'yes'}
+
+        result = lambda_handler(event)
+        assert result[STATUS_CODE] == STATUS_CODE_BAD_REQUEST, f"Expected a bad request, but got {result}"
+        assert 'Profile field must be a boolean' in result[ERRORS], f"Unexpected errors: {result[ERRORS]}"
+
+
+class Tests__Response_Format:
+
+    def mock_classify_messages(self, model, vectorizer, messages, metrics=None, version=None):
+        # Classify MESSAGE_2 as spam and everything else as ham
+        return {message: SPAM if message == MESSAGE_2 else HAM for message in dict.fromkeys(messages)}
+
+    def handle(self, event):
+        # Run the event through the handler with mocked artifacts and classification
+        with patch('lambda_function.get_artifacts', return_value=(build_mock_model(), build_mock_vectorizer())):
+            with patch('lambda_function.classify_messages', side_effect=self.mock_classify_messages):
+                return lambda_handler(event)
+
+    def test__labels_format(self):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_2, MESSAGE_1, MESSAGE_2], RESPONSE_FORMAT: 'labels'}
+        result = self.handle(event)
+        assert result[RESPONSES] == [SPAM, HAM, SPAM], f"Expected a label per message, in order, but got {result}"
+
+    def test__codes_format(self):
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1, MESSAGE_2, MESSAGE_1], RESPONSE_FORMAT: 'codes'}
+        result = self.handle(event)
+        assert result[RESPONSES] == [0, 1, 0], f"Expected a code per message, in order, but got {result}"
+
+    def test__map_format_is_the_default(self):
+        result = self.handle({FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1, MESSAGE_2]})
+        assert result[RESPONSES] == {MESSAGE_1: HAM, MESSAGE_2: SPAM}, f"Unexpected responses: {result}"
+        assert PROBABILITIES not in result, f"Expected no probabilities, but got {result}"
+
+    def test__probabilities(self):
+        # Fit a small TF-IDF vectorizer and mock a model that gives messages with 'prize' a 0.9 spam probability
+        text = pytest.importorskip('sklearn.feature_extraction.text')
+        vectorizer = text.TfidfVectorizer().fit([MESSAGE_1, MESSAGE_2, MESSAGE_3])
+        prize = vectorizer.vocabulary_['prize']
+
+        def predict(encoded, **kwargs):
+            spam = np.where(np.asarray(encoded[:, prize].todense()).ravel() > 0, 0.9, 0.2)
+            return np.stack([1 - spam, spam], axis=1)
+
+        mock_model = build_mock_model(num_features=len(vectorizer.vocabulary_))
+        mock_model.supports_sparse = True
+        mock_model.predict.side_effect = predict
+        event = {FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_2, MESSAGE_1, MESSAGE_2], RESPONSE_FORMAT: 'codes', PROBABILITIES: True}
+
+        with patch('lambda_function.get_artifacts', return_value=(mock_model, vectorizer)):
+            result = lambda_handler(event)
+
+        assert result[RESPONSES] == [1, 0, 1], f"Unexpected responses: {result}"
+        assert np.allclose(result[PROBABILITIES], [0.9, 0.2, 0.9]), f"Unexpected probabilities: {result}"
+        assert mock_model.predict.call_args.args[0].shape[0] == 2, "Expected each distinct message to be scored once"
+
+    def test__invalid_response_format(self):
+        result = event_is_valid({FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1], RESPONSE_FORMAT: 'xml'})
+        assert result[ERRORS] == ['Invalid response format: xml'], f"Unexpected errors: {result}"
+
+    def test__probabilities_require_an_array_format(self):
+        result = event_is_valid({FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1], PROBABILITIES: True})
+        assert result[ERRORS] == ['Probabilities field requires the labels or codes response format'], f"Unexpected errors: {result}"
+
+    def test__invalid_probabilities_field(self):
+        result = event_is_valid({FUNCTION: FUNCTION_NAME, MESSAGES: [MESSAGE_1], RESPONSE_FORMAT: 'labels', PROBABILITIES: 'yes'})
+        assert result[ERRORS] == ['Probabilities field must be a boolean'], f"Unexpected errors: {result}"
+
+    @pytest.mark.parametrize('use_orjson', [True, False])
+    def test__serialize_response(self, use_orjson):
+        response = {STATUS_CODE: STATUS_CODE_SUCCESS, FUNCTION: FUNCTION_NAME, RESPONSES: [0, 1], PROBABILITIES: [0.25, 0.75], ERRORS: []}
+        if use_orjson:
+            pytest.importorskip('orjson')
+            result = serialize_response(response)
+        else:
+            with patch('lambda_function.orjson', None):
+                result = serialize_response(response)
+
+        assert json.loads(result) == response, f"Expected the response to round-trip, but got {result}"
+        assert ' ' not in result, f"Expected compact JSON, but got {result}"
+
+
+class Tests__Load_Model:
+
+    def test__numpy_backend(self):
+        # Mock the Numpy_Model.load method
+        with patch('lambda_function.MODEL_BACKEND', 'numpy'):
+            with patch('lambda_function.Numpy_Model.load') as mock_numpy_load:
+                with patch('lambda_function.load_keras_model') as mock_load_model:
+                    result = load_model()
+
+                    assert result is mock_numpy_load.return_value, f"Expected the NumPy model, but got {result}"
+                    assert mock_load_model.call_count == 0, f"Expected Keras not to be used, but got {mock_load_model.call_count} calls"
+
+    def test__auto_backend_without_weights(self):
+        # Mock the weights file as missing
+        with patch('lambda_function.MODEL_BACKEND', 'auto'):
+            with patch('lambda_function.os.path.exists') as mock_exists:
+                mock_exists.return_value = False
+
+                with patch('lambda_function.load_keras_model') as mock_load_model:
+                    result = load_model()
+
+                    assert result is mock_load_model.return_value, f"Expected the Keras model, but got {result}"
+
+    def test__import_does_not_load_tensorflow(self):
+        # Import the module in a fresh interpreter, since this one may already have loaded Keras
+        code = 'import sys, lambda_function; print("tensorflow" in sys.modules or "keras" in sys.modules)'
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        assert result.stdout.strip() == 'False', f"Expected Keras and TensorFlow not to be imported, but got {result.stdout}"
+
+    def test__keras_not_installed(self):
+        # Mock Keras as missing
+        with patch.dict(sys.modules, {'keras': None}):
+            with pytest.raises(ImportError, match='Keras is not installed'):
+                load_keras_model('model.keras')
+
+    def test__invalid_backend(self):
+        with patch('lambda_function.MODEL_BACKEND', 'invalid'):
+            with pytest.raises(ValueError, match='Invalid model backend: invalid'):
+                load_model()
+
+    def test__cascade_wraps_the_model(self):
+        # Mock the linear scorer file
+        with patch('lambda_function.CASCADE_ENABLED', True), patch('lambda_function.CASCADE_MARGIN', 0.4):
+            with patch('lambda_function.Linear_Scorer.load') as mock_scorer_load:
+                mock_scorer_load.return_value.num_features = len(VOCABULARY)
+
+                with patch('lambda_function.load_keras_model') as mock_load_model:
+                    mock_load_model.return_value = build_mock_model()
+                    result = load_model()
+
+                    assert isinstance(result, Cascade_Model), f"Expected a cascade, but got {result}"
+                    assert result.model is mock_load_model.return_value, f"Expected the cascade to wrap the Keras model, but got {result.model}"
+                    assert result.margin == 0.4, f"Expected margin 0.4, but got {result.margin}"
+
+
+class Tests__Load_Vectorizer:
+
+    def test__compact_format(self):
+        # Mock the Compact_Vectorizer.load method
+        with patch('lambda_function.VECTORIZER_FORMAT', 'compact'):
+            with patch('lambda_function.Compact_Vectorizer.load') as mock_compact_load:
+                with patch('lambda_function.pickle.load') as mock_pickle_load:
+                    result = load_vectorizer()
+
+                    assert result is mock_compact_load.return_value, f"Expected the compact vectorizer, but got {result}"
+                    assert mock_pickle_load.call_count == 0, f"Expected nothing to be unpickled, but got {mock_pickle_load.call_count} calls"
+
+    def test__auto_format_without_compact_vectorizer(self):
+        # Mock the compact vectorizer directory as missing
+        with patch('lambda_function.VECTORIZER_FORMAT', 'auto'):
+            with patch('lambda_function.os.path.isdir', return_value=False):
+                with patch('lambda_function.open'):
+                    with patch('lambda_function.pickle.load') as mock_pickle_load:
+                        mock_pickle_load.return_value = build_mock_vectorizer()
+                        result = load_vectorizer()
+
+                        assert result is mock_pickle_load.return_value, f"Expected the pickled vectorizer, but got {result}"
+
+    def test__invalid_format(self):
+        with patch('lambda_function.VECTORIZER_FORMAT', 'invalid'):
+            with pytest.raises(ValueError, match='Invalid vectorizer format: invalid'):
+                load_vectorizer()
+
+
 class Tests__Main:
 
     def test__happy_path(self):
@@ -486,6 +1074,7 @@ class Tests__Main:
             mock_args = MagicMock()
             mock_argparse.return_value.parse_args.return_value = mock_args
             mock_args.event = None
+            mock_args.input = None
             
             result = main()
             assert result is not None, f"Expected response != None, but got {result}"
@@ -499,6 +1088,269 @@ class Tests__Main:
             assert result[ERRORS] == ['No JSON-encoded event object provided. Use the --event argument to provide an event object'], f"Expected response[{ERRORS}] == ['No JSON-encoded event object provided. Use the --event argument to provide an event object'], but got {result[ERRORS]}"
                     
 
+class Tests__Classify_Bulk:
+
+    def test__happy_path(self, tmp_path):
+        # Define the test inputs
+        input_path = tmp_path / 'messages.jsonl'
+        output_path = tmp_path / 'results.jsonl'
+        input_path.write_text('\n'.join(f'"{message}"' for message in [MESSAGE_1, MESSAGE_2, MESSAGE_3]), encoding='utf-8')
+
+        # Mock the artifacts and the spam_or_ham function
+        with patch('lambda_function.get_artifacts') as mock_get_artifacts:
+            mock_get_artifacts.return_value = (build_mock_model(), build_mock_vectorizer())
+
+            with patch('lambda_function.spam_or_ham') as mock_spam_or_ham:
+                mock_spam_or_ham.return_value = {
+                    STATUS_CODE: STATUS_CODE_SUCCESS,
+                    FUNCTION: FUNCTION_NAME,
+                    RESPONSES: {MESSAGE_1: HAM, MESSAGE_2: SPAM, MESSAGE_3: HAM},
+                    ERRORS: []
+                }
+
+                result = classify_bulk(str(input_path), str(output_path), chunk_size=10)
+                assert result[STATUS_CODE] == STATUS_CODE_SUCCESS, f"Expected response[{STATUS_CODE}] == {STATUS_CODE_SUCCESS}, but got {result}"
+                assert result['messages_classified'] == 3, f"Expected 3 messages classified, but got {result}"
+
+                lines = output_path.read_text(encoding='utf-8').splitlines()
+                assert len(lines) == 3, f"Expected 3 results, but got {lines}"
+                assert '"label": "spam"' in lines[1], f"Expected the second message to be spam, but got {lines[1]}"
+
+    def test__missing_output(self, tmp_path):
+        result = classify_bulk(str(tmp_path / 'messages.jsonl'), None)
+        assert result[STATUS_CODE] == STATUS_CODE_BAD_REQUEST, f"Expected response[{STATUS_CODE}] == {STATUS_CODE_BAD_REQUEST}, but got {result}"
+        assert 'No output file provided. Use the --output argument to provide an output file' in result[ERRORS], f"Unexpected errors: {result[ERRORS]}"
+
+    def test__streamed_results_are_not_mixed_with_the_summary(self, tmp_path, capsys):
+        input_path = tmp_path / 'messages.jsonl'
+        input_path.write_text('\n'.join(f'"{message}"' for message in [MESSAGE_1, MESSAGE_2, MESSAGE_3]), encoding='utf-8')
+
+        # Mock the artifacts and the spam_or_ham function
+        with patch('lambda_function.get_artifacts', return_value=(build_mock_model(), build_mock_vectorizer())):
+            with patch('lambda_function.spam_or_ham') as mock_spam_or_ham:
+                mock_spam_or_ham.return_value = {RESPONSES: {MESSAGE_1: HAM, MESSAGE_2: SPAM, MESSAGE_3: HAM}}
+                with patch('sys.argv', ['lambda_function.py', '--input', str(input_path), '--output', '-', '--workers', '1']):
+                    print_result(main())
+
+        captured = capsys.readouterr()
+        records = [json.loads(line) for line in captured.out.splitlines()]
+        assert [record['label'] for record in records] == [HAM, SPAM, HAM], f"Expected only result records on stdout, but got {records}"
+        summary = json.loads(captured.err)
+        assert summary['messages_classified'] == 3, f"Expected the summary on stderr, but got {captured.err}"
+
+    def test__main_routes_input_to_bulk(self):
+        # Mock the argument parser to return a namespace with an input file and no event
+        with patch('lambda_function.argparse.ArgumentParser') as mock_argparse:
+            mock_args = MagicMock()
+            mock_argparse.return_value.parse_args.return_value = mock_args
+            mock_args.event = None
+
+            with patch('lambda_function.classify_bulk') as mock_classify_bulk:
+                result = main()
+                assert result is mock_classify_bulk.return_value, f"Expected the bulk result, but got {result}"
+                mock_classify_bulk.assert_called_once_with(mock_args.input, mock_args.output, mock_args.chunk_size,
+                                                           mock_args.encoding, mock_args.column, mock_args.workers)
+
+
+
+class Counting_Tokenizer:
+    # Splits the words and counts the messages it tokenizes
+
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize(self, text):
+        self.calls += 1
+        return re.findall(r'\w+', text)
+
+
+class Tests__Model_Registry:
+
+    def build_artifacts(self, tokenizer, spam_term):
+        # Fit a vectorizer with the tokenizer, and mock a model that classifies messages containing spam_term as spam
+        text = pytest.importorskip('sklearn.feature_extraction.text')
+        vectorizer = text.TfidfVectorizer(tokenizer=tokenizer.tokenize, token_pattern=None).fit([MESSAGE_1, MESSAGE_2, MESSAGE_3])
+        column = vectorizer.vocabulary_[spam_term]
+
+        def predict(encoded, **kwargs):
+            spam = np.where(np.asarray(encoded[:, column].todense()).ravel() > 0, 0.9, 0.1)
+            return np.stack([1 - spam, spam], axis=1)
+
+        mock_model = build_mock_model(num_features=len(vectorizer.vocabulary_))
+        mock_model.supports_sparse = True
+        mock_model.predict.side_effect = predict
+        return mock_model, vectorizer
+
+    def test__registry_functions_are_valid(self):
+        mock_registry = MagicMock()
+        mock_registry.functions.return_value = [OTHER_FUNCTION_NAME]
+
+        with patch('lambda_function.get_registry', return_value=mock_registry):
+            result = event_is_valid({FUNCTION: OTHER_FUNCTION_NAME, MESSAGES: [MESSAGE_1]})
+            assert result is None, f"Expected the registry's function to be valid, but got {result}"
+
+            result = event_is_valid({FUNCTION: [FUNCTION_NAME, OTHER_FUNCTION_NAME], MESSAGES: [MESSAGE_1]})
+            assert result is None, f"Expected a list of supported functions to be valid, but got {result}"
+
+    @pytest.mark.parametrize('function, error', [
+        ([], 'Function field must contain at least one function name'),
+        ([FUNCTION_NAME, BAD_MESSAGE], 'Function field contains an invalid function name; all function names must be strings'),
+        ([FUNCTION_NAME, INVALID_FUNCTION_NAME], f'Invalid function name: {INVALID_FUNCTION_NAME}')
+    ])
+    def test__invalid_function_lists(self, function, error):
+        result = event_is_valid({FUNCTION: function, MESSAGES: [MESSAGE_1]})
+        assert result is not None and error in result[ERRORS], f"Expected '{error}', but got {result}"
+
+    def test__probabilities_require_a_single_function(self):
+        event = {FUNCTION: [FUNCTION_NAME], MESSAGES: [MESSAGE_1], RESPONSE_FORMAT: 'codes', PROBABILITIES: True}
+        result = event_is_valid(event)
+        assert result is not None and 'Probabilities field requires a single function' in result[ERRORS], f"Unexpected result: {result}"
+
+    def test__registry_version_serves_the_function(self):
+        mock_model, vectorizer = self.build_artifacts(Counting_Tokenizer(), 'prize')
+        mock_registry = MagicMock()
+        mock_registry.functions.return_value = [OTHER_FUNCTION_NAME]
+        mock_registry.get.return_value.model = mock_model
+        mock_registry.get.return_value.vectorizer = vectorizer
+        mock_registry.get.return_value.cache_version = f'{OTHER_FUNCTION_NAME}/1'
+
+        with patch('lambda_function.get_registry', return_value=mock_registry):
+            with patch('lambda_function.get_artifacts') as mock_get_artifacts:
+                result = lambda_handler({FUNCTION: OTHER_FUNCTION_NAME, MESSAGES: [MESSAGE_1, MESSAGE_2]})
+
+        assert result[FUNCTION] == OTHER_FUNCTION_NAME, f"Expected response[{FUNCTION}] == {OTHER_FUNCTION_NAME}, but got {result}"
+        assert result[RESPONSES] == {MESSAGE_1: HAM, MESSAGE_2: SPAM}, f"Unexpected responses: {result}"
+        assert mock_get_artifacts.call_count == 0, "Expected the built-in artifacts not to be loaded"
+
+    @pytest.mark.parametrize('function, dimension', [
+        (OTHER_FUNCTION_NAME, OTHER_FUNCTION_NAME),
+        ([FUNCTION_NAME, OTHER_FUNCTION_NAME], f'{FUNCTION_NAME},{OTHER_FUNCTION_NAME}')
+    ])
+    def test__metrics_are_filed_under_the_called_functions(self, function, dimension, capsys):
+        tokenizer = Counting_Tokenizer()
+        artifacts = {FUNCTION_NAME: self.build_artifacts(tokenizer, 'prize'),
+                     OTHER_FUNCTION_NAME: self.build_artifacts(tokenizer, 'job')}
+
+        def get_function_artifacts(function_name):
+            return (*artifacts[function_name], function_name)
+
+        mock_registry = MagicMock()
+        mock_registry.functions.return_value = [OTHER_FUNCTION_NAME]
+
+        with patch('lambda_function.METRICS_ENABLED', True), patch('lambda_function.get_registry', return_value=mock_registry):
+            with patch('lambda_function.get_function_artifacts', side_effect=get_function_artifacts):
+                result = lambda_handler({FUNCTION: function, MESSAGES: [MESSAGE_1, MESSAGE_3]})
+
+        record = json.loads(capsys.readouterr().out.splitlines()[-1])
+        assert result[STATUS_CODE] == STATUS_CODE_SUCCESS, f"Expected response[{STATUS_CODE}] == {STATUS_CODE_SUCCESS}, but got {result}"
+        assert record['function'] == dimension, f"Expected the metrics under {dimension}, but got {record['function']}"
+        assert record['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['function']], f"Unexpected dimensions: {record['_aws']}"
+
+    def test__functions_share_one_tokenization_pass(self):
+        tokenizer = Counting_Tokenizer()
+        artifacts = {FUNCTION_NAME: self.build_artifacts(tokenizer, 'prize'),
+                     OTHER_FUNCTION_NAME: self.build_artifacts(tokenizer, 'job')}
+        tokenizer.calls = 0
+
+        def get_function_artifacts(function_name):
+            return (*artifacts[function_name], function_name)
+
+        mock_registry = MagicMock()
+        mock_registry.functions.return_value = [OTHER_FUNCTION_NAME]
+        event = {FUNCTION: [FUNCTION_NAME, OTHER_FUNCTION_NAME], MESSAGES: [MESSAGE_1, MESSAGE_2, MESSAGE_3, MESSAGE_1]}
+
+        with patch('lambda_function.get_registry', return_value=mock_registry):
+            with patch('lambda_function.get_function_artifacts', side_effect=get_function_artifacts):
+                result = lambda_handler(event)
+
+        expected = {FUNCTION_NAME: {MESSAGE_1: HAM, MESSAGE_2: SPAM, MESSAGE_3: HAM},
+                    OTHER_FUNCTION_NAME: {MESSAGE_1: HAM, MESSAGE_2: HAM, MESSAGE_3: SPAM}}
+        assert result[STATUS_CODE] == STATUS_CODE_SUCCESS, f"Expected response[{STATUS_CODE}] == {STATUS_CODE_SUCCESS}, but got {result}"
+        assert result[RESPONSES] == expected, f"Expected {expected}, but got {result[RESPONSES]}"
+        assert tokenizer.calls == 3, f"Expected each distinct message to be tokenized once, but got {tokenizer.calls} calls"
+
+    def test__tokenizations_only_cover_their_functions_messages(self):
+        tokenizer = Counting_Tokenizer()
+        other_tokenizer = Counting_Tokenizer()
+        artifacts = {FUNCTION_NAME: self.build_artifacts(tokenizer, 'prize'),
+                     OTHER_FUNCTION_NAME: self.build_artifacts(other_tokenizer, 'job')}
+
+        def get_function_artifacts(function_name):
+            return (*artifacts[function_name], function_name)
+
+        mock_registry = MagicMock()
+        mock_registry.functions.return_value = [OTHER_FUNCTION_NAME]
+        event = {FUNCTION: [FUNCTION_NAME, OTHER_FUNCTION_NAME], MESSAGES: [MESSAGE_1, MESSAGE_2, MESSAGE_3]}
+
+        with patch('lambda_function.get_registry', return_value=mock_registry):
+            with patch('lambda_function.get_function_artifacts', side_effect=get_function_artifacts):
+                # Cache the other function's predictions of MESSAGE_1 and MESSAGE_2, so only MESSAGE_3 is new to it
+                lambda_handler({FUNCTION: OTHER_FUNCTION_NAME, MESSAGES: [MESSAGE_1, MESSAGE_2]})
+                tokenizer.calls = other_tokenizer.calls = 0
+                result = lambda_handler(event)
+
+        assert result[RESPONSES][OTHER_FUNCTION_NAME] == {MESSAGE_1: HAM, MESSAGE_2: HAM, MESSAGE_3: SPAM}, f"Unexpected responses: {result}"
+        assert tokenizer.calls == 3, f"Expected every message to be tokenized for the first function, but got {tokenizer.calls} calls"
+        assert other_tokenizer.calls == 1, f"Expected only MESSAGE_3 to be tokenized for the other function, but got {other_tokenizer.calls} calls"
+
+
 # To run the tests, simply execute `pytest` in the terminal
 if __name__ == "__main__":
     pytest.main()
+
+
+class Tests__Near_Duplicate_Index:
+
+    def build_artifacts(self):
+        # Fit a vectorizer on the messages, and mock a model that classifies messages mentioning a prize as spam
+        text = pytest.importorskip('sklearn.feature_extraction.text')
+        vectorizer = text.TfidfVectorizer().fit([MESSAGE_1, MESSAGE_2, MESSAGE_3, CAMPAIGN])
+        column = vectorizer.vocabulary_['prize']
+
+        def predict(encoded, **kwargs):
+            spam = np.where(np.asarray(encoded)[:, column] > 0, 0.9, 0.1)
+            return np.stack([1 - spam, spam], axis=1)
+
+        mock_model = build_mock_model(num_features=len(vectorizer.vocabulary_))
+        mock_model.predict.side_effect = predict
+        return mock_model, vectorizer
+
+    def test__variants_of_recent_spam_skip_the_model(self):
+        mock_model, vectorizer = self.build_artifacts()
+
+        with patch('lambda_function._near_duplicate_index', Near_Duplicate_Index(threshold=0.7)):
+            with patch('lambda_function.get_artifacts', return_value=(mock_model, vectorizer)):
+                first = lambda_handler({FUNCTION: FUNCTION_NAME, MESSAGES: [CAMPAIGN, MESSAGE_1]})
+                calls = mock_model.predict.call_count
+                second = lambda_handler({FUNCTION: FUNCTION_NAME, MESSAGES: [CAMPAIGN_VARIANT], METRICS: True})
+                stats = get_cache_stats()['near_duplicate_index']
+
+        assert first[RESPONSES] == {CAMPAIGN: SPAM, MESSAGE_1: HAM}, f"Unexpected responses: {first}"
+        assert second[RESPONSES] == {CAMPAIGN_VARIANT: SPAM}, f"Expected the variant to be spam, but got {second}"
+        assert mock_model.predict.call_count == calls, "Expected the variant to be labeled without the model"
+        assert second[METRICS]['near_duplicate_hits'] == 1, f"Expected a near-duplicate hit, but got {second[METRICS]}"
+        assert stats['hits'] == 1 and stats['size'] == 1, f"Expected only the spam to be indexed, but got {stats}"
+
+    def test__index_is_disabled_by_default(self):
+        mock_model, vectorizer = self.build_artifacts()
+
+        with patch('lambda_function.get_artifacts', return_value=(mock_model, vectorizer)):
+            lambda_handler({FUNCTION: FUNCTION_NAME, MESSAGES: [CAMPAIGN]})
+            calls = mock_model.predict.call_count
+            result = lambda_handler({FUNCTION: FUNCTION_NAME, MESSAGES: [CAMPAIGN_VARIANT]})
+
+        assert result[RESPONSES] == {CAMPAIGN_VARIANT: SPAM}, f"Unexpected responses: {result}"
+        assert mock_model.predict.call_count == calls + 1, "Expected the variant to be classified by the model"
+        assert 'near_duplicate_index' not in get_cache_stats(), "Expected no near-duplicate statistics"
+
+    def test__classify_many_uses_the_index(self):
+        mock_model, vectorizer = self.build_artifacts()
+
+        with patch('lambda_function._near_duplicate_index', Near_Duplicate_Index(threshold=0.7)):
+            with patch('lambda_function.get_artifacts', return_value=(mock_model, vectorizer)):
+                classify_many([CAMPAIGN])
+                calls = mock_model.predict.call_count
+                result = classify_many([CAMPAIGN_VARIANT])
+
+        assert result == {CAMPAIGN_VARIANT: SPAM}, f"Expected the variant to be spam, but got {result}"
+        assert mock_model.predict.call_count == calls, "Expected the variant to be labeled without the model"
@@ -0,0 +1,193 @@
+# This module implements unit tests for the open-loop load generator in the Resources/LoadGenerator.py module.
+''' Implements tests for the open-loop load generator. '''
+
+# Import the required libraries
+import time
+import asyncio
+import numpy as np
+import pytest
+from Resources.LoadGenerator import parse_batch_sizes, arrival_offsets, Message_Replayer, Handler_Target, Http_Target
+from Resources.LoadGenerator import run_load, summarize_run, sustainable_rate
+from Resources.BatchingServer import Micro_Batcher, Batching_Server
+
+# Define the test constants
+MESSAGES = ['Hello, how are you?', 'Congratulations, you have won a prize!', 'You have been selected for a job interview.']
+SUCCESS = {'status_code': 200}
+BAD_REQUEST = {'status_code': 400}
+RATE = 40.0
+DURATION = 0.5
+SERVICE_SECONDS = 0.05      # Slower than the arrivals at RATE, so requests queue
+
+
+def classify(messages):
+    # Classify every message as ham
+    return {message: 'ham' for message in messages}
+
+
+class Tests__Schedule:
+
+    def test__parse_batch_sizes(self):
+        sizes, probabilities = parse_batch_sizes('1:3,10:1')
+        assert sizes == [1, 10], f"Expected sizes [1, 10], but got {sizes}"
+        assert probabilities == [0.75, 0.25], f"Expected probabilities [0.75, 0.25], but got {probabilities}"
+
+        sizes, probabilities = parse_batch_sizes('5')
+        assert (sizes, probabilities) == ([5], [1.0]), f"Expected a single size, but got {sizes}, {probabilities}"
+
+    @pytest.mark.parametrize('spec', ['0', '1:0', 'a', '1:x', '1,'])
+    def test__invalid_batch_sizes(self, spec):
+        with pytest.raises(ValueError):
+            parse_batch_sizes(spec)
+
+    def test__fixed_arrivals(self):
+        result = arrival_offsets(4, 1, 'fixed')
+        assert np.allclose(result, [0, 0.25, 0.5, 0.75]), f"Unexpected arrivals: {result}"
+
+    def test__poisson_arrivals(self):
+        result = arrival_offsets(1000, 10, 'poisson', np.random.default_rng(0))
+        assert np.all(np.diff(result) >= 0) and result[-1] < 10, "Expected increasing arrivals within the duration"
+        assert abs(len(result) - 10000) < 400, f"Expected about 10000 arrivals, but got {len(result)}"
+
+    @pytest.mark.parametrize('rate, duration, process', [(0, 1, 'fixed'), (1, 0, 'poisson'), (1, 1, 'bursty')])
+    def test__invalid_arrivals(self, rate, duration, process):
+        with pytest.raises(ValueError):
+            arrival_offsets(rate, duration, process)
+
+    def test__messages_are_replayed_in_order(self):
+        replayer = Message_Replayer(MESSAGES)
+
+        result = [replayer.next_batch(2), replayer.next_batch(5)]
+        expected = [MESSAGES[:2], [MESSAGES[2]] + MESSAGES + [MESSAGES[0]]]
+        assert result == expected, f"Expected {expected}, but got {result}"
+
+
+class Tests__Run_Load:
+
+    def test__every_scheduled_request_is_sent(self):
+        events = []
+
+        def handler(event):
+            events.append(event)
+            return SUCCESS if len(events) % 2 else BAD_REQUEST
+
+        results = asyncio.run(run_load(Handler_Target(handler), MESSAGES, RATE, DURATION, 'fixed', '2', interval=0.25))
+
+        assert results['requests'] == 20, f"Expected 20 requests, but got {results['requests']}"
+        assert len(events) == 20, f"Expected every request to be sent, but got {len(events)}"
+        assert all(len(event['messages']) == 2 for event in events), "Expected 2 messages per request"
+        assert results['completed'] == 10, f"Expected 10 successful requests, but got {results['completed']}"
+        assert results['errors'] == {'status_400': 10}, f"Unexpected errors: {results['errors']}"
+        assert results['error_rate'] == 0.5, f"Expected an error rate of 0.5, but got {results['error_rate']}"
+        assert len(results['intervals']) >= 2, f"Expected several intervals, but got {results['intervals']}"
+
+    def test__latency_includes_queueing(self):
+
+        def handler(event):
+            time.sleep(SERVICE_SECONDS)
+            return SUCCESS
+
+        results = asyncio.run(run_load(Handler_Target(handler), MESSAGES, RATE, DURATION, 'fixed'))
+
+        # 20 requests arrive in 0.5 s, but one thread serves them in 1 s, so the last waits about 0.5 s
+        assert results['latency_ms']['max'] > 400, f"Expected requests to queue, but got {results['latency_ms']}"
+        assert results['latency_ms']['p50'] > SERVICE_SECONDS * 1000, f"Unexpected latency: {results['latency_ms']}"
+        assert results['throughput']['requests_per_second'] < RATE, f"Unexpected throughput: {results['throughput']}"
+
+    def test__arrivals_beyond_the_in_flight_limit_are_dropped(self):
+
+        def handler(event):
+            time.sleep(SERVICE_SECONDS)
+            return SUCCESS
+
+        results = asyncio.run(run_load(Handler_Target(handler), MESSAGES, RATE, DURATION, 'fixed', max_in_flight=2))
+
+        assert results['errors'].get('dropped', 0) > 0, f"Expected dropped requests, but got {results['errors']}"
+        assert results['completed'] + results['errors']['dropped'] == 20, f"Unexpected results: {results}"
+
+    def test__timeouts_and_exceptions_are_errors(self):
+
+        def handler(event):
+            if event['messages'] == [MESSAGES[0]]:
+                raise RuntimeError('failed')
+            time.sleep(SERVICE_SECONDS)
+            return SUCCESS
+
+        results = asyncio.run(run_load(Handler_Target(handler, threads=4), MESSAGES, 6, DURATION, 'fixed',
+                                       timeout=SERVICE_SECONDS / 5))
+        assert results['errors'] == {'RuntimeError': 1, 'timeout': 2}, f"Unexpected errors: {results['errors']}"
+
+    def test__http_target(self):
+
+        async def run():
+            server = Batching_Server(Micro_Batcher(classify, max_wait_ms=1), port=0)
+            await server.start()
+            target = Http_Target(f'http://127.0.0.1:{server.port}/')
+            results = await run_load(target, MESSAGES, RATE, DURATION, 'poisson', '1:0.5,3:0.5')
+            await target.close()
+            await server.stop()
+            return results
+
+        results = asyncio.run(run())
+        assert results['requests'] > 0, f"Expected requests to be scheduled, but got {results}"
+        assert results['completed'] == results['requests'], f"Expected every request to succeed, but got {results['errors']}"
+
+    @pytest.mark.parametrize('status, headers', [
+        (200, 'Connection: close\r\n'),
+        (400, ''),
+        (413, ''),
+    ])
+    def test__closed_connections_are_not_reused(self, status, headers):
+        connections = []
+
+        async def respond_and_close(reader, writer):
+            # Answer a single request, then close the connection
+            connections.append(writer)
+            await reader.readuntil(b'\r\n\r\n')
+            writer.write(f'HTTP/1.1 {status} Status\r\n{headers}Content-Length: 2\r\n\r\n{{}}'.encode('latin-1'))
+            await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(respond_and_close, '127.0.0.1', 0)
+            target = Http_Target(f'http://127.0.0.1:{server.sockets[0].getsockname()[1]}/')
+            results = [await target.send(SUCCESS) for _ in range(3)]
+            idle = len(target._idle)
+            await target.close()
+            server.close()
+            await server.wait_closed()
+            return results, idle
+
+        results, idle = asyncio.run(run())
+        expected = None if status == 200 else f'http_{status}'
+        assert results == [expected] * 3, f"Expected every request to get a response, but got {results}"
+        assert len(connections) == 3 and idle == 0, f"Expected a new connection per request, but got {len(connections)} ({idle} idle)"
+
+    def test__invalid_url(self):
+        with pytest.raises(ValueError):
+            Http_Target('https://example.com/')
+
+
+class Tests__Summary:
+
+    def test__intervals_by_finish_time(self):
+        records = [(0.1, 10.0, 1, None), (0.2, 30.0, 2, None), (1.5, 50.0, 1, 'timeout')]
+
+        results = summarize_run(records, requests=4, dropped=1, duration=2.0)
+
+        assert results['completed'] == 2, f"Expected 2 completed requests, but got {results['completed']}"
+        assert results['errors'] == {'timeout': 1, 'dropped': 1}, f"Unexpected errors: {results['errors']}"
+        assert results['error_rate'] == 0.5, f"Expected an error rate of 0.5, but got {results['error_rate']}"
+        assert results['throughput']['messages_per_second'] == 1.5, f"Unexpected throughput: {results['throughput']}"
+
+        first, second = results['intervals']
+        assert first['completed'] == 2 and first['latency_ms']['max'] == 30.0, f"Unexpected interval: {first}"
+        assert second['completed'] == 0 and second['latency_ms'] is None, f"Unexpected interval: {second}"
+        assert second['errors'] == {'timeout': 1}, f"Unexpected interval: {second}"
+
+    def test__sustainable_rate(self):
+        sweep = [{'rate': rate, 'latency_ms': {'p99': p99}, 'error_rate': error_rate}
+                 for rate, p99, error_rate in [(200, 80.0, 0.0), (100, 20.0, 0.0), (400, 90.0, 0.05), (800, 50.0, 0.0)]]
+
+        result = sustainable_rate(sweep, slo_ms=100)
+        assert result == 200, f"Expected 200 requests per second, but got {result}"
+        assert sustainable_rate(sweep, slo_ms=10) is None, "Expected no rate within 10 ms"
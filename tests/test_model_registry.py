@@ -0,0 +1,176 @@
+# This module implements unit tests for the model registry in the Resources/ModelRegistry.py module.
+''' Implements tests for the model registry. '''
+
+# Import the required libraries
+import os
+import time
+import pickle
+import pytest
+import numpy as np
+from sklearn.feature_extraction.text import TfidfVectorizer
+from Resources.NumpyModel import Numpy_Model
+from Resources.ModelRegistry import Model_Registry, Model_Version, load_version, version_key, tokenization_key, \
+    restart_watchers
+
+# Define the test constants
+FUNCTION_NAME = 'spam_or_ham'
+OTHER_FUNCTION_NAME = 'sms_spam'
+TRAINING_MESSAGES = ['win a free prize', 'see you at lunch', 'free cash now']
+FAILED_VERSIONS = 'failed_versions'
+POLL_SECONDS = 0.01
+TIMEOUT_SECONDS = 5
+
+
+class Split_Tokenizer:
+    # Stands in for Custom_Tokenizer, which needs the NLTK data
+    engine = 'split'
+
+    def custom_tokenizer(self, text):
+        return text.split()
+
+
+def publish(registry_path, function, version, ready=True):
+    # Write a version directory with a small model and pickled vectorizer
+    path = registry_path / function / version
+    path.mkdir(parents=True)
+    vectorizer = TfidfVectorizer(tokenizer=str.split, token_pattern=None).fit(TRAINING_MESSAGES)
+    with open(path / 'vectorizer.pkl', 'wb') as file:
+        pickle.dump(vectorizer, file)
+    Numpy_Model([np.ones((len(vectorizer.vocabulary_), 2))], [np.zeros(2)], ['softmax']).save(str(path / 'model.npz'))
+    if ready:
+        (path / 'READY').touch()
+    return path
+
+
+def fake_loader(function, version, path, tokenizer_for):
+    # Load nothing, failing for versions named 'broken'
+    if version == 'broken':
+        raise ValueError('Broken version')
+    return Model_Version(function, version, path, None, None)
+
+
+class Tests__Versions:
+
+    def test__natural_order(self):
+        versions = ['10', '2', '1', '2024-01-10', '2024-01-02']
+        result = sorted(versions, key=version_key)
+        assert result == ['1', '2', '10', '2024-01-02', '2024-01-10'], f"Unexpected order: {result}"
+
+    def test__latest_ready_version(self, tmp_path):
+        for version in ['1', '2', '10']:
+            (tmp_path / FUNCTION_NAME / version).mkdir(parents=True)
+            (tmp_path / FUNCTION_NAME / version / 'READY').touch()
+        (tmp_path / FUNCTION_NAME / '11').mkdir()     # Still being written
+        (tmp_path / OTHER_FUNCTION_NAME).mkdir()       # No versions yet
+
+        result = Model_Registry(str(tmp_path)).latest_versions()
+        assert result == {FUNCTION_NAME: '10'}, f"Expected {{'{FUNCTION_NAME}': '10'}}, but got {result}"
+
+    def test__missing_directory(self, tmp_path):
+        result = Model_Registry(str(tmp_path / 'missing')).latest_versions()
+        assert result == {}, f"Expected no versions, but got {result}"
+
+
+class Tests__Refresh:
+
+    def test__swaps_in_new_versions(self, tmp_path):
+        (tmp_path / FUNCTION_NAME / '1').mkdir(parents=True)
+        (tmp_path / FUNCTION_NAME / '1' / 'READY').touch()
+        registry = Model_Registry(str(tmp_path), loader=fake_loader)
+
+        assert registry.refresh() == [(FUNCTION_NAME, '1')], "Expected the first version to be loaded"
+        in_flight = registry.get(FUNCTION_NAME)
+
+        (tmp_path / FUNCTION_NAME / '2').mkdir()
+        (tmp_path / FUNCTION_NAME / '2' / 'READY').touch()
+        assert registry.refresh() == [(FUNCTION_NAME, '2')], "Expected the new version to be swapped in"
+        assert registry.refresh() == [], "Expected nothing to be swapped in without a new version"
+
+        assert registry.get(FUNCTION_NAME).version == '2', f"Expected version 2, but got {registry.get(FUNCTION_NAME).version}"
+        assert in_flight.version == '1', "Expected a version held by a request to stay intact"
+        assert registry.stats()[FUNCTION_NAME]['swaps'] == 2, f"Unexpected statistics: {registry.stats()}"
+
+    def test__failed_version_keeps_the_previous_one(self, tmp_path):
+        for version in ['1', 'broken']:
+            (tmp_path / FUNCTION_NAME / version).mkdir(parents=True)
+            (tmp_path / FUNCTION_NAME / version / 'READY').touch()
+        registry = Model_Registry(str(tmp_path), loader=fake_loader)
+        registry._versions = {FUNCTION_NAME: Model_Version(FUNCTION_NAME, '1', None, None, None)}
+
+        assert registry.refresh() == [], "Expected the broken version not to be swapped in"
+        assert registry.get(FUNCTION_NAME).version == '1', "Expected the previous version to keep serving"
+        assert registry.stats()[FAILED_VERSIONS] == {f'{FUNCTION_NAME}/broken': 'Broken version'}, f"Unexpected statistics: {registry.stats()}"
+
+    def test__watcher_swaps_in_the_background(self, tmp_path):
+        registry = Model_Registry(str(tmp_path), poll_seconds=POLL_SECONDS, loader=fake_loader)
+        registry.start()
+        try:
+            (tmp_path / FUNCTION_NAME / '1').mkdir(parents=True)
+            (tmp_path / FUNCTION_NAME / '1' / 'READY').touch()
+
+            deadline = time.monotonic() + TIMEOUT_SECONDS
+            while registry.get(FUNCTION_NAME) is None and time.monotonic() < deadline:
+                time.sleep(POLL_SECONDS)
+        finally:
+            registry.stop()
+
+        assert registry.get(FUNCTION_NAME) is not None, "Expected the watcher to load the new version"
+
+
+    @pytest.mark.skipif(not hasattr(os, 'fork'), reason='Requires os.fork')
+    def test__forked_children_only_watch_after_restarting(self, tmp_path):
+        registry = Model_Registry(str(tmp_path), poll_seconds=POLL_SECONDS, loader=fake_loader)
+        registry.start()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                # Child: the watcher thread did not survive the fork until it is restarted explicitly
+                watching = registry._thread.is_alive()
+                restart_watchers()
+                os._exit(0 if not watching and registry._thread.is_alive() else 1)
+            _, status = os.waitpid(pid, 0)
+        finally:
+            registry.stop()
+
+        assert os.waitstatus_to_exitcode(status) == 0, "Expected the watcher to run in the child only once restarted"
+
+
+class Tests__Load_Version:
+
+    def test__loads_and_shares_the_tokenizer(self, tmp_path):
+        tokenizer = Split_Tokenizer()
+        registry = Model_Registry(str(tmp_path), tokenizers={Split_Tokenizer.engine: tokenizer})
+        publish(tmp_path, FUNCTION_NAME, '1')
+        publish(tmp_path, OTHER_FUNCTION_NAME, '1')
+
+        # The pickled vectorizers use str.split, so they fall back to the default engine's tokenizer
+        loaded = [load_version(function, '1', str(tmp_path / function / '1'), lambda engine: tokenizer)
+                  for function in (FUNCTION_NAME, OTHER_FUNCTION_NAME)]
+
+        keys = {tokenization_key(version.vectorizer) for version in loaded}
+        assert len(keys) == 1, f"Expected both functions to tokenize the same way, but got {keys}"
+        assert loaded[0].vectorizer.transform(['free prize']).nnz == 2, "Expected the loaded vectorizer to encode messages"
+        assert registry.tokenizer_for(Split_Tokenizer.engine) is tokenizer, "Expected the registry to share the given tokenizer"
+
+    @pytest.mark.parametrize('settings', [
+        {'analyzer': 'char'},
+        {'preprocessor': str.upper},
+        {'tokenizer': None, 'token_pattern': r'(?u)\b\w+\b'},
+    ])
+    def test__settings_that_change_the_tokens_change_the_key(self, settings):
+        tokenizer = Split_Tokenizer().custom_tokenizer
+        vectorizer = TfidfVectorizer(tokenizer=tokenizer, token_pattern=None)
+        other = TfidfVectorizer(**{'tokenizer': tokenizer, 'token_pattern': None, **settings})
+
+        assert tokenization_key(vectorizer) != tokenization_key(other), f"Expected {settings} to change the key"
+        assert tokenization_key(vectorizer) == tokenization_key(TfidfVectorizer(tokenizer=tokenizer)), \
+            "Expected the token pattern to be ignored when there is a tokenizer"
+
+    def test__missing_model(self, tmp_path):
+        path = publish(tmp_path, FUNCTION_NAME, '1')
+        (path / 'model.npz').unlink()
+
+        registry = Model_Registry(str(tmp_path), tokenizers={'nltk': Split_Tokenizer(), 'regex': Split_Tokenizer()})
+        registry.refresh()
+        errors = registry.stats()[FAILED_VERSIONS]
+        assert errors == {f'{FUNCTION_NAME}/1': f'No model found in {path}'}, f"Unexpected errors: {errors}"
@@ -0,0 +1,138 @@
+# This module implements unit tests for the Near_Duplicate_Index class in the Resources/NearDuplicateIndex.py module.
+''' Implements tests for the near-duplicate spam index. '''
+
+# Import the required libraries
+import numpy as np
+import pytest
+from Resources.NearDuplicateIndex import Near_Duplicate_Index, evaluate_index, normalize
+
+# Define the test constants
+SPAM = 'spam'
+HAM = 'ham'
+CAMPAIGN_1 = 'WINNER!! As a valued network customer you have been selected to receive a £900 prize reward! To claim call 09061701461.'
+VARIANT_1 = 'WINNER!!  As a valued network customer you have been selected to receive a £800 prize reward! To claim call 09061701999.'
+CAMPAIGN_2 = 'URGENT! Your mobile number has been awarded a 2000 bonus caller prize. Call 09058095201 from a landline now.'
+VARIANT_2 = 'urgent! your mobile number has been awarded a 2000 bonus caller prize. call 09058095107 from a landline now'
+UNRELATED = 'Hey, are we still meeting for lunch tomorrow at the usual place? Let me know when you leave.'
+SHORT_MESSAGE = 'Call me'
+VERSION_1 = 'model_v1'
+VERSION_2 = 'model_v2'
+HITS = 'hits'
+MISSES = 'misses'
+SKIPPED = 'skipped'
+SIZE = 'size'
+EVICTIONS = 'evictions'
+
+
+def jaccard(first, second, shingle_size=5):
+    # Compute the exact Jaccard similarity of the shingles of two messages
+    first, second = normalize(first), normalize(second)
+    first = {first[i:i + shingle_size] for i in range(len(first) - shingle_size + 1)}
+    second = {second[i:i + shingle_size] for i in range(len(second) - shingle_size + 1)}
+    return len(first & second) / len(first | second)
+
+
+class Tests__Signatures:
+
+    def test__batched_signatures_match_single_signatures(self):
+        index = Near_Duplicate_Index()
+        messages = [CAMPAIGN_1, SHORT_MESSAGE, VARIANT_1, UNRELATED, CAMPAIGN_2]
+
+        result = index.signatures(messages)
+        assert result[1] is None, f"Expected no signature for a short message, but got {result[1]}"
+        for message, signature in zip(messages, result):
+            if signature is not None:
+                assert np.array_equal(signature, index.signature(message)), f"Expected the same signature for {message!r}"
+
+    def test__signature_estimates_the_jaccard_similarity(self):
+        index = Near_Duplicate_Index(num_permutations=256, num_bands=64)
+
+        for first, second in [(CAMPAIGN_1, VARIANT_1), (CAMPAIGN_2, VARIANT_2), (CAMPAIGN_1, UNRELATED)]:
+            estimate = np.mean(index.signature(first) == index.signature(second))
+            expected = jaccard(first, second)
+            assert abs(estimate - expected) < 0.1, f"Expected an estimate close to {expected}, but got {estimate}"
+
+    @pytest.mark.parametrize('arguments', [{'threshold': 0}, {'threshold': 1.5}, {'num_bands': 7}, {'shingle_size': 9}])
+    def test__invalid_settings(self, arguments):
+        with pytest.raises(ValueError):
+            Near_Duplicate_Index(**arguments)
+
+
+class Tests__Near_Duplicate_Index:
+
+    def test__variants_of_indexed_spam_match(self):
+        index = Near_Duplicate_Index(max_size=10, threshold=0.7)
+        index.put_many([CAMPAIGN_1, CAMPAIGN_2])
+
+        result = index.get_many([VARIANT_1, VARIANT_2, UNRELATED, SHORT_MESSAGE])
+        assert result == {VARIANT_1: SPAM, VARIANT_2: SPAM}, f"Expected the variants to match, but got {result}"
+
+        stats = index.stats()
+        assert (stats[HITS], stats[MISSES], stats[SKIPPED]) == (2, 1, 1), f"Unexpected stats: {stats}"
+
+    def test__threshold(self):
+        similarity = jaccard(CAMPAIGN_1, VARIANT_1)
+        strict = Near_Duplicate_Index(threshold=min(similarity + 0.15, 1.0))
+        strict.put_many([CAMPAIGN_1])
+
+        result = strict.get_many([VARIANT_1, CAMPAIGN_1])
+        assert result == {CAMPAIGN_1: SPAM}, f"Expected only the identical message to match, but got {result}"
+
+    def test__versions_are_separate(self):
+        index = Near_Duplicate_Index(threshold=0.7)
+        index.put_many([CAMPAIGN_1], VERSION_1)
+
+        assert index.get_many([VARIANT_1], VERSION_2) == {}, "Expected no match for another version"
+        assert index.get_many([VARIANT_1], VERSION_1) == {VARIANT_1: SPAM}, "Expected a match for the same version"
+
+    def test__least_recently_used_is_evicted(self):
+        index = Near_Duplicate_Index(max_size=2, threshold=0.7)
+        index.put_many([CAMPAIGN_1, CAMPAIGN_2])
+        index.get_many([VARIANT_1])         # CAMPAIGN_1 is now the most recently used
+        index.put_many([UNRELATED])
+
+        result = index.get_many([VARIANT_1, VARIANT_2])
+        assert result == {VARIANT_1: SPAM}, f"Expected CAMPAIGN_2 to be evicted, but got {result}"
+
+        stats = index.stats()
+        assert stats[SIZE] == 2 and stats[EVICTIONS] == 1, f"Unexpected stats: {stats}"
+        assert sum(len(keys) for band in index._bands for keys in band.values()) == 2 * index.num_bands, \
+            "Expected the evicted signature to be removed from every band"
+
+    def test__disabled_index(self):
+        index = Near_Duplicate_Index(max_size=0)
+        index.put_many([CAMPAIGN_1])
+
+        assert index.get_many([CAMPAIGN_1]) == {}, "Expected a disabled index to never match"
+
+    def test__clear(self):
+        index = Near_Duplicate_Index()
+        index.put_many([CAMPAIGN_1])
+        index.get_many([CAMPAIGN_1])
+        index.clear()
+
+        assert index.get_many([CAMPAIGN_1]) == {}, "Expected the index to be empty"
+        stats = index.stats()
+        assert stats[HITS] == 0 and stats[SIZE] == 0, f"Expected the statistics to be reset, but got {stats}"
+
+
+class Tests__Evaluate_Index:
+
+    def test__report(self):
+        messages = [CAMPAIGN_1, UNRELATED, VARIANT_1, CAMPAIGN_2, VARIANT_2]
+        labels = [SPAM, HAM, SPAM, SPAM, SPAM]
+
+        report, = evaluate_index(messages, labels, thresholds=[0.7])
+        assert report['index_labeled'] == 2, f"Expected both variants to be labeled by the index, but got {report}"
+        assert report['index_precision'] == 1.0, f"Expected no false positives, but got {report}"
+        assert report['spam_recall'] == 0.5, f"Expected half of the spam to be caught, but got {report}"
+        assert report['accuracy'] == 1.0, f"Expected every message to be labeled correctly, but got {report}"
+
+    def test__false_positives_are_reported(self):
+        messages = [CAMPAIGN_1, VARIANT_1]
+        labels = [SPAM, HAM]
+
+        report, = evaluate_index(messages, labels, thresholds=[0.7])
+        assert report['false_positives'] == [VARIANT_1], f"Expected the variant as a false positive, but got {report}"
+        assert report['index_precision'] == 0.0, f"Expected a precision of 0, but got {report}"
+        assert report['accuracy'] == 0.5, f"Expected an accuracy of 0.5, but got {report}"
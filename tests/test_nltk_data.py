@@ -0,0 +1,151 @@
+# This module implements unit tests for the NLTK data resolver in the Resources/NltkData.py module.
+''' Implements tests for the NLTK data resolver. '''
+
+# Import the required libraries
+import os
+import zipfile
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+import Resources.NltkData as NltkData
+from Resources.NltkData import require_packages, load_packages, vendor_packages, configure_data_path, Nltk_Data_Error
+
+# Define the test constants
+REQUIRED_PACKAGES = {
+    'punkt_tab': 'tokenizers/punkt_tab/english/',
+    'stopwords': 'corpora/stopwords',
+    'wordnet': 'corpora/wordnet'
+}
+
+
+def create_package(data_dir, resource):
+    # Create an (empty) NLTK package directory
+    os.makedirs(os.path.join(data_dir, resource), exist_ok=True)
+
+
+@pytest.fixture(autouse=True)
+def reset_resolver(tmp_path):
+    # Every test starts with an unconfigured resolver that only searches its own data directory
+    with patch.object(NltkData, 'NLTK_DATA_DIR', str(tmp_path)), \
+         patch.object(NltkData, '_configured', False), \
+         patch.object(NltkData, '_found_packages', set()), \
+         patch.object(NltkData, '_punkt_loaded', False), \
+         patch('Resources.NltkData.nltk.data.path', ['/nonexistent/nltk_data']):
+        yield
+
+
+class Tests__Require_Packages:
+
+    def test__all_packages_found(self, tmp_path):
+        for resource in REQUIRED_PACKAGES.values():
+            create_package(tmp_path, resource)
+
+        with patch('Resources.NltkData.nltk.download') as mock_download:
+            require_packages()
+            assert mock_download.call_count == 0, f"Expected no downloads, but got {mock_download.call_count}"
+
+    def test__missing_package_fails_fast(self, tmp_path):
+        create_package(tmp_path, REQUIRED_PACKAGES['punkt_tab'])
+        create_package(tmp_path, REQUIRED_PACKAGES['stopwords'])
+
+        with patch('Resources.NltkData.nltk.download') as mock_download:
+            with pytest.raises(Nltk_Data_Error, match='NLTK data not found: wordnet'):
+                require_packages()
+            assert mock_download.call_count == 0, f"Expected no downloads, but got {mock_download.call_count}"
+
+    def test__found_packages_are_not_looked_up_again(self, tmp_path):
+        for resource in REQUIRED_PACKAGES.values():
+            create_package(tmp_path, resource)
+
+        require_packages()
+        with patch('Resources.NltkData.nltk.data.find') as mock_find:
+            require_packages()
+            assert mock_find.call_count == 0, f"Expected no lookups, but got {mock_find.call_count}"
+
+    def test__bundled_directories_are_searched_first(self, tmp_path):
+        configure_data_path()
+
+        result = NltkData.nltk.data.path
+        assert result[:2] == [str(tmp_path), NltkData.LAMBDA_LAYER_DATA_DIR], f"Expected the bundled directories first, but got {result}"
+
+
+class Tests__Load_Packages:
+
+    def test__loads_once_across_threads(self):
+        # The corpora are passed in explicitly so that patch does not inspect (and load) the lazy corpora
+        mock_stopwords = MagicMock()
+        mock_wordnet = MagicMock()
+        start = threading.Barrier(8)
+
+        def load():
+            start.wait()
+            load_packages()
+
+        with patch.object(NltkData, '_loaded', False), \
+             patch('Resources.NltkData.require_packages') as mock_require_packages, \
+             patch('Resources.NltkData.nltk.word_tokenize') as mock_word_tokenize, \
+             patch('nltk.corpus.stopwords', new=mock_stopwords), \
+             patch('nltk.corpus.wordnet', new=mock_wordnet):
+            threads = [threading.Thread(target=load) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            assert mock_require_packages.call_count == 1, f"Expected 1 lookup, but got {mock_require_packages.call_count}"
+            assert mock_stopwords.ensure_loaded.call_count == 1, f"Expected the stopwords to be loaded once, but got {mock_stopwords.ensure_loaded.call_count}"
+            assert mock_wordnet.ensure_loaded.call_count == 1, f"Expected wordnet to be loaded once, but got {mock_wordnet.ensure_loaded.call_count}"
+            assert mock_word_tokenize.call_count == 1, f"Expected the tokenizer to be loaded once, but got {mock_word_tokenize.call_count}"
+
+    def test__missing_package_is_not_marked_loaded(self):
+        with patch.object(NltkData, '_loaded', False), \
+             patch('Resources.NltkData.require_packages', side_effect=Nltk_Data_Error('NLTK data not found: wordnet')):
+            with pytest.raises(Nltk_Data_Error, match='NLTK data not found: wordnet'):
+                load_packages()
+
+            assert NltkData._loaded is False, "Expected a failed load to be retried"
+
+
+    def test__punkt_is_optional(self, tmp_path):
+        create_package(tmp_path, REQUIRED_PACKAGES['stopwords'])
+        create_package(tmp_path, REQUIRED_PACKAGES['wordnet'])
+
+        with patch.object(NltkData, '_loaded', False), \
+             patch('Resources.NltkData.nltk.word_tokenize') as mock_word_tokenize, \
+             patch('nltk.corpus.stopwords', new=MagicMock()), \
+             patch('nltk.corpus.wordnet', new=MagicMock()):
+            load_packages(punkt=False)
+            assert mock_word_tokenize.call_count == 0, "Expected the Punkt tokenizer not to be loaded"
+
+            with pytest.raises(Nltk_Data_Error, match='NLTK data not found: punkt_tab'):
+                load_packages()
+            assert NltkData._loaded is True and NltkData._punkt_loaded is False, "Expected only the corpora to be loaded"
+
+
+class Tests__Vendor_Packages:
+
+    def test__downloads_and_extracts(self, tmp_path):
+        target_dir = tmp_path / 'bundle'
+
+        def fake_download(package, download_dir, **kwargs):
+            # Mimic the NLTK downloader, which leaves some packages zipped
+            corpora_dir = os.path.join(download_dir, 'corpora')
+            os.makedirs(corpora_dir, exist_ok=True)
+            with zipfile.ZipFile(os.path.join(corpora_dir, f'{package}.zip'), 'w') as file:
+                file.writestr(f'{package}/README', package)
+            return True
+
+        with patch('Resources.NltkData.nltk.download', side_effect=fake_download):
+            result = vendor_packages(str(target_dir), {'wordnet': 'corpora/wordnet'})
+
+        expected = os.path.join(str(target_dir), 'corpora', 'wordnet')
+        assert result == [expected], f"Expected {[expected]}, but got {result}"
+        assert os.path.isfile(os.path.join(expected, 'README')), "Expected the package to be extracted"
+        assert not os.path.exists(expected + '.zip'), "Expected the archive to be removed"
+
+    def test__download_failure(self, tmp_path):
+        with patch('Resources.NltkData.nltk.download') as mock_download:
+            mock_download.return_value = False
+
+            with pytest.raises(Nltk_Data_Error, match='Unable to download NLTK package: stopwords'):
+                vendor_packages(str(tmp_path), {'stopwords': 'corpora/stopwords'})
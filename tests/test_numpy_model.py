@@ -0,0 +1,181 @@
+# This module implements unit tests for the NumPy inference engine in the Resources/NumpyModel.py module.
+''' Implements tests for the NumPy inference engine. '''
+
+# Import the required libraries
+import pytest
+import numpy as np
+from scipy import sparse
+from Resources.NumpyModel import Numpy_Model, export_weights, check_parity, quantize_model, compare_accuracy
+
+# Define the test constants
+NUM_FEATURES = 6
+NUM_NODES = 4
+NUM_CLASSES = 2
+NUM_MESSAGES = 5
+RANDOM_STATE = 24
+MAX_ABS_DIFFERENCE = 'max_abs_difference'
+MISMATCHED_PREDICTIONS = 'mismatched_predictions'
+PARITY_OK = 'parity_ok'
+ACCURACY_DELTA = 'accuracy_delta'
+QUANTIZATION_TOLERANCE = {'int8': 0.05, 'float16': 0.005}
+
+
+def build_numpy_model():
+    # Build a model with random weights: one ReLU hidden layer and a softmax output layer
+    rng = np.random.default_rng(RANDOM_STATE)
+    kernels = [rng.normal(size=(NUM_FEATURES, NUM_NODES)), rng.normal(size=(NUM_NODES, NUM_CLASSES))]
+    biases = [rng.normal(size=NUM_NODES), rng.normal(size=NUM_CLASSES)]
+    return Numpy_Model(kernels, biases, ['relu', 'softmax'])
+
+
+def build_inputs():
+    # Build a batch of non-negative inputs, like TF-IDF encoded messages
+    rng = np.random.default_rng(RANDOM_STATE + 1)
+    return rng.random((NUM_MESSAGES, NUM_FEATURES)).astype(np.float32)
+
+
+class Tests__Numpy_Model:
+
+    def test__predict(self):
+        model = build_numpy_model()
+        inputs = build_inputs()
+
+        # Compute the expected output step by step
+        hidden = np.maximum(inputs @ model.kernels[0] + model.biases[0], 0)
+        logits = hidden @ model.kernels[1] + model.biases[1]
+        expected = np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)
+
+        result = model.predict(inputs)
+        assert result.shape == (NUM_MESSAGES, NUM_CLASSES), f"Expected shape {(NUM_MESSAGES, NUM_CLASSES)}, but got {result.shape}"
+        assert np.allclose(result, expected, atol=1e-6), f"Expected {expected}, but got {result}"
+        assert np.allclose(result.sum(axis=1), 1.0), f"Expected each row to sum to 1, but got {result.sum(axis=1)}"
+
+    def test__predict_sparse_matches_dense(self):
+        model = build_numpy_model()
+        inputs = build_inputs()
+
+        # Zero out most of the entries, like a TF-IDF encoding
+        inputs[inputs < 0.7] = 0
+        sparse_inputs = sparse.csr_matrix(inputs.astype(np.float64))
+
+        result = model.predict(sparse_inputs)
+        expected = model.predict(inputs)
+        assert isinstance(result, np.ndarray), f"Expected a dense result, but got {type(result)}"
+        assert np.allclose(result, expected, atol=1e-6), f"Expected {expected}, but got {result}"
+
+    def test__shapes(self):
+        model = build_numpy_model()
+
+        assert model.input_shape == (None, NUM_FEATURES), f"Expected input_shape == {(None, NUM_FEATURES)}, but got {model.input_shape}"
+        assert model.output_shape == (None, NUM_CLASSES), f"Expected output_shape == {(None, NUM_CLASSES)}, but got {model.output_shape}"
+
+    def test__save_and_load(self, tmp_path):
+        model = build_numpy_model()
+        weights_path = tmp_path / 'weights.npz'
+        np.savez(weights_path,
+                 kernel_0=model.kernels[0], bias_0=model.biases[0],
+                 kernel_1=model.kernels[1], bias_1=model.biases[1],
+                 activations=np.array(model.activations))
+
+        loaded = Numpy_Model.load(weights_path)
+        inputs = build_inputs()
+        assert np.array_equal(loaded.predict(inputs), model.predict(inputs)), "Expected the loaded model to match the original"
+
+    @pytest.mark.parametrize('mode', [None, 'int8'])
+    def test__save_and_load_mapped(self, tmp_path, mode):
+        model = build_numpy_model()
+        if mode is not None:
+            model = quantize_model(model, mode)
+        model.save_mapped(tmp_path / 'weights')
+
+        loaded = Numpy_Model.load(str(tmp_path / 'weights'))
+        inputs = build_inputs()
+        assert np.array_equal(loaded.predict(inputs), model.predict(inputs)), "Expected the loaded model to match the original"
+        for array in loaded.kernels + loaded.biases:
+            assert not array.flags.writeable, "Expected the weights to be read-only memory maps"
+            assert isinstance(array, np.memmap) or isinstance(array.base, np.memmap), f"Expected a memory map, but got {type(array)}"
+
+    def test__unsupported_activation(self):
+        with pytest.raises(ValueError, match='Unsupported activation function: tanh'):
+            Numpy_Model([np.zeros((1, 1))], [np.zeros(1)], ['tanh'])
+
+    def test__missing_layer_parts(self):
+        with pytest.raises(ValueError, match='Each layer requires a kernel, a bias and an activation'):
+            Numpy_Model([np.zeros((1, 1))], [], ['relu'])
+
+
+class Tests__Quantize_Model:
+
+    @pytest.mark.parametrize('mode', ['int8', 'float16'])
+    def test__predictions_stay_close(self, mode):
+        model = build_numpy_model()
+        quantized = quantize_model(model, mode)
+        inputs = build_inputs()
+
+        assert quantized.kernels[0].dtype == np.dtype(mode), f"Expected a {mode} first layer, but got {quantized.kernels[0].dtype}"
+        assert quantized.kernels[1].dtype == np.float32, f"Expected the output layer to stay float32, but got {quantized.kernels[1].dtype}"
+
+        difference = np.max(np.abs(quantized.predict(inputs) - model.predict(inputs)))
+        assert difference < QUANTIZATION_TOLERANCE[mode], f"Expected a difference below {QUANTIZATION_TOLERANCE[mode]}, but got {difference}"
+
+    @pytest.mark.parametrize('mode', ['int8', 'float16'])
+    def test__sparse_matches_dense(self, mode):
+        quantized = quantize_model(build_numpy_model(), mode)
+        inputs = build_inputs()
+        inputs[inputs < 0.7] = 0
+
+        result = quantized.predict(sparse.csr_matrix(inputs))
+        expected = quantized.predict(inputs)
+        assert np.allclose(result, expected, atol=1e-6), f"Expected {expected}, but got {result}"
+
+    def test__int8_kernel_dequantizes_per_column(self):
+        model = build_numpy_model()
+        quantized = quantize_model(model, 'int8')
+
+        dequantized = quantized.kernels[0].astype(np.float32) * quantized.scales[0]
+        max_error = np.max(np.abs(dequantized - model.kernels[0]), axis=0)
+        assert np.all(max_error <= quantized.scales[0] / 2 + 1e-7), f"Expected rounding errors of at most half a step, but got {max_error}"
+
+    def test__save_and_load(self, tmp_path):
+        quantized = quantize_model(build_numpy_model(), 'int8')
+        weights_path = tmp_path / 'weights.int8.npz'
+        quantized.save(weights_path)
+
+        loaded = Numpy_Model.load(weights_path)
+        inputs = build_inputs()
+        assert loaded.kernels[0].dtype == np.int8, f"Expected an int8 first layer, but got {loaded.kernels[0].dtype}"
+        assert np.array_equal(loaded.predict(inputs), quantized.predict(inputs)), "Expected the loaded model to match the quantized model"
+
+    def test__compare_accuracy(self):
+        model = build_numpy_model()
+        inputs = build_inputs()
+        labels = np.argmax(model.predict(inputs), axis=1)
+
+        result = compare_accuracy(model, model, inputs, labels)
+        assert result[ACCURACY_DELTA] == 0.0, f"Expected no accuracy change, but got {result}"
+        assert result[MISMATCHED_PREDICTIONS] == 0, f"Expected no mismatched predictions, but got {result}"
+
+    def test__unsupported_mode(self):
+        with pytest.raises(ValueError, match='Unsupported quantization mode: int4'):
+            quantize_model(build_numpy_model(), 'int4')
+
+
+class Tests__Export_Weights:
+
+    def test__parity_with_keras(self, tmp_path):
+        keras = pytest.importorskip('keras')
+
+        # Build and save a model with the same architecture as the Model Builder notebook
+        keras.utils.set_random_seed(RANDOM_STATE)
+        keras_model = keras.models.Sequential([
+            keras.Input(shape=(NUM_FEATURES,)),
+            keras.layers.Dense(NUM_NODES, name='Hidden-Layer-1', activation='relu'),
+            keras.layers.Dense(NUM_CLASSES, name='Output-Layer', activation='softmax')])
+        model_path = tmp_path / 'model.keras'
+        keras_model.save(model_path)
+
+        numpy_model = export_weights(str(model_path), str(tmp_path / 'model.npz'))
+        result = check_parity(keras_model, numpy_model, build_inputs())
+
+        assert result[PARITY_OK], f"Expected the NumPy engine to match Keras, but got {result}"
+        assert result[MISMATCHED_PREDICTIONS] == 0, f"Expected no mismatched predictions, but got {result[MISMATCHED_PREDICTIONS]}"
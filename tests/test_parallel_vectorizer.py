@@ -0,0 +1,76 @@
+# This module implements unit tests for the Parallel_Vectorizer class in the Resources/ParallelVectorizer.py module.
+''' Implements tests for the parallel vectorizer. '''
+
+# Import the required libraries
+import threading
+import pytest
+from unittest.mock import patch, MagicMock
+from Resources.ParallelVectorizer import Parallel_Vectorizer
+
+# Define the test constants
+TRAINING_MESSAGES = ['free prize call now', 'are you coming home', 'win a free holiday', 'see you at home']
+MESSAGES = [f'{message} {i}' for i in range(25) for message in TRAINING_MESSAGES]
+WORKERS = 3
+
+
+def build_vectorizer():
+    # Fit a TF-IDF vectorizer with the default (picklable) tokenizer
+    text = pytest.importorskip('sklearn.feature_extraction.text')
+    vectorizer = text.TfidfVectorizer()
+    vectorizer.fit(TRAINING_MESSAGES)
+    return vectorizer
+
+
+class Tests__Parallel_Vectorizer:
+
+    def test__matches_serial_transform(self):
+        vectorizer = build_vectorizer()
+
+        with Parallel_Vectorizer(vectorizer, workers=WORKERS, min_batch_size=10) as parallel_vectorizer:
+            result = parallel_vectorizer.transform(MESSAGES)
+            assert parallel_vectorizer._pool is not None, "Expected the batch to be vectorized in parallel"
+
+        expected = vectorizer.transform(MESSAGES)
+        assert result.shape == expected.shape, f"Expected shape {expected.shape}, but got {result.shape}"
+        assert (result != expected).nnz == 0, "Expected the parallel result to match the serial result, in order"
+
+    def test__small_batches_stay_in_process(self):
+        mock_vectorizer = MagicMock()
+        parallel_vectorizer = Parallel_Vectorizer(mock_vectorizer, workers=WORKERS, min_batch_size=1000)
+
+        result = parallel_vectorizer.transform(MESSAGES)
+        assert result is mock_vectorizer.transform.return_value, f"Expected the serial result, but got {result}"
+        assert parallel_vectorizer._pool is None, "Expected no worker processes to be started"
+
+    def test__single_worker_stays_in_process(self):
+        mock_vectorizer = MagicMock()
+        parallel_vectorizer = Parallel_Vectorizer(mock_vectorizer, workers=1, min_batch_size=1)
+
+        parallel_vectorizer.transform(MESSAGES)
+        assert parallel_vectorizer._pool is None, "Expected no worker processes to be started"
+
+    def test__concurrent_first_use_starts_one_pool(self):
+        parallel_vectorizer = Parallel_Vectorizer(build_vectorizer(), workers=WORKERS, min_batch_size=10)
+        start = threading.Barrier(8)
+        pools = []
+
+        def get_pool():
+            start.wait()
+            pools.append(parallel_vectorizer._get_pool())
+
+        with patch('Resources.ParallelVectorizer.ProcessPoolExecutor') as mock_executor:
+            threads = [threading.Thread(target=get_pool) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert mock_executor.call_count == 1, f"Expected 1 pool to be started, but got {mock_executor.call_count}"
+        assert pools == [mock_executor.return_value] * 8, f"Expected every thread to share the pool, but got {pools}"
+
+    def test__delegates_attributes(self):
+        mock_vectorizer = MagicMock()
+        mock_vectorizer.vocabulary_ = {'free': 0}
+        parallel_vectorizer = Parallel_Vectorizer(mock_vectorizer)
+
+        assert parallel_vectorizer.vocabulary_ == {'free': 0}, f"Unexpected vocabulary: {parallel_vectorizer.vocabulary_}"
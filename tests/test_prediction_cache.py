@@ -0,0 +1,107 @@
+# This module implements unit tests for the Prediction_Cache class in the Resources/PredictionCache.py module.
+''' Implements tests for the prediction cache. '''
+
+# Import the required libraries
+from Resources.PredictionCache import Prediction_Cache
+
+# Define the test constants
+HAM = 'ham'
+SPAM = 'spam'
+MESSAGE_1 = 'Hello, how are you?'
+MESSAGE_2 = 'Congratulations, you have won a prize!'
+MESSAGE_3 = 'You have been selected for a job interview.'
+VERSION_1 = 'model_v1'
+VERSION_2 = 'model_v2'
+TTL_SECONDS = 60
+HITS = 'hits'
+MISSES = 'misses'
+SIZE = 'size'
+EVICTIONS = 'evictions'
+EXPIRATIONS = 'expirations'
+HIT_RATE = 'hit_rate'
+
+
+class Fake_Clock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class Tests__Prediction_Cache:
+
+    def test__get_after_put(self):
+        cache = Prediction_Cache(max_size=10)
+        cache.put_many({MESSAGE_1: HAM, MESSAGE_2: SPAM})
+
+        result = cache.get_many([MESSAGE_1, MESSAGE_2, MESSAGE_3])
+        assert result == {MESSAGE_1: HAM, MESSAGE_2: SPAM}, f"Expected the cached predictions, but got {result}"
+
+        stats = cache.stats()
+        assert stats[HITS] == 2, f"Expected stats[{HITS}] == 2, but got {stats[HITS]}"
+        assert stats[MISSES] == 1, f"Expected stats[{MISSES}] == 1, but got {stats[MISSES]}"
+        assert stats[HIT_RATE] == 2 / 3, f"Expected stats[{HIT_RATE}] == {2 / 3}, but got {stats[HIT_RATE]}"
+
+    def test__least_recently_used_is_evicted(self):
+        cache = Prediction_Cache(max_size=2)
+        cache.put(MESSAGE_1, HAM)
+        cache.put(MESSAGE_2, SPAM)
+
+        # Using MESSAGE_1 makes MESSAGE_2 the least recently used entry
+        cache.get(MESSAGE_1)
+        cache.put(MESSAGE_3, HAM)
+
+        assert cache.get(MESSAGE_2) is None, "Expected the least recently used entry to be evicted"
+        assert cache.get(MESSAGE_1) == HAM, "Expected the recently used entry to be kept"
+
+        stats = cache.stats()
+        assert stats[SIZE] == 2, f"Expected stats[{SIZE}] == 2, but got {stats[SIZE]}"
+        assert stats[EVICTIONS] == 1, f"Expected stats[{EVICTIONS}] == 1, but got {stats[EVICTIONS]}"
+
+    def test__entries_expire(self):
+        clock = Fake_Clock()
+        cache = Prediction_Cache(max_size=10, ttl_seconds=TTL_SECONDS, clock=clock)
+        cache.put(MESSAGE_1, HAM)
+
+        clock.now = TTL_SECONDS - 1
+        assert cache.get(MESSAGE_1) == HAM, "Expected the entry to be valid before its time-to-live"
+
+        clock.now = TTL_SECONDS
+        assert cache.get(MESSAGE_1) is None, "Expected the entry to expire after its time-to-live"
+
+        stats = cache.stats()
+        assert stats[EXPIRATIONS] == 1, f"Expected stats[{EXPIRATIONS}] == 1, but got {stats[EXPIRATIONS]}"
+        assert stats[SIZE] == 0, f"Expected stats[{SIZE}] == 0, but got {stats[SIZE]}"
+
+    def test__keys_depend_on_version(self):
+        cache_1 = Prediction_Cache(max_size=10, version=VERSION_1)
+        cache_2 = Prediction_Cache(max_size=10, version=VERSION_2)
+
+        assert cache_1.key(MESSAGE_1) != cache_2.key(MESSAGE_1), "Expected different versions to use different keys"
+        assert cache_1.key(MESSAGE_1) != cache_1.key(MESSAGE_2), "Expected different messages to use different keys"
+
+    def test__versions_share_one_cache(self):
+        cache = Prediction_Cache(max_size=10, version=VERSION_1)
+        cache.put_many({MESSAGE_1: HAM})
+        cache.put_many({MESSAGE_1: SPAM}, version=VERSION_2)
+
+        assert cache.get_many([MESSAGE_1]) == {MESSAGE_1: HAM}, "Expected the cache's own version by default"
+        assert cache.get_many([MESSAGE_1], version=VERSION_2) == {MESSAGE_1: SPAM}, "Expected the prediction of the requested version"
+
+    def test__disabled_cache(self):
+        cache = Prediction_Cache(max_size=0)
+        cache.put(MESSAGE_1, HAM)
+
+        assert cache.get(MESSAGE_1) is None, "Expected a disabled cache to never return predictions"
+        assert cache.stats()[SIZE] == 0, "Expected a disabled cache to stay empty"
+
+    def test__clear(self):
+        cache = Prediction_Cache(max_size=10)
+        cache.put(MESSAGE_1, HAM)
+        cache.get(MESSAGE_1)
+        cache.clear()
+
+        stats = cache.stats()
+        assert stats[SIZE] == 0 and stats[HITS] == 0, f"Expected an empty cache, but got {stats}"
@@ -0,0 +1,136 @@
+# This module implements unit tests for the pre-fork HTTP server in the Resources/PreforkServer.py module.
+''' Implements tests for the pre-fork HTTP server. '''
+
+# Import the required libraries
+import os
+import sys
+import json
+import asyncio
+import pytest
+import numpy as np
+from unittest.mock import MagicMock, patch
+from sklearn.feature_extraction.text import TfidfVectorizer
+from Resources.NumpyModel import Numpy_Model
+from Resources.CompactVectorizer import Compact_Vectorizer, export_vectorizer
+from Resources.PreforkServer import Prefork_Server, memory_usage, is_memory_mapped, unshared_artifacts
+
+# Define the test constants
+HAM = 'ham'
+SPAM = 'spam'
+MESSAGE_1 = 'Hello, how are you?'
+MESSAGE_2 = 'Congratulations, you have won a prize!'
+FUNCTION_NAME = 'spam_or_ham'
+TRAINING_MESSAGES = ['win a free prize', 'see you at lunch', 'free cash now']
+NUM_WORKERS = 2
+
+
+def classify(messages):
+    # Classify MESSAGE_2 as spam and everything else as ham, and report the worker that did it
+    return {message: f'{SPAM if message == MESSAGE_2 else HAM}:{os.getpid()}' for message in messages}
+
+
+def build_artifacts(path):
+    # Save a small model and vectorizer in the memory-mapped formats and load them back
+    vectorizer = TfidfVectorizer(tokenizer=str.split, token_pattern=None).fit(TRAINING_MESSAGES)
+    num_features = len(vectorizer.vocabulary_)
+    Numpy_Model([np.ones((num_features, 2))], [np.zeros(2)], ['softmax']).save_mapped(path / 'weights')
+    export_vectorizer(vectorizer, str(path / 'vectorizer'))
+
+    return (Numpy_Model.load(str(path / 'weights')), Compact_Vectorizer.load(str(path / 'vectorizer'), str.split),
+            vectorizer)
+
+
+async def post(port, event):
+    # Send an event to the server and return the HTTP status and the decoded response
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    body = json.dumps(event).encode('utf-8')
+    writer.write(f'POST / HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode('latin-1') + body)
+    await writer.drain()
+
+    response = await reader.read()
+    writer.close()
+
+    head, _, payload = response.partition(b'\r\n\r\n')
+    return int(head.split(b' ')[1]), json.loads(payload)
+
+
+class Tests__Shared_Artifacts:
+
+    def test__memory_mapped_artifacts_are_shared(self, tmp_path):
+        model, vectorizer, _ = build_artifacts(tmp_path)
+        result = unshared_artifacts(model, vectorizer)
+        assert result == [], f"Expected every artifact to be memory-mapped, but got {result}"
+
+    def test__in_memory_artifacts_are_reported(self, tmp_path):
+        _, _, vectorizer = build_artifacts(tmp_path)
+        model = Numpy_Model([np.ones((len(vectorizer.vocabulary_), 2))], [np.zeros(2)], ['softmax'])
+        result = unshared_artifacts(model, vectorizer)
+        assert result == ['model', 'vectorizer'], f"Expected both artifacts to be reported, but got {result}"
+
+    def test__keras_backend_is_rejected(self, tmp_path):
+        _, vectorizer, _ = build_artifacts(tmp_path)
+        with pytest.raises(ValueError, match='requires the numpy model backend'):
+            unshared_artifacts(MagicMock(spec=['predict', 'input_shape', 'output_shape']), vectorizer)
+
+    def test__is_memory_mapped(self, tmp_path):
+        np.save(tmp_path / 'array.npy', np.arange(4))
+        mapped = np.asarray(np.load(tmp_path / 'array.npy', mmap_mode='r'))
+        assert is_memory_mapped(mapped), "Expected a view of a memory map to be detected"
+        assert not is_memory_mapped(np.arange(4)), "Expected an in-memory array not to be detected"
+
+
+class Tests__Memory_Usage:
+
+    def test__current_process(self):
+        usage = memory_usage()
+        if usage is None:
+            pytest.skip('smaps_rollup is not available on this platform')
+        assert usage['rss_mb'] > 0, f"Expected a resident size, but got {usage}"
+        assert usage['private_mb'] + usage['shared_mb'] == pytest.approx(usage['rss_mb'], abs=0.01), \
+            f"Expected the private and shared memory to add up to the resident size, but got {usage}"
+
+    def test__missing_process(self):
+        assert memory_usage(-1) is None, "Expected no memory usage for a missing process"
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='Requires os.fork')
+class Tests__Prefork_Server:
+
+    def test__workers_serve_the_shared_socket(self):
+        server = Prefork_Server(classify, workers=NUM_WORKERS, host='127.0.0.1', port=0)
+
+        # Other tests may have imported TensorFlow into this process; these workers never use it
+        with patch.dict(sys.modules):
+            sys.modules.pop('tensorflow', None)
+            server.start()
+        try:
+            async def run():
+                return await asyncio.gather(*[post(server.port, {'function': FUNCTION_NAME, 'messages': [MESSAGE_1, MESSAGE_2]})
+                                              for _ in range(4)])
+
+            results = asyncio.run(run())
+            workers = set(server.pids)
+        finally:
+            server.stop()
+
+        for status, response in results:
+            labels = {message: label.split(':') for message, label in response['responses'].items()}
+            assert status == 200, f"Expected status 200, but got {status}"
+            assert labels[MESSAGE_1][0] == HAM and labels[MESSAGE_2][0] == SPAM, f"Unexpected response: {response}"
+            assert int(labels[MESSAGE_1][1]) in workers, f"Expected a worker to classify the messages, but got {labels}"
+        assert len(workers) == NUM_WORKERS, f"Expected {NUM_WORKERS} workers, but got {workers}"
+        assert server.pids == set(), f"Expected every worker to be stopped, but got {server.pids}"
+
+    def test__tensorflow_is_not_forked(self):
+        server = Prefork_Server(classify, workers=NUM_WORKERS, host='127.0.0.1', port=0)
+
+        # Mock TensorFlow as imported
+        with patch.dict(sys.modules, {'tensorflow': MagicMock()}):
+            with pytest.raises(RuntimeError, match='imported tensorflow'):
+                server.start()
+
+        assert server.pids == set(), f"Expected no workers to be forked, but got {server.pids}"
+
+    def test__invalid_worker_count(self):
+        with pytest.raises(ValueError, match='at least 1 worker'):
+            Prefork_Server(classify, workers=0)
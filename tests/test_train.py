@@ -0,0 +1,71 @@
+# This module implements unit tests for the training pipeline in the Resources/Train.py module.
+''' Implements tests for the training pipeline. '''
+
+# Import the required libraries
+import numpy as np
+from unittest.mock import patch
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from Resources.Train import sparse_batches, load_tokenized_corpus, artifact_name
+
+# Define the test constants
+MESSAGES = ['win a free prize', 'see you at lunch', 'free cash now', 'call me later', 'hello friend']
+LABELS = [1, 0, 1, 0, 0]
+ENGINE = 'split'
+
+
+def build_vectorizer():
+    # Build a vectorizer that tokenizes on whitespace
+    return TfidfVectorizer(tokenizer=str.split, token_pattern=None)
+
+
+class Tests__Sparse_Batches:
+
+    def test__batches_cover_every_message_each_epoch(self):
+        encoded = sparse.csr_matrix(np.arange(len(MESSAGES), dtype=float).reshape(-1, 1))
+        batches = sparse_batches(encoded, LABELS, batch_size=2, seed=0)
+
+        for _ in range(2):
+            epoch = [next(batches) for _ in range(3)]
+            sizes = [inputs.shape[0] for inputs, _ in epoch]
+            rows = np.concatenate([inputs[:, 0] for inputs, _ in epoch]).astype(int)
+            assert sizes == [2, 2, 1], f"Expected batches of [2, 2, 1], but got {sizes}"
+            assert sorted(rows) == list(range(len(MESSAGES))), f"Expected every message once per epoch, but got {rows}"
+
+    def test__dense_float32_one_hot(self):
+        encoded = sparse.csr_matrix(np.eye(len(MESSAGES)))
+        inputs, targets = next(sparse_batches(encoded, LABELS, batch_size=len(MESSAGES), shuffle=False))
+        expected = np.eye(2)[LABELS]
+        assert isinstance(inputs, np.ndarray) and inputs.dtype == np.float32, f"Expected a float32 array, but got {type(inputs)}"
+        assert np.array_equal(targets, expected), f"Expected one-hot labels {expected}, but got {targets}"
+
+
+class Tests__Tokenized_Corpus:
+
+    def test__second_run_uses_cache(self, tmp_path):
+        expected = [message.split() for message in MESSAGES]
+        first = load_tokenized_corpus(build_vectorizer(), MESSAGES, ENGINE, str(tmp_path))
+
+        with patch('Resources.Train.tokenize_corpus') as tokenize:
+            second = load_tokenized_corpus(build_vectorizer(), MESSAGES, ENGINE, str(tmp_path))
+
+        assert first == expected, f"Expected {expected}, but got {first}"
+        assert second == expected, f"Expected the cached tokens {expected}, but got {second}"
+        assert not tokenize.called, "Expected the second run not to tokenize"
+
+    def test__engine_is_part_of_the_key(self, tmp_path):
+        load_tokenized_corpus(build_vectorizer(), MESSAGES, ENGINE, str(tmp_path))
+        load_tokenized_corpus(build_vectorizer(), MESSAGES, 'other', str(tmp_path))
+        files = list(tmp_path.iterdir())
+        assert len(files) == 2, f"Expected one cache file per engine, but got {files}"
+
+    def test__no_cache(self, tmp_path):
+        result = load_tokenized_corpus(build_vectorizer(), MESSAGES, ENGINE, None)
+        assert result == [message.split() for message in MESSAGES], f"Unexpected tokens: {result}"
+
+
+class Tests__Artifact_Name:
+
+    def test__notebook_naming_scheme(self):
+        result = artifact_name(0.99875, epochs=5, batch_size=32)
+        assert result == 'Sequential_0.99875_5_32_1_64_relu_softmax', f"Unexpected artifact name: {result}"
@@ -0,0 +1,69 @@
+# This module implements unit tests for the vocabulary pruning tool in the Resources/VocabularyPruning.py module.
+''' Implements tests for the vocabulary pruning tool. '''
+
+# Import the required libraries
+import pytest
+import numpy as np
+from scipy import sparse
+from Resources.VocabularyPruning import rank_features, prune_vocabulary, build_vectorizer, artifact_name
+
+# Define the test constants
+TOKENS = [['free', 'prize', 'win'], ['hello', 'friend'], ['win', 'free', 'cash'], ['see', 'you', 'friend']]
+LABELS = [1, 0, 1, 0]
+VOCABULARY = {'cash': 0, 'free': 1, 'friend': 2, 'hello': 3, 'prize': 4, 'see': 5, 'win': 6, 'you': 7}
+CLASS_SPECIFIC_TERMS = {'free', 'friend', 'win'}  # Appear in both messages of one class and none of the other
+
+
+def build_counts():
+    # Build the term counts of TOKENS over VOCABULARY
+    counts = np.zeros((len(TOKENS), len(VOCABULARY)))
+    for row, tokens in enumerate(TOKENS):
+        for token in tokens:
+            counts[row, VOCABULARY[token]] += 1
+    return sparse.csr_matrix(counts)
+
+
+class Tests__Rank_Features:
+
+    @pytest.mark.parametrize('method', ['chi2', 'mutual_info'])
+    def test__most_informative_first(self, method):
+        ranking = rank_features(build_counts(), LABELS, method)
+        terms = {term for term, column in VOCABULARY.items() if column in ranking[:3]}
+        assert sorted(ranking) == list(range(len(VOCABULARY))), f"Expected every feature to be ranked, but got {ranking}"
+        assert terms == CLASS_SPECIFIC_TERMS, f"Expected {CLASS_SPECIFIC_TERMS} first, but got {terms}"
+
+    def test__invalid_method(self):
+        with pytest.raises(ValueError, match='Invalid ranking method'):
+            rank_features(build_counts(), LABELS, 'invalid')
+
+
+class Tests__Prune_Vocabulary:
+
+    def test__keeps_top_terms_sorted(self):
+        ranking = np.array([6, 1, 2, 0, 3, 4, 5, 7])
+        result = prune_vocabulary(VOCABULARY, ranking, 3)
+        assert result == ['free', 'friend', 'win'], f"Expected ['free', 'friend', 'win'], but got {result}"
+
+    def test__invalid_size(self):
+        with pytest.raises(ValueError, match='at least 1'):
+            prune_vocabulary(VOCABULARY, np.arange(len(VOCABULARY)), 0)
+
+
+class Tests__Build_Vectorizer:
+
+    def test__fixed_vocabulary(self):
+        vectorizer, encoded = build_vectorizer(['free', 'friend', 'win'], TOKENS)
+        assert encoded.shape == (len(TOKENS), 3), f"Expected shape {(len(TOKENS), 3)}, but got {encoded.shape}"
+        assert vectorizer.vocabulary_ == {'free': 0, 'friend': 1, 'win': 2}, f"Unexpected vocabulary: {vectorizer.vocabulary_}"
+
+    def test__rows_are_normalized_over_kept_terms(self):
+        _, encoded = build_vectorizer(['free', 'win'], TOKENS)
+        norms = np.sqrt(encoded.multiply(encoded).sum(axis=1)).A1
+        assert np.allclose(norms, [1, 0, 1, 0]), f"Expected unit rows for messages with kept terms, but got {norms}"
+
+
+class Tests__Artifact_Name:
+
+    def test__notebook_naming_scheme(self):
+        result = artifact_name(0.99875)
+        assert result == 'Sequential_0.99875_10_64_1_64_relu_softmax', f"Unexpected artifact name: {result}"